@@ -7,6 +7,9 @@ from .base_provider import BaseIAProvider
 from .provider_factory import ProviderFactory
 from .function_utils import normalize_name, clip_value, slugify
 from .path_utils import get_project_root, ensure_directory
+from .schema_utils import compact_schema, expand_arguments
+from .concurrency import AdaptiveLimiter, get_limiter
+from .render_queue import RenderQueue, render_priority, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 
 __all__ = [
     'BaseIAProvider',
@@ -16,5 +19,13 @@ __all__ = [
     'slugify',
     'get_project_root',
     'ensure_directory',
+    'compact_schema',
+    'expand_arguments',
+    'AdaptiveLimiter',
+    'get_limiter',
+    'RenderQueue',
+    'render_priority',
+    'PRIORITY_INTERACTIVE',
+    'PRIORITY_BACKGROUND',
 ]
 
@@ -0,0 +1,450 @@
+"""
+Assets pre-decodificados ("horneados") para cargas instantáneas.
+
+Decodificar PNG/JPG con pg.image.load domina el tiempo de entrada a las
+escenas. Este módulo guarda cada imagen ya decodificada (y, si se pide, ya
+escalada al tamaño de la UI) como un blob RGBA crudo con una cabecera
+pequeña; la UI lo abre con mmap y crea la superficie con pg.image.frombuffer
+sin pasar por el decodificador.
+
+Formato del blob (little endian, cabecera de HEADER_SIZE bytes):
+    magic, versión, ancho, alto, flags, mtime_ns y tamaño del fichero fuente,
+    hash blake2b-128 del fichero fuente, crop_info (-1 si no hay), píxeles RGBA
+
+Invalidación: si mtime_ns y tamaño coinciden con la fuente, el blob es
+válido sin leer nada más; si solo cambia el mtime (p.ej. tras copiar el
+fichero) se compara el hash del contenido y se actualiza la cabecera; si el
+contenido cambió, se vuelve a hornear.
+
+Derivados: al guardar una imagen generada (hilo de write-behind) se hornea
+también a cada tamaño al que la dibuja la UI (ver derivative_sizes), con el
+mismo filtro que usa la escena (LANCZOS; nearest en los fondos); la escena carga el tamaño exacto y no escala en cada entrada. Un
+derivado de una imagen recortada ya lleva el contenido recolocado en su
+lienzo (como pg_assets.scale_cropped), así que no trae crop_info.
+
+Uso:
+    python -m app.Agent.Utils.asset_bake --bake     # hornear retratos, fondos, sprites y derivados
+    python -m app.Agent.Utils.asset_bake --bench    # comparar con pg.image.load
+"""
+
+import os
+import mmap
+import time
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from app.Agent.Utils.path_utils import get_project_root, ensure_directory
+from app.Agent.Utils.image_postprocess import CropInfo, read_crop_info, place_cropped
+
+BLOB_MAGIC = b"AFRGBA"
+BLOB_VERSION = 1
+BLOB_SUFFIX = ".rgba"
+# magic, versión, ancho, alto, flags, mtime_ns, tamaño, hash, crop_info
+_HEADER = struct.Struct("<6sHIIIqq16s4i")
+_MTIME_OFFSET = 20
+HEADER_SIZE = 80  # cabecera (68 bytes) + relleno
+FLAG_SMOOTH = 1
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+SPRITES_DIR = "app/UI/assets/images/sprites"
+TEST_PORTRAITS_DIR = "app/UI/assets/test/portraits"
+# Los fondos se escalan con nearest (pixel art nítido, ver pg_assets.load_background);
+# el filtro forma parte de la identidad del blob, así que se hornean igual
+BACKGROUND_SMOOTH = False
+
+
+class BakedImage:
+    """
+    Blob abierto con mmap. Se usa como context manager:
+
+        with baker.open(path) as baked:
+            surf = pg.image.frombuffer(baked.pixels, baked.size, "RGBA").convert_alpha()
+    """
+
+    def __init__(self, mm: mmap.mmap, size: Tuple[int, int], crop_info: Optional[CropInfo]):
+        self._mm = mm
+        self.size = size
+        self.crop_info = crop_info
+        self.pixels = memoryview(mm)[HEADER_SIZE:HEADER_SIZE + size[0] * size[1] * 4]
+
+    def close(self):
+        try:
+            self.pixels.release()
+            self._mm.close()
+        except BufferError:
+            # Alguna superficie sigue usando el buffer: lo cierra el GC
+            pass
+
+    def __enter__(self) -> "BakedImage":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _content_hash(src: Path) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+class AssetBaker:
+    """Almacén de blobs RGBA pre-decodificados, invalidados por mtime/tamaño/hash de la fuente."""
+
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: Directorio de los blobs
+        """
+        self.root = Path(root)
+        self.baked = 0
+        self._later: dict = {}  # (fuente, tamaño, smooth) -> Future del horneado en vuelo
+        self._later_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def blob_path(self, src: Path, size: Optional[Tuple[int, int]] = None, smooth: bool = True) -> Path:
+        """
+        Ruta del blob de una imagen fuente a un tamaño dado (exista o no).
+
+        Args:
+            src: Imagen fuente
+            size: Tamaño al que se escala al hornear (None = tamaño original)
+            smooth: Escalado suave (LANCZOS) o nearest (pixel art)
+        """
+        ident = f"{os.path.abspath(src)}|{tuple(size) if size else None}|{int(bool(smooth))}"
+        digest = hashlib.sha1(ident.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / f"{Path(src).stem}.{digest[:16]}{BLOB_SUFFIX}"
+
+    def bake(self, src: Path, size: Optional[Tuple[int, int]] = None, smooth: bool = True,
+             image: Optional[Image.Image] = None, crop_info: Optional[CropInfo] = None) -> Path:
+        """
+        Hornea una imagen: decodifica (o usa la ya decodificada), escala y escribe el blob.
+
+        Args:
+            src: Imagen fuente (su mtime, tamaño y hash invalidan el blob)
+            size: Tamaño final (None = original). Si la imagen está recortada, el
+                  contenido se recoloca en su lienzo escalado y el blob no lleva crop_info
+            smooth: Escalado suave o nearest
+            image: Imagen ya decodificada (evita volver a leer la fuente)
+            crop_info: Info de recorte (por defecto la del PNG fuente)
+
+        Returns:
+            Path: Ruta del blob
+        """
+        src = Path(src)
+        stat = src.stat()
+        if image is None:
+            with Image.open(src) as img:
+                rgba = img.convert("RGBA")
+        else:
+            rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+        if crop_info is None:
+            crop_info = read_crop_info(src)
+        if size is not None and (crop_info or rgba.size != tuple(size)):
+            rgba = place_cropped(rgba, crop_info, size, smooth)
+            crop_info = None
+
+        header = _HEADER.pack(
+            BLOB_MAGIC, BLOB_VERSION, rgba.size[0], rgba.size[1], FLAG_SMOOTH if smooth else 0,
+            stat.st_mtime_ns, stat.st_size, _content_hash(src), *(crop_info or (-1, -1, -1, -1)),
+        ).ljust(HEADER_SIZE, b"\0")
+
+        dst = self.blob_path(src, size, smooth)
+        ensure_directory(dst.parent)
+        fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.stem}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(rgba.tobytes())
+            os.replace(tmp, dst)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.baked += 1
+        return dst
+
+    def open(self, src: Path, size: Optional[Tuple[int, int]] = None, smooth: bool = True) -> Optional[BakedImage]:
+        """
+        Abre el blob de una imagen si existe y sigue siendo válido para la fuente.
+
+        Returns:
+            BakedImage (hay que cerrarlo) o None si falta o está obsoleto
+        """
+        src = Path(src)
+        try:
+            stat = src.stat()
+            with open(self.blob_path(src, size, smooth), "r+b") as f:
+                mm = mmap.mmap(f.fileno(), 0)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, version, w, h, _flags, mtime_ns, src_size, digest, *crop = _HEADER.unpack_from(mm)
+            if magic != BLOB_MAGIC or version != BLOB_VERSION or len(mm) < HEADER_SIZE + w * h * 4:
+                raise ValueError("blob inválido")
+            if src_size != stat.st_size:
+                raise ValueError("fuente modificada")
+            if mtime_ns != stat.st_mtime_ns:
+                # Mismo tamaño, otra fecha: decidir por contenido
+                if _content_hash(src) != digest:
+                    raise ValueError("fuente modificada")
+                struct.pack_into("<q", mm, _MTIME_OFFSET, stat.st_mtime_ns)
+        except (ValueError, struct.error):
+            mm.close()
+            return None
+        return BakedImage(mm, (w, h), None if crop[0] < 0 else tuple(crop))
+
+    def load(self, src: Path, size: Optional[Tuple[int, int]] = None, smooth: bool = True) -> Optional[BakedImage]:
+        """
+        Abre el blob de una imagen y, si falta o está obsoleto, lo hornea antes.
+
+        Returns:
+            BakedImage o None si la fuente no se puede leer
+        """
+        baked = self.open(src, size, smooth)
+        if baked is not None:
+            return baked
+        try:
+            self.bake(src, size, smooth)
+        except Exception as e:
+            print(f"[AssetBake] ⚠️ No se pudo hornear {src}: {e}")
+            return None
+        return self.open(src, size, smooth)
+
+    def bake_later(self, src: Path, size: Optional[Tuple[int, int]] = None, smooth: bool = True) -> Future:
+        """
+        Hornea una imagen en un hilo propio (una vez por fuente y tamaño en vuelo):
+        la UI carga el PNG esta vez y el blob queda listo para la siguiente.
+
+        Returns:
+            Future con la ruta del blob (o la excepción si no se pudo hornear)
+        """
+        key = (os.path.abspath(src), tuple(size) if size else None, bool(smooth))
+
+        def run():
+            try:
+                baked = self.open(src, size, smooth)
+                if baked is not None:
+                    baked.close()
+                    return self.blob_path(src, size, smooth)
+                return self.bake(src, size, smooth)
+            except Exception as e:
+                print(f"[AssetBake] ⚠️ No se pudo hornear {src}: {e}")
+                raise
+            finally:
+                with self._later_lock:
+                    self._later.pop(key, None)
+
+        # Se encola con el lock tomado: run() no puede olvidar la clave antes de registrarla
+        with self._later_lock:
+            future = self._later.get(key)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AssetBake")
+                future = self._later[key] = self._executor.submit(run)
+        return future
+
+    def bake_derivatives(self, src: Path, image: Optional[Image.Image] = None,
+                         crop_info: Optional[CropInfo] = None) -> int:
+        """
+        Hornea los derivados de una imagen a los tamaños de la UI (ver derivative_sizes).
+        Con image (recién guardada) se hornean todos sin decodificar la fuente;
+        sin ella solo los que faltan o están obsoletos.
+
+        Returns:
+            int: Número de blobs escritos
+        """
+        written = 0
+        for size, smooth in derivative_sizes(src):
+            if image is None:
+                baked = self.open(src, size, smooth)
+                if baked is not None:
+                    baked.close()
+                    continue
+            self.bake(src, size, smooth, image=image, crop_info=crop_info)
+            written += 1
+        return written
+
+    def bake_all(self, targets: Iterable[Tuple[Path, Optional[Tuple[int, int]], bool]]) -> int:
+        """
+        Hornea las imágenes cuyo blob falta o está obsoleto.
+
+        Args:
+            targets: (fuente, tamaño, smooth) como los carga la UI (ver ui_targets)
+
+        Returns:
+            int: Número de blobs escritos
+        """
+        written = 0
+        for src, size, smooth in targets:
+            baked = self.open(src, size, smooth)
+            if baked is not None:
+                baked.close()
+                continue
+            try:
+                self.bake(src, size, smooth)
+                written += 1
+            except Exception as e:
+                print(f"[AssetBake] ⚠️ No se pudo hornear {src}: {e}")
+        return written
+
+
+# ---------------- instancia global ----------------
+_baker: Optional[AssetBaker] = None
+_baker_lock = threading.Lock()
+
+
+def get_asset_baker() -> Optional[AssetBaker]:
+    """Obtiene el almacén global (lazy initialization), o None si está desactivado"""
+    global _baker
+    from settings.settings import settings
+    if not getattr(settings, 'ASSET_BAKE_ENABLED', True):
+        return None
+    if _baker is None:
+        with _baker_lock:
+            if _baker is None:
+                base = Path(getattr(settings, 'ASSET_BAKE_DIR', None) or "cache/baked")
+                _baker = AssetBaker(base if base.is_absolute() else get_project_root() / base)
+    return _baker
+
+
+# ---------------- horneado de la UI ----------------
+def _images(directory: Path) -> List[Path]:
+    if not directory.exists():
+        return []
+    return sorted(p for p in directory.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def _resolve(value) -> Path:
+    return (Path(value) if Path(value).is_absolute() else get_project_root() / value).resolve()
+
+
+def derivative_sizes(src: Path) -> List[Tuple[Tuple[int, int], bool]]:
+    """
+    Tamaños (y filtro) a los que la UI dibuja una imagen, según su carpeta:
+    retratos al hueco de su marco en la selección de personaje y fondos a
+    pantalla completa (con settings.WIDTH/HEIGHT actuales).
+
+    Returns:
+        List[(tamaño, smooth)]
+    """
+    from settings.settings import settings
+    from app.UI.ui_layout import portrait_slot_size
+    src = Path(src).resolve()
+    parent = src.parent
+    if any(value and parent == _resolve(value) for value in (settings.PORTRAIT_DIR, TEST_PORTRAITS_DIR)):
+        return [(portrait_slot_size(settings.WIDTH), not getattr(settings, 'PIXEL_ART_MODE', False))]
+    screen = (settings.WIDTH, settings.HEIGHT)
+    if any(value and parent == _resolve(value) for value in (settings.BG_GEN_DIR, settings.BG_FIGHT_DIR)):
+        return [(screen, BACKGROUND_SMOOTH)]
+    if any(value and src == _resolve(value) for value in (settings.BG_MENU, settings.BG_SELECT)):
+        return [(screen, BACKGROUND_SMOOTH)]
+    return []
+
+
+def ui_targets() -> List[Tuple[Path, Optional[Tuple[int, int]], bool]]:
+    """
+    Imágenes de la UI con el tamaño y filtro con que las carga cada escena:
+    fondos a pantalla completa (nearest); retratos y sprites a su tamaño original.
+    """
+    from settings.settings import settings
+    root = get_project_root()
+
+    def resolve(value) -> Path:
+        return Path(value) if Path(value).is_absolute() else root / value
+
+    screen = (settings.WIDTH, settings.HEIGHT)
+    targets: List[Tuple[Path, Optional[Tuple[int, int]], bool]] = []
+    for value in (settings.BG_MENU, settings.BG_SELECT, settings.BG_FIGHT_DIR, settings.BG_GEN_DIR):
+        if value:
+            path = resolve(value)
+            targets.extend((p, screen, BACKGROUND_SMOOTH) for p in ([path] if path.is_file() else _images(path)))
+    for value in (settings.PORTRAIT_DIR, TEST_PORTRAITS_DIR, SPRITES_DIR):
+        if value:
+            targets.extend((p, None, True) for p in _images(resolve(value)))
+    # Sin duplicados (un directorio puede estar dentro de otro)
+    return list(dict.fromkeys(targets))
+
+
+def benchmark(baker: AssetBaker, targets: List[Tuple[Path, Optional[Tuple[int, int]], bool]],
+              repeats: int = 3) -> Tuple[float, float]:
+    """
+    Compara pg.image.load (+ escalado) con el blob horneado (mmap + frombuffer).
+
+    Returns:
+        (ms por imagen con PNG, ms por imagen horneada)
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame as pg
+
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    baker.bake_all(targets)
+
+    def png(src, size, smooth):
+        img = pg.image.load(str(src)).convert_alpha()
+        scale = pg.transform.smoothscale if smooth else pg.transform.scale
+        return scale(img, size) if size and img.get_size() != tuple(size) else img
+
+    def baked(src, size, smooth):
+        with baker.open(src, size, smooth) as b:
+            tmp = pg.image.frombuffer(b.pixels, b.size, "RGBA")
+            img = tmp.convert_alpha()
+            del tmp
+        return img
+
+    results = []
+    try:
+        for loader in (png, baked):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for src, size, smooth in targets:
+                    loader(src, size, smooth)
+            results.append((time.perf_counter() - start) * 1000 / max(1, repeats * len(targets)))
+    finally:
+        pg.display.quit()
+    return results[0], results[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assets pre-decodificados (blobs RGBA)")
+    parser.add_argument("--bake", action="store_true", help="Hornear retratos, fondos y sprites")
+    parser.add_argument("--bench", action="store_true", help="Comparar la carga horneada con PNG")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeticiones del benchmark")
+    args = parser.parse_args()
+
+    baker = get_asset_baker()
+    if baker is None:
+        print("[AssetBake] ⚠️ Horneado desactivado (ASSET_BAKE_ENABLED)")
+        return
+    targets = ui_targets()
+    if args.bake:
+        written = baker.bake_all(targets)
+        for src in dict.fromkeys(src for src, _, _ in targets):
+            try:
+                written += baker.bake_derivatives(src)
+            except Exception as e:
+                print(f"[AssetBake] ⚠️ No se pudieron hornear los derivados de {src}: {e}")
+        print(f"[AssetBake] ✅ {written} blobs escritos ({len(targets)} imágenes) en {baker.root}")
+    if args.bench:
+        if not targets:
+            print("[AssetBake] ⚠️ No hay imágenes que medir")
+            return
+        png_ms, baked_ms = benchmark(baker, targets, args.repeats)
+        print(f"[AssetBake] PNG: {png_ms:.2f} ms/img | horneado: {baked_ms:.2f} ms/img "
+              f"(x{png_ms / max(baked_ms, 1e-6):.1f}) sobre {len(targets)} imágenes")
+    if not (args.bake or args.bench):
+        print(f"[AssetBake] {len(targets)} imágenes de UI, blobs en {baker.root}")
+
+
+if __name__ == "__main__":
+    main()
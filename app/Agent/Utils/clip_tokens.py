@@ -0,0 +1,95 @@
+"""
+Conteo y recorte de prompts con el tokenizador real de CLIP.
+
+Los text encoders de Stable Diffusion solo ven 77 tokens (75 útiles más
+BOS/EOS); lo que sobra se descarta en silencio y suele ser justo el sufijo
+de estilo. En lugar de estimar por caracteres, se cuenta con el tokenizador
+del modelo: el del pipeline si ya está cargado, o solo el tokenizador (unos
+pocos MB, sin pesos) si no. Sin transformers se vuelve a la estimación.
+"""
+
+import threading
+from typing import Optional
+
+CLIP_MAX_TOKENS = 77
+CLIP_USABLE_TOKENS = CLIP_MAX_TOKENS - 2  # sin BOS/EOS
+
+_tokenizer = None
+_tokenizer_model: Optional[str] = None
+_tokenizer_failed = False
+_tokenizer_lock = threading.Lock()
+
+
+def get_clip_tokenizer():
+    """
+    Tokenizador CLIP del modelo configurado (lazy initialization).
+
+    Returns:
+        Tokenizador de transformers, o None si no se puede cargar
+    """
+    global _tokenizer, _tokenizer_model, _tokenizer_failed
+    from settings.settings import settings
+    model = settings.STABLE_DIFFUSION_MODEL
+
+    # Reutilizar el del pipeline si ya está en memoria
+    from app.Agent.image_providers import StableDiffusionProvider
+    pipeline = StableDiffusionProvider._pipeline
+    if pipeline is not None and StableDiffusionProvider._model_name == model and getattr(pipeline, "tokenizer", None):
+        return pipeline.tokenizer
+
+    if _tokenizer is not None and _tokenizer_model == model:
+        return _tokenizer
+    if _tokenizer_failed:
+        return None
+    with _tokenizer_lock:
+        if _tokenizer is not None and _tokenizer_model == model:
+            return _tokenizer
+        try:
+            from transformers import CLIPTokenizer
+            _tokenizer = CLIPTokenizer.from_pretrained(model, subfolder="tokenizer")
+            _tokenizer_model = model
+        except Exception as e:
+            print(f"[ClipTokens] ⚠️ Tokenizador no disponible, se estima por caracteres: {e}")
+            _tokenizer_failed = True
+            return None
+    return _tokenizer
+
+
+def count_tokens(text: str, tokenizer) -> int:
+    """Tokens de text sin contar BOS/EOS"""
+    return len(tokenizer(text, add_special_tokens=False, truncation=False)["input_ids"])
+
+
+def truncate_to_tokens(text: str, max_tokens: int, tokenizer) -> str:
+    """
+    Recorta text al prefijo más largo (por palabras) que cabe en max_tokens.
+    Si puede, corta en el último punto o coma del prefijo para no dejar frases a medias.
+
+    Args:
+        text: Texto a recortar
+        max_tokens: Presupuesto de tokens (sin BOS/EOS)
+        tokenizer: Tokenizador CLIP
+
+    Returns:
+        str: Texto que cabe en el presupuesto
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, tokenizer) <= max_tokens:
+        return text
+
+    # Búsqueda binaria sobre el número de palabras (log2(n) tokenizaciones)
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid]), tokenizer) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = " ".join(words[:lo])
+
+    cut = max(prefix.rfind("."), prefix.rfind(","))
+    if cut > len(prefix) * 0.7:
+        prefix = prefix[:cut]
+    return prefix.rstrip(" ,.")
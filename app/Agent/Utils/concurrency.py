@@ -0,0 +1,261 @@
+"""
+Control adaptativo de concurrencia (AIMD) para proveedores de IA.
+Cada proveedor (Stable Diffusion, OpenAI imágenes, LLM...) tiene su propio
+limitador que ajusta cuántas llamadas deja en vuelo según la latencia y
+los errores observados, sin tener que ajustar workers a mano.
+"""
+
+import time
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional
+
+# Valores por defecto por proveedor (se pueden sobrescribir en settings.json -> "Concurrency")
+DEFAULT_LIMITS: Dict[str, Dict[str, Any]] = {
+    # Un único pipeline compartido y su scheduler no es thread-safe: una llamada a la vez
+    # (el paralelismo viene del micro-batching, ver Utils/render_queue.py)
+    "stable_diffusion": {"initial": 1, "min_limit": 1, "max_limit": 1},
+    "onnx_diffusion":   {"initial": 1, "min_limit": 1, "max_limit": 1},
+    # API remota: admite bastante paralelismo hasta que aparecen rate limits
+    "openai_image":     {"initial": 4, "min_limit": 1, "max_limit": 16},
+    "llm_ollama":       {"initial": 1, "min_limit": 1, "max_limit": 4},
+    "llm_openai":       {"initial": 4, "min_limit": 1, "max_limit": 16},
+}
+
+
+class _Slot:
+    """Resultado de una llamada dentro de AdaptiveLimiter.slot()"""
+
+    def __init__(self):
+        self.ok = True
+        self.skip = False   # True = no usar esta llamada para ajustar el límite (p.ej. interrumpida)
+        self.units = 1.0    # Trabajo de la llamada (p.ej. imágenes x steps x megapíxeles): la latencia se mide por unidad
+
+
+class AdaptiveLimiter:
+    """
+    Limitador AIMD (additive increase / multiplicative decrease).
+
+    - Si la llamada va bien y su latencia no se dispara respecto a la base,
+      el límite sube ~1 por cada 'límite' llamadas (solo si está saturado).
+    - Si falla, o la latencia supera base * tolerance, el límite se multiplica por backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 2,
+        min_limit: int = 1,
+        max_limit: int = 8,
+        tolerance: float = 1.5,
+        backoff: float = 0.5,
+    ):
+        """
+        Args:
+            name: Nombre del proveedor (para logs/métricas)
+            initial: Límite inicial de llamadas en vuelo
+            min_limit: Límite mínimo
+            max_limit: Límite máximo
+            tolerance: Factor de latencia sobre la base que se considera congestión
+            backoff: Factor multiplicativo al detectar congestión o error
+        """
+        self.name = name
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.tolerance = tolerance
+        self.backoff = backoff
+
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiting = 0
+        self._baseline: Optional[float] = None
+        self._last_latency: Optional[float] = None
+        self._errors = 0
+        self._completed = 0
+        self._cond = threading.Condition()
+
+    # ---------- estado ----------
+    @property
+    def limit(self) -> int:
+        """Límite actual de llamadas en vuelo"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        """Llamadas en ejecución"""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Llamadas esperando un hueco"""
+        return self._waiting
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Obtiene métricas del limitador
+
+        Returns:
+            dict: límite, en vuelo, cola, latencias y errores
+        """
+        with self._cond:
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "baseline_latency": self._baseline,
+                "last_latency": self._last_latency,
+                "completed": self._completed,
+                "errors": self._errors,
+            }
+
+    # ---------- control ----------
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera hasta que haya hueco según el límite actual
+
+        Args:
+            timeout: Segundos máximos de espera (None = sin límite)
+
+        Returns:
+            bool: True si se obtuvo hueco
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.limit:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+                return True
+            finally:
+                self._waiting -= 1
+
+    def release(self, latency: float, ok: bool = True, record: bool = True):
+        """
+        Libera el hueco y ajusta el límite con la observación
+
+        Args:
+            latency: Segundos que tardó la llamada (por unidad de trabajo, ver _Slot.units)
+            ok: False si la llamada falló (error, rate limit, imagen vacía...)
+            record: False para liberar sin ajustar el límite (llamada interrumpida)
+        """
+        with self._cond:
+            saturated = self._in_flight >= self.limit
+            self._in_flight = max(0, self._in_flight - 1)
+            if not record:
+                self._cond.notify_all()
+                return
+            self._completed += 1
+            self._last_latency = latency
+
+            if not ok:
+                self._errors += 1
+                self._decrease()
+            else:
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    # La base sube despacio para adaptarse a cambios de carga/máquina
+                    self._baseline += (latency - self._baseline) * 0.05
+
+                if latency > self._baseline * self.tolerance:
+                    self._decrease()
+                elif saturated:
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / max(self._limit, 1.0))
+
+            self._cond.notify_all()
+
+    def _decrease(self):
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+
+    @contextmanager
+    def slot(self):
+        """
+        Context manager que adquiere un hueco y mide la latencia.
+        Marca slot.ok = False para contar la llamada como fallida sin lanzar excepción,
+        o slot.skip = True para que no cuente (p.ej. una render interrumpida a propósito).
+        Con slot.units la latencia se divide por el trabajo de la llamada: un lote de
+        4 imágenes o una final frente a una previa no parecen congestión.
+        """
+        self.acquire()
+        slot = _Slot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        except Exception:
+            slot.ok = False
+            raise
+        finally:
+            latency = (time.perf_counter() - start) / max(float(slot.units), 1e-6)
+            self.release(latency, slot.ok, record=not slot.skip)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """
+        Equivalente de slot() para corrutinas: el hueco se espera en un hilo del
+        executor (sin bloquear el event loop) y cuenta en el mismo límite que las
+        llamadas síncronas.
+        """
+        import asyncio
+        acquiring = asyncio.get_running_loop().run_in_executor(None, self.acquire)
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # Cancelada mientras esperaba: el hilo obtendrá el hueco igualmente, devolverlo sin contar
+            acquiring.add_done_callback(self._release_unused)
+            raise
+        slot = _Slot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        except BaseException:
+            slot.ok = False
+            raise
+        finally:
+            latency = (time.perf_counter() - start) / max(float(slot.units), 1e-6)
+            self.release(latency, slot.ok, record=not slot.skip)
+
+    def _release_unused(self, acquiring):
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self.release(0.0, record=False)
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """
+    Obtiene (o crea) el limitador de un proveedor.
+    Combina DEFAULT_LIMITS con la sección "Concurrency" de settings.json.
+
+    Args:
+        name: Clave del proveedor (stable_diffusion, openai_image, llm_ollama...)
+
+    Returns:
+        AdaptiveLimiter: Limitador compartido para ese proveedor
+    """
+    limiter = _limiters.get(name)
+    if limiter is not None:
+        return limiter
+    with _registry_lock:
+        if name not in _limiters:
+            from settings.settings import settings
+            config = dict(DEFAULT_LIMITS.get(name, {}))
+            config.update(getattr(settings, 'CONCURRENCY_CONFIG', {}).get(name, {}))
+            _limiters[name] = AdaptiveLimiter(name, **config)
+        return _limiters[name]
+
+
+def get_all_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Métricas de todos los limitadores creados
+
+    Returns:
+        dict: {nombre: stats}
+    """
+    return {name: limiter.stats() for name, limiter in list(_limiters.items())}
@@ -0,0 +1,282 @@
+"""
+Perfil de ejecución en CPU para Stable Diffusion.
+
+Sin GPU, la latencia de los retratos depende de cómo se configure torch:
+número de hilos, formato de memoria channels_last, autocast bfloat16 (si la
+CPU lo soporta), attention slicing y, opcionalmente, torch.compile con una
+cache de compilación persistente.
+
+El perfil se guarda en JSON (settings.SD_CPU_PROFILE_PATH) y se puede
+calcular para la máquina actual con el comando de autotune:
+
+    python -m app.Agent.Utils.cpu_profile --autotune
+"""
+
+import os
+import json
+import time
+import argparse
+import itertools
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.Agent.Utils.path_utils import get_project_root, ensure_directory
+
+_torch_default_threads: Optional[int] = None  # hilos de torch antes de aplicar ningún perfil
+
+DEFAULT_CPU_PROFILE: Dict[str, Any] = {
+    "threads": None,            # None = el valor por defecto de torch (núcleos físicos)
+    "channels_last": False,
+    "bf16_autocast": False,
+    "attention_slicing": False,
+    "compile": False,
+}
+
+
+def _resolve(path_value: Optional[str], default: str) -> Path:
+    path = Path(path_value or default)
+    return path if path.is_absolute() else get_project_root() / path
+
+
+def get_profile_path() -> Path:
+    """Ruta del JSON con el perfil de CPU"""
+    from settings.settings import settings
+    return _resolve(getattr(settings, 'SD_CPU_PROFILE_PATH', None), "cache/sd_cpu_profile.json")
+
+
+def get_compile_cache_dir() -> Path:
+    """Directorio de la cache persistente de torch.compile (inductor)"""
+    from settings.settings import settings
+    return _resolve(getattr(settings, 'SD_COMPILE_CACHE_DIR', None), "cache/torch_compile")
+
+
+def load_cpu_profile() -> Dict[str, Any]:
+    """
+    Carga el perfil de CPU: valores por defecto < JSON de autotune < settings.json.
+
+    Returns:
+        dict: Perfil a aplicar
+    """
+    from settings.settings import settings
+    profile = dict(DEFAULT_CPU_PROFILE)
+    path = get_profile_path()
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            profile.update({k: v for k, v in saved.get("profile", saved).items() if k in DEFAULT_CPU_PROFILE})
+        except Exception as e:
+            print(f"[CPUProfile] ⚠️ No se pudo leer {path}: {e}")
+    profile.update(getattr(settings, 'SD_CPU_PROFILE', {}) or {})
+    return profile
+
+
+def save_cpu_profile(profile: Dict[str, Any], results: Optional[List[Dict[str, Any]]] = None) -> Path:
+    """
+    Guarda el perfil elegido (y las mediciones del autotune).
+
+    Args:
+        profile: Perfil ganador
+        results: Mediciones de cada combinación
+
+    Returns:
+        Path: Ruta del fichero guardado
+    """
+    path = get_profile_path()
+    ensure_directory(path.parent)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"profile": profile, "results": results or []}, f, indent=2)
+    return path
+
+
+def bf16_supported() -> bool:
+    """True si la CPU soporta bfloat16 acelerado (AVX512-BF16 / AMX)"""
+    try:
+        import torch
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def apply_cpu_profile(pipeline, profile: Dict[str, Any]):
+    """
+    Aplica el perfil al pipeline cargado en CPU.
+
+    Args:
+        pipeline: Pipeline de diffusers
+        profile: Perfil (ver DEFAULT_CPU_PROFILE)
+
+    Returns:
+        Pipeline configurado (torch.compile sustituye el UNet)
+    """
+    import torch
+    global _torch_default_threads
+
+    # Solo se fijan hilos medidos (autotune) o configurados: os.cpu_count() cuenta
+    # hilos lógicos y sobresuscribir el hyperthreading ralentiza las matmuls
+    if _torch_default_threads is None:
+        _torch_default_threads = torch.get_num_threads()
+    threads = profile.get("threads")
+    if threads:
+        torch.set_num_threads(int(threads))
+    elif torch.get_num_threads() != _torch_default_threads:
+        torch.set_num_threads(_torch_default_threads)  # vuelve al defecto tras otro perfil (autotune)
+
+    memory_format = torch.channels_last if profile.get("channels_last") else torch.contiguous_format
+    for name in ("unet", "vae"):
+        module = getattr(pipeline, name, None)
+        if module is not None:
+            module.to(memory_format=memory_format)
+
+    if profile.get("attention_slicing"):
+        pipeline.enable_attention_slicing()
+    elif hasattr(pipeline, "disable_attention_slicing"):
+        pipeline.disable_attention_slicing()
+
+    if profile.get("compile") and hasattr(torch, "compile") and not hasattr(pipeline.unet, "_orig_mod"):
+        # Cache persistente: la segunda ejecución reutiliza los kernels compilados
+        cache_dir = get_compile_cache_dir()
+        ensure_directory(cache_dir)
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir))
+        os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+        pipeline.unet = torch.compile(pipeline.unet)
+
+    print(f"[CPUProfile] Perfil aplicado: {describe_profile(profile)}")
+    return pipeline
+
+
+def cpu_autocast(profile: Optional[Dict[str, Any]]):
+    """
+    Context manager de autocast bfloat16 si el perfil lo pide y la CPU lo soporta.
+
+    Args:
+        profile: Perfil activo (o None)
+
+    Returns:
+        Context manager (nullcontext si no aplica)
+    """
+    if not profile or not profile.get("bf16_autocast"):
+        return nullcontext()
+    import torch
+    return torch.autocast("cpu", dtype=torch.bfloat16)
+
+
+def describe_profile(profile: Dict[str, Any]) -> str:
+    """Resumen de una línea del perfil"""
+    flags = [k for k in ("channels_last", "bf16_autocast", "attention_slicing", "compile") if profile.get(k)]
+    return f"threads={profile.get('threads') or 'torch'} " + (" ".join(flags) or "base")
+
+
+def candidate_profiles() -> List[Dict[str, Any]]:
+    """
+    Combinaciones a medir en el autotune.
+    torch.compile solo se prueba sobre la mejor combinación (es caro de compilar).
+
+    Returns:
+        List[dict]: Perfiles candidatos sin compilación
+    """
+    cpus = os.cpu_count() or 1
+    # None = defecto de torch (la referencia sin perfil), más los lógicos y la mitad
+    thread_options = [None] + sorted({cpus, max(1, cpus // 2)}, reverse=True)
+    bf16_options = [False, True] if bf16_supported() else [False]
+    out = []
+    for threads, channels_last, bf16, slicing in itertools.product(
+        thread_options, [False, True], bf16_options, [False, True]
+    ):
+        out.append({
+            "threads": threads,
+            "channels_last": channels_last,
+            "bf16_autocast": bf16,
+            "attention_slicing": slicing,
+            "compile": False,
+        })
+    return out
+
+
+def _benchmark(provider, pipeline, profile, prompt: str, size: str, repeats: int) -> float:
+    """Segundos medios por imagen con el perfil aplicado (tras un calentamiento)."""
+    apply_cpu_profile(pipeline, profile)
+    type(provider)._cpu_profile = profile
+    width, height = provider._parse_size(size)
+    key = (width, height, provider._num_steps(), provider._guidance())
+    provider._run_batch([prompt], [""], key)  # calentamiento (y compilación)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        provider._run_batch([prompt], [""], key)
+    return (time.perf_counter() - start) / repeats
+
+
+def autotune(
+    prompt: str = "pixel art portrait of a warrior",
+    size: str = "512x512",
+    repeats: int = 2,
+    try_compile: bool = True,
+) -> Dict[str, Any]:
+    """
+    Mide las combinaciones del perfil en esta máquina y guarda la más rápida.
+
+    Args:
+        prompt: Prompt de prueba
+        size: Tamaño de imagen a medir (el de los retratos)
+        repeats: Repeticiones por combinación
+        try_compile: Probar torch.compile sobre la mejor combinación
+
+    Returns:
+        dict: Perfil ganador
+    """
+    from app.Agent.image_providers import StableDiffusionProvider
+
+    provider = StableDiffusionProvider()
+    pipeline = provider._get_pipeline()
+    results: List[Dict[str, Any]] = []
+
+    for profile in candidate_profiles():
+        try:
+            seconds = _benchmark(provider, pipeline, profile, prompt, size, repeats)
+        except Exception as e:
+            print(f"[CPUProfile] ❌ {describe_profile(profile)}: {e}")
+            continue
+        results.append({"profile": profile, "seconds": round(seconds, 3)})
+        print(f"[CPUProfile] {describe_profile(profile):<55} {seconds:6.2f}s/img")
+
+    if not results:
+        raise RuntimeError("Ninguna combinación del perfil de CPU funcionó")
+    best = min(results, key=lambda r: r["seconds"])
+
+    if try_compile:
+        import torch
+        if hasattr(torch, "compile"):
+            profile = dict(best["profile"], compile=True)
+            try:
+                seconds = _benchmark(provider, pipeline, profile, prompt, size, repeats)
+                results.append({"profile": profile, "seconds": round(seconds, 3)})
+                print(f"[CPUProfile] {describe_profile(profile):<55} {seconds:6.2f}s/img")
+                if seconds < best["seconds"]:
+                    best = results[-1]
+            except Exception as e:
+                print(f"[CPUProfile] ⚠️ torch.compile no disponible: {e}")
+
+    path = save_cpu_profile(best["profile"], results)
+    print(f"[CPUProfile] ✅ Mejor perfil: {describe_profile(best['profile'])} "
+          f"({best['seconds']:.2f}s/img) guardado en {path}")
+    return best["profile"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de CPU para Stable Diffusion")
+    parser.add_argument("--autotune", action="store_true", help="Medir combinaciones y guardar la más rápida")
+    parser.add_argument("--size", default=None, help="Tamaño a medir (por defecto el de los retratos)")
+    parser.add_argument("--repeats", type=int, default=2, help="Repeticiones por combinación")
+    parser.add_argument("--no-compile", action="store_true", help="No probar torch.compile")
+    args = parser.parse_args()
+
+    if args.autotune:
+        from settings.settings import settings
+        autotune(size=args.size or settings.PORTRAIT_SIZE_GEN, repeats=args.repeats, try_compile=not args.no_compile)
+    else:
+        print(f"[CPUProfile] Perfil actual: {describe_profile(load_cpu_profile())} ({get_profile_path()})")
+
+
+if __name__ == "__main__":
+    main()
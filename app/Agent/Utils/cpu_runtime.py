@@ -0,0 +1,261 @@
+"""
+Stable Diffusion exportado para CPU (ONNX Runtime u OpenVINO).
+
+Sin GPU, ejecutar el modelo en PyTorch eager deja mucho rendimiento sin usar.
+Este módulo exporta el modelo configurado con optimum a un runtime de CPU y
+lo carga con sus optimizaciones de grafo:
+
+- onnxruntime: ORT_ENABLE_ALL (fusión de operadores, constant folding...) y
+  pesos int8 con cuantización dinámica del UNet y los text encoders.
+- openvino: compilación para la CPU con PERFORMANCE_HINT=LATENCY, cache de
+  modelos compilados y pesos int8 (compresión de pesos de NNCF) o inferencia
+  en fp16 (INFERENCE_PRECISION_HINT, CPUs con AMX/AVX512-FP16).
+
+La exportación se hace una sola vez por (modelo, runtime, pesos) y se guarda
+en settings.ONNX_MODEL_DIR; el proveedor que lo usa es OnnxDiffusionProvider
+(image_providers, provider "onnx").
+
+Uso:
+    python -m app.Agent.Utils.cpu_runtime --export            # exportar con la config actual
+    python -m app.Agent.Utils.cpu_runtime --bench             # comparar con PyTorch en esta máquina
+"""
+
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.Agent.Utils.path_utils import get_project_root, ensure_directory
+
+BACKENDS = ("onnxruntime", "openvino")
+WEIGHTS = ("fp32", "fp16", "int8")
+EXPORT_MARKER = "agentfight_export.json"
+# Submodelos que se cuantizan a int8 en ONNX Runtime (el VAE es sensible y pesa poco)
+ORT_INT8_SUBMODELS = ("unet", "text_encoder", "text_encoder_2")
+
+
+def _is_xl(model_name: str) -> bool:
+    name = model_name.lower()
+    return "xl" in name or "sdxl" in name
+
+
+def export_dir(model_name: str, backend: str, weights: str) -> Path:
+    """Directorio del modelo exportado para (modelo, runtime, pesos)"""
+    from settings.settings import settings
+    base = Path(getattr(settings, 'ONNX_MODEL_DIR', None) or "cache/cpu_runtime")
+    base = base if base.is_absolute() else get_project_root() / base
+    slug = model_name.replace("/", "--")
+    return base / f"{slug}-{backend}-{weights}"
+
+
+def _check(backend: str, weights: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Runtime no soportado: {backend} (opciones: {', '.join(BACKENDS)})")
+    if weights not in WEIGHTS:
+        raise ValueError(f"Pesos no soportados: {weights} (opciones: {', '.join(WEIGHTS)})")
+
+
+def _pipeline_class(backend: str, model_name: str):
+    """Clase de pipeline de optimum para el runtime y el tipo de modelo"""
+    try:
+        if backend == "openvino":
+            from optimum.intel import OVStableDiffusionPipeline, OVStableDiffusionXLPipeline
+            return OVStableDiffusionXLPipeline if _is_xl(model_name) else OVStableDiffusionPipeline
+        from optimum.onnxruntime import ORTStableDiffusionPipeline, ORTStableDiffusionXLPipeline
+        return ORTStableDiffusionXLPipeline if _is_xl(model_name) else ORTStableDiffusionPipeline
+    except ImportError as e:
+        extra = "optimum[openvino]" if backend == "openvino" else "optimum[onnxruntime]"
+        raise ImportError(f"{backend} no está disponible ({e}). Ejecuta: uv pip install {extra}")
+
+
+def _quantize_ort_int8(out_dir: Path):
+    """Cuantización dinámica int8 (pesos) de los submodelos ONNX pesados"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    for name in ORT_INT8_SUBMODELS:
+        model_path = out_dir / name / "model.onnx"
+        if not model_path.exists():
+            continue
+        tmp = model_path.with_name("model.int8.onnx")
+        print(f"[CPURuntime] Cuantizando {name} a int8...")
+        quantize_dynamic(str(model_path), str(tmp), weight_type=QuantType.QInt8,
+                         use_external_data_format=True)
+        # Sustituir el modelo y sus pesos externos por la versión cuantizada
+        for old in model_path.parent.glob("model.onnx*"):
+            old.unlink()
+        for new in model_path.parent.glob("model.int8.onnx*"):
+            new.rename(new.with_name(new.name.replace("model.int8.onnx", "model.onnx")))
+
+
+def export_model(model_name: str, backend: str, weights: str) -> Path:
+    """
+    Exporta el modelo al runtime (una sola vez) y aplica la cuantización pedida.
+
+    Args:
+        model_name: Modelo de Hugging Face (settings.STABLE_DIFFUSION_MODEL)
+        backend: 'onnxruntime' u 'openvino'
+        weights: 'fp32', 'fp16' o 'int8'
+
+    Returns:
+        Path: Directorio del modelo exportado
+    """
+    _check(backend, weights)
+    out_dir = export_dir(model_name, backend, weights)
+    if (out_dir / EXPORT_MARKER).exists():
+        return out_dir
+
+    pipeline_cls = _pipeline_class(backend, model_name)
+    started = time.perf_counter()
+    print(f"[CPURuntime] Exportando {model_name} a {backend} ({weights}) en {out_dir}...")
+    kwargs: Dict[str, Any] = {"export": True}
+    if backend == "openvino":
+        kwargs["compile"] = False
+        if weights == "int8":
+            from optimum.intel import OVWeightQuantizationConfig
+            kwargs["quantization_config"] = OVWeightQuantizationConfig(bits=8)
+    pipeline = pipeline_cls.from_pretrained(model_name, **kwargs)
+    ensure_directory(out_dir)
+    pipeline.save_pretrained(out_dir)
+    del pipeline
+
+    if backend == "onnxruntime":
+        if weights == "int8":
+            _quantize_ort_int8(out_dir)
+        elif weights == "fp16":
+            # El proveedor de CPU de ONNX Runtime no acelera fp16: se queda en fp32
+            print("[CPURuntime] ⚠️ fp16 no acelera en ONNX Runtime CPU, se mantienen pesos fp32")
+
+    with open(out_dir / EXPORT_MARKER, "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "backend": backend, "weights": weights,
+                   "seconds": round(time.perf_counter() - started, 1)}, f, indent=2)
+    print(f"[CPURuntime] ✅ Exportado en {time.perf_counter() - started:.0f}s")
+    return out_dir
+
+
+def load_pipeline(model_name: str, backend: str, weights: str, threads: Optional[int] = None):
+    """
+    Carga el pipeline exportado (exportándolo antes si hace falta) con las
+    optimizaciones de grafo del runtime.
+
+    Args:
+        model_name: Modelo de Hugging Face
+        backend: 'onnxruntime' u 'openvino'
+        weights: 'fp32', 'fp16' o 'int8'
+        threads: Hilos de inferencia (None = el valor por defecto del runtime)
+
+    Returns:
+        Pipeline de optimum (misma llamada que un pipeline de diffusers)
+    """
+    model_dir = export_model(model_name, backend, weights)
+    pipeline_cls = _pipeline_class(backend, model_name)
+
+    if backend == "openvino":
+        ov_config = {
+            "PERFORMANCE_HINT": "LATENCY",
+            "CACHE_DIR": str(model_dir / "ov_cache"),  # modelos compilados: arranques siguientes más rápidos
+        }
+        if threads:
+            ov_config["INFERENCE_NUM_THREADS"] = int(threads)
+        if weights == "fp16":
+            ov_config["INFERENCE_PRECISION_HINT"] = "f16"
+        pipeline = pipeline_cls.from_pretrained(model_dir, ov_config=ov_config, compile=False)
+        pipeline.compile()
+        return pipeline
+
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = int(threads or 0)  # 0 = defecto de ONNX Runtime (núcleos físicos)
+    return pipeline_cls.from_pretrained(model_dir, provider="CPUExecutionProvider", session_options=options)
+
+
+# ---------------- benchmark ----------------
+def _measure(provider, prompt: str, size: str, repeats: int) -> Dict[str, Any]:
+    """Tiempo de carga y segundos medios por imagen (tras un calentamiento) de un proveedor"""
+    started = time.perf_counter()
+    provider._get_pipeline()
+    load_seconds = time.perf_counter() - started
+    width, height = provider._parse_size(size)
+    key = (width, height, provider._num_steps(), provider._guidance())
+    negative = provider.DEFAULT_NEGATIVE_PROMPT
+    provider._run_batch([prompt], [negative], key)  # calentamiento
+    started = time.perf_counter()
+    for _ in range(repeats):
+        provider._run_batch([prompt], [negative], key)
+    return {"load_seconds": round(load_seconds, 1),
+            "seconds": round((time.perf_counter() - started) / repeats, 2),
+            "steps": key[2]}
+
+
+def benchmark(
+    prompt: str = "pixel art portrait of a warrior",
+    size: str = "512x512",
+    repeats: int = 2,
+    backends: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Compara el camino PyTorch (con el perfil de CPU) con los runtimes exportados
+    en esta máquina: mismo modelo, prompt, tamaño y steps. Cada pipeline se
+    descarga antes de medir el siguiente.
+
+    Returns:
+        List[dict]: {name, load_seconds, seconds, steps, speedup} por backend
+    """
+    from settings.settings import settings
+    from app.Agent.image_providers import StableDiffusionProvider, OnnxDiffusionProvider
+
+    weights = getattr(settings, 'ONNX_WEIGHTS', "int8")
+    candidates = [("pytorch", StableDiffusionProvider, None)]
+    candidates += [(f"{b} ({weights})", OnnxDiffusionProvider, b) for b in (backends or BACKENDS)]
+
+    results: List[Dict[str, Any]] = []
+    for name, provider_cls, backend in candidates:
+        provider = provider_cls()
+        if backend is not None:
+            provider.backend = backend
+        try:
+            result = dict(name=name, **_measure(provider, prompt, size, repeats))
+        except Exception as e:
+            print(f"[CPURuntime] ❌ {name}: {e}")
+            continue
+        finally:
+            provider_cls._release_pipeline()
+        results.append(result)
+        print(f"[CPURuntime] {name:<22} carga {result['load_seconds']:6.1f}s | "
+              f"{result['seconds']:6.2f}s/img ({result['steps']} steps, {size})")
+
+    base = next((r["seconds"] for r in results if r["name"] == "pytorch"), None)
+    for r in results:
+        r["speedup"] = round(base / r["seconds"], 2) if base and r["seconds"] else None
+    if base:
+        print("[CPURuntime] Aceleración frente a PyTorch: " +
+              ", ".join(f"{r['name']} x{r['speedup']}" for r in results if r["name"] != "pytorch"))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stable Diffusion en ONNX Runtime / OpenVINO (CPU)")
+    parser.add_argument("--export", action="store_true", help="Exportar el modelo con la configuración actual")
+    parser.add_argument("--bench", action="store_true", help="Comparar PyTorch con los runtimes de CPU")
+    parser.add_argument("--backend", choices=BACKENDS, default=None, help="Runtime (por defecto el de settings)")
+    parser.add_argument("--size", default=None, help="Tamaño a medir (por defecto el de los retratos)")
+    parser.add_argument("--repeats", type=int, default=2, help="Repeticiones por backend")
+    args = parser.parse_args()
+
+    from settings.settings import settings
+    backend = args.backend or getattr(settings, 'ONNX_BACKEND', "onnxruntime")
+    weights = getattr(settings, 'ONNX_WEIGHTS', "int8")
+    if args.export:
+        export_model(settings.STABLE_DIFFUSION_MODEL, backend, weights)
+    if args.bench:
+        benchmark(size=args.size or settings.PORTRAIT_SIZE_GEN, repeats=args.repeats,
+                  backends=[args.backend] if args.backend else None)
+    if not (args.export or args.bench):
+        path = export_dir(settings.STABLE_DIFFUSION_MODEL, backend, weights)
+        state = "exportado" if (path / EXPORT_MARKER).exists() else "sin exportar"
+        print(f"[CPURuntime] {settings.STABLE_DIFFUSION_MODEL} -> {backend} ({weights}): {state} ({path})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Cache de imágenes direccionada por contenido.
+
+Cada imagen generada se guarda bajo el hash de la petición que la produjo
+(prompt, prompt negativo, tamaño, modelo, steps, seed y post-procesado), así
+que una petición idéntica la reutiliza y una petición distinta nunca devuelve
+una imagen obsoleta aunque el personaje se llame igual.
+
+Estructura en disco (settings.IMAGE_CACHE_DIR):
+    objects/<ab>/<hash>.png   imágenes
+    manifest.json             índice {hash: {bytes, last_access, created, meta}}
+
+Cuando el total supera settings.IMAGE_CACHE_MAX_MB se expulsan las entradas
+usadas hace más tiempo (LRU por last_access). Los accesos solo se anotan en
+memoria: el manifiesto se reescribe en el siguiente put (que es cuando se
+expulsa) o al salir, no en cada acierto.
+"""
+
+import os
+import atexit
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.Agent.Utils.path_utils import get_project_root, ensure_directory
+
+
+def request_key(**fields: Any) -> str:
+    """
+    Hash estable de una petición de imagen.
+
+    Args:
+        **fields: prompt, negative_prompt, size, model, steps, seed... (valores JSON)
+
+    Returns:
+        str: sha256 hexadecimal
+    """
+    canonical = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def copy_atomic(src: Path, dst: Path):
+    """Copia src a dst sin que un lector vea nunca un fichero a medias."""
+    ensure_directory(dst.parent)
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.stem}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class ImageCache:
+    """Almacén de imágenes por hash con manifiesto y expulsión LRU a un presupuesto de disco."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        """
+        Args:
+            root: Directorio de la cache
+            max_bytes: Presupuesto de disco (0 = sin límite)
+        """
+        self.root = Path(root)
+        self.max_bytes = max(0, int(max_bytes))
+        self._manifest_path = self.root / "manifest.json"
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False  # accesos (o entradas huérfanas quitadas) sin escribir en el manifiesto
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------- persistencia ----------
+    def object_path(self, key: str) -> Path:
+        """Ruta del objeto de una clave (exista o no)"""
+        return self.root / "objects" / key[:2] / f"{key}.png"
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self._manifest_path.exists():
+            return
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f).get("entries", {})
+        except Exception as e:
+            print(f"[ImageCache] ⚠️ Manifiesto ilegible, se reconstruye vacío: {e}")
+            self._entries = {}
+
+    def _save_manifest(self):
+        ensure_directory(self.root)
+        tmp = self._manifest_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries}, f)
+        os.replace(tmp, self._manifest_path)
+        self._dirty = False
+
+    def save(self):
+        """Escribe los accesos pendientes en el manifiesto (no hace nada si no los hay)"""
+        with self._lock:
+            if self._dirty:
+                self._save_manifest()
+
+    # ---------- API ----------
+    def get(self, key: str) -> Optional[Path]:
+        """
+        Busca una imagen por clave y actualiza su último acceso.
+
+        Returns:
+            Path del objeto, o None si no está en la cache
+        """
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(key)
+            path = self.object_path(key)
+            if entry is None or not path.exists():
+                if entry is not None:
+                    # Objeto borrado a mano: la entrada ya no sirve
+                    del self._entries[key]
+                    self._dirty = True
+                self.misses += 1
+                return None
+            # Solo en memoria: se persiste con el siguiente put o al salir
+            entry["last_access"] = time.time()
+            self._dirty = True
+            self.hits += 1
+            return path
+
+    def put(self, key: str, src: Path, meta: Optional[Dict[str, Any]] = None) -> Path:
+        """
+        Guarda una copia de src bajo la clave y aplica el presupuesto de disco.
+
+        Args:
+            key: Clave (ver request_key)
+            src: Fichero PNG a guardar
+            meta: Datos informativos (prompt, tamaño...) para el manifiesto
+
+        Returns:
+            Path: Ruta del objeto en la cache
+        """
+        path = self.object_path(key)
+        copy_atomic(Path(src), path)
+        now = time.time()
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[key] = {
+                "bytes": path.stat().st_size,
+                "created": now,
+                "last_access": now,
+                "meta": meta or {},
+            }
+            self._evict(keep=key)
+            self._save_manifest()
+        return path
+
+    def materialize(self, key: str, dst: Path) -> bool:
+        """
+        Copia la imagen cacheada a dst (la ruta que espera la UI).
+
+        Returns:
+            bool: True si había imagen para esa clave
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            copy_atomic(path, Path(dst))
+        except OSError as e:
+            print(f"[ImageCache] ⚠️ No se pudo copiar {path} -> {dst}: {e}")
+            return False
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        """Comprueba si la clave está en la cache (sin contar como acceso)"""
+        with self._lock:
+            self._ensure_loaded()
+            return key in self._entries and self.object_path(key).exists()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return sum(e.get("bytes", 0) for e in self._entries.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Expulsa las entradas menos usadas hasta caber en el presupuesto (con el lock tomado)."""
+        if not self.max_bytes:
+            return
+        total = sum(e.get("bytes", 0) for e in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k].get("last_access", 0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key).get("bytes", 0)
+            self.object_path(key).unlink(missing_ok=True)
+            self.evictions += 1
+
+
+# ---------------- instancia global ----------------
+_cache: Optional[ImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> Optional[ImageCache]:
+    """Obtiene la cache global (lazy initialization), o None si está desactivada"""
+    global _cache
+    from settings.settings import settings
+    if not getattr(settings, 'IMAGE_CACHE_ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                base = Path(getattr(settings, 'IMAGE_CACHE_DIR', None) or "cache/images")
+                root = base if base.is_absolute() else (get_project_root() / base)
+                max_mb = getattr(settings, 'IMAGE_CACHE_MAX_MB', 512) or 0
+                _cache = ImageCache(root, int(max_mb * 1024 * 1024))
+                atexit.register(save_image_cache)
+    return _cache
+
+
+def save_image_cache():
+    """Escribe los accesos pendientes de la cache global (si se llegó a crear)"""
+    if _cache is not None:
+        _cache.save()
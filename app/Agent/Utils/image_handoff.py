@@ -0,0 +1,243 @@
+"""
+Entrega en memoria de las imágenes generadas.
+
+En lugar de guardar el PNG y que la UI lo vuelva a leer (compresión +
+descompresión + sondeo del disco), el render publica los píxeles RGBA en
+memoria bajo la ruta final y la UI crea la superficie con pg.image.frombuffer.
+El PNG se escribe en segundo plano (write-behind, un hilo, en orden FIFO) y
+de forma atómica, así que quien lea del disco nunca ve un fichero a medias.
+
+Uso:
+    publish(path, image, crop_info)     # render: memoria + PNG en segundo plano
+    get_rendered(path)                  # UI: RenderedImage o None
+    wait_written(path)                  # antes de mover/leer el fichero
+"""
+
+import os
+import queue
+import atexit
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+from app.Agent.Utils.image_postprocess import CropInfo, save_png
+from app.Agent.Utils.asset_bake import get_asset_baker
+from app.Agent.Utils.perceptual_hash import get_perceptual_index, is_indexable, save_perceptual_index
+
+# Imágenes publicadas que se conservan en memoria (las más recientes)
+MAX_PUBLISHED = 32
+
+
+@dataclass
+class RenderedImage:
+    """Píxeles RGBA de una imagen generada, listos para pg.image.frombuffer"""
+    path: str
+    size: Tuple[int, int]
+    rgba: bytes
+    crop_info: Optional[CropInfo] = None
+
+
+def _key(path) -> str:
+    return os.path.abspath(str(path))
+
+
+class WriteBehind:
+    """Escritor de PNG en segundo plano (un hilo, orden de llegada)"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._pending: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.written = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._loop, name="WriteBehind", daemon=True)
+            self._worker.start()
+
+    def save(self, image: Image.Image, path: Path, crop_info: Optional[CropInfo] = None,
+             on_written: Optional[Callable[[Path], None]] = None):
+        """
+        Encola la escritura de un PNG.
+
+        Args:
+            image: Imagen a guardar
+            path: Ruta final
+            crop_info: Info de recorte (se guarda en el PNG)
+            on_written: Callback con la ruta cuando el fichero ya está en disco
+        """
+        key = _key(path)
+        with self._lock:
+            event = self._pending.get(key)
+            if event is None or event.is_set():
+                event = self._pending[key] = threading.Event()
+            self._ensure_worker()
+        self._queue.put(("save", key, Path(path), image, crop_info, on_written, event))
+
+    def discard(self, path: Path):
+        """Encola el borrado de un fichero (después de las escrituras pendientes)"""
+        self._queue.put(("unlink", _key(path), Path(path), None, None, None, None))
+        with self._lock:
+            self._ensure_worker()
+
+    def wait(self, path: Path, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que el PNG de path esté escrito.
+
+        Returns:
+            bool: True si está escrito (o no había escritura pendiente)
+        """
+        with self._lock:
+            event = self._pending.get(_key(path))
+        return True if event is None else event.wait(timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que se vacíe la cola"""
+        done = threading.Event()
+        self._queue.put(("mark", None, None, None, None, None, done))
+        with self._lock:
+            self._ensure_worker()
+        return done.wait(timeout)
+
+    def _loop(self):
+        while True:
+            op, key, path, image, crop_info, on_written, event = self._queue.get()
+            try:
+                if op == "save":
+                    self._write(path, image, crop_info)
+                    self.written += 1
+                    if on_written is not None:
+                        on_written(path)
+                    self._bake(path, image, crop_info)
+                    self._index(path, image)
+                elif op == "unlink":
+                    path.unlink(missing_ok=True)
+                    _forget(key)
+            except Exception as e:
+                print(f"[WriteBehind] ❌ Error escribiendo {path}: {e}")
+            finally:
+                if event is not None:
+                    event.set()
+                if op == "save":
+                    with self._lock:
+                        if self._pending.get(key) is event:
+                            del self._pending[key]
+
+    @staticmethod
+    def _bake(path: Path, image: Image.Image, crop_info: Optional[CropInfo]):
+        """
+        Blob pre-decodificado con los píxeles que ya tenemos (la próxima carga no
+        decodifica el PNG) y derivados a los tamaños a los que lo dibuja la UI.
+        """
+        try:
+            baker = get_asset_baker()
+            if baker is not None:
+                baker.bake(path, image=image, crop_info=crop_info)
+                baker.bake_derivatives(path, image=image, crop_info=crop_info)
+        except Exception as e:
+            print(f"[WriteBehind] ⚠️ No se pudo hornear {path}: {e}")
+
+    @staticmethod
+    def _index(path: Path, image: Image.Image):
+        """Hash perceptual de la imagen guardada (búsqueda de casi duplicados)"""
+        if not is_indexable(path):
+            return
+        try:
+            index = get_perceptual_index()
+            if index is not None:
+                index.add(path, image)
+        except Exception as e:
+            print(f"[WriteBehind] ⚠️ No se pudo indexar {path}: {e}")
+
+    @staticmethod
+    def _write(path: Path, image: Image.Image, crop_info: Optional[CropInfo]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        save_png(image, tmp, crop_info)
+        os.replace(tmp, path)
+
+
+# ---------------- registro en memoria ----------------
+_published: "OrderedDict[str, RenderedImage]" = OrderedDict()
+_published_lock = threading.Lock()
+_writer: Optional[WriteBehind] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> WriteBehind:
+    """Obtiene el escritor global (lazy initialization)"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehind()
+                # Al salir del juego, terminar de escribir lo pendiente
+                atexit.register(_flush_at_exit)
+    return _writer
+
+
+def _flush_at_exit():
+    _writer.flush(5.0)
+    # Las últimas imágenes escritas se indexaron sin guardar el JSON (ver PerceptualIndex.save)
+    save_perceptual_index()
+
+
+def _forget(key: str):
+    with _published_lock:
+        _published.pop(key, None)
+
+
+def publish(path: Path, image: Image.Image, crop_info: Optional[CropInfo] = None,
+            on_written: Optional[Callable[[Path], None]] = None) -> RenderedImage:
+    """
+    Publica una imagen generada en memoria y encola su PNG.
+
+    Args:
+        path: Ruta final del PNG (también es la clave para la UI)
+        image: Imagen generada
+        crop_info: Info de recorte (ver image_postprocess.autocrop)
+        on_written: Callback cuando el PNG ya está en disco
+
+    Returns:
+        RenderedImage: Píxeles RGBA publicados
+    """
+    rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+    rendered = RenderedImage(str(path), rgba.size, rgba.tobytes(), crop_info)
+    key = _key(path)
+    with _published_lock:
+        _published[key] = rendered
+        _published.move_to_end(key)
+        while len(_published) > MAX_PUBLISHED:
+            _published.popitem(last=False)
+    get_writer().save(rgba, Path(path), crop_info, on_written)
+    return rendered
+
+
+def write_behind(image: Image.Image, path: Path, crop_info: Optional[CropInfo] = None,
+                 on_written: Optional[Callable[[Path], None]] = None):
+    """Encola un PNG sin publicarlo en memoria (p.ej. versiones que la UI no muestra)"""
+    get_writer().save(image, Path(path), crop_info, on_written)
+
+
+def get_rendered(path) -> Optional[RenderedImage]:
+    """Imagen publicada en memoria para esa ruta, o None"""
+    if not path:
+        return None
+    with _published_lock:
+        return _published.get(_key(path))
+
+
+def discard(path: Path):
+    """Olvida una imagen publicada y borra su PNG (tras escribirlo, si estaba pendiente)"""
+    _forget(_key(path))
+    get_writer().discard(Path(path))
+
+
+def wait_written(path: Path, timeout: Optional[float] = None) -> bool:
+    """Espera a que el PNG de path esté en disco"""
+    return get_writer().wait(Path(path), timeout)
@@ -0,0 +1,244 @@
+"""
+Post-procesado de imágenes generadas (NumPy).
+
+- remove_border_background: quita solo el fondo conectado con el borde
+  (flood fill desde los bordes), sin agujerear blancos/negros interiores.
+- autocrop: recorta a la caja del canal alfa y devuelve el offset para
+  poder recolocar la imagen en su lienzo original.
+- quantize_palette: reduce a una paleta corta estilo pixel art.
+- pixel_art_plan / upscale_nearest: modo pixel art nativo (se genera a baja
+  resolución y se amplía por un factor entero con vecino más próximo).
+- place_cropped: escala un recorte a un tamaño de la UI recolocándolo en su
+  lienzo original (derivados precalculados, ver asset_bake).
+
+El offset y el tamaño original de un recorte se guardan en el propio PNG
+(chunk de texto "agentfight_crop") con save_png y se leen con read_crop_info.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+CROP_INFO_KEY = "agentfight_crop"
+
+# (ox, oy, ancho_original, alto_original)
+CropInfo = Tuple[int, int, int, int]
+
+
+def _fill_runs(reached: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """
+    Extiende 'reached' a todas las rachas horizontales de 'candidate' que
+    tocan algún píxel alcanzado (un barrido de scanline vectorizado).
+    """
+    h, w = candidate.shape
+    starts = candidate.copy()
+    starts[:, 1:] &= ~candidate[:, :-1]
+    run_id = np.cumsum(starts.ravel()).reshape(h, w)
+    run_id[~candidate] = 0
+    hit = np.zeros(int(run_id.max()) + 1, dtype=bool)
+    hit[run_id[reached & candidate]] = True
+    hit[0] = False
+    return hit[run_id]
+
+
+def border_flood_fill(candidate: np.ndarray) -> np.ndarray:
+    """
+    Píxeles de 'candidate' conectados (4-vecindad) con el borde de la imagen.
+
+    Alterna barridos horizontales y verticales por rachas hasta converger:
+    cada iteración recorre rachas completas, así que el número de pasadas
+    depende de los giros del camino y no de su longitud.
+
+    Args:
+        candidate: Máscara booleana HxW de píxeles que pueden ser fondo
+
+    Returns:
+        np.ndarray: Máscara booleana del fondo conectado al borde
+    """
+    reached = np.zeros_like(candidate)
+    reached[0, :] = candidate[0, :]
+    reached[-1, :] = candidate[-1, :]
+    reached[:, 0] |= candidate[:, 0]
+    reached[:, -1] |= candidate[:, -1]
+    if not reached.any():
+        return reached
+
+    count = int(reached.sum())
+    while True:
+        reached = _fill_runs(reached, candidate)
+        reached = _fill_runs(reached.T, candidate.T).T
+        new_count = int(reached.sum())
+        if new_count == count:
+            return reached
+        count = new_count
+
+
+def _dominant_border_color(rgb: np.ndarray) -> np.ndarray:
+    """Color más frecuente del borde (cuantizado a 16 niveles para agrupar ruido)."""
+    border = np.concatenate([rgb[0, :], rgb[-1, :], rgb[:, 0], rgb[:, -1]]).astype(np.int32)
+    q = border >> 4
+    codes = (q[:, 0] << 8) | (q[:, 1] << 4) | q[:, 2]
+    values, counts = np.unique(codes, return_counts=True)
+    mode = values[np.argmax(counts)]
+    return border[codes == mode].mean(axis=0)
+
+
+def remove_border_background(image: Image.Image, tolerance: int = 24) -> Image.Image:
+    """
+    Hace transparente solo el fondo conectado con los bordes de la imagen.
+
+    Args:
+        image: Imagen PIL
+        tolerance: Distancia máxima (por canal) al color de fondo dominante del borde
+
+    Returns:
+        Image.Image: Imagen RGBA con el fondo transparente
+    """
+    rgba = np.array(image.convert("RGBA"))
+    rgb = rgba[:, :, :3]
+    bg = _dominant_border_color(rgb)
+    distance = np.abs(rgb.astype(np.int16) - bg.astype(np.int16)).max(axis=2)
+    candidate = (distance <= tolerance) & (rgba[:, :, 3] > 0)
+    background = border_flood_fill(candidate)
+    rgba[:, :, 3][background] = 0
+    return Image.fromarray(rgba, "RGBA")
+
+
+def autocrop(image: Image.Image, pad: int = 0) -> Tuple[Image.Image, CropInfo]:
+    """
+    Recorta la imagen a la caja del canal alfa.
+
+    Args:
+        image: Imagen RGBA
+        pad: Margen extra en píxeles alrededor del contenido
+
+    Returns:
+        (imagen recortada, (ox, oy, ancho_original, alto_original))
+    """
+    rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+    w, h = rgba.size
+    alpha = np.asarray(rgba)[:, :, 3]
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if rows.size == 0:
+        return rgba, (0, 0, w, h)
+    top, bottom = max(0, rows[0] - pad), min(h, rows[-1] + 1 + pad)
+    left, right = max(0, cols[0] - pad), min(w, cols[-1] + 1 + pad)
+    return rgba.crop((left, top, right, bottom)), (int(left), int(top), w, h)
+
+
+def quantize_palette(image: Image.Image, colors: int = 16) -> Image.Image:
+    """
+    Reduce los colores a una paleta corta (median cut, sin tramado) y binariza el alfa.
+
+    Args:
+        image: Imagen RGBA
+        colors: Número de colores de la paleta
+
+    Returns:
+        Image.Image: Imagen RGBA cuantizada
+    """
+    rgba = np.array(image.convert("RGBA"))
+    rgb = Image.fromarray(rgba[:, :, :3], "RGB")
+    paletted = rgb.quantize(colors=max(2, int(colors)), method=Image.Quantize.MEDIANCUT,
+                            dither=Image.Dither.NONE)
+    out = np.array(paletted.convert("RGB"))
+    alpha = np.where(rgba[:, :, 3] >= 128, 255, 0).astype(np.uint8)
+    return Image.fromarray(np.dstack([out, alpha]), "RGBA")
+
+
+def pixel_art_plan(size: str, native_size: str = "256x256") -> Tuple[str, int]:
+    """
+    Tamaño nativo a generar y factor entero de ampliación para el modo pixel art.
+
+    Args:
+        size: Tamaño final pedido ('512x512')
+        native_size: Resolución mínima con la que el modelo aún rinde bien
+
+    Returns:
+        (tamaño a generar 'WxH', factor entero >= 1)
+    """
+    tw, th = (int(v) for v in size.split("x"))
+    nw, nh = (int(v) for v in native_size.split("x"))
+    # Múltiplos de 8 (requisito del VAE), nunca por encima del tamaño final
+    gw = max(8, min(tw, nw) // 8 * 8)
+    gh = max(8, min(th, nh) // 8 * 8)
+    factor = max(1, min(tw // gw, th // gh))
+    return f"{gw}x{gh}", factor
+
+
+def upscale_nearest(
+    image: Image.Image, factor: int, crop_info: Optional[CropInfo] = None
+) -> Tuple[Image.Image, Optional[CropInfo]]:
+    """
+    Amplía por un factor entero con vecino más próximo (píxeles nítidos).
+
+    Args:
+        image: Imagen a baja resolución
+        factor: Factor entero de ampliación
+        crop_info: Info de recorte de la imagen pequeña (se escala igual)
+
+    Returns:
+        (imagen ampliada, info de recorte escalada o None)
+    """
+    if factor <= 1:
+        return image, crop_info
+    big = image.resize((image.width * factor, image.height * factor), Image.NEAREST)
+    if crop_info is not None:
+        crop_info = tuple(int(v) * factor for v in crop_info)
+    return big, crop_info
+
+
+def place_cropped(
+    image: Image.Image, crop_info: Optional[CropInfo], size: Tuple[int, int], smooth: bool = True
+) -> Image.Image:
+    """
+    Escala una imagen recortada como si fuera su lienzo original (equivalente
+    a pg_assets.scale_cropped, con LANCZOS en lugar de smoothscale).
+
+    Args:
+        image: Imagen (recortada o no)
+        crop_info: (ox, oy, ancho_original, alto_original) o None
+        size: Tamaño final del lienzo
+        smooth: LANCZOS o vecino más próximo (pixel art)
+
+    Returns:
+        Image.Image: Lienzo RGBA de tamaño size
+    """
+    resample = Image.LANCZOS if smooth else Image.NEAREST
+    rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+    if not crop_info:
+        return rgba.resize(tuple(size), resample)
+    ox, oy, full_w, full_h = crop_info
+    sx, sy = size[0] / full_w, size[1] / full_h
+    content = rgba.resize((max(1, round(rgba.width * sx)), max(1, round(rgba.height * sy))), resample)
+    canvas = Image.new("RGBA", tuple(size), (0, 0, 0, 0))
+    canvas.paste(content, (round(ox * sx), round(oy * sy)))
+    return canvas
+
+
+def save_png(image: Image.Image, path: Path, crop_info: Optional[CropInfo] = None):
+    """Guarda un PNG con la info de recorte (si la hay) en un chunk de texto."""
+    pnginfo = None
+    if crop_info is not None:
+        pnginfo = PngImagePlugin.PngInfo()
+        pnginfo.add_text(CROP_INFO_KEY, json.dumps(list(crop_info)))
+    image.save(path, "PNG", pnginfo=pnginfo)
+
+
+def read_crop_info(path) -> Optional[CropInfo]:
+    """
+    Lee la info de recorte de un PNG guardado con save_png.
+
+    Returns:
+        (ox, oy, ancho_original, alto_original) o None si la imagen no está recortada
+    """
+    try:
+        with Image.open(path) as img:
+            raw = getattr(img, "text", {}).get(CROP_INFO_KEY)
+        return tuple(json.loads(raw)) if raw else None
+    except Exception:
+        return None
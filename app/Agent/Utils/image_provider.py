@@ -4,7 +4,7 @@ Usa la implementación existente de image_providers.py que soporta
 Stable Diffusion (por defecto) y OpenAI como fallback.
 """
 
-from typing import Optional
+from typing import List, Optional
 from pathlib import Path
 from PIL import Image
 
@@ -76,6 +76,44 @@ class ImageProvider:
             print(f"[ImageProvider] Error generating image: {e}")
             return None
     
+    @property
+    def supports_img2img(self) -> bool:
+        """True si el proveedor puede derivar imágenes de una pose base (Stable Diffusion local)"""
+        return callable(getattr(self.provider, 'generate_variations', None))
+    
+    def generate_variations(
+        self,
+        prompts: List[str],
+        base_image: Image.Image,
+        base_key: str,
+        strength: float = 0.35,
+        size: str = "256x256",
+        **kwargs
+    ) -> Optional[List[Image.Image]]:
+        """
+        Deriva una imagen por prompt a partir de una pose base (img2img)
+        
+        Args:
+            prompts: Un prompt por imagen
+            base_image: Pose base
+            base_key: Identificador estable de la base (cache de latentes)
+            strength: Fuerza del img2img (0-1)
+            size: Tamaño de las imágenes
+            **kwargs: Parámetros adicionales
+        
+        Returns:
+            List[Image.Image] o None si el proveedor no lo soporta o falla
+        """
+        if not self.supports_img2img:
+            return None
+        try:
+            return self.provider.generate_variations(
+                prompts, base_image, base_key, strength=strength, size=size, **kwargs
+            )
+        except Exception as e:
+            print(f"[ImageProvider] Error generating variations: {e}")
+            return None
+    
     def save_image(self, image: Image.Image, output_path: Path) -> bool:
         """
         Guarda una imagen PIL
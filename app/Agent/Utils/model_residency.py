@@ -0,0 +1,189 @@
+"""
+Residencia en memoria de modelos grandes.
+
+Un pipeline de Stable Diffusion ocupa varios GB y, una vez cargado, se queda
+en RAM aunque el jugador pase media hora en combates que no generan nada. El
+gestor de residencia vigila dos cosas en un hilo de fondo:
+
+- Inactividad: si el modelo no se usa en idle_seconds, se libera.
+- Presión de memoria: si el RSS del proceso supera rss_limit_mb y el modelo
+  no está en uso, se libera aunque no haya vencido el plazo.
+
+"Liberar" es descargar (unload: soltar las referencias y devolver la memoria
+al sistema) u offload (mover los componentes a CPU / cargarlos bajo demanda),
+según el callback que se registre. La recarga es transparente: la siguiente
+petición vuelve a cargar el modelo. Cada liberación informa del RSS antes y
+después.
+"""
+
+import gc
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+def current_rss_mb() -> Optional[float]:
+    """
+    RSS actual del proceso en MB (psutil si está instalado, /proc en Linux).
+
+    Returns:
+        float o None si no se puede medir
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def release_memory():
+    """Recolecta basura y devuelve al sistema la memoria libre (CUDA y glibc si aplican)."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            # Sin malloc_trim, glibc se queda con las arenas liberadas y el RSS no baja
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class ModelResidency:
+    """Libera un modelo tras un periodo sin uso o si el proceso supera un RSS límite"""
+
+    def __init__(
+        self,
+        name: str,
+        is_loaded: Callable[[], bool],
+        release: Callable[[], None],
+        idle_seconds: float = 600.0,
+        rss_limit_mb: float = 0,
+        check_interval: float = 15.0,
+        rss_reader: Callable[[], Optional[float]] = current_rss_mb,
+    ):
+        """
+        Args:
+            name: Nombre para los logs
+            is_loaded: Indica si el modelo está en memoria
+            release: Descarga u offload del modelo (la recarga la hace el propio proveedor)
+            idle_seconds: Inactividad tras la que se libera (0 = nunca por inactividad)
+            rss_limit_mb: RSS del proceso a partir del que se libera (0 = sin límite)
+            check_interval: Segundos entre comprobaciones del hilo de fondo
+            rss_reader: Lectura del RSS en MB (inyectable para pruebas)
+        """
+        self.name = name
+        self.is_loaded = is_loaded
+        self.release = release
+        self.idle_seconds = float(idle_seconds or 0)
+        self.rss_limit_mb = float(rss_limit_mb or 0)
+        self.check_interval = max(0.5, float(check_interval))
+        self.rss_reader = rss_reader
+        self._lock = threading.Lock()
+        self._active = 0
+        self._last_used = time.monotonic()
+        self._watcher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.releases = 0
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def use(self):
+        """Marca el modelo como en uso (no se libera mientras dure el bloque)"""
+        with self._lock:
+            self._active += 1
+            self._last_used = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_used = time.monotonic()
+
+    def touch(self):
+        """Cuenta como uso (p.ej. justo después de cargar)"""
+        with self._lock:
+            self._last_used = time.monotonic()
+
+    def idle_for(self) -> float:
+        with self._lock:
+            return 0.0 if self._active else time.monotonic() - self._last_used
+
+    def check(self) -> Optional[str]:
+        """
+        Aplica la política una vez.
+
+        Returns:
+            Motivo de la liberación ('idle' o 'rss'), o None si no se liberó
+        """
+        if not self.is_loaded():
+            return None
+        idle = self.idle_for()
+        if self._active:
+            return None
+        if self.idle_seconds and idle >= self.idle_seconds:
+            return self._release("idle")
+        if self.rss_limit_mb and idle >= self.check_interval:
+            rss = self.rss_reader()
+            if rss is not None and rss > self.rss_limit_mb:
+                return self._release("rss")
+        return None
+
+    def _release(self, reason: str) -> Optional[str]:
+        with self._lock:
+            # Una petición pudo empezar entre la comprobación y el lock
+            if self._active or not self.is_loaded():
+                return None
+            before = self.rss_reader()
+            started = time.perf_counter()
+            try:
+                self.release()
+            except Exception as e:
+                print(f"[Residency] ❌ Error liberando {self.name}: {e}")
+                return None
+            release_memory()
+            after = self.rss_reader()
+            self.releases += 1
+            self.last_report = {
+                "reason": reason,
+                "rss_before_mb": None if before is None else round(before, 1),
+                "rss_after_mb": None if after is None else round(after, 1),
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+        if before is not None and after is not None:
+            print(f"[Residency] ♻️ {self.name} liberado ({reason}): RSS {before:.0f} MB -> {after:.0f} MB")
+        else:
+            print(f"[Residency] ♻️ {self.name} liberado ({reason})")
+        return reason
+
+    def start(self):
+        """Arranca el hilo de vigilancia (una sola vez)"""
+        if not (self.idle_seconds or self.rss_limit_mb) or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            self._watcher = threading.Thread(target=self._loop, name=f"Residency-{self.name}", daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        """Detiene el hilo de vigilancia (el modelo ya no se libera solo)"""
+        self._stopped.set()
+
+    def _loop(self):
+        while not self._stopped.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"[Residency] ⚠️ Error comprobando {self.name}: {e}")
@@ -169,6 +169,8 @@ class OllamaProvider(BaseIAProvider):
         for key, value in properties.items():
             prop_type = value.get('type', 'string')
             is_required = key in required
+            # Con esquema compacto, 'description' lleva el nombre canónico
+            hint = f" [{value['description']}]" if value.get('description') else ""
             
             # Detectar si es array
             if prop_type == 'array':
@@ -184,14 +186,15 @@ class OllamaProvider(BaseIAProvider):
                     prop_details = []
                     for prop_key, prop_value in item_props.items():
                         prop_req = prop_key in item_required
-                        prop_details.append(f"    - {prop_key}: {prop_value.get('type', 'string')}{' (REQUERIDO)' if prop_req else ' (opcional)'}")
-                    schema_desc.append(f"- {key}: array de objetos (mínimo {min_items}, máximo {max_items}){'(REQUERIDO)' if is_required else '(opcional)'}")
+                        prop_hint = f" [{prop_value['description']}]" if prop_value.get('description') else ""
+                        prop_details.append(f"    - {prop_key}{prop_hint}: {prop_value.get('type', 'string')}{' (REQUERIDO)' if prop_req else ' (opcional)'}")
+                    schema_desc.append(f"- {key}{hint}: array de objetos (mínimo {min_items}, máximo {max_items}){'(REQUERIDO)' if is_required else '(opcional)'}")
                     schema_desc.extend(prop_details)
                 else:
-                    schema_desc.append(f"- {key}: array de {items_type} (mínimo {min_items}, máximo {max_items}){'(REQUERIDO)' if is_required else '(opcional)'}")
+                    schema_desc.append(f"- {key}{hint}: array de {items_type} (mínimo {min_items}, máximo {max_items}){'(REQUERIDO)' if is_required else '(opcional)'}")
             else:
                 req_mark = " (REQUERIDO)" if is_required else " (opcional)"
-                schema_desc.append(f"- {key}: {prop_type}{req_mark}")
+                schema_desc.append(f"- {key}{hint}: {prop_type}{req_mark}")
         
         schema_text = "\n".join(schema_desc)
         
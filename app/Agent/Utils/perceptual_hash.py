@@ -0,0 +1,466 @@
+"""
+Índice de hashes perceptuales para detectar imágenes casi idénticas.
+
+Muchos retratos generados son prácticamente la misma imagen con otro nombre
+(sombra-oscura, sombra-aterradora, sombra-de-terror...). Cada imagen guardada
+se resume en dos hashes de 64 bits calculados con NumPy:
+
+- pHash: DCT 2D de la imagen en gris a 32x32 (como producto de matrices, en
+  lote) y signo de las 8x8 frecuencias bajas respecto a su mediana.
+- dHash: gradiente horizontal de la imagen a 9x8.
+
+Dos imágenes se parecen si la distancia de Hamming de sus pHash es pequeña.
+Las búsquedas por radio van por un BK-tree (solo se visitan las ramas que la
+desigualdad triangular no descarta), así que miles de imágenes se consultan
+en milisegundos. Con el índice:
+
+- la generación puede reutilizar una imagen existente suficientemente
+  parecida (ver image_renderer, PHASH_REUSE_RADIUS);
+- el almacenamiento puede deduplicar (ver --dupes).
+
+El índice se persiste en JSON (settings.PHASH_INDEX_PATH); al reconstruir
+solo se vuelven a hashear los ficheros cuyo mtime o tamaño cambió. Las altas
+sueltas (una por imagen guardada) se escriben cada SAVE_EVERY y al salir.
+
+Uso:
+    python -m app.Agent.Utils.perceptual_hash --rebuild     # indexar retratos y fondos
+    python -m app.Agent.Utils.perceptual_hash --dupes 6     # grupos de casi duplicados
+    python -m app.Agent.Utils.perceptual_hash --bench       # tiempo de consulta
+"""
+
+import os
+import json
+import atexit
+import time
+import argparse
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from app.Agent.Utils.path_utils import get_project_root, ensure_directory
+
+HASH_SIZE = 8           # 8x8 bits = 64
+PHASH_SAMPLE = 32       # lado de la imagen sobre la que se hace la DCT
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+SAVE_EVERY = 25         # add() reescribe el JSON cada tantas altas (el resto, en save())
+ImageLike = Union[Image.Image, str, Path]
+
+
+# ---------------- hashes ----------------
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Matriz de la DCT-II ortonormal de orden n"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+def flatten(image: ImageLike) -> Image.Image:
+    """
+    Imagen en gris con la transparencia compuesta sobre negro. Decodificar es lo
+    caro: para calcular pHash y dHash de un fichero se aplana una sola vez.
+    """
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as img:
+            flat = flatten(img)
+            # En gris se devuelve la misma imagen: cargarla antes de cerrar el fichero
+            return flat.copy() if flat is img else flat
+    if image.mode == "L":
+        return image
+    if image.mode in ("RGBA", "LA", "P"):
+        rgba = image.convert("RGBA")
+        image = Image.alpha_composite(Image.new("RGBA", rgba.size, (0, 0, 0, 255)), rgba)
+    return image.convert("L")
+
+
+def _gray(image: ImageLike, size: Tuple[int, int]) -> np.ndarray:
+    return np.asarray(flatten(image).resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+def _pack(bits: np.ndarray) -> List[int]:
+    """(B, 64) bool -> enteros de 64 bits"""
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in packed]
+
+
+def phash_many(images: Sequence[ImageLike]) -> List[int]:
+    """
+    pHash de varias imágenes (la DCT se hace en lote: D · X · Dᵀ).
+
+    Args:
+        images: Imágenes PIL o rutas
+
+    Returns:
+        List[int]: Un hash de 64 bits por imagen
+    """
+    if not images:
+        return []
+    stack = np.stack([_gray(img, (PHASH_SAMPLE, PHASH_SAMPLE)) for img in images])
+    d = _dct_matrix(PHASH_SAMPLE)
+    low = (d @ stack @ d.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(stack), -1)
+    # Mediana sin el término DC (solo refleja el brillo medio)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack(low > median)
+
+
+def dhash_many(images: Sequence[ImageLike]) -> List[int]:
+    """dHash de varias imágenes: signo del gradiente horizontal a (HASH_SIZE+1)xHASH_SIZE"""
+    if not images:
+        return []
+    stack = np.stack([_gray(img, (HASH_SIZE + 1, HASH_SIZE)) for img in images])
+    return _pack(stack[:, :, 1:] > stack[:, :, :-1])
+
+
+def phash(image: ImageLike) -> int:
+    return phash_many([image])[0]
+
+
+def dhash(image: ImageLike) -> int:
+    return dhash_many([image])[0]
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def is_indexable(path: Path) -> bool:
+    """Las previas y las versiones lowres son copias de otra imagen: no se indexan"""
+    path = Path(path)
+    return (path.suffix.lower() in IMAGE_SUFFIXES and ".preview." not in path.name
+            and path.parent.name != "lowres")
+
+
+# ---------------- BK-tree ----------------
+class BKTree:
+    """Árbol BK sobre distancia de Hamming: búsqueda por radio sin recorrer todo"""
+
+    def __init__(self):
+        # Nodo: [hash, claves, {distancia: hijo}]
+        self._root: Optional[list] = None
+        self._size = 0
+
+    def add(self, value: int, key: str):
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [key], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [key], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, str]]:
+        """
+        Claves a distancia <= radius, de la más cercana a la más lejana.
+
+        Returns:
+            List[(distancia, clave)]
+        """
+        found: List[Tuple[int, str]] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.extend((d, key) for key in node[1])
+            # Desigualdad triangular: solo hijos con |dist - d| <= radius
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        found.sort()
+        return found
+
+    def __len__(self) -> int:
+        return self._size
+
+
+# ---------------- índice persistente ----------------
+class PerceptualIndex:
+    """Índice de pHash/dHash de las imágenes generadas, persistido en JSON"""
+
+    def __init__(self, index_path: Path, root: Optional[Path] = None):
+        """
+        Args:
+            index_path: JSON donde se persiste el índice
+            root: Raíz para guardar rutas relativas (None = raíz del proyecto)
+        """
+        self.index_path = Path(index_path)
+        self.root = Path(root) if root is not None else get_project_root()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # ruta -> {phash, dhash, mtime_ns, bytes}
+        self._tree: Optional[BKTree] = None
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._unsaved = 0  # altas de add() aún no escritas en el JSON
+
+    # ---------- persistencia ----------
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+            self._entries = {k: {**e, "phash": int(e["phash"], 16), "dhash": int(e["dhash"], 16)}
+                             for k, e in entries.items()}
+        except Exception as e:
+            print(f"[PerceptualHash] ⚠️ Índice ilegible, se reconstruye vacío: {e}")
+            self._entries = {}
+
+    def _save(self):
+        ensure_directory(self.index_path.parent)
+        entries = {k: {**e, "phash": f"{e['phash']:016x}", "dhash": f"{e['dhash']:016x}"}
+                   for k, e in self._entries.items()}
+        tmp = self.index_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entries": entries}, f)
+        os.replace(tmp, self.index_path)
+        self._unsaved = 0
+
+    def save(self):
+        """Escribe las altas pendientes de add() (no hace nada si no las hay)"""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _key(self, path: Path) -> str:
+        path = Path(path).resolve()
+        try:
+            return str(path.relative_to(self.root.resolve()))
+        except ValueError:
+            return str(path)
+
+    def resolve(self, key: str) -> Path:
+        path = Path(key)
+        return path if path.is_absolute() else self.root / path
+
+    def _get_tree(self) -> BKTree:
+        if self._tree is None:
+            tree = BKTree()
+            for key, entry in self._entries.items():
+                tree.add(entry["phash"], key)
+            self._tree = tree
+        return self._tree
+
+    # ---------- API ----------
+    def add(self, path: Path, image: Optional[Image.Image] = None) -> Dict[str, Any]:
+        """
+        Indexa una imagen (con image se evita volver a leer el fichero).
+        Volver a indexar una ruta (p.ej. un retrato regenerado) sustituye su hash.
+        El JSON se escribe cada SAVE_EVERY altas (ver save).
+
+        Returns:
+            dict: Entrada del índice
+        """
+        path = Path(path)
+        source = flatten(image if image is not None else path)
+        stat = path.stat()
+        entry = {"phash": phash(source), "dhash": dhash(source),
+                 "mtime_ns": stat.st_mtime_ns, "bytes": stat.st_size}
+        key = self._key(path)
+        with self._lock:
+            self._ensure_loaded()
+            previous = self._entries.get(key)
+            self._entries[key] = entry
+            if previous is not None and previous["phash"] != entry["phash"]:
+                # El BK-tree no admite borrados: el hash antiguo se rehace en la próxima consulta
+                self._tree = None
+            elif previous is None and self._tree is not None:
+                self._tree.add(entry["phash"], key)
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._save()
+        return entry
+
+    def remove(self, path: Path):
+        """Quita una imagen del índice (el fichero no se toca)"""
+        with self._lock:
+            self._ensure_loaded()
+            if self._entries.pop(self._key(path), None) is not None:
+                # El BK-tree no admite borrados: se rehace en la próxima consulta
+                self._tree = None
+                self._save()
+
+    def rebuild(self, paths: Iterable[Path], batch: int = 64) -> int:
+        """
+        Sincroniza el índice con una lista de ficheros: hashea (en lotes) los
+        nuevos o modificados y olvida los que ya no existen.
+
+        Returns:
+            int: Imágenes hasheadas
+        """
+        wanted = {self._key(p): Path(p) for p in paths if is_indexable(p)}
+        with self._lock:
+            self._ensure_loaded()
+            stale = []
+            for key, path in wanted.items():
+                stat = path.stat()
+                entry = self._entries.get(key)
+                if entry is None or entry.get("mtime_ns") != stat.st_mtime_ns or entry.get("bytes") != stat.st_size:
+                    stale.append((key, path, stat))
+            for i in range(0, len(stale), batch):
+                chunk = stale[i:i + batch]
+                images = [flatten(p) for _, p, _ in chunk]
+                for (key, _, stat), ph, dh in zip(chunk, phash_many(images), dhash_many(images)):
+                    self._entries[key] = {"phash": ph, "dhash": dh,
+                                          "mtime_ns": stat.st_mtime_ns, "bytes": stat.st_size}
+            for key in [k for k in self._entries if k not in wanted]:
+                del self._entries[key]
+            self._tree = None
+            self._save()
+        return len(stale)
+
+    def search(self, image: ImageLike, radius: int, exclude: Optional[Path] = None) -> List[Tuple[int, Path]]:
+        """
+        Imágenes indexadas a distancia de Hamming <= radius (pHash).
+
+        Args:
+            image: Imagen o ruta de consulta
+            radius: Distancia máxima (bits de 64)
+            exclude: Ruta a ignorar (p.ej. la propia imagen)
+
+        Returns:
+            List[(distancia, ruta)] de la más parecida a la menos
+        """
+        return self.search_hash(phash(image), radius, exclude)
+
+    def search_hash(self, value: int, radius: int, exclude: Optional[Path] = None) -> List[Tuple[int, Path]]:
+        skip = self._key(exclude) if exclude is not None else None
+        with self._lock:
+            self._ensure_loaded()
+            found = self._get_tree().search(value, radius)
+            return [(d, self.resolve(k)) for d, k in found if k != skip and k in self._entries]
+
+    def find_similar(self, image: ImageLike, radius: int, exclude: Optional[Path] = None) -> Optional[Path]:
+        """Imagen indexada más parecida dentro del radio (que siga en disco), o None"""
+        for _, path in self.search(image, radius, exclude):
+            if path.exists():
+                return path
+        return None
+
+    def duplicates(self, radius: int = 6) -> List[List[Path]]:
+        """
+        Grupos de imágenes casi idénticas (componentes conexas a distancia <= radius).
+
+        Returns:
+            List[List[Path]]: Grupos de 2 o más imágenes
+        """
+        with self._lock:
+            self._ensure_loaded()
+            tree = self._get_tree()
+            parent = {k: k for k in self._entries}
+
+            def find(k):
+                while parent[k] != k:
+                    parent[k] = parent[parent[k]]
+                    k = parent[k]
+                return k
+
+            for key, entry in self._entries.items():
+                for _, other in tree.search(entry["phash"], radius):
+                    if other in parent:
+                        parent[find(other)] = find(key)
+            groups: Dict[str, List[str]] = {}
+            for key in self._entries:
+                groups.setdefault(find(key), []).append(key)
+        return [[self.resolve(k) for k in sorted(g)] for g in groups.values() if len(g) > 1]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+
+# ---------------- instancia global ----------------
+_index: Optional[PerceptualIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_perceptual_index() -> Optional[PerceptualIndex]:
+    """Obtiene el índice global (lazy initialization), o None si está desactivado"""
+    global _index
+    from settings.settings import settings
+    if not getattr(settings, 'PHASH_INDEX_ENABLED', True):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                base = Path(getattr(settings, 'PHASH_INDEX_PATH', None) or "cache/phash_index.json")
+                _index = PerceptualIndex(base if base.is_absolute() else get_project_root() / base)
+                atexit.register(save_perceptual_index)
+    return _index
+
+
+def save_perceptual_index():
+    """Escribe las altas pendientes del índice global (si se llegó a crear)"""
+    if _index is not None:
+        _index.save()
+
+
+def generated_images() -> List[Path]:
+    """Retratos y fondos generados (lo que se indexa al reconstruir)"""
+    from settings.settings import settings
+    root = get_project_root()
+    paths: List[Path] = []
+    for value in (settings.PORTRAIT_DIR, settings.BG_GEN_DIR, settings.BG_FIGHT_DIR):
+        if not value:
+            continue
+        directory = Path(value) if Path(value).is_absolute() else root / value
+        if directory.is_dir():
+            paths.extend(p for p in directory.rglob("*") if is_indexable(p))
+    return sorted(dict.fromkeys(paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice de hashes perceptuales de imágenes generadas")
+    parser.add_argument("--rebuild", action="store_true", help="Indexar retratos y fondos")
+    parser.add_argument("--dupes", type=int, nargs="?", const=6, default=None,
+                        help="Listar grupos de casi duplicados (radio, por defecto 6)")
+    parser.add_argument("--bench", action="store_true", help="Medir el tiempo de consulta")
+    args = parser.parse_args()
+
+    index = get_perceptual_index()
+    if index is None:
+        print("[PerceptualHash] ⚠️ Índice desactivado (PHASH_INDEX_ENABLED)")
+        return
+    if args.rebuild:
+        start = time.perf_counter()
+        hashed = index.rebuild(generated_images())
+        print(f"[PerceptualHash] ✅ {hashed} imágenes hasheadas, {len(index)} en el índice "
+              f"({time.perf_counter() - start:.2f}s)")
+    if args.dupes is not None:
+        groups = index.duplicates(args.dupes)
+        wasted = 0
+        for group in groups:
+            print(" ~ " + ", ".join(p.name for p in group))
+            wasted += sum(p.stat().st_size for p in group[1:] if p.exists())
+        print(f"[PerceptualHash] {len(groups)} grupos (radio {args.dupes}), "
+              f"{wasted / 1024:.0f} KB deduplicables")
+    if args.bench:
+        rng = np.random.default_rng(0)
+        queries = [int(v) for v in rng.integers(0, 2 ** 63, size=200, dtype=np.int64)]
+        start = time.perf_counter()
+        for q in queries:
+            index.search_hash(q, 6)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"[PerceptualHash] {ms:.3f} ms/consulta (radio 6) sobre {len(index)} imágenes")
+    if not (args.rebuild or args.dupes is not None or args.bench):
+        print(f"[PerceptualHash] {len(index)} imágenes en {index.index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Cola de render con micro-batching y prioridades para Stable Diffusion.
+Las peticiones compatibles (mismo tamaño, steps, guidance y prioridad) que
+llegan dentro de una ventana corta se ejecutan en una única llamada al
+pipeline (lista de prompts), y cada llamante recibe su imagen mediante un Future.
+
+Prioridades: las peticiones interactivas (retratos que el jugador está
+esperando) se atienden antes que las de fondo (prefetch de fondos, sprites).
+Si llega una petición más urgente mientras corre un lote de menor prioridad,
+el lote se interrumpe entre steps de denoising (callback de fin de step del
+pipeline) y se vuelve a encolar.
+
+Otras operaciones sobre el mismo pipeline (p.ej. img2img) usan la misma cola
+con una clave que empieza por el nombre de la operación, así que nunca corren a
+la vez que un lote de txt2img y también se pueden interrumpir.
+"""
+
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+
+# Clave de compatibilidad: (width, height, steps, guidance); otras operaciones
+# anteponen su nombre, p.ej. ("img2img", base_key, width, height, steps, guidance, strength)
+BatchKey = Tuple
+
+# Menor número = más urgente
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_local = threading.local()
+
+
+class RenderPreempted(Exception):
+    """Se lanza desde el callback de step para interrumpir un lote en curso"""
+
+
+class RenderAborted(Exception):
+    """Resultado de una petición abortada con RenderQueue.abort()"""
+
+
+@contextmanager
+def render_priority(priority: int):
+    """
+    Fija la prioridad de las renders lanzadas desde este hilo.
+
+    Args:
+        priority: PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND u otro entero
+    """
+    previous = getattr(_local, "priority", None)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority() -> int:
+    """Prioridad activa en este hilo (interactiva por defecto)"""
+    priority = getattr(_local, "priority", None)
+    return PRIORITY_INTERACTIVE if priority is None else priority
+
+
+@dataclass
+class RenderRequest:
+    """Petición individual dentro de la cola"""
+    prompt: str
+    negative_prompt: str
+    key: BatchKey
+    priority: int = PRIORITY_INTERACTIVE
+    seq: int = 0
+    payload: Any = None     # datos de la operación fuera de la clave (p.ej. imagen base de img2img)
+    future: Future = field(default_factory=Future)
+    started: bool = False   # ya pasó a RUNNING (p.ej. lote interrumpido y reencolado)
+    aborted: bool = False
+
+
+class RenderQueue:
+    """
+    Cola con un único worker que agrupa peticiones compatibles.
+
+    El worker toma la petición pendiente más urgente, espera hasta window_ms
+    a que lleguen otras con la misma clave y prioridad (o hasta max_batch) y
+    ejecuta run_batch(prompts, negative_prompts, key, should_abort) -> lista
+    de imágenes. run_batch debe consultar should_abort() entre steps y lanzar
+    RenderPreempted si devuelve True. Si las peticiones llevan payload, se pasa
+    como payload=... (la clave lo identifica: el lote comparte el del primero).
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[..., list],
+        window_ms: float = 40.0,
+        max_batch: int = 4,
+        name: str = "RenderQueue",
+    ):
+        """
+        Args:
+            run_batch: Función que ejecuta un lote y devuelve una imagen por prompt
+            window_ms: Milisegundos que se espera a peticiones compatibles
+            max_batch: Tamaño máximo de lote
+            name: Nombre para logs
+        """
+        self._run_batch = run_batch
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.name = name
+        self._pending: List[RenderRequest] = []
+        self._running: List[RenderRequest] = []
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._seq = itertools.count()
+        self.batches = 0
+        self.images = 0
+        self.preempted = 0
+
+    def submit(self, prompt: str, negative_prompt: str, key: BatchKey, priority: Optional[int] = None,
+               payload: Any = None) -> Future:
+        """
+        Encola una petición.
+
+        Args:
+            prompt: Prompt positivo
+            negative_prompt: Prompt negativo
+            key: (width, height, steps, guidance)
+            priority: Prioridad (None = la del hilo, ver render_priority)
+            payload: Datos de la operación que no van en la clave (ver RenderRequest)
+
+        Returns:
+            Future: Se resuelve con la imagen (o None si el pipeline no la devolvió)
+        """
+        request = RenderRequest(
+            prompt, negative_prompt, key,
+            priority=current_priority() if priority is None else priority,
+            seq=next(self._seq),
+            payload=payload,
+        )
+        with self._cond:
+            self._pending.append(request)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+        return request.future
+
+    def abort(self, future: Future) -> bool:
+        """
+        Aborta una petición: si está pendiente se cancela; si está en curso,
+        el lote se interrumpe en el siguiente step.
+
+        Returns:
+            bool: True si la petición seguía viva
+        """
+        with self._cond:
+            for request in self._pending:
+                if request.future is future:
+                    self._pending.remove(request)
+                    if not future.cancel():
+                        future.set_exception(RenderAborted("render abortada"))
+                    return True
+            for request in self._running:
+                if request.future is future:
+                    request.aborted = True
+                    return True
+        return False
+
+    def _take_batch(self) -> List[RenderRequest]:
+        """Espera a la petición más urgente y recoge las compatibles dentro de la ventana."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while True:
+                head = min(self._pending, key=lambda r: (r.priority, r.seq))
+                compatible = sorted(
+                    (r for r in self._pending if r.key == head.key and r.priority == head.priority),
+                    key=lambda r: r.seq,
+                )
+                remaining = deadline - time.monotonic()
+                # Un lote interrumpido vuelve sin esperar la ventana
+                if len(compatible) >= self.max_batch or remaining <= 0 or head.started:
+                    break
+                self._cond.wait(remaining)
+            batch = compatible[:self.max_batch]
+            self._pending = [r for r in self._pending if r not in batch]
+            self._running = batch
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            ready = []
+            for request in batch:
+                # Descartar peticiones canceladas antes de empezar
+                if request.started or request.future.set_running_or_notify_cancel():
+                    request.started = True
+                    ready.append(request)
+            if ready:
+                self._execute(ready)
+            with self._cond:
+                self._running = []
+
+    def _should_abort(self, batch: List[RenderRequest]) -> Callable[[], bool]:
+        priority = batch[0].priority
+
+        def should_abort() -> bool:
+            with self._cond:
+                return (any(r.aborted for r in batch)
+                        or any(p.priority < priority for p in self._pending))
+        return should_abort
+
+    def _requeue(self, batch: List[RenderRequest]):
+        """Devuelve a la cola un lote interrumpido (las abortadas se resuelven con error)."""
+        self.preempted += 1
+        with self._cond:
+            for request in batch:
+                if request.aborted:
+                    request.future.set_exception(RenderAborted("render abortada"))
+                else:
+                    self._pending.append(request)
+            self._cond.notify_all()
+        print(f"[{self.name}] Lote de {len(batch)} interrumpido (prioridad {batch[0].priority})")
+
+    def _call(self, batch: List[RenderRequest]) -> list:
+        """run_batch sobre un lote (con el payload del primero si lo hay)"""
+        kwargs = {} if batch[0].payload is None else {"payload": batch[0].payload}
+        return self._run_batch(
+            [r.prompt for r in batch],
+            [r.negative_prompt for r in batch],
+            batch[0].key,
+            self._should_abort(batch),
+            **kwargs,
+        )
+
+    def _execute(self, batch: List[RenderRequest]):
+        try:
+            images = self._call(batch)
+            self.batches += 1
+            self.images += len(batch)
+            for i, request in enumerate(batch):
+                request.future.set_result(images[i] if i < len(images) else None)
+        except RenderPreempted:
+            self._requeue(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            # El lote completo falló (p.ej. memoria): reintentar de uno en uno
+            print(f"[{self.name}] ⚠️ Lote de {len(batch)} falló ({e}), reintentando por separado")
+            for i, request in enumerate(batch):
+                try:
+                    images = self._call([request])
+                    request.future.set_result(images[0] if images else None)
+                except RenderPreempted:
+                    self._requeue(batch[i:])
+                    return
+                except Exception as e2:
+                    request.future.set_exception(e2)
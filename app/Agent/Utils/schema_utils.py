@@ -0,0 +1,135 @@
+"""
+Utilidades para esquemas JSON de salidas estructuradas.
+Permite enviar al modelo un esquema con claves cortas ("wire schema")
+y traducir después la respuesta a los nombres canónicos.
+"""
+
+from typing import Dict, Any, Tuple
+
+
+def _short_key_candidates(key: str):
+    """
+    Genera abreviaturas candidatas para una clave, de más corta a más larga.
+
+    Args:
+        key: Nombre canónico de la propiedad
+
+    Returns:
+        generator: Abreviaturas posibles (iniciales de palabras y prefijos)
+    """
+    words = [w for w in key.lower().split("_") if w]
+    if len(words) > 1:
+        yield "".join(w[0] for w in words)
+    for i in range(1, len(key) + 1):
+        yield key[:i]
+
+
+def _short_key(key: str, used: set) -> str:
+    """
+    Elige la abreviatura más corta que no esté ya usada en el mismo objeto.
+
+    Args:
+        key: Nombre canónico de la propiedad
+        used: Claves cortas ya asignadas en ese nivel
+
+    Returns:
+        str: Clave corta única
+    """
+    for cand in _short_key_candidates(key):
+        if cand not in used:
+            return cand
+    # Extremo: todos los prefijos ocupados -> sufijo numérico
+    n = 2
+    while f"{key}{n}" in used:
+        n += 1
+    return f"{key}{n}"
+
+
+def compact_schema(schema: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Construye una copia del esquema con nombres de propiedad cortos.
+    El nombre canónico se conserva en la 'description' de cada propiedad
+    para que el modelo sepa qué significa cada clave.
+
+    Args:
+        schema: Esquema JSON original (objetos, arrays y escalares)
+
+    Returns:
+        Tuple[Dict, Dict]: (esquema compacto, mapa para expand_arguments)
+    """
+    if not isinstance(schema, dict):
+        return schema, {}
+
+    schema_type = schema.get("type")
+
+    if schema_type == "object" and "properties" in schema:
+        compact = {k: v for k, v in schema.items() if k not in ("properties", "required")}
+        properties: Dict[str, Any] = {}
+        keys: Dict[str, str] = {}
+        children: Dict[str, Any] = {}
+        used: set = set()
+        canonical_to_short: Dict[str, str] = {}
+
+        for key, prop in schema["properties"].items():
+            short = _short_key(key, used)
+            used.add(short)
+            canonical_to_short[key] = short
+            keys[short] = key
+
+            child_schema, child_map = compact_schema(prop)
+            child_schema = dict(child_schema) if isinstance(child_schema, dict) else child_schema
+            if isinstance(child_schema, dict):
+                desc = child_schema.get("description")
+                child_schema["description"] = f"{key}: {desc}" if desc else key
+            properties[short] = child_schema
+            if child_map:
+                children[short] = child_map
+
+        compact["properties"] = properties
+        if "required" in schema:
+            compact["required"] = [canonical_to_short.get(k, k) for k in schema["required"]]
+        return compact, {"keys": keys, "children": children}
+
+    if schema_type == "array" and isinstance(schema.get("items"), dict):
+        items_schema, items_map = compact_schema(schema["items"])
+        compact = dict(schema)
+        compact["items"] = items_schema
+        return compact, ({"items": items_map} if items_map else {})
+
+    return schema, {}
+
+
+def expand_arguments(args: Any, key_map: Dict[str, Any]) -> Any:
+    """
+    Traduce una respuesta con claves cortas a los nombres canónicos.
+    Las claves desconocidas (p.ej. si el modelo ya usó el nombre largo)
+    se conservan tal cual.
+
+    Args:
+        args: Argumentos devueltos por el modelo
+        key_map: Mapa generado por compact_schema
+
+    Returns:
+        Any: Argumentos con los nombres canónicos
+    """
+    if not key_map:
+        return args
+
+    if isinstance(args, list) and "items" in key_map:
+        return [expand_arguments(item, key_map["items"]) for item in args]
+
+    if isinstance(args, dict) and "keys" in key_map:
+        keys = key_map["keys"]
+        children = key_map.get("children", {})
+        out: Dict[str, Any] = {}
+        for short, value in args.items():
+            canonical = keys.get(short, short)
+            child_map = children.get(short)
+            if child_map is None:
+                # El modelo respondió con el nombre canónico
+                short_for = next((s for s, c in keys.items() if c == short), None)
+                child_map = children.get(short_for) if short_for else None
+            out[canonical] = expand_arguments(value, child_map) if child_map else value
+        return out
+
+    return args
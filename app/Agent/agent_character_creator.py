@@ -1,6 +1,8 @@
 import os
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
+from settings.settings import settings
 from app.Agent.agents import Agent, Runner
 from app.domain.character import Character
 from app.Agent.prompts.prompts_character_creator import PromptsCharacterCreator
@@ -83,14 +85,79 @@ def create_character(banned_norm_names: set[str] | None = None) -> Character:
         portrait="",  # Se asignará después en char_select_scene
     )
 
+def _placeholder(k: int) -> Character:
+    """Personaje de relleno cuando la IA no consigue completar el lote."""
+    return Character(
+        name=f"Enemigo_{k}",
+        damage=5,
+        resistence=5,
+        weapon="arma",
+        description="placeholder",
+        portrait=""  # Se asignará después en char_select_scene
+    )
+
+def _is_valid(ch: Character, seen: set[str]) -> bool:
+    """Un candidato vale si tiene nombre, arma y descripción y el nombre no está repetido."""
+    return bool(ch.name.strip() and ch.weapon and ch.description) and normalize_name(ch.name) not in seen
+
+@traceable(name="create_candidates_parallel")
+def create_candidates_parallel(n: int = 4) -> list[Character]:
+    """
+    Crea n enemigos lanzando n llamadas unitarias en paralelo.
+    - Solo se lanza una llamada de reemplazo cuando otra falla o devuelve un
+      candidato inválido o repetido (no hay llamadas sobrantes que gasten cuota)
+    - Los reemplazos vetan los nombres ya aceptados
+    - Como máximo n*3 intentos; lo que falte se rellena con placeholders
+
+    Nota: con Ollama solo hay paralelismo real si el servidor lo permite (OLLAMA_NUM_PARALLEL).
+    """
+    out: list[Character] = []
+    seen: set[str] = set()
+    attempts = 0
+    max_attempts = n * 3
+
+    with ThreadPoolExecutor(max_workers=max(1, n)) as ex:
+        pending = set()
+        for _ in range(min(n, max_attempts)):
+            pending.add(ex.submit(create_character, set(seen)))
+            attempts += 1
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    ch = fut.result()
+                except Exception as e:
+                    print(f"[agent_character_creator] ⚠️ Candidato fallido: {e}")
+                    ch = None
+                if ch is not None and _is_valid(ch, seen):
+                    seen.add(normalize_name(ch.name))
+                    out.append(ch)
+                elif attempts < max_attempts:
+                    # Reemplazo con los nombres aceptados hasta ahora vetados
+                    pending.add(ex.submit(create_character, set(seen)))
+                    attempts += 1
+
+    while len(out) < n:
+        out.append(_placeholder(len(out) + 1))
+    return out
+
 @traceable(name="create_candidates")
-def create_candidates(n: int = 4) -> list[Character]:
+def create_candidates(n: int = 4, parallel: bool | None = None) -> list[Character]:
     """
     Crea EXACTAMENTE n enemigos:
     - 1 llamada en lote con uniqueItems
     - deduplicación local por nombre normalizado
     - relleno con llamadas unitarias si hiciera falta
+
+    Con parallel=True (o AIProvider.parallel_candidates en settings) usa
+    create_candidates_parallel: menor latencia a cambio de algo más de cómputo.
     """
+    if parallel is None:
+        parallel = getattr(settings, 'AI_PARALLEL_CANDIDATES', False)
+    if parallel:
+        return create_candidates_parallel(n)
+
     prompts = PromptsCharacterCreator()
     schema = _candidates_schema(n)
     user_prompt = prompts.create_candidates(n)
@@ -137,14 +204,6 @@ def create_candidates(n: int = 4) -> list[Character]:
 
     # 3) seguridad: si aún faltaran por algún motivo extremo
     while len(out) < n:
-        k = len(out) + 1
-        out.append(Character(
-            name=f"Enemigo_{k}",
-            damage=5,
-            resistence=5,
-            weapon="arma",
-            description="placeholder",
-            portrait=""  # Se asignará después en char_select_scene
-        ))
+        out.append(_placeholder(len(out) + 1))
 
     return out
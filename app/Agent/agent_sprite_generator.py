@@ -1,7 +1,8 @@
 import os
 import traceback
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
 from dotenv import load_dotenv
 from app.domain.character import Character
 from settings.settings import settings
@@ -9,6 +10,8 @@ from app.Agent.agents import Agent, Runner
 from app.Agent.prompts.prompts_sprite_generator import PromptsSpriteGenerator
 from app.Agent.Utils.path_utils import get_project_root
 from app.Agent.Utils.image_provider import ImageProvider
+from app.Agent.Utils.image_cache import get_image_cache, request_key
+from app.Agent.Utils.render_queue import render_priority, PRIORITY_BACKGROUND
 
 # Intentar importar LangSmith (opcional)
 try:
@@ -65,6 +68,17 @@ SPRITE_REFERENCES = {
     }
 }
 
+# Frames por tipo de sprite (los mismos que espera SpriteRenderer) y tamaño de cada frame
+SPRITE_FRAMES = {
+    "idle": 10, "walk": 8, "run": 8, "jump": 3,
+    "attack": 7, "block": 3, "hurt": 3, "death": 7,
+}
+FRAME_SIZE = 162
+# Modo pixel art: cada píxel lógico del frame ocupa PIXEL_ART_FRAME_FACTOR x PIXEL_ART_FRAME_FACTOR
+# (162 no es múltiplo de 8, así que el frame no puede generarse a un tamaño nativo que lo divida:
+# se reduce a una rejilla de 81 px y se amplía por un factor entero)
+PIXEL_ART_FRAME_FACTOR = 2
+
 # ---------------- Image Provider ----------------
 _image_provider = None
 
@@ -120,11 +134,7 @@ def generate_sprite_image(
         return str(output_path)
     
     # Construir prompt
-    type_to_frames = {
-        "idle": 10, "walk": 8, "run": 8, "jump": 3,
-        "attack": 7, "block": 3, "hurt": 3, "death": 7,
-    }
-    forced_frames = type_to_frames.get(sprite_spec["sprite_type"], sprite_spec.get("animation_frames", 6))
+    forced_frames = SPRITE_FRAMES.get(sprite_spec["sprite_type"], sprite_spec.get("animation_frames", 6))
     prompt = (
         f"SpriteSheet horizontal de {sprite_spec['character_name']} - {sprite_spec['sprite_type']}. "
         f"Descripción: {sprite_spec['description']}. "
@@ -140,10 +150,19 @@ def generate_sprite_image(
         print(f"[sprite_generator] generating: {output_path}")
         
         provider = _get_image_provider()
-        image = provider.generate_image(
-            prompt=prompt,
-            size="162x162"
-        )
+        image = None
+        factor = 1
+        if getattr(settings, 'SPRITE_IMG2IMG_ENABLED', True) and provider.supports_img2img:
+            # Frames derivados de la pose base: misma identidad y pocos steps por frame
+            image = _derive_from_base_pose(sprite_spec, output_dir, size, forced_frames)
+            factor = _frame_factor() if image is not None else 1
+        if image is None:
+            # Los sprites se generan por adelantado: ceden el pipeline a los retratos interactivos
+            with render_priority(PRIORITY_BACKGROUND):
+                image = provider.generate_image(
+                    prompt=prompt,
+                    size="162x162"
+                )
         
         if image is None:
             print(f"[sprite_generator] ERROR: No se pudo generar el sprite")
@@ -151,6 +170,18 @@ def generate_sprite_image(
         
         # Hacer fondo transparente si el proveedor lo soporta
         image = provider.make_transparent_background(image)
+        if settings.PALETTE_COLORS:
+            from app.Agent.Utils.image_postprocess import quantize_palette
+            image = quantize_palette(image, settings.PALETTE_COLORS)
+        
+        if factor > 1:
+            # Pixel art: la tira está en la rejilla lógica; se guarda tal cual en lowres/
+            # y se amplía por un factor entero (nearest) a FRAME_SIZE por frame
+            from app.Agent.Utils.image_postprocess import upscale_nearest
+            lowres_path = output_dir / "lowres" / filename
+            lowres_path.parent.mkdir(parents=True, exist_ok=True)
+            provider.save_image(image, lowres_path)
+            image, _ = upscale_nearest(image, factor)
         
         # Guardar imagen
         provider.save_image(image, output_path)
@@ -162,6 +193,109 @@ def generate_sprite_image(
         traceback.print_exc()
         return None
 
+def _base_pose_request(sprite_spec: Dict[str, str], size: str) -> Tuple[str, str]:
+    """
+    Prompt de la pose base y su clave de cache por contenido (ver Utils/image_cache.py):
+    si cambia la descripción o la paleta de un personaje con el mismo nombre, la base
+    se vuelve a generar en lugar de reutilizar {slug}_base.png.
+
+    Returns:
+        (prompt, key)
+    """
+    from app.Agent.image_renderer import _cache_fields
+    prompt = (
+        f"Sprite de cuerpo entero de {sprite_spec['character_name']}, de pie en pose neutral, de perfil. "
+        f"Descripción: {sprite_spec['description']}. "
+        f"Paleta: {sprite_spec['color_palette']}. "
+        f"Estilo: {sprite_spec['reference_style']}. "
+        "Un solo personaje centrado sobre fondo liso. Estilo pixel art para juego de lucha."
+    )
+    provider = _get_image_provider()
+    fields = _cache_fields(getattr(provider, 'provider', provider), prompt, size)
+    return prompt, request_key(kind="sprite_base", **fields)
+
+def _base_pose(sprite_spec: Dict[str, str], output_dir: Path, size: str, prompt: str, key: str) -> Optional[Image.Image]:
+    """
+    Pose base del personaje (de pie, neutral), generada una sola vez a coste completo
+    y guardada como {slug}_base.png. Todos los tipos de sprite se derivan de ella.
+    """
+    from app.Agent.Utils.function_utils import slugify
+    base_path = output_dir / f"{slugify(sprite_spec['character_name'])}_base.png"
+    cache = get_image_cache()
+    # Sin cache por contenido: comportamiento anterior (cache por nombre)
+    if (cache is None and base_path.exists()) or (cache is not None and cache.materialize(key, base_path)):
+        with Image.open(base_path) as img:
+            return img.convert("RGB")
+    
+    print(f"[sprite_generator] generating base pose: {base_path} ({key[:12]})")
+    provider = _get_image_provider()
+    with render_priority(PRIORITY_BACKGROUND):
+        base = provider.generate_image(prompt=prompt, size=size)
+    if base is None:
+        return None
+    if provider.save_image(base, base_path) and cache is not None:
+        cache.put(key, base_path, {"kind": "sprite_base", "character": sprite_spec['character_name']})
+    return base.convert("RGB")
+
+def _derive_from_base_pose(
+    sprite_spec: Dict[str, str],
+    output_dir: Path,
+    size: str,
+    num_frames: int
+) -> Optional[Image.Image]:
+    """
+    Genera un spritesheet horizontal derivando cada frame de la pose base con img2img
+    de baja fuerza (las latentes de la base se codifican una vez y se reutilizan).
+    
+    En modo pixel art los frames se generan a la resolución nativa y la tira queda en la
+    rejilla lógica (FRAME_SIZE // PIXEL_ART_FRAME_FACTOR px por frame); generate_sprite_image
+    la amplía después por el factor entero.
+    
+    Returns:
+        Image.Image: Tira de num_frames frames de FRAME_SIZE px (o de la rejilla lógica), o None si falla
+    """
+    factor = _frame_factor()
+    if factor > 1:
+        from app.Agent.Utils.image_postprocess import pixel_art_plan
+        size, _ = pixel_art_plan(size, settings.PIXEL_ART_NATIVE_SIZE)
+    base_prompt, base_key = _base_pose_request(sprite_spec, size)
+    base = _base_pose(sprite_spec, output_dir, size, base_prompt, base_key)
+    if base is None:
+        return None
+    
+    prompts = [
+        f"{sprite_spec['character_name']}, animación {sprite_spec['sprite_type']}, frame {i + 1} de {num_frames}. "
+        f"Pose: {sprite_spec['pose_details']}. "
+        f"Mismo personaje, misma ropa y paleta: {sprite_spec['color_palette']}. "
+        "Un solo personaje centrado sobre fondo liso. Estilo pixel art para juego de lucha."
+        for i in range(num_frames)
+    ]
+    provider = _get_image_provider()
+    strength = getattr(settings, 'SPRITE_IMG2IMG_STRENGTH', 0.35)
+    max_batch = max(1, getattr(settings, 'SD_MAX_BATCH', 4))
+    frames: List[Image.Image] = []
+    with render_priority(PRIORITY_BACKGROUND):
+        for start in range(0, num_frames, max_batch):
+            chunk = provider.generate_variations(
+                prompts[start:start + max_batch], base, base_key, strength=strength, size=size
+            )
+            if not chunk:
+                return None
+            frames.extend(chunk)
+    
+    # Reducir con BOX (promedio por celda) en pixel art o LANCZOS sin él: un NEAREST de
+    # factor no entero (256 -> 162) deja píxeles de anchos distintos
+    cell = FRAME_SIZE // factor
+    resample = Image.BOX if factor > 1 else Image.LANCZOS
+    sheet = Image.new("RGB", (cell * num_frames, cell))
+    for i, frame in enumerate(frames[:num_frames]):
+        sheet.paste(frame.convert("RGB").resize((cell, cell), resample), (i * cell, 0))
+    return sheet
+
+def _frame_factor() -> int:
+    """Factor entero de ampliación de los frames (1 fuera del modo pixel art)"""
+    return PIXEL_ART_FRAME_FACTOR if getattr(settings, 'PIXEL_ART_MODE', False) else 1
+
 def generate_character_sprite_set(
     character: Character,
     output_dir: Path,
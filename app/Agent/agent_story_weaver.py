@@ -5,7 +5,9 @@ from dotenv import load_dotenv
 from app.Agent.agents import Agent, Runner
 from app.domain.character import Character
 from app.Agent.prompts.prompts_story_weaver import PromptsStoryWeaver
-from typing import Dict, Any, List, Optional
+from app.Agent.narrative_cache import get_narrative_cache, character_features
+from settings.settings import settings
+from typing import Dict, Any, List, Optional, Callable
 
 # Intentar importar LangSmith (opcional)
 try:
@@ -63,6 +65,35 @@ _ENDING_SCHEMA = {
     "required": ["epilogue", "conclusion", "moral"],
 }
 
+# ---------------- Cache por similitud ----------------
+def _cached_or_generate(
+    kind: str,
+    features: str,
+    names: Dict[str, str],
+    generate: Callable[[], Any]
+) -> Any:
+    """
+    Devuelve una narrativa guardada si hay una suficientemente parecida;
+    si no, la genera con la IA y la guarda para futuras peticiones.
+    """
+    cache = get_narrative_cache() if getattr(settings, 'NARRATIVE_CACHE_ENABLED', False) else None
+    if cache is not None:
+        try:
+            hit = cache.lookup(kind, features, names, settings.NARRATIVE_CACHE_THRESHOLD)
+            if hit is not None:
+                return hit
+        except Exception as e:
+            print(f"[agent_story_weaver] ⚠️ Error consultando cache narrativa: {e}")
+    
+    output = generate()
+    
+    if cache is not None and output:
+        try:
+            cache.add(kind, features, names, output)
+        except Exception as e:
+            print(f"[agent_story_weaver] ⚠️ Error guardando en cache narrativa: {e}")
+    return output
+
 # ---------------- API ----------------
 @traceable(name="create_introduction_story")
 def create_introduction_story(player: Character = None) -> Dict[str, str]:
@@ -70,18 +101,25 @@ def create_introduction_story(player: Character = None) -> Dict[str, str]:
     Crea la introducción narrativa de la partida.
     Si se proporciona un jugador, personaliza la historia.
     """
-    prompts = PromptsStoryWeaver()
-    user_prompt = prompts.create_introduction_story(player)
+    def generate():
+        prompts = PromptsStoryWeaver()
+        user_prompt = prompts.create_introduction_story(player)
+        
+        res = Runner.run_structured(
+            _STORY_AGENT,
+            prompt=user_prompt,
+            tool_name="create_introduction",
+            parameters_schema=_INTRO_SCHEMA,
+            tool_description="Crea la introducción narrativa personalizada del juego.",
+        )
+        return res.arguments
     
-    res = Runner.run_structured(
-        _STORY_AGENT,
-        prompt=user_prompt,
-        tool_name="create_introduction",
-        parameters_schema=_INTRO_SCHEMA,
-        tool_description="Crea la introducción narrativa personalizada del juego.",
+    return _cached_or_generate(
+        "intro",
+        character_features(player, "player"),
+        {"player": player.name if player else None},
+        generate,
     )
-    
-    return res.arguments
 
 @traceable(name="create_combat_narrative")
 def create_combat_narrative(
@@ -93,18 +131,29 @@ def create_combat_narrative(
     """
     Crea la narrativa de un combate específico.
     """
-    prompts = PromptsStoryWeaver()
-    user_prompt = prompts.create_combat_narrative(player, enemy, combat_result, story_context)
+    def generate():
+        prompts = PromptsStoryWeaver()
+        user_prompt = prompts.create_combat_narrative(player, enemy, combat_result, story_context)
+        
+        res = Runner.run_structured(
+            _STORY_AGENT,
+            prompt=user_prompt,
+            tool_name="create_combat_narrative",
+            parameters_schema=_COMBAT_NARRATIVE_SCHEMA,
+            tool_description="Crea la narrativa de un combate específico.",
+        )
+        return res.arguments
     
-    res = Runner.run_structured(
-        _STORY_AGENT,
-        prompt=user_prompt,
-        tool_name="create_combat_narrative",
-        parameters_schema=_COMBAT_NARRATIVE_SCHEMA,
-        tool_description="Crea la narrativa de un combate específico.",
+    outcome = "victoria" if combat_result.get("victory", False) else "derrota"
+    features = f"{character_features(player, 'player')} {character_features(enemy, 'enemy')}"
+    if story_context:
+        features += f" {story_context.get('last_event', '')}"
+    return _cached_or_generate(
+        f"combat:{outcome}",
+        features,
+        {"player": player.name, "enemy": enemy.name},
+        generate,
     )
-    
-    return res.arguments
 
 @traceable(name="create_ending_story")
 def create_ending_story(
@@ -137,10 +186,10 @@ def create_story_beat(
     """
     Crea un beat narrativo específico para un evento.
     """
-    prompts = PromptsStoryWeaver()
-    user_prompt = prompts.create_story_beat(event_type, player, context)
-    
-    try:
+    def generate():
+        prompts = PromptsStoryWeaver()
+        user_prompt = prompts.create_story_beat(event_type, player, context)
+        
         res = Runner.run_structured(
             _STORY_AGENT,
             prompt=user_prompt,
@@ -153,6 +202,18 @@ def create_story_beat(
             tool_description="Crea un beat narrativo específico.",
         )
         return res.arguments.get("beat", "")
+    
+    # Nombres como huecos; el resto del contexto (armas, etc.) como rasgos
+    names = {"player": player.name if player else None}
+    if context and isinstance(context.get("enemy"), str):
+        names["enemy"] = context["enemy"]
+    features = character_features(player, "player")
+    for key, value in sorted((context or {}).items()):
+        if value not in names.values():
+            features += f" {key} {value}"
+    
+    try:
+        return _cached_or_generate(f"beat:{event_type}", features, names, generate)
     except Exception:
         return f"Un momento épico ocurre en la aventura de {player.name if player else 'el héroe'}."
 
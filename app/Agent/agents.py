@@ -1,9 +1,11 @@
 # agents.py
 from dataclasses import dataclass
-from typing import Dict, Any
-import os, json
+from typing import Dict, Any, Optional
+import os, json, threading
 from settings.settings import settings
 from app.Agent.Utils.provider_factory import ProviderFactory
+from app.Agent.Utils.schema_utils import compact_schema, expand_arguments
+from app.Agent.Utils.concurrency import get_limiter
 
 
 @dataclass
@@ -33,19 +35,32 @@ class Runner:
     """
     
     _provider = None
+    _lock = threading.Lock()  # Varias llamadas en paralelo pueden pedir el proveedor a la vez
     
     @staticmethod
     def _get_provider():
         """
-        Obtiene el proveedor configurado (lazy initialization)
+        Obtiene el proveedor configurado (lazy initialization) - Thread-safe
         
         Returns:
             BaseIAProvider: Proveedor configurado
         """
         if Runner._provider is None:
-            Runner._provider = ProviderFactory.crear_provider(settings)
+            with Runner._lock:
+                if Runner._provider is None:
+                    Runner._provider = ProviderFactory.crear_provider(settings)
         return Runner._provider
     
+    @staticmethod
+    def _limiter():
+        """
+        Limitador adaptativo de concurrencia del proveedor LLM configurado
+        
+        Returns:
+            AdaptiveLimiter: Limitador compartido (llm_ollama, llm_openai...)
+        """
+        return get_limiter(f"llm_{str(getattr(settings, 'AI_PROVIDER', 'openai')).lower()}")
+    
     @staticmethod
     def run_sync(agent: Agent, prompt: str) -> Result:
         """
@@ -66,11 +81,12 @@ class Runner:
         
         # Generar respuesta usando el proveedor
         system_prompt = agent.instructions
-        resultado = provider.generate(
-            system_prompt,
-            prompt,
-            temperature=agent.temperature
-        )
+        with Runner._limiter().slot():
+            resultado = provider.generate(
+                system_prompt,
+                prompt,
+                temperature=agent.temperature
+            )
         
         # Incrementar contador
         provider.incrementar_consumo()
@@ -85,7 +101,8 @@ class Runner:
         *,
         tool_name: str,
         parameters_schema: Dict[str, Any],
-        tool_description: str = ""
+        tool_description: str = "",
+        compact_keys: Optional[bool] = None
     ) -> StructuredResult:
         """
         Fuerza al modelo a responder mediante una 'function call' con argumentos
@@ -97,6 +114,8 @@ class Runner:
             tool_name: Nombre de la función/tool
             parameters_schema: Esquema JSON de los parámetros
             tool_description: Descripción de la función
+            compact_keys: Si True, el modelo ve claves cortas y la respuesta se
+                traduce a los nombres canónicos (None = settings.AI_COMPACT_SCHEMA)
         
         Returns:
             StructuredResult: Resultado con argumentos parseados
@@ -107,16 +126,28 @@ class Runner:
         if not provider.verificar_limite():
             raise RuntimeError("Límite de consumo de IA alcanzado")
         
+        # Esquema "de cable" con claves cortas (menos tokens de salida)
+        if compact_keys is None:
+            compact_keys = getattr(settings, 'AI_COMPACT_SCHEMA', False)
+        wire_schema, key_map = parameters_schema, {}
+        if compact_keys:
+            wire_schema, key_map = compact_schema(parameters_schema)
+        
         # Generar respuesta estructurada usando el proveedor
         system_prompt = agent.instructions
-        args = provider.generate_structured(
-            system_prompt,
-            prompt,
-            tool_name,
-            parameters_schema,
-            tool_description,
-            temperature=agent.temperature
-        )
+        with Runner._limiter().slot():
+            args = provider.generate_structured(
+                system_prompt,
+                prompt,
+                tool_name,
+                wire_schema,
+                tool_description,
+                temperature=agent.temperature
+            )
+        
+        # Traducir claves cortas a los nombres que esperan los agentes
+        if key_map:
+            args = expand_arguments(args, key_map)
         
         # Incrementar contador
         provider.incrementar_consumo()
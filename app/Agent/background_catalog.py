@@ -0,0 +1,278 @@
+"""
+Catálogo persistente de fondos de batalla.
+
+Cada fondo se registra una vez con sus etiquetas (tipo de enemigo, rareza,
+bioma, ambiente) y un histograma de color precalculado. Las búsquedas van
+por índice de etiquetas (O(1) por etiqueta, sin recorrer el directorio ni
+hacer stat() de cada fichero) y, si ninguna coincide, se elige el fondo con
+la paleta más parecida a la del tipo de enemigo.
+
+El catálogo se guarda en JSON (settings.BG_CATALOG_PATH). Si no existe se
+reconstruye una sola vez a partir de los nombres de fichero del directorio
+de batalla ({tipo}_{rareza}_*.png).
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.Agent.Utils.function_utils import normalize_name
+from app.Agent.Utils.path_utils import get_project_root, ensure_directory
+
+HIST_BINS = 4  # por canal -> 64 dimensiones
+TAG_FIELDS = ("enemy_type", "rarity", "biome", "mood")
+
+# Paleta de referencia por tipo de enemigo (fallback por color)
+TYPE_PALETTES: Dict[str, List[Tuple[int, int, int]]] = {
+    'hielo': [(200, 230, 255), (120, 170, 220), (240, 250, 255)],
+    'fuego': [(230, 80, 20), (250, 170, 40), (90, 20, 10)],
+    'agua': [(20, 90, 160), (60, 160, 200), (10, 40, 80)],
+    'tierra': [(120, 90, 60), (160, 130, 90), (70, 60, 40)],
+    'sombra': [(30, 20, 40), (70, 40, 90), (10, 10, 15)],
+    'luz': [(255, 240, 180), (250, 250, 230), (220, 190, 100)],
+    'viento': [(190, 220, 230), (140, 180, 200), (230, 240, 240)],
+    'electrico': [(250, 240, 80), (80, 80, 160), (30, 30, 70)],
+}
+
+# Palabras clave para resumir el brief (setting / mood) en una etiqueta corta
+BIOME_KEYWORDS: Dict[str, List[str]] = {
+    'bosque': ['bosque', 'selva', 'arbol', 'jungla'],
+    'desierto': ['desierto', 'arena', 'duna'],
+    'montana': ['montana', 'pico', 'acantilado', 'cumbre'],
+    'cueva': ['cueva', 'caverna', 'gruta', 'mina'],
+    'castillo': ['castillo', 'fortaleza', 'torre', 'palacio'],
+    'ruinas': ['ruina', 'templo', 'antigu'],
+    'volcan': ['volcan', 'lava', 'magma'],
+    'nieve': ['nieve', 'hielo', 'glaciar', 'tundra'],
+    'mar': ['mar', 'oceano', 'playa', 'costa', 'puerto'],
+    'ciudad': ['ciudad', 'calle', 'aldea', 'pueblo', 'mercado'],
+}
+MOOD_KEYWORDS: Dict[str, List[str]] = {
+    'oscuro': ['oscur', 'tenebros', 'sombri', 'siniestr'],
+    'epico': ['epic', 'heroic', 'grandios'],
+    'tenso': ['tens', 'amenaz', 'peligr'],
+    'misterioso': ['mister', 'enigm', 'mistic'],
+    'tranquilo': ['tranquil', 'sereno', 'calma', 'apacible'],
+}
+
+
+def keyword_tag(text: str, vocabulary: Dict[str, List[str]]) -> str:
+    """Primera etiqueta del vocabulario cuyas palabras clave aparecen en el texto."""
+    norm = normalize_name(text or "")
+    for tag, words in vocabulary.items():
+        if any(w in norm for w in words):
+            return tag
+    return "desconocido"
+
+
+def color_histogram(path: Path) -> List[float]:
+    """
+    Histograma RGB normalizado (HIST_BINS³) de una imagen reducida.
+
+    Returns:
+        List[float]: Histograma (suma 1)
+    """
+    with Image.open(path) as img:
+        small = img.convert("RGB")
+        small.thumbnail((64, 64))
+        rgb = np.asarray(small).reshape(-1, 3)
+    return _histogram(rgb)
+
+
+def palette_histogram(colors: List[Tuple[int, int, int]]) -> List[float]:
+    """Histograma de una paleta de referencia (mismo espacio que color_histogram)"""
+    return _histogram(np.asarray(colors, dtype=np.uint8).reshape(-1, 3))
+
+
+def _histogram(rgb: np.ndarray) -> List[float]:
+    q = (rgb.astype(np.int32) * HIST_BINS) // 256
+    codes = (q[:, 0] * HIST_BINS + q[:, 1]) * HIST_BINS + q[:, 2]
+    hist = np.bincount(codes, minlength=HIST_BINS ** 3).astype(np.float32)
+    total = float(hist.sum())
+    return (hist / total if total else hist).round(5).tolist()
+
+
+class BackgroundCatalog:
+    """Índice de fondos por etiquetas con fallback por paleta"""
+
+    def __init__(self, catalog_path: Path, battle_dir: Path):
+        """
+        Args:
+            catalog_path: JSON donde se persiste el catálogo
+            battle_dir: Directorio de fondos de batalla (solo para reconstruir)
+        """
+        self.catalog_path = Path(catalog_path)
+        self.battle_dir = Path(battle_dir)
+        self._entries: Dict[str, Dict[str, Any]] = {}       # ruta -> entrada
+        self._by_tag: Dict[Tuple[str, str], Set[str]] = {}  # (campo, valor) -> rutas
+        self._hist_paths: List[str] = []
+        self._hist_matrix: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    # ---------- persistencia ----------
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.catalog_path.exists():
+            try:
+                with open(self.catalog_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f).get("entries", [])
+                for entry in entries:
+                    self._index(entry)
+                print(f"[BackgroundCatalog] {len(self._entries)} fondos en el catálogo")
+                return
+            except Exception as e:
+                print(f"[BackgroundCatalog] ⚠️ Catálogo ilegible, se reconstruye: {e}")
+                self._entries.clear()
+                self._by_tag.clear()
+        self.rebuild()
+
+    def _save(self):
+        ensure_directory(self.catalog_path.parent)
+        tmp = self.catalog_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entries": list(self._entries.values())}, f, ensure_ascii=False)
+        os.replace(tmp, self.catalog_path)
+
+    def rebuild(self):
+        """
+        Reconstruye el catálogo a partir del directorio de batalla (una sola vez,
+        cuando no hay catálogo). Las etiquetas salen del nombre {tipo}_{rareza}_*.png.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self._hist_matrix = None
+            if self.battle_dir.exists():
+                for path in sorted(self.battle_dir.iterdir()):
+                    if path.suffix.lower() not in (".png", ".jpg", ".jpeg", ".webp"):
+                        continue
+                    parts = path.stem.split("_")
+                    tags = {"enemy_type": parts[0], "rarity": parts[1]} if len(parts) >= 3 else {}
+                    try:
+                        self._index(self._make_entry(path, tags, path.stat().st_mtime))
+                    except Exception as e:
+                        print(f"[BackgroundCatalog] ⚠️ No se pudo catalogar {path.name}: {e}")
+            self._save()
+            print(f"[BackgroundCatalog] Catálogo reconstruido: {len(self._entries)} fondos")
+
+    # ---------- índice ----------
+    def _key(self, path: Path) -> str:
+        """Ruta relativa a la raíz del proyecto si cae dentro (catálogo portable)"""
+        path = Path(path).resolve()
+        try:
+            return str(path.relative_to(get_project_root()))
+        except ValueError:
+            return str(path)
+
+    def resolve(self, key: str) -> Path:
+        path = Path(key)
+        return path if path.is_absolute() else get_project_root() / path
+
+    def _make_entry(self, path: Path, tags: Dict[str, str], created: Optional[float] = None) -> Dict[str, Any]:
+        entry = {"path": self._key(path), "created": created or time.time(), "hist": color_histogram(path)}
+        for field in TAG_FIELDS:
+            entry[field] = normalize_name(tags.get(field) or "") or "desconocido"
+        return entry
+
+    def _index(self, entry: Dict[str, Any]):
+        key = entry["path"]
+        self._unindex(key)
+        self._entries[key] = entry
+        for field in TAG_FIELDS:
+            self._by_tag.setdefault((field, entry.get(field, "desconocido")), set()).add(key)
+        self._hist_matrix = None
+
+    def _unindex(self, key: str):
+        old = self._entries.pop(key, None)
+        if old is None:
+            return
+        for field in TAG_FIELDS:
+            bucket = self._by_tag.get((field, old.get(field, "desconocido")))
+            if bucket is not None:
+                bucket.discard(key)
+        self._hist_matrix = None
+
+    # ---------- API ----------
+    def add(self, path: Path, **tags: str) -> Dict[str, Any]:
+        """
+        Registra un fondo (calcula su histograma una sola vez).
+
+        Args:
+            path: Fichero del fondo
+            **tags: enemy_type, rarity, biome, mood
+
+        Returns:
+            dict: Entrada del catálogo
+        """
+        entry = self._make_entry(Path(path), tags)
+        with self._lock:
+            self._ensure_loaded()
+            self._index(entry)
+            self._save()
+        return entry
+
+    def remove(self, path: Path):
+        """Quita un fondo del catálogo (el fichero no se toca)"""
+        with self._lock:
+            self._ensure_loaded()
+            self._unindex(self._key(path))
+            self._save()
+
+    def find(self, **tags: str) -> List[Dict[str, Any]]:
+        """
+        Fondos que cumplen todas las etiquetas dadas, más recientes primero.
+
+        Args:
+            **tags: Subconjunto de enemy_type, rarity, biome, mood
+
+        Returns:
+            List[dict]: Entradas coincidentes
+        """
+        with self._lock:
+            self._ensure_loaded()
+            buckets = [self._by_tag.get((f, normalize_name(v)), set()) for f, v in tags.items() if v]
+            if not buckets:
+                keys = set(self._entries)
+            else:
+                buckets.sort(key=len)
+                keys = set(buckets[0]).intersection(*buckets[1:])
+            return sorted((self._entries[k] for k in keys), key=lambda e: -e.get("created", 0))
+
+    def nearest_palette(self, colors: List[Tuple[int, int, int]]) -> Optional[Dict[str, Any]]:
+        """
+        Fondo con el histograma de color más parecido a una paleta (intersección de histogramas).
+
+        Returns:
+            dict o None si el catálogo está vacío
+        """
+        query = np.asarray(palette_histogram(colors), dtype=np.float32)
+        with self._lock:
+            self._ensure_loaded()
+            if not self._entries:
+                return None
+            if self._hist_matrix is None:
+                self._hist_paths = list(self._entries)
+                self._hist_matrix = np.asarray(
+                    [self._entries[k]["hist"] for k in self._hist_paths], dtype=np.float32
+                )
+            scores = np.minimum(self._hist_matrix, query[None, :]).sum(axis=1)
+            return self._entries[self._hist_paths[int(np.argmax(scores))]]
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._entries.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
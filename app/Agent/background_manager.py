@@ -5,6 +5,11 @@ from pathlib import Path
 from typing import Optional, Dict, List
 from app.Agent.agent_background_director import create_combat_background_brief
 from app.Agent.image_renderer import generate_background_image
+from app.Agent.background_catalog import (
+    BackgroundCatalog, TYPE_PALETTES, BIOME_KEYWORDS, MOOD_KEYWORDS, keyword_tag,
+)
+from app.Agent.Utils.path_utils import get_project_root
+from app.Agent.Utils.image_handoff import wait_written
 from app.domain.character import Character
 from settings.settings import settings
 
@@ -19,6 +24,11 @@ class BackgroundManager:
         self.generated_dir = Path(settings.BG_GEN_DIR)
         self.seed_path = Path(settings.BG_SEED_PATH)
         self._ensure_directories()
+        catalog_path = Path(getattr(settings, 'BG_CATALOG_PATH', None) or "cache/background_catalog.json")
+        if not catalog_path.is_absolute():
+            catalog_path = get_project_root() / catalog_path
+        # Se carga en la primera búsqueda (no al importar)
+        self.catalog = BackgroundCatalog(catalog_path, self.battle_dir)
     
     def _ensure_directories(self):
         """Asegura que existan los directorios necesarios."""
@@ -49,15 +59,19 @@ class BackgroundManager:
         return name_lower.split()[0] if name_lower.split() else 'generico'
     
     def _get_enemy_rarity(self, enemy: Character) -> str:
-        """Determina la rareza del enemigo basado en sus stats."""
-        # Lógica simple basada en stats - se puede mejorar
-        total_power = (enemy.attack + enemy.defense + enemy.speed + enemy.health) / 4
+        """
+        Determina la rareza del enemigo basado en sus stats.
+        Determinista (no usa compute_rarity, que es aleatoria) para que el
+        mismo enemigo reutilice siempre los mismos fondos.
+        """
+        # damage y resistence van de 1 a 10
+        total_power = int(enemy.damage or 0) + int(enemy.resistence or 0)
         
-        if total_power > 80:
+        if total_power >= 17:
             return 'legendario'
-        elif total_power > 60:
+        elif total_power >= 14:
             return 'epico'
-        elif total_power > 40:
+        elif total_power >= 10:
             return 'raro'
         else:
             return 'comun'
@@ -69,20 +83,33 @@ class BackgroundManager:
         timestamp = int(time.time())
         return f"{enemy_type}_{rarity}_{timestamp}.png"
     
+    def _first_available(self, entries) -> Optional[Path]:
+        """Primera entrada cuyo fichero sigue en disco (las huérfanas salen del catálogo)."""
+        for entry in entries:
+            path = self.catalog.resolve(entry["path"])
+            if path.exists():
+                return path
+            self.catalog.remove(path)
+        return None
+    
     def _find_existing_background(self, enemy: Character) -> Optional[Path]:
-        """Busca un fondo existente para el tipo y rareza del enemigo."""
+        """Busca en el catálogo un fondo para el tipo y rareza del enemigo (sin escanear el directorio)."""
         enemy_type = self._get_enemy_type(enemy)
         rarity = self._get_enemy_rarity(enemy)
-        
-        # Buscar en directorio de batalla
-        pattern = f"{enemy_type}_{rarity}_*.png"
-        existing_files = list(self.battle_dir.glob(pattern))
-        
-        if existing_files:
-            # Retornar el más reciente
-            return max(existing_files, key=lambda x: x.stat().st_mtime)
-        
-        return None
+        return self._first_available(self.catalog.find(enemy_type=enemy_type, rarity=rarity))
+    
+    def _find_nearest_palette(self, enemy: Character) -> Optional[Path]:
+        """Fallback: el fondo catalogado con la paleta más parecida a la del tipo de enemigo."""
+        palette = TYPE_PALETTES.get(self._get_enemy_type(enemy))
+        if not palette:
+            return None
+        while True:
+            entry = self.catalog.nearest_palette(palette)
+            if entry is None:
+                return None
+            path = self._first_available([entry])
+            if path is not None:
+                return path
     
     def get_combat_background(self, player: Character, enemy: Character) -> str:
         """
@@ -103,45 +130,55 @@ class BackgroundManager:
                 # Crear brief específico para el combate
                 background_brief = create_combat_background_brief(player, enemy)
                 
-                # Generar imagen
-                generated_path = generate_background_image(background_brief)
+                # Generar imagen directamente en el directorio de batalla con nombre codificado
+                # (moverla después dejaría su horneado, su pHash y la entrada en memoria en la ruta vieja)
+                new_path = self.battle_dir / self._generate_background_filename(enemy)
+                generated_path = generate_background_image(background_brief, out_path=new_path)
                 
                 if generated_path:
-                    # Mover a directorio de batalla con nombre codificado
-                    new_filename = self._generate_background_filename(enemy)
-                    new_path = self.battle_dir / new_filename
-                    
-                    # Mover archivo generado
-                    Path(generated_path).rename(new_path)
+                    # El catálogo lee el fichero: esperar a que el write-behind lo haya escrito
+                    wait_written(generated_path)
+                    self.catalog.add(
+                        new_path,
+                        enemy_type=self._get_enemy_type(enemy),
+                        rarity=self._get_enemy_rarity(enemy),
+                        biome=keyword_tag(background_brief.get('setting', ''), BIOME_KEYWORDS),
+                        mood=keyword_tag(background_brief.get('mood', ''), MOOD_KEYWORDS),
+                    )
                     print(f"[BackgroundManager] Fondo generado y guardado: {new_path}")
                     return str(new_path)
                     
             except Exception as e:
                 print(f"[BackgroundManager] Error generando fondo: {e}")
         
+        # Sin fondo con esas etiquetas: el de paleta más parecida
+        nearest = self._find_nearest_palette(enemy)
+        if nearest:
+            print(f"[BackgroundManager] Usando fondo de paleta similar: {nearest}")
+            return str(nearest)
+        
         # Fallback: usar fondo por defecto
         print(f"[BackgroundManager] Usando fondo por defecto")
         return str(self.seed_path)
     
     def get_backgrounds_by_type(self, enemy_type: str) -> List[Path]:
         """Obtiene todos los fondos de un tipo específico."""
-        pattern = f"{enemy_type}_*.png"
-        return list(self.battle_dir.glob(pattern))
+        return [self.catalog.resolve(e["path"]) for e in self.catalog.find(enemy_type=enemy_type)]
     
     def get_backgrounds_by_rarity(self, rarity: str) -> List[Path]:
         """Obtiene todos los fondos de una rareza específica."""
-        pattern = f"*_{rarity}_*.png"
-        return list(self.battle_dir.glob(pattern))
+        return [self.catalog.resolve(e["path"]) for e in self.catalog.find(rarity=rarity)]
     
     def cleanup_old_backgrounds(self, max_age_days: int = 30):
         """Limpia fondos antiguos para ahorrar espacio."""
         current_time = time.time()
         max_age_seconds = max_age_days * 24 * 60 * 60
         
-        for bg_file in self.battle_dir.glob("*.png"):
-            file_age = current_time - bg_file.stat().st_mtime
-            if file_age > max_age_seconds:
-                bg_file.unlink()
+        for entry in self.catalog.entries():
+            if current_time - entry.get("created", current_time) > max_age_seconds:
+                bg_file = self.catalog.resolve(entry["path"])
+                bg_file.unlink(missing_ok=True)
+                self.catalog.remove(bg_file)
                 print(f"[BackgroundManager] Eliminado fondo antiguo: {bg_file}")
 
 # Instancia global
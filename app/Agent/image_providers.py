@@ -1,13 +1,22 @@
 import os
 import base64
 import traceback
+import time
 import threading
-from typing import Optional, Tuple
+import zlib
+from concurrent.futures import Future
+from contextlib import nullcontext
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 from pathlib import Path
 from PIL import Image
-import numpy as np
 from dotenv import load_dotenv
 from settings.settings import settings
+from app.Agent.Utils.concurrency import get_limiter
+from app.Agent.Utils.render_queue import RenderQueue, RenderPreempted
+from app.Agent.Utils.cpu_profile import load_cpu_profile, apply_cpu_profile, cpu_autocast
+from app.Agent.Utils.image_postprocess import remove_border_background
+from app.Agent.Utils.model_residency import ModelResidency
 
 # Intentar importar LangSmith para trazabilidad de generación de imágenes
 try:
@@ -23,148 +32,323 @@ except ImportError:
 
 load_dotenv()
 
+WORK_UNIT_PIXELS = 512 * 512  # Una unidad de trabajo del limitador = 1 step a 512x512
+IMG2IMG_OP = "img2img"        # Primer elemento de la clave de cola de img2img (ver generate_variations)
+
+
+def _work_units(images: int, steps: float, width: int, height: int) -> float:
+    """Trabajo de una llamada al pipeline para el limitador (latencia por imagen, step y píxel)"""
+    return max(1, images) * max(1.0, steps) * (width * height) / WORK_UNIT_PIXELS
+
+
 # ============= STABLE DIFFUSION PROVIDER =============
 class StableDiffusionProvider:
-    """Proveedor de imágenes usando Stable Diffusion local"""
+    """
+    Proveedor de imágenes usando Stable Diffusion local.
     
+    El pipeline y su estado (carga, cola, caches, residencia) son de clase y los
+    comparten todas las instancias; cada subclase (otro backend, ver
+    OnnxDiffusionProvider) tiene el suyo propio (ver __init_subclass__).
+    """
+    
+    LIMITER = "stable_diffusion"  # Limitador adaptativo (ver Utils/concurrency.py)
+    MODEL = None              # Modelo fijo de la subclase (None = settings.STABLE_DIFFUSION_MODEL)
+    STEPS = None              # Steps fijos de la subclase (None = settings.STABLE_DIFFUSION_STEPS)
     _pipeline = None
     _model_name = None
     _lock = threading.Lock()  # Lock para sincronizar carga del pipeline
+    _queue = None             # Cola de micro-batching compartida (ver _get_queue)
+    _cpu_profile = None       # Perfil de CPU aplicado (ver Utils/cpu_profile.py)
+    _load_future = None       # Carga en curso/terminada: todas las peticiones esperan la misma (ver _get_pipeline)
+    _load_status = {"state": "idle", "stage": "", "progress": 0.0, "seconds": None, "error": None}
+    _residency = None         # Libera el modelo tras inactividad o con RSS alto (ver _get_residency)
+    _pinned = False           # Residente siempre, sin residencia (daemon de render, ver pin)
+    _offloaded = False        # Componentes movidos a CPU por el gestor de residencia
+    _img2img_pipeline = None  # img2img sobre los mismos componentes (ver _get_img2img_pipeline)
+    _img2img_model = None
+    _latent_cache: "OrderedDict[tuple, object]" = OrderedDict()  # (base_key, w, h) -> latentes del VAE
+    LATENT_CACHE_SIZE = 8
+    _embed_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # (modelo, texto) -> (embeds, pooled)
+    embed_hits = 0
+    embed_misses = 0
+    
+    # Prompt negativo optimizado para pixel art
+    DEFAULT_NEGATIVE_PROMPT = "blurry, low quality, distorted, text, watermark, photorealistic, 3d render, smooth gradients, realistic textures, high resolution, detailed shading"
+    
+    def __init_subclass__(cls, **kwargs):
+        """Estado propio para cada backend: no comparten pipeline, cola ni caches"""
+        super().__init_subclass__(**kwargs)
+        cls._pipeline = None
+        cls._model_name = None
+        cls._lock = threading.Lock()
+        cls._queue = None
+        cls._cpu_profile = None
+        cls._load_future = None
+        cls._load_status = {"state": "idle", "stage": "", "progress": 0.0, "seconds": None, "error": None}
+        cls._residency = None
+        cls._pinned = False
+        cls._offloaded = False
+        cls._img2img_pipeline = None
+        cls._img2img_model = None
+        cls._latent_cache = OrderedDict()
+        cls._embed_cache = OrderedDict()
+        cls.embed_hits = 0
+        cls.embed_misses = 0
     
     def __init__(self):
-        self.model_name = settings.STABLE_DIFFUSION_MODEL
-        self.steps = settings.STABLE_DIFFUSION_STEPS
+        self.model_name = self.MODEL or settings.STABLE_DIFFUSION_MODEL
+        self.steps = self.STEPS or settings.STABLE_DIFFUSION_STEPS
         
     def _get_pipeline(self):
-        """Carga el pipeline de Stable Diffusion (lazy loading) - Thread-safe"""
+        """
+        Devuelve el pipeline de Stable Diffusion (lazy loading) - Thread-safe.
+        Si ya se está cargando (p.ej. precarga al arrancar), espera a esa misma carga.
+        """
         # Verificar primero sin lock (fast path)
         if self._pipeline is not None and self._model_name == self.model_name:
             return self._pipeline
-        
-        # Si necesitamos cargar, usar lock para evitar cargas concurrentes
+        return self._start_load().result()
+    
+    def _start_load(self) -> Future:
+        """
+        Futuro de la carga del modelo configurado: reutiliza la carga en curso o
+        terminada, o lanza una nueva en un hilo (si no hay o la anterior falló).
+        """
+        cls = type(self)
         with self._lock:
-            # Verificar de nuevo dentro del lock (double-check pattern)
-            if self._pipeline is not None and self._model_name == self.model_name:
-                return self._pipeline
+            future = cls._load_future
+            reusable = future is not None and getattr(future, "model_name", None) == self.model_name and not (
+                future.done() and future.exception() is not None
+            )
+            if reusable:
+                return future
+            future = Future()
+            future.model_name = self.model_name
+            cls._load_future = future
+        
+        def run():
+            started = time.perf_counter()
+            try:
+                pipeline = self._load_pipeline()
+            except BaseException as e:
+                self._set_load_status("error", "error", 0.0, error=str(e))
+                future.set_exception(e)
+                return
+            seconds = time.perf_counter() - started
+            self._set_load_status("ready", "listo", 1.0, seconds=round(seconds, 2))
+            print(f"[StableDiffusion] ⏱️ Pipeline cargado en {seconds:.1f}s")
+            residency = self._get_residency()
+            if residency is not None:
+                residency.touch()
+                residency.start()
+            future.set_result(pipeline)
+        
+        self._set_load_status("loading", "importando diffusers", 0.05)
+        threading.Thread(target=run, name="SDPipelineLoad", daemon=True).start()
+        return future
+    
+    @classmethod
+    def _set_load_status(cls, state: str, stage: str, progress: float, seconds=None, error=None):
+        cls._load_status = {"state": state, "stage": stage, "progress": progress,
+                            "seconds": seconds, "error": error}
+    
+    @classmethod
+    def _get_residency(cls) -> Optional[ModelResidency]:
+        """Gestor de residencia del pipeline (lazy initialization), o None si está desactivado"""
+        if cls._pinned or not getattr(settings, 'SD_RESIDENCY_ENABLED', True):
+            return None
+        if not (getattr(settings, 'SD_IDLE_UNLOAD_SECONDS', 0) or getattr(settings, 'SD_RSS_LIMIT_MB', 0)):
+            return None
+        if cls._residency is None:
+            with cls._lock:
+                if cls._residency is None:
+                    cls._residency = ModelResidency(
+                        "StableDiffusion",
+                        is_loaded=lambda: cls._pipeline is not None and not cls._offloaded,
+                        release=cls._release_pipeline,
+                        idle_seconds=getattr(settings, 'SD_IDLE_UNLOAD_SECONDS', 0),
+                        rss_limit_mb=getattr(settings, 'SD_RSS_LIMIT_MB', 0),
+                        check_interval=getattr(settings, 'SD_RESIDENCY_CHECK_SECONDS', 15),
+                    )
+        return cls._residency
+    
+    @classmethod
+    def pin(cls):
+        """Mantiene el pipeline residente mientras viva el proceso (p.ej. en el daemon de render)"""
+        with cls._lock:
+            cls._pinned = True
+            residency, cls._residency = cls._residency, None
+        if residency is not None:
+            residency.stop()
+    
+    def _in_use(self):
+        """Contexto que impide liberar el modelo mientras se usa"""
+        residency = self._get_residency()
+        return residency.use() if residency is not None else nullcontext()
+    
+    @classmethod
+    def _release_pipeline(cls):
+        """
+        Libera el modelo según SD_RESIDENCY_MODE:
+        - 'offload' (con GPU): los componentes pasan a CPU y accelerate los sube bajo demanda.
+        - 'unload' (o sin GPU): se sueltan todas las referencias; la siguiente petición recarga.
+        """
+        pipeline = cls._pipeline
+        if pipeline is None:
+            return
+        if getattr(settings, 'SD_RESIDENCY_MODE', 'unload') == 'offload' and hasattr(pipeline, "enable_model_cpu_offload"):
+            import torch
+            if torch.cuda.is_available():
+                pipeline.enable_model_cpu_offload()
+                cls._offloaded = True
+                return
+        with cls._lock:
+            cls._pipeline = None
+            cls._model_name = None
+            cls._load_future = None
+            cls._offloaded = False
+            cls._img2img_pipeline = None
+            cls._img2img_model = None
+            cls._latent_cache.clear()
+            cls._embed_cache.clear()
+        cls._set_load_status("idle", "descargado", 0.0)
+    
+    @classmethod
+    def preload(cls) -> Future:
+        """Empieza a cargar el pipeline en segundo plano; devuelve el futuro compartido de la carga"""
+        return cls()._start_load()
+    
+    @traceable(name="stable_diffusion_load_pipeline")
+    def _load_pipeline(self):
+        """Carga el pipeline de Stable Diffusion (solo desde _start_load: una carga a la vez)"""
+        # Cargar el pipeline
+        try:
+            import torch
+            import diffusers
+            
+            # Intentar importar los pipelines disponibles de forma robusta
+            StableDiffusionPipeline = None
+            StableDiffusionXLPipeline = None
             
-            # Cargar el pipeline
+            # Intentar importar StableDiffusionPipeline (el estándar)
             try:
-                import torch
-                import diffusers
-                
-                # Intentar importar los pipelines disponibles de forma robusta
-                StableDiffusionPipeline = None
-                StableDiffusionXLPipeline = None
-                
-                # Intentar importar StableDiffusionPipeline (el estándar)
+                StableDiffusionPipeline = getattr(diffusers, 'StableDiffusionPipeline', None)
+                if StableDiffusionPipeline is None:
+                    from diffusers import StableDiffusionPipeline
+                print("[StableDiffusion] StableDiffusionPipeline disponible")
+            except (ImportError, AttributeError) as e:
+                print(f"[StableDiffusion] ⚠️ No se pudo importar StableDiffusionPipeline: {e}")
+                # Intentar importar usando importlib como fallback
                 try:
-                    StableDiffusionPipeline = getattr(diffusers, 'StableDiffusionPipeline', None)
+                    import importlib
+                    diffusers_module = importlib.import_module('diffusers')
+                    StableDiffusionPipeline = getattr(diffusers_module, 'StableDiffusionPipeline', None)
                     if StableDiffusionPipeline is None:
-                        from diffusers import StableDiffusionPipeline
-                    print("[StableDiffusion] StableDiffusionPipeline disponible")
-                except (ImportError, AttributeError) as e:
-                    print(f"[StableDiffusion] ⚠️ No se pudo importar StableDiffusionPipeline: {e}")
-                    # Intentar importar usando importlib como fallback
-                    try:
-                        import importlib
-                        diffusers_module = importlib.import_module('diffusers')
-                        StableDiffusionPipeline = getattr(diffusers_module, 'StableDiffusionPipeline', None)
-                        if StableDiffusionPipeline is None:
-                            raise ImportError("StableDiffusionPipeline no está disponible en diffusers")
-                    except Exception as e2:
-                        raise ImportError(
-                            f"diffusers no tiene StableDiffusionPipeline disponible. "
-                            f"Error: {e2}. "
-                            f"Verifica que diffusers esté correctamente instalado: uv pip install diffusers"
-                        )
-                
-                # Intentar importar StableDiffusionXLPipeline si está disponible
-                try:
-                    StableDiffusionXLPipeline = getattr(diffusers, 'StableDiffusionXLPipeline', None)
-                    if StableDiffusionXLPipeline is None:
-                        from diffusers import StableDiffusionXLPipeline
-                    print("[StableDiffusion] StableDiffusionXLPipeline disponible")
-                except (ImportError, AttributeError):
-                    print("[StableDiffusion] StableDiffusionXLPipeline no disponible, usando StableDiffusionPipeline")
-                    StableDiffusionXLPipeline = None
-                
-                if StableDiffusionPipeline is None:
-                    raise ImportError("StableDiffusionPipeline no está disponible")
-                
-                print(f"[StableDiffusion] Cargando modelo: {self.model_name}")
-                
-                # Intentar usar SDXL solo si está disponible y el modelo es SDXL
-                use_sdxl = False
-                if StableDiffusionXLPipeline is not None:
-                    if "xl" in self.model_name.lower() or "sdxl" in self.model_name.lower():
-                        try:
-                            print("[StableDiffusion] Intentando cargar con StableDiffusionXLPipeline...")
-                            self._pipeline = StableDiffusionXLPipeline.from_pretrained(
-                                self.model_name,
-                                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                                use_safetensors=True,
-                                variant="fp16" if torch.cuda.is_available() else None,
-                                safety_checker=None,  # Desactivar safety checker (muy estricto)
-                                requires_safety_checker=False
-                            )
-                            # Desactivar safety checker también después de cargar
-                            self._pipeline.safety_checker = None
-                            self._pipeline.feature_extractor = None
-                            use_sdxl = True
-                            print("[StableDiffusion] Modelo cargado con StableDiffusionXLPipeline (safety_checker desactivado)")
-                        except Exception as e:
-                            print(f"[StableDiffusion] ⚠️ No se pudo cargar con StableDiffusionXLPipeline: {e}")
-                            print("[StableDiffusion] Intentando con StableDiffusionPipeline como fallback...")
-                            use_sdxl = False
-                
-                # Si no se usó SDXL, usar el pipeline estándar
-                if not use_sdxl:
-                    self._pipeline = StableDiffusionPipeline.from_pretrained(
-                        self.model_name,
-                        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                        use_safetensors=True,
-                        variant="fp16" if torch.cuda.is_available() else None,
-                        safety_checker=None,  # Desactivar safety checker (muy estricto)
-                        requires_safety_checker=False
-                    )
-                    # Desactivar safety checker también después de cargar
-                    self._pipeline.safety_checker = None
-                    self._pipeline.feature_extractor = None
-                    print("[StableDiffusion] Modelo cargado con StableDiffusionPipeline (safety_checker desactivado)")
-                
-                if torch.cuda.is_available():
-                    self._pipeline = self._pipeline.to("cuda")
-                    print(f"[StableDiffusion] Modelo cargado en GPU")
-                else:
-                    print(f"[StableDiffusion] Modelo cargado en CPU")
-                
-                self._model_name = self.model_name
-                
-            except ImportError as e:
-                error_msg = str(e)
-                if "transformers" in error_msg.lower():
-                    raise ImportError(
-                        "transformers no está instalado. "
-                        "Ejecuta: uv pip install transformers"
-                    )
-                elif "diffusers" in error_msg.lower() or "StableDiffusion" in error_msg:
-                    raise ImportError(
-                        f"Error importando diffusers: {error_msg}. "
-                        f"Ejecuta: uv pip install --upgrade diffusers torch torchvision accelerate transformers"
-                    )
-                else:
+                        raise ImportError("StableDiffusionPipeline no está disponible en diffusers")
+                except Exception as e2:
                     raise ImportError(
-                        f"diffusers, torch o transformers no están instalados. "
-                        f"Error: {error_msg}. "
-                        f"Ejecuta: uv pip install diffusers torch torchvision accelerate transformers"
+                        f"diffusers no tiene StableDiffusionPipeline disponible. "
+                        f"Error: {e2}. "
+                        f"Verifica que diffusers esté correctamente instalado: uv pip install diffusers"
                     )
-            except Exception as e:
-                print(f"[StableDiffusion] Error cargando modelo: {e}")
-                import traceback
-                traceback.print_exc()
-                raise
+            
+            # Intentar importar StableDiffusionXLPipeline si está disponible
+            try:
+                StableDiffusionXLPipeline = getattr(diffusers, 'StableDiffusionXLPipeline', None)
+                if StableDiffusionXLPipeline is None:
+                    from diffusers import StableDiffusionXLPipeline
+                print("[StableDiffusion] StableDiffusionXLPipeline disponible")
+            except (ImportError, AttributeError):
+                print("[StableDiffusion] StableDiffusionXLPipeline no disponible, usando StableDiffusionPipeline")
+                StableDiffusionXLPipeline = None
+            
+            if StableDiffusionPipeline is None:
+                raise ImportError("StableDiffusionPipeline no está disponible")
+            
+            print(f"[StableDiffusion] Cargando modelo: {self.model_name}")
+            self._set_load_status("loading", "cargando pesos", 0.2)
+            
+            # Intentar usar SDXL solo si está disponible y el modelo es SDXL
+            use_sdxl = False
+            if StableDiffusionXLPipeline is not None:
+                if "xl" in self.model_name.lower() or "sdxl" in self.model_name.lower():
+                    try:
+                        print("[StableDiffusion] Intentando cargar con StableDiffusionXLPipeline...")
+                        pipeline = StableDiffusionXLPipeline.from_pretrained(
+                            self.model_name,
+                            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+                            use_safetensors=True,
+                            variant="fp16" if torch.cuda.is_available() else None,
+                            safety_checker=None,  # Desactivar safety checker (muy estricto)
+                            requires_safety_checker=False
+                        )
+                        # Desactivar safety checker también después de cargar
+                        pipeline.safety_checker = None
+                        pipeline.feature_extractor = None
+                        use_sdxl = True
+                        print("[StableDiffusion] Modelo cargado con StableDiffusionXLPipeline (safety_checker desactivado)")
+                    except Exception as e:
+                        print(f"[StableDiffusion] ⚠️ No se pudo cargar con StableDiffusionXLPipeline: {e}")
+                        print("[StableDiffusion] Intentando con StableDiffusionPipeline como fallback...")
+                        use_sdxl = False
+            
+            # Si no se usó SDXL, usar el pipeline estándar
+            if not use_sdxl:
+                pipeline = StableDiffusionPipeline.from_pretrained(
+                    self.model_name,
+                    torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+                    use_safetensors=True,
+                    variant="fp16" if torch.cuda.is_available() else None,
+                    safety_checker=None,  # Desactivar safety checker (muy estricto)
+                    requires_safety_checker=False
+                )
+                # Desactivar safety checker también después de cargar
+                pipeline.safety_checker = None
+                pipeline.feature_extractor = None
+                print("[StableDiffusion] Modelo cargado con StableDiffusionPipeline (safety_checker desactivado)")
+            
+            self._set_load_status("loading", "preparando dispositivo", 0.85)
+            if torch.cuda.is_available():
+                pipeline = pipeline.to("cuda")
+                type(self)._cpu_profile = None
+                print(f"[StableDiffusion] Modelo cargado en GPU")
+            else:
+                # Hilos, channels_last, bf16, attention slicing, torch.compile
+                profile = load_cpu_profile()
+                pipeline = apply_cpu_profile(pipeline, profile)
+                type(self)._cpu_profile = profile
+                print(f"[StableDiffusion] Modelo cargado en CPU")
+            
+            # Compartido por todas las instancias del proveedor
+            type(self)._pipeline = pipeline
+            type(self)._model_name = self.model_name
+            type(self)._offloaded = False
+            
+        except ImportError as e:
+            error_msg = str(e)
+            if "transformers" in error_msg.lower():
+                raise ImportError(
+                    "transformers no está instalado. "
+                    "Ejecuta: uv pip install transformers"
+                )
+            elif "diffusers" in error_msg.lower() or "StableDiffusion" in error_msg:
+                raise ImportError(
+                    f"Error importando diffusers: {error_msg}. "
+                    f"Ejecuta: uv pip install --upgrade diffusers torch torchvision accelerate transformers"
+                )
+            else:
+                raise ImportError(
+                    f"diffusers, torch o transformers no están instalados. "
+                    f"Error: {error_msg}. "
+                    f"Ejecuta: uv pip install diffusers torch torchvision accelerate transformers"
+                )
+        except Exception as e:
+            print(f"[StableDiffusion] Error cargando modelo: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
         
-        return self._pipeline
+        return pipeline
     
     @traceable(name="stable_diffusion_generate_image")
     def generate_image(
@@ -175,51 +359,388 @@ class StableDiffusionProvider:
     ) -> Optional[Image.Image]:
         """Genera una imagen usando Stable Diffusion - Rastreado en LangSmith"""
         try:
-            pipeline = self._get_pipeline()
+            # Cargar antes de encolar para que los errores de carga se reporten aquí
+            self._get_pipeline()
             
             # Parsear tamaño
             width, height = self._parse_size(size)
             
-            # Prompt negativo optimizado para pixel art
-            if negative_prompt is None:
-                negative_prompt = "blurry, low quality, distorted, text, watermark, photorealistic, 3d render, smooth gradients, realistic textures, high resolution, detailed shading"
-            
-            # Validar número de steps (algunos schedulers tienen límites)
-            # SDXL Turbo funciona mejor con 10-20 steps para EulerAncestralDiscrete
-            # El scheduler EulerAncestralDiscrete tiene problemas con menos de 10 steps
-            if "turbo" in self.model_name.lower():
-                num_steps = min(self.steps, 20)  # Máximo 20 steps para Turbo
-                num_steps = max(num_steps, 10)   # Mínimo 10 steps para Turbo (evita errores de scheduler)
-            else:
-                num_steps = min(self.steps, 50)  # Máximo 50 steps para otros modelos
-                num_steps = max(num_steps, 10)   # Mínimo 10 steps para otros modelos
+            num_steps = self._num_steps()
+            key = (width, height, num_steps, self._guidance())
             
             print(f"[StableDiffusion] Generando imagen: {width}x{height}, steps={num_steps}")
+            return self._generate(prompt, negative_prompt or self.DEFAULT_NEGATIVE_PROMPT, key)
             
-            # Generar imagen (desactivar safety_checker en la llamada también)
-            result = pipeline(
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                width=width,
-                height=height,
-                num_inference_steps=num_steps,
-                guidance_scale=2.0 if "turbo" in self.model_name.lower() else (7.5 if "xl" not in self.model_name.lower() else 9.0),
-            )
+        except Exception as e:
+            print(f"[StableDiffusion] Error generando imagen: {e}")
+            traceback.print_exc()
+            return None
+    
+    @traceable(name="stable_diffusion_generate_preview")
+    def generate_preview(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        negative_prompt: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """
+        Genera una vista previa barata (baja resolución y pocos steps)
+        reescalada al tamaño pedido, para mostrar algo mientras llega la final.
+        
+        Args:
+            prompt: Prompt positivo
+            size: Tamaño final ('512x512'); la previa se genera a PORTRAIT_PREVIEW_SCALE
+            negative_prompt: Prompt negativo (None = el de pixel art)
+        
+        Returns:
+            Image.Image o None si falla
+        """
+        try:
+            self._get_pipeline()
+            width, height = self._parse_size(size)
+            scale = getattr(settings, 'PORTRAIT_PREVIEW_SCALE', 0.5)
+            # Múltiplos de 8 (requisito del VAE) y mínimo 256 para que el modelo no degenere
+            pw = max(256, int(width * scale) // 8 * 8)
+            ph = max(256, int(height * scale) // 8 * 8)
+            # Mismos límites que la final (EulerAncestral falla por debajo de 10 steps) y nunca más que ella
+            steps = min(self._num_steps(getattr(settings, 'SD_PREVIEW_STEPS', 4)), self._num_steps())
+            
+            print(f"[StableDiffusion] Generando previa: {pw}x{ph}, steps={steps}")
+            image = self._generate(prompt, negative_prompt or self.DEFAULT_NEGATIVE_PROMPT, (pw, ph, steps, self._guidance()))
+            if image is not None and image.size != (width, height):
+                image = image.resize((width, height), Image.BILINEAR)
+            return image
             
+        except Exception as e:
+            print(f"[StableDiffusion] Error generando previa: {e}")
+            traceback.print_exc()
+            return None
+    
+    def _generate(self, prompt: str, negative_prompt: str, key) -> Optional[Image.Image]:
+        """Genera una imagen con la clave (width, height, steps, guidance), usando la cola si está activa"""
+        if getattr(settings, 'SD_BATCHING_ENABLED', False):
+            # Las peticiones compatibles se agrupan en una sola pasada del UNet
+            return self._get_queue().submit(prompt, negative_prompt, key).result()
+        
+        images = self._run_batch([prompt], [negative_prompt], key)
+        return images[0] if images else None
+    
+    def _num_steps(self, steps: Optional[int] = None) -> int:
+        """Número de steps validado para el modelo (algunos schedulers tienen límites); por defecto self.steps"""
+        steps = self.steps if steps is None else steps
+        # SDXL Turbo funciona mejor con 10-20 steps para EulerAncestralDiscrete
+        # El scheduler EulerAncestralDiscrete tiene problemas con menos de 10 steps
+        if "turbo" in self.model_name.lower():
+            num_steps = min(steps, 20)       # Máximo 20 steps para Turbo
+            num_steps = max(num_steps, 10)   # Mínimo 10 steps para Turbo (evita errores de scheduler)
+        else:
+            num_steps = min(steps, 50)       # Máximo 50 steps para otros modelos
+            num_steps = max(num_steps, 10)   # Mínimo 10 steps para otros modelos
+        return num_steps
+    
+    def _guidance(self) -> float:
+        """Guidance scale según el modelo"""
+        return 2.0 if "turbo" in self.model_name.lower() else (7.5 if "xl" not in self.model_name.lower() else 9.0)
+    
+    def _get_queue(self) -> RenderQueue:
+        """Obtiene la cola de micro-batching compartida (lazy loading) - Thread-safe"""
+        if type(self)._queue is None:
+            with self._lock:
+                if type(self)._queue is None:
+                    type(self)._queue = RenderQueue(
+                        self._run_batch,
+                        window_ms=getattr(settings, 'SD_BATCH_WINDOW_MS', 40),
+                        max_batch=getattr(settings, 'SD_MAX_BATCH', 4),
+                        name="StableDiffusion",
+                    )
+        return type(self)._queue
+    
+    def _run_batch(self, prompts: List[str], negative_prompts: List[str], key, should_abort=None,
+                   payload=None) -> List[Image.Image]:
+        """
+        Ejecuta un lote de prompts compatibles en una única llamada al pipeline.
+        
+        Args:
+            prompts: Prompts positivos
+            negative_prompts: Prompts negativos (uno por prompt)
+            key: (width, height, steps, guidance), o la clave de img2img (ver generate_variations)
+            should_abort: Callable consultado al final de cada step; si devuelve True
+                          se lanza RenderPreempted (lo usa la cola de prioridades)
+            payload: Imagen base en img2img
+        
+        Returns:
+            List[Image.Image]: Una imagen por prompt
+        """
+        if key[0] == IMG2IMG_OP:
+            return self._run_img2img(prompts, negative_prompts, key, payload, should_abort)
+        # El modelo no se libera (ver _get_residency) mientras haya un lote en marcha
+        with self._in_use():
+            width, height, num_steps, guidance = key
+            pipeline = self._get_pipeline()
+            if len(prompts) > 1:
+                print(f"[StableDiffusion] Lote de {len(prompts)} imágenes: {width}x{height}, steps={num_steps}")
+        
+            call_kwargs = self._step_callback_kwargs(pipeline, should_abort) if should_abort else {}
+            seed = getattr(settings, 'IMAGE_SEED', None)
+            if seed is not None:
+                import torch
+                # Un generador por prompt: la imagen no depende de con quién comparta lote
+                call_kwargs["generator"] = [torch.Generator(device="cpu").manual_seed(int(seed)) for _ in prompts]
+        
+            # Generar imagen (desactivar safety_checker en la llamada también)
+            # El limitador adaptativo regula cuántas llamadas compiten por el pipeline
+            with get_limiter(self.LIMITER).slot() as slot, cpu_autocast(type(self)._cpu_profile):
+                # Lotes, previas y finales tardan distinto: el límite se ajusta por unidad de trabajo
+                slot.units = _work_units(len(prompts), num_steps, width, height)
+                try:
+                    result = pipeline(
+                        **self._prompt_kwargs(pipeline, prompts, negative_prompts),
+                        width=width,
+                        height=height,
+                        num_inference_steps=num_steps,
+                        guidance_scale=guidance,
+                        **call_kwargs,
+                    )
+                except RenderPreempted:
+                    # Interrupción voluntaria: no es congestión, no ajustar el límite
+                    slot.skip = True
+                    raise
+        
             # Asegurar que no hay safety_checker activo
-            if hasattr(result, 'images') and len(result.images) > 0:
-                image = result.images[0]
-            else:
-                # Fallback si el resultado tiene estructura diferente
-                image = result[0] if isinstance(result, (list, tuple)) else result
+            if hasattr(result, 'images'):
+                return list(result.images)
+            # Fallback si el resultado tiene estructura diferente
+            return list(result) if isinstance(result, (list, tuple)) else [result]
+    
+    def _encode_text(self, pipeline, text: str) -> tuple:
+        """
+        Embeddings de un texto (cache LRU por modelo y texto).
+        El prompt negativo fijo y los prompts repetidos no vuelven a pasar por los text encoders.
+        
+        Returns:
+            (prompt_embeds, pooled_prompt_embeds o None si el modelo no es SDXL)
+        """
+        import torch
+        key = (self.model_name, text)
+        cache = type(self)._embed_cache
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                type(self).embed_hits += 1
+                return cache[key]
+        
+        with torch.no_grad():
+            # Sin guidance: se codifica solo el texto (el negativo se cachea como un texto más)
+            encoded = pipeline.encode_prompt(
+                prompt=text,
+                device=pipeline._execution_device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False,
+            )
+        # SD: (embeds, None); SDXL: (embeds, None, pooled, None)
+        value = (encoded[0], encoded[2] if len(encoded) > 2 else None)
+        
+        with self._lock:
+            type(self).embed_misses += 1
+            cache[key] = value
+            limit = max(1, int(getattr(settings, 'SD_EMBED_CACHE_SIZE', 64)))
+            while len(cache) > limit:
+                cache.popitem(last=False)
+        return value
+    
+    def _prompt_kwargs(self, pipeline, prompts: List[str], negative_prompts: List[str]) -> dict:
+        """
+        Argumentos de prompt para el pipeline: embeddings cacheados si el pipeline
+        permite pasarlos (encode_prompt), o los textos tal cual si no.
+        """
+        if not getattr(settings, 'SD_EMBED_CACHE_ENABLED', True) or not hasattr(pipeline, "encode_prompt"):
+            return {"prompt": prompts, "negative_prompt": negative_prompts}
+        try:
+            import torch
+            positive = [self._encode_text(pipeline, p) for p in prompts]
+            negative = [self._encode_text(pipeline, n) for n in negative_prompts]
+            kwargs = {
+                "prompt_embeds": torch.cat([e for e, _ in positive]),
+                "negative_prompt_embeds": torch.cat([e for e, _ in negative]),
+            }
+            if positive[0][1] is not None:
+                kwargs["pooled_prompt_embeds"] = torch.cat([p for _, p in positive])
+                kwargs["negative_pooled_prompt_embeds"] = torch.cat([p for _, p in negative])
+            return kwargs
+        except Exception as e:
+            print(f"[StableDiffusion] ⚠️ Embeddings no cacheables, se usan los textos: {e}")
+            return {"prompt": prompts, "negative_prompt": negative_prompts}
+    
+    @staticmethod
+    def _step_callback_kwargs(pipeline, should_abort) -> dict:
+        """
+        Argumentos de callback por step para poder interrumpir la generación.
+        diffusers >= 0.22 usa callback_on_step_end; versiones anteriores, callback/callback_steps.
+        """
+        import inspect
+        try:
+            params = inspect.signature(pipeline).parameters
+        except (TypeError, ValueError):
+            return {}
+        
+        if "callback_on_step_end" in params:
+            def on_step_end(pipe, step, timestep, callback_kwargs):
+                if should_abort():
+                    raise RenderPreempted(f"interrumpida en el step {step}")
+                return callback_kwargs
+            return {"callback_on_step_end": on_step_end}
+        
+        if "callback" in params:
+            def on_step(step, timestep, latents):
+                if should_abort():
+                    raise RenderPreempted(f"interrumpida en el step {step}")
+            return {"callback": on_step, "callback_steps": 1}
+        return {}
+    
+    def _get_img2img_pipeline(self):
+        """Pipeline img2img que comparte pesos con el de texto (lazy loading) - Thread-safe"""
+        if self._img2img_pipeline is not None and self._img2img_model == self.model_name:
+            return self._img2img_pipeline
+        pipeline = self._get_pipeline()
+        with self._lock:
+            if self._img2img_pipeline is not None and self._img2img_model == self.model_name:
+                return self._img2img_pipeline
+            try:
+                from diffusers import AutoPipelineForImage2Image
+                img2img = AutoPipelineForImage2Image.from_pipe(pipeline)
+            except (ImportError, AttributeError, ValueError):
+                # diffusers antiguo: construir el img2img con los mismos componentes
+                from diffusers import StableDiffusionImg2ImgPipeline, StableDiffusionXLImg2ImgPipeline
+                cls = StableDiffusionXLImg2ImgPipeline if "XL" in type(pipeline).__name__ else StableDiffusionImg2ImgPipeline
+                img2img = cls(**pipeline.components)
+            type(self)._img2img_pipeline = img2img
+            type(self)._img2img_model = self.model_name
+            type(self)._latent_cache.clear()
+            print(f"[StableDiffusion] Pipeline img2img listo ({type(img2img).__name__})")
+        return self._img2img_pipeline
+    
+    def _base_latents(self, base_image: Image.Image, base_key: str, width: int, height: int):
+        """
+        Latentes del VAE de la pose base, codificadas una sola vez por (base_key, tamaño).
+        Cada frame derivado parte de ellas sin volver a pasar la imagen por el encoder.
+        """
+        import torch
+        key = (base_key, width, height)
+        cache = type(self)._latent_cache
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        
+        pipe = self._get_img2img_pipeline()
+        vae = pipe.vae
+        pixels = pipe.image_processor.preprocess(base_image.convert("RGB").resize((width, height), Image.LANCZOS))
+        with torch.no_grad():
+            pixels = pixels.to(device=vae.device, dtype=vae.dtype)
+            latents = vae.encode(pixels).latent_dist.mean * vae.config.scaling_factor
+        
+        with self._lock:
+            cache[key] = latents
+            while len(cache) > self.LATENT_CACHE_SIZE:
+                cache.popitem(last=False)
+        print(f"[StableDiffusion] Latentes de la pose base cacheadas: {Path(base_key).name} {width}x{height}")
+        return latents
+    
+    @traceable(name="stable_diffusion_generate_variations")
+    def generate_variations(
+        self,
+        prompts: List[str],
+        base_image: Image.Image,
+        base_key: str,
+        strength: float = 0.35,
+        size: str = "256x256",
+        negative_prompt: Optional[str] = None
+    ) -> Optional[List[Image.Image]]:
+        """
+        Deriva una imagen por prompt a partir de una pose base con img2img de baja fuerza.
+        Todas comparten las latentes cacheadas de la base (misma identidad) y se agrupan
+        en lotes; img2img solo ejecuta int(steps * strength) steps.
+        
+        Pasa por la misma cola que txt2img (img2img comparte UNet y scheduler con
+        ese pipeline): nunca corre a la vez que otro lote, respeta render_priority
+        y un retrato interactivo la interrumpe entre steps.
+        
+        Args:
+            prompts: Un prompt por imagen (p.ej. un frame de animación cada uno)
+            base_image: Pose base del personaje
+            base_key: Identificador estable de la base (clave de la cache de latentes)
+            strength: Cuánto se aleja cada imagen de la base (0-1)
+            size: Tamaño de las imágenes ('256x256')
+            negative_prompt: Prompt negativo (None = el de pixel art)
+        
+        Returns:
+            List[Image.Image] o None si falla
+        """
+        try:
+            # Cargar antes de encolar para que los errores de carga se reporten aquí
+            self._get_img2img_pipeline()
+            width, height = self._parse_size(size)
+            num_steps = self._num_steps()
+            # Al menos un step de denoising por imagen
+            strength = min(1.0, max(float(strength), 1.0 / num_steps))
+            key = (IMG2IMG_OP, base_key, width, height, num_steps, self._guidance(), strength)
+            negatives = [negative_prompt or self.DEFAULT_NEGATIVE_PROMPT] * len(prompts)
             
-            return image
+            print(f"[StableDiffusion] img2img: {len(prompts)} imágenes {width}x{height}, "
+                  f"strength={strength:.2f} (~{max(1, int(num_steps * strength))} steps)")
+            if getattr(settings, 'SD_BATCHING_ENABLED', False):
+                queue = self._get_queue()
+                futures = [queue.submit(p, n, key, payload=base_image) for p, n in zip(prompts, negatives)]
+                return [f.result() for f in futures]
+            return self._run_batch(prompts, negatives, key, payload=base_image)
             
         except Exception as e:
-            print(f"[StableDiffusion] Error generando imagen: {e}")
+            print(f"[StableDiffusion] Error en img2img: {e}")
             traceback.print_exc()
             return None
     
+    def _run_img2img(self, prompts: List[str], negative_prompts: List[str], key, base_image: Image.Image,
+                     should_abort=None) -> List[Image.Image]:
+        """
+        Ejecuta un lote img2img desde la pose base (ver generate_variations).
+        
+        Args:
+            key: ("img2img", base_key, width, height, steps, guidance, strength)
+            base_image: Pose base (solo se codifica si sus latentes no están en cache)
+        """
+        _, base_key, width, height, num_steps, guidance, strength = key
+        # El modelo no se libera mientras se derivan las imágenes
+        with self._in_use():
+            pipe = self._get_img2img_pipeline()
+            latents = self._base_latents(base_image, base_key, width, height)
+            
+            call_kwargs = self._step_callback_kwargs(pipe, should_abort) if should_abort else {}
+            seed = getattr(settings, 'IMAGE_SEED', None)
+            if seed is not None:
+                import torch
+                # Semilla por prompt: el frame no depende de con quién comparta lote
+                call_kwargs["generator"] = [
+                    torch.Generator(device="cpu").manual_seed(int(seed) + zlib.crc32(p.encode("utf-8")))
+                    for p in prompts
+                ]
+            
+            with get_limiter(self.LIMITER).slot() as slot, cpu_autocast(type(self)._cpu_profile):
+                slot.units = _work_units(len(prompts), num_steps * strength, width, height)
+                try:
+                    result = pipe(
+                        **self._prompt_kwargs(pipe, prompts, negative_prompts),
+                        image=latents.repeat(len(prompts), 1, 1, 1),
+                        strength=strength,
+                        num_inference_steps=num_steps,
+                        guidance_scale=guidance,
+                        **call_kwargs,
+                    )
+                except RenderPreempted:
+                    # Interrupción voluntaria: no es congestión, no ajustar el límite
+                    slot.skip = True
+                    raise
+            return list(result.images)
+    
     def _parse_size(self, size: str) -> Tuple[int, int]:
         """Convierte string '512x512' a tupla (512, 512)"""
         try:
@@ -229,23 +750,102 @@ class StableDiffusionProvider:
             return (512, 512)
     
     def make_transparent_background(self, image: Image.Image) -> Image.Image:
-        """Hace el fondo transparente (blanco/negro -> transparente)"""
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        data = np.array(image)
-        r, g, b, a = data[:,:,0], data[:,:,1], data[:,:,2], data[:,:,3]
-        
-        # Detectar fondo blanco o muy claro
-        white_areas = (r > 240) & (g > 240) & (b > 240)
-        # Detectar fondo negro o muy oscuro
-        black_areas = (r < 15) & (g < 15) & (b < 15)
-        
-        # Hacer transparente
-        a[white_areas] = 0
-        a[black_areas] = 0
-        
-        return Image.fromarray(data)
+        """
+        Hace el fondo transparente: solo el fondo conectado con el borde
+        (los blancos/negros interiores del personaje se conservan)
+        """
+        return remove_border_background(image, getattr(settings, 'MATTING_TOLERANCE', 24))
+
+
+# ============= ONNX RUNTIME / OPENVINO PROVIDER =============
+class OnnxDiffusionProvider(StableDiffusionProvider):
+    """
+    Stable Diffusion exportado a ONNX Runtime u OpenVINO y ejecutado en CPU con
+    optimizaciones de grafo y pesos int8/fp16 (ver Utils/cpu_runtime.py).
+    
+    Misma interfaz que StableDiffusionProvider (generate_image / generate_preview,
+    micro-batching, precarga y residencia se heredan); solo cambia la carga del
+    pipeline. img2img no está disponible: los sprites se generan frame a frame.
+    """
+    
+    LIMITER = "onnx_diffusion"
+    generate_variations = None  # Sin img2img (ver ImageProvider.supports_img2img)
+    
+    def __init__(self):
+        super().__init__()
+        self.backend = getattr(settings, 'ONNX_BACKEND', "onnxruntime")
+        self.weights = getattr(settings, 'ONNX_WEIGHTS', "int8")
+    
+    @traceable(name="onnx_diffusion_load_pipeline")
+    def _load_pipeline(self):
+        """Carga el modelo exportado (exportándolo la primera vez) en el runtime de CPU"""
+        from app.Agent.Utils.cpu_runtime import load_pipeline
+        cls = type(self)
+        self._set_load_status("loading", f"cargando {self.backend} ({self.weights})", 0.2)
+        print(f"[OnnxDiffusion] Cargando {self.model_name} con {self.backend} ({self.weights})")
+        pipeline = load_pipeline(self.model_name, self.backend, self.weights,
+                                 threads=load_cpu_profile().get("threads"))
+        cls._pipeline = pipeline
+        cls._model_name = self.model_name
+        cls._offloaded = False
+        return pipeline
+    
+    def _prompt_kwargs(self, pipeline, prompts: List[str], negative_prompts: List[str]) -> dict:
+        # Los text encoders corren dentro del runtime: se le pasan los textos
+        return {"prompt": prompts, "negative_prompt": negative_prompts}
+
+
+# ============= PROCEDURAL PROVIDER =============
+class ProceduralProvider:
+    """
+    Generador procedural sin modelo: una figura de elipses sobre fondo liso,
+    determinista a partir del prompt. Tarda milisegundos; el enrutador de
+    imágenes (ver image_router.py) lo usa cuando ningún modelo llega al deadline.
+    """
+    
+    model_name = "procedural"
+    EXPECTED_SECONDS = 0.02  # s/imagen a 512x512 antes de medir (ver image_router.py)
+    
+    def generate_image(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        negative_prompt: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """Genera la imagen procedural del prompt (misma firma que Stable Diffusion)"""
+        import random
+        import hashlib
+        from PIL import ImageDraw
+        try:
+            width, height = (int(v) for v in size.split('x'))
+        except ValueError:
+            width, height = 512, 512
+        rng = random.Random(hashlib.sha1(prompt.encode("utf-8")).hexdigest())
+        background = tuple(rng.randrange(16, 64) for _ in range(3))
+        image = Image.new("RGB", (width, height), background)
+        draw = ImageDraw.Draw(image)
+        # Cuerpo, cabeza y unos detalles, centrados como un retrato
+        palette = [tuple(rng.randrange(96, 256) for _ in range(3)) for _ in range(3)]
+        cx = width // 2
+        draw.ellipse((cx - width * 0.28, height * 0.45, cx + width * 0.28, height * 1.05), fill=palette[0])
+        draw.ellipse((cx - width * 0.16, height * 0.14, cx + width * 0.16, height * 0.50), fill=palette[1])
+        for _ in range(4):
+            x, y = rng.uniform(0.25, 0.75) * width, rng.uniform(0.2, 0.9) * height
+            r = rng.uniform(0.02, 0.06) * min(width, height)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=palette[2])
+        return image
+    
+    def generate_preview(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        negative_prompt: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """La previa es la misma imagen: ya es instantánea"""
+        return self.generate_image(prompt, size=size, negative_prompt=negative_prompt)
+    
+    def make_transparent_background(self, image: Image.Image) -> Image.Image:
+        return remove_border_background(image, getattr(settings, 'MATTING_TOLERANCE', 24))
 
 
 # ============= OPENAI PROVIDER =============
@@ -267,24 +867,29 @@ class OpenAIProvider:
         self,
         prompt: str,
         size: str = "512x512",
-        background: Optional[str] = None
+        background: Optional[str] = None,
+        quality: Optional[str] = None
     ) -> Optional[Image.Image]:
         """Genera una imagen usando OpenAI - Rastreado en LangSmith"""
         try:
-            # Intentar con background transparente
-            try:
-                resp = self._client.images.generate(
-                    model="gpt-image-1",
-                    prompt=prompt,
-                    size=size,
-                    background="transparent" if background else None,
-                )
-            except TypeError:
-                resp = self._client.images.generate(
-                    model="gpt-image-1",
-                    prompt=prompt,
-                    size=size,
-                )
+            extra = {"quality": quality} if quality else {}
+            # El limitador adaptativo baja la concurrencia ante rate limits o latencias altas
+            with get_limiter("openai_image").slot():
+                # Intentar con background transparente
+                try:
+                    resp = self._client.images.generate(
+                        model="gpt-image-1",
+                        prompt=prompt,
+                        size=size,
+                        background="transparent" if background else None,
+                        **extra,
+                    )
+                except TypeError:
+                    resp = self._client.images.generate(
+                        model="gpt-image-1",
+                        prompt=prompt,
+                        size=size,
+                    )
             
             b64 = resp.data[0].b64_json
             image_bytes = base64.b64decode(b64)
@@ -297,15 +902,226 @@ class OpenAIProvider:
             print(f"[OpenAI] Error generando imagen: {e}")
             traceback.print_exc()
             return None
+    
+    @traceable(name="openai_generate_preview")
+    def generate_preview(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        background: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """Vista previa barata con quality='low' (más rápida y económica)"""
+        return self.generate_image(prompt, size=size, background=background, quality="low")
+
+
+# ============= OPENAI ASYNC PROVIDER =============
+class AsyncOpenAIProvider(OpenAIProvider):
+    """
+    Proveedor OpenAI asíncrono: todas las peticiones comparten un event loop
+    en un hilo propio, con concurrencia acotada (semáforo), reintentos con
+    backoff exponencial ante rate limits / errores transitorios y decodificación
+    del base64 a RGBA fuera del hilo que llama.
+
+    La interfaz síncrona (generate_image / generate_preview) es la misma que la
+    de OpenAIProvider, así que los hilos de render_portraits lanzan los cuatro
+    retratos a la vez. El semáforo acota este proveedor y cada petición toma
+    además un hueco del limitador adaptativo "openai_image", el mismo que la
+    ruta síncrona: los 429 bajan el límite para ambas.
+    """
+    
+    _loop = None
+    _loop_thread = None
+    _loop_lock = threading.Lock()
+    
+    def __init__(self, client=None, base_url: Optional[str] = None, max_concurrency: Optional[int] = None):
+        """
+        Args:
+            client: Cliente AsyncOpenAI ya creado (tests); None = crear uno
+            base_url: URL base de la API (None = settings.OPENAI_BASE_URL o la oficial)
+            max_concurrency: Peticiones en vuelo (None = settings.OPENAI_MAX_CONCURRENCY)
+        """
+        if client is None:
+            try:
+                from openai import AsyncOpenAI
+            except ImportError:
+                raise ImportError("openai no está instalado. Ejecuta: pip install openai")
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY no encontrada en .env")
+            # Los reintentos los gestiona este proveedor (con backoff propio)
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url or getattr(settings, 'OPENAI_BASE_URL', None) or None,
+                max_retries=0,
+            )
+        self._client = client
+        self.max_concurrency = max(1, int(max_concurrency or getattr(settings, 'OPENAI_MAX_CONCURRENCY', 4)))
+        self.max_retries = max(0, int(getattr(settings, 'OPENAI_MAX_RETRIES', 5)))
+        self.backoff_base = float(getattr(settings, 'OPENAI_BACKOFF_BASE', 1.0))
+        self.backoff_max = float(getattr(settings, 'OPENAI_BACKOFF_MAX', 30.0))
+        self._semaphore = None  # se crea dentro del loop
+        self.retries = 0
+    
+    @classmethod
+    def _get_loop(cls):
+        """Event loop compartido en un hilo daemon (lazy loading) - Thread-safe"""
+        if cls._loop is None:
+            with cls._loop_lock:
+                if cls._loop is None:
+                    import asyncio
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="OpenAIAsync", daemon=True)
+                    thread.start()
+                    cls._loop_thread = thread
+                    cls._loop = loop
+        return cls._loop
+    
+    @staticmethod
+    def _decode_rgba(b64: str) -> Image.Image:
+        """base64 -> imagen RGBA ya decodificada (se ejecuta en el pool del loop)"""
+        from io import BytesIO
+        with Image.open(BytesIO(base64.b64decode(b64))) as img:
+            return img.convert("RGBA")
+    
+    def _retry_delay(self, error, attempt: int) -> Optional[float]:
+        """
+        Segundos a esperar antes de reintentar, o None si el error no es transitorio.
+        Respeta la cabecera Retry-After si la API la envía.
+        """
+        import random
+        import openai
+        transient = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+        if not isinstance(error, transient) or attempt >= self.max_retries:
+            return None
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            if retry_after is not None:
+                return min(self.backoff_max, float(retry_after))
+        except ValueError:
+            pass
+        # Backoff exponencial con jitter para no reintentar todos a la vez
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        background: Optional[str] = None,
+        quality: Optional[str] = None
+    ) -> Image.Image:
+        """
+        Genera una imagen (corrutina del loop compartido).
+        
+        Returns:
+            Image.Image: Imagen RGBA
+        
+        Raises:
+            openai.OpenAIError: si falla tras agotar los reintentos
+        """
+        import asyncio
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        extra = {"quality": quality} if quality else {}
+        if background:
+            extra["background"] = "transparent"
+        
+        attempt = 0
+        limiter = get_limiter("openai_image")
+        async with self._semaphore:
+            while True:
+                try:
+                    # Un hueco por intento: un fallo cuenta como congestión y el backoff se espera sin hueco
+                    async with limiter.aslot():
+                        resp = await self._client.images.generate(
+                            model="gpt-image-1", prompt=prompt, size=size, **extra
+                        )
+                    break
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    self.retries += 1
+                    print(f"[OpenAIAsync] {type(e).__name__}, reintento {attempt}/{self.max_retries} en {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        
+        # La decodificación (base64 + PNG) no bloquea el loop ni al llamante
+        return await asyncio.get_running_loop().run_in_executor(None, self._decode_rgba, resp.data[0].b64_json)
+    
+    @traceable(name="openai_async_generate_image")
+    def generate_image(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        background: Optional[str] = None,
+        quality: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """Genera una imagen esperando a la corrutina del loop compartido"""
+        import asyncio
+        future = asyncio.run_coroutine_threadsafe(
+            self.agenerate(prompt, size=size, background=background, quality=quality), self._get_loop()
+        )
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"[OpenAIAsync] Error generando imagen: {e}")
+            return None
+    
+    def generate_many(self, prompts: List[str], size: str = "512x512", background: Optional[str] = None) -> List[Optional[Image.Image]]:
+        """
+        Genera varias imágenes a la vez (todas en vuelo hasta max_concurrency).
+        
+        Returns:
+            List: Una imagen (o None si falló) por prompt, en el mismo orden
+        """
+        import asyncio
+        
+        async def run_all():
+            return await asyncio.gather(
+                *(self.agenerate(p, size=size, background=background) for p in prompts),
+                return_exceptions=True,
+            )
+        results = asyncio.run_coroutine_threadsafe(run_all(), self._get_loop()).result()
+        out = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"[OpenAIAsync] Error generando imagen: {result}")
+                out.append(None)
+            else:
+                out.append(result)
+        return out
 
 
 # ============= FACTORY =============
 def get_image_provider():
-    """Factory que devuelve el proveedor configurado"""
-    provider_name = getattr(settings, 'IMAGE_PROVIDER', 'stable_diffusion')
+    """
+    Factory que devuelve el proveedor configurado, o el enrutador por tier y
+    deadline si hay varios backends en settings.IMAGE_ROUTER_BACKENDS
+    """
+    if getattr(settings, 'IMAGE_ROUTER_BACKENDS', None):
+        from app.Agent.image_router import get_image_router
+        return get_image_router()
+    return make_provider(getattr(settings, 'IMAGE_PROVIDER', 'stable_diffusion'))
+
+
+def make_provider(provider_name: str):
+    """
+    Crea el proveedor de un backend por nombre
+    
+    Args:
+        provider_name: 'stable_diffusion', 'onnx', 'openai' o 'procedural'
+    
+    Returns:
+        Proveedor con generate_image / generate_preview
+    """
+    if provider_name == 'procedural':
+        return ProceduralProvider()
     
     if provider_name == 'openai':
         try:
+            if getattr(settings, 'OPENAI_ASYNC', True):
+                return AsyncOpenAIProvider()
             return OpenAIProvider()
         except Exception as e:
             print(f"[ImageProvider] Error inicializando OpenAI: {e}")
@@ -314,6 +1130,54 @@ def get_image_provider():
                 return StableDiffusionProvider()
             raise
     
-    # Por defecto: Stable Diffusion
+    if provider_name == 'onnx':
+        # El daemon de render ejecuta PyTorch: con el runtime de CPU se carga en este proceso
+        return OnnxDiffusionProvider()
+    
+    # Por defecto: Stable Diffusion (si hay un daemon de render en marcha, compartir su modelo)
+    if getattr(settings, 'RENDER_DAEMON_ENABLED', False):
+        from app.Agent.render_daemon import RenderDaemonProvider
+        daemon = RenderDaemonProvider.connect()
+        if daemon is not None:
+            return daemon
     return StableDiffusionProvider()
 
+
+def preload_image_pipeline() -> Optional[Future]:
+    """
+    Empieza a cargar el pipeline de Stable Diffusion en segundo plano, si es el
+    proveedor que se va a usar (no con OpenAI ni con un daemon de render en marcha).
+    
+    Returns:
+        Future compartido de la carga, o None si no hay nada que precargar
+    """
+    if getattr(settings, 'IMAGE_ROUTER_BACKENDS', None):
+        from app.Agent.image_router import get_image_router
+        return get_image_router().preload()
+    provider_name = getattr(settings, 'IMAGE_PROVIDER', 'stable_diffusion')
+    if provider_name in ('openai', 'procedural'):
+        return None
+    if provider_name == 'onnx':
+        print("[OnnxDiffusion] Precargando pipeline en segundo plano...")
+        return OnnxDiffusionProvider.preload()
+    if getattr(settings, 'RENDER_DAEMON_ENABLED', False):
+        from app.Agent.render_daemon import RenderDaemonProvider
+        if RenderDaemonProvider.ping() is not None:
+            return None
+    print("[StableDiffusion] Precargando pipeline en segundo plano...")
+    return StableDiffusionProvider.preload()
+
+
+def get_pipeline_status() -> dict:
+    """
+    Estado de la carga del pipeline para la UI.
+    
+    Returns:
+        dict: state ('idle'|'loading'|'ready'|'error'), stage, progress (0-1),
+              seconds (tiempo de carga) y error
+    """
+    if getattr(settings, 'IMAGE_ROUTER_BACKENDS', None):
+        from app.Agent.image_router import get_image_router
+        return get_image_router().pipeline_status()
+    provider_cls = OnnxDiffusionProvider if getattr(settings, 'IMAGE_PROVIDER', None) == 'onnx' else StableDiffusionProvider
+    return dict(provider_cls._load_status)
@@ -1,12 +1,24 @@
 import os, base64, re, traceback
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, List
+from PIL import Image
+from typing import Callable, Dict, List, Optional
 from concurrent.futures     import ThreadPoolExecutor, as_completed
 from dotenv                 import load_dotenv
 from app.domain.character   import Character
 from settings.settings      import settings
 from app.Agent.agent_art_director import PortraitSpec
 from app.Agent.image_providers import get_image_provider
+from app.Agent.image_router import ImageRouter
+from app.Agent.Utils.concurrency import get_all_stats
+from app.Agent.Utils.render_queue import render_priority, PRIORITY_BACKGROUND
+from app.Agent.Utils.image_postprocess import (
+    autocrop, quantize_palette, pixel_art_plan, upscale_nearest, read_crop_info,
+)
+from app.Agent.Utils.image_cache import get_image_cache, request_key
+from app.Agent.Utils.image_handoff import publish, write_behind, discard, get_rendered
+from app.Agent.Utils.perceptual_hash import get_perceptual_index
+from app.Agent.Utils.clip_tokens import get_clip_tokenizer
 from app.Agent.prompts.prompts_image_renderer import PromptsImageRenderer
 
 # Intentar importar LangSmith (opcional)
@@ -24,13 +36,24 @@ load_dotenv()
 # Inicializar proveedor de imágenes
 _image_provider = None
 
-def _get_image_provider():
-    """Lazy loading del proveedor de imágenes"""
+def _get_image_provider(tier: str = "final", size: Optional[str] = None):
+    """
+    Lazy loading del proveedor de imágenes. Con el enrutador (varios backends)
+    devuelve el proveedor elegido para el tier y el tamaño de esta petición.
+    """
     global _image_provider
     if _image_provider is None:
         _image_provider = get_image_provider()
+    if isinstance(_image_provider, ImageRouter):
+        return _image_provider.provider_for(tier, size)
     return _image_provider
 
+def _tracked(provider, size: str, preview: bool = False):
+    """Mide la generación para las estimaciones del enrutador (sin enrutador no hace nada)"""
+    if isinstance(_image_provider, ImageRouter):
+        return _image_provider.track(provider, size, preview)
+    return nullcontext()
+
 # Tamaños permitidos
 ALLOWED_SIZES = {"1024x1024", "1024x1536", "1536x1024", "auto", "512x512", "256x256", "162x162"}
 
@@ -67,51 +90,135 @@ def _project_root() -> Path:
 def _ensure_dir(path: Path):
     path.mkdir(parents=True, exist_ok=True)
 
+def _pixel_art_active(provider) -> bool:
+    """Modo pixel art nativo: solo con proveedores que aceptan tamaños pequeños (no OpenAI)"""
+    from app.Agent.image_providers import OpenAIProvider
+    return bool(getattr(settings, 'PIXEL_ART_MODE', False)) and not isinstance(provider, OpenAIProvider)
+
+def _cache_fields(provider, prompt: str, size: str) -> Dict[str, object]:
+    """
+    Campos que identifican una imagen en la cache: prompt, negativo, tamaño,
+    modelo, steps y seed. Con el daemon se usan los valores del SD local
+    (es el mismo modelo), así que ambos comparten entradas.
+    """
+    from app.Agent.image_providers import (
+        OpenAIProvider, StableDiffusionProvider, OnnxDiffusionProvider, ProceduralProvider,
+    )
+    if isinstance(provider, OpenAIProvider):
+        return {"prompt": prompt, "negative_prompt": None, "size": size,
+                "model": "openai:gpt-image-1", "steps": None, "seed": None}
+    if isinstance(provider, ProceduralProvider):
+        return {"prompt": prompt, "negative_prompt": None, "size": size,
+                "model": provider.model_name, "steps": None, "seed": None}
+    sd = provider if isinstance(provider, StableDiffusionProvider) else StableDiffusionProvider()
+    fields = {
+        "prompt": prompt,
+        "negative_prompt": sd.DEFAULT_NEGATIVE_PROMPT,
+        "size": size,
+        "model": sd.model_name,
+        "steps": sd._num_steps(),
+        "seed": getattr(settings, 'IMAGE_SEED', None),
+    }
+    # Otro runtime o cuantización da otros píxeles: no comparten entrada con PyTorch
+    if isinstance(sd, OnnxDiffusionProvider):
+        fields.update(backend=sd.backend, weights=sd.weights)
+    return fields
+
+def _portrait_request(spec: PortraitSpec, size: str, provider, preview: bool):
+    """
+    Prompt, tamaño a generar, factor pixel art y clave de cache de un retrato.
+
+    Returns:
+        (prompt, gen_size, factor, key)
+    """
+    from app.Agent.image_providers import OpenAIProvider
+    # OpenAI no tiene límite de 77 tokens: el tokenizador CLIP solo se usa con SD
+    tokenizer = None if isinstance(provider, OpenAIProvider) else get_clip_tokenizer()
+    prompt = PromptsImageRenderer().portrait_prompt(spec.prompt, spec.style, tokenizer)
+    gen_size, factor = size, 1
+    if not preview and _pixel_art_active(provider):
+        gen_size, factor = pixel_art_plan(size, settings.PIXEL_ART_NATIVE_SIZE)
+    # La previa se genera a otra escala y con otros steps que la final
+    preview_fields = {
+        "preview_scale": getattr(settings, 'PORTRAIT_PREVIEW_SCALE', 0.5),
+        "preview_steps": getattr(settings, 'SD_PREVIEW_STEPS', 4),
+    } if preview else {}
+    key = request_key(
+        kind="portrait_preview" if preview else "portrait",
+        factor=factor,
+        # El post-procesado también cambia el PNG resultante
+        matting=getattr(settings, 'MATTING_TOLERANCE', 24),
+        palette=settings.PALETTE_COLORS,
+        autocrop=settings.PORTRAIT_AUTOCROP,
+        **preview_fields,
+        **_cache_fields(provider, prompt, gen_size),
+    )
+    return prompt, gen_size, factor, key
+
 # ---------------- Core ----------------
 @traceable(name="render_portrait_image")
-def _render_one(spec: PortraitSpec, out_dir: Path, size: str | None = None) -> Path | None:
-    """Genera 1 PNG y lo guarda en out_dir. Devuelve Path o None si falla."""
+def _render_one(spec: PortraitSpec, out_dir: Path, size: str | None = None, preview: bool = False) -> Path | None:
+    """
+    Genera 1 PNG y lo guarda en out_dir. Devuelve Path o None si falla.
+    Con preview=True genera la vista previa barata (<slug>.preview.png).
+    En modo pixel art se genera a la resolución nativa, se guarda tal cual en
+    lowres/<slug>.png y se amplía por un factor entero (nearest) a <slug>.png.
+
+    La cache es por contenido (ver Utils/image_cache.py): un prompt nuevo para
+    un nombre ya conocido vuelve a generar en lugar de devolver el PNG antiguo.
+    """
     size = size or DEFAULT_PORTRAIT_SIZE
-    filename = _slugify(spec.name) + ".png"
+    filename = _slugify(spec.name) + (".preview.png" if preview else ".png")
     out_path = out_dir / filename
+    lowres_path = out_dir / "lowres" / filename
 
-    # cache
-    if out_path.exists():
+    cache = get_image_cache()
+    # Sin cache por contenido: comportamiento anterior (cache por nombre)
+    if cache is None and out_path.exists():
         print(f"[image_renderer] cache hit: {out_path}")
         return out_path
 
-    # Usar prompt especializado desde prompts_image_renderer
-    prompts = PromptsImageRenderer()
-    prompt = prompts.portrait_prompt(spec.prompt, spec.style)
-    
-    # Estimar tokens aproximados (1 token ≈ 0.75 palabras o 4 caracteres)
-    estimated_tokens = len(prompt.split()) * 1.3  # Aproximación conservadora
-    
     try:
+        provider = _get_image_provider("preview" if preview else "final", size)
+        print(f"[image_renderer] provider type: {type(provider).__name__}")
+        prompt, gen_size, factor, key = _portrait_request(spec, size, provider, preview)
+        lowres_key = request_key(parent=key, variant="lowres")
+        
+        if cache is not None and cache.materialize(key, out_path):
+            if factor > 1:
+                cache.materialize(lowres_key, lowres_path)
+            print(f"[image_renderer] cache hit: {out_path} ({key[:12]})")
+            return out_path
+        
+        # Estimar tokens aproximados (1 token ≈ 0.75 palabras o 4 caracteres)
+        estimated_tokens = len(prompt.split()) * 1.3  # Aproximación conservadora
         print(f"[image_renderer] generating: {spec.name} -> {out_path} (size={size})")
         print(f"[image_renderer] prompt ({estimated_tokens:.0f} tokens aprox): {prompt[:120]}...")  # Log del prompt
-        
-        provider = _get_image_provider()
-        print(f"[image_renderer] provider type: {type(provider).__name__}")
+        if factor > 1:
+            print(f"[image_renderer] pixel art: {gen_size} x{factor}")
         
         # Generar imagen usando el proveedor configurado
         # OpenAI acepta 'background', Stable Diffusion no
         from app.Agent.image_providers import OpenAIProvider
-        if isinstance(provider, OpenAIProvider):
-            # Es OpenAI
-            print("[image_renderer] Using OpenAI provider")
-            image = provider.generate_image(
-                prompt=prompt,
-                size=size,
-                background="transparent"
-            )
-        else:
-            # Es Stable Diffusion u otro
-            print(f"[image_renderer] Using {type(provider).__name__} provider")
-            image = provider.generate_image(
-                prompt=prompt,
-                size=size
-            )
+        generate = provider.generate_preview if preview else provider.generate_image
+        with _tracked(provider, gen_size, preview) as obs:
+            if isinstance(provider, OpenAIProvider):
+                # Es OpenAI
+                print("[image_renderer] Using OpenAI provider")
+                image = generate(
+                    prompt=prompt,
+                    size=gen_size,
+                    background="transparent"
+                )
+            else:
+                # Es Stable Diffusion u otro
+                print(f"[image_renderer] Using {type(provider).__name__} provider")
+                image = generate(
+                    prompt=prompt,
+                    size=gen_size
+                )
+            if obs is not None:
+                obs.ok = image is not None
         
         if image is None:
             print(f"[image_renderer] ERROR: No se pudo generar la imagen")
@@ -122,9 +229,28 @@ def _render_one(spec: PortraitSpec, out_dir: Path, size: str | None = None) -> P
             # Solo para retratos, intentar hacer fondo transparente
             image = provider.make_transparent_background(image)
         
-        # Guardar imagen
-        image.save(out_path, "PNG")
-        print(f"[image_renderer] saved: {out_path}")
+        # Paleta pixel art opcional y recorte al contenido (el offset va dentro del PNG)
+        if settings.PALETTE_COLORS:
+            image = quantize_palette(image, settings.PALETTE_COLORS)
+        crop_info = None
+        if settings.PORTRAIT_AUTOCROP:
+            image, crop_info = autocrop(image)
+        
+        # Pixel art: se guardan las dos versiones (nativa y ampliada)
+        if factor > 1:
+            _ensure_dir(lowres_path.parent)
+            write_behind(image, lowres_path, crop_info, on_written=(
+                None if cache is None else
+                lambda p: cache.put(lowres_key, p, {"name": spec.name, "size": gen_size})
+            ))
+            image, crop_info = upscale_nearest(image, factor, crop_info)
+        
+        # Publicar en memoria para la UI; el PNG (y la cache) se escriben en segundo plano
+        publish(out_path, image, crop_info, on_written=(
+            None if cache is None else
+            lambda p: cache.put(key, p, {"name": spec.name, "size": size, "preview": preview})
+        ))
+        print(f"[image_renderer] published: {out_path}")
         return out_path
 
     except Exception:
@@ -132,11 +258,88 @@ def _render_one(spec: PortraitSpec, out_dir: Path, size: str | None = None) -> P
         traceback.print_exc()
         return None
 
+def _render_progressive(
+    spec: PortraitSpec,
+    out_dir: Path,
+    size: str,
+    on_update: Optional[Callable[[str, str, bool], None]],
+    preview: bool,
+) -> Path | None:
+    """
+    Genera la vista previa (si procede) y después la versión final,
+    avisando a on_update(nombre, ruta, final) en cada fase.
+    """
+    preview_path = None
+    provider = _get_image_provider("final", size)
+    # En pixel art la final ya es barata: no compensa una previa
+    if (preview and hasattr(provider, 'generate_preview') and not _pixel_art_active(provider)
+            and not _final_cached(spec, out_dir, size, provider)):
+        preview_path = _render_one(spec, out_dir, size, preview=True)
+        if preview_path and on_update:
+            on_update(spec.name, str(preview_path), False)
+
+    out_path = out_dir / (_slugify(spec.name) + ".png")
+    if preview_path and _reuse_similar(preview_path, out_path):
+        path = out_path
+    else:
+        path = _render_one(spec, out_dir, size)
+    if path:
+        if on_update:
+            on_update(spec.name, str(path), True)
+        if preview_path:
+            # La previa ya no hace falta: la final la sustituye
+            discard(preview_path)
+    return path
+
+def _reuse_similar(preview_path: Path, out_path: Path) -> bool:
+    """
+    Si la previa ya es casi idéntica (pHash a distancia <= PHASH_REUSE_RADIUS) a
+    un retrato final existente, se publica ese retrato como final de este
+    personaje y no se genera la versión cara. Sin previa no hay con qué comparar.
+
+    Returns:
+        bool: True si se reutilizó un retrato
+    """
+    radius = getattr(settings, 'PHASH_REUSE_RADIUS', 0)
+    index = get_perceptual_index() if radius else None
+    if index is None:
+        return False
+    rendered = get_rendered(preview_path)
+    query = Image.frombytes("RGBA", rendered.size, rendered.rgba) if rendered else preview_path
+    for distance, path in index.search(query, radius, exclude=out_path):
+        if path.parent != out_path.parent or not path.exists():
+            continue
+        with Image.open(path) as img:
+            image = img.convert("RGBA")
+        publish(out_path, image, read_crop_info(path))
+        print(f"[image_renderer] reutilizado {path.name} para {out_path.name} (distancia {distance})")
+        return True
+    return False
+
+def _final_cached(spec: PortraitSpec, out_dir: Path, size: str, provider) -> bool:
+    """True si la versión final saldrá de la cache (no hace falta previa)"""
+    cache = get_image_cache()
+    if cache is None:
+        return (out_dir / (_slugify(spec.name) + ".png")).exists()
+    return _portrait_request(spec, size, provider, False)[3] in cache
+
 @traceable(name="render_portraits")
-def render_portraits(briefs: List[PortraitSpec], max_workers: int = 3) -> Dict[str, str]:
+def render_portraits(
+    briefs: List[PortraitSpec],
+    max_workers: int | None = None,
+    on_update: Optional[Callable[[str, str, bool], None]] = None,
+    preview: bool | None = None,
+) -> Dict[str, str]:
     """
     Genera retratos para una lista de briefs.
     Devuelve dict {nombre: ruta_png} solo para los que se generaron correctamente.
+
+    La concurrencia real la decide el limitador adaptativo de cada proveedor;
+    max_workers solo acota los hilos (None = uno por retrato).
+
+    Con preview (None = settings.PORTRAIT_PREVIEW_ENABLED) cada retrato se genera
+    en dos fases: una previa barata y la final. on_update(nombre, ruta, final)
+    se llama desde los hilos de render en cuanto cada versión está en disco.
     """
     print(f"[image_renderer] render_portraits called with {len(briefs)} briefs")
     
@@ -162,33 +365,41 @@ def render_portraits(briefs: List[PortraitSpec], max_workers: int = 3) -> Dict[s
         filtered.append(b)
 
     size = DEFAULT_PORTRAIT_SIZE
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futs = {ex.submit(_render_one, b, out_dir, size): b for b in filtered}
+    if preview is None:
+        preview = getattr(settings, 'PORTRAIT_PREVIEW_ENABLED', False)
+    with ThreadPoolExecutor(max_workers=max_workers or len(filtered)) as ex:
+        futs = {ex.submit(_render_progressive, b, out_dir, size, on_update, preview): b for b in filtered}
         for fut in as_completed(futs):
             b = futs[fut]
             path = fut.result()
             if path:
                 results[b.name] = str(path)
+    print(f"[image_renderer] concurrency: {get_all_stats()}")
     return results
 
 @traceable(name="generate_background_image")
-def generate_background_image(background_brief: Dict[str, str]) -> str | None:
+def generate_background_image(
+    background_brief: Dict[str, str],
+    priority: int = PRIORITY_BACKGROUND,
+    out_path: Path | None = None,
+) -> str | None:
     """
     Genera una imagen de fondo basada en un brief.
     Devuelve la ruta del archivo generado o None si falla.
+
+    Por defecto es una render de fondo (especulativa): con la cola de render activa
+    se interrumpe entre steps si llega una render interactiva (p.ej. un retrato).
+
+    out_path: ruta final del fondo (por defecto BG_GEN_DIR/background_<clave>.png).
+    Se escribe directamente ahí: el horneado, el índice perceptual y la entrada en
+    memoria (image_handoff) quedan asociados a esa ruta y no hay que mover el fichero.
     """
     # Ruta para fondos generados
     base = Path(settings.BG_GEN_DIR or "app/UI/assets/images/background/generated")
-    out_dir = base if base.is_absolute() else (_project_root() / base)
+    out_dir = Path(out_path).parent if out_path else (base if base.is_absolute() else (_project_root() / base))
     _ensure_dir(out_dir)
     print(f"[image_renderer] background output dir: {out_dir}")
 
-    # Crear nombre único para el fondo
-    import time
-    timestamp = int(time.time())
-    filename = f"background_{timestamp}.png"
-    out_path = out_dir / filename
-
     # Usar prompt especializado desde prompts_image_renderer
     prompts = PromptsImageRenderer()
     # Construir diccionario con la descripción combinada
@@ -207,23 +418,37 @@ def generate_background_image(background_brief: Dict[str, str]) -> str | None:
     })
 
     try:
-        print(f"[image_renderer] generating background: {out_path}")
+        provider = _get_image_provider("best_effort", DEFAULT_BACKGROUND_SIZE)
         
-        provider = _get_image_provider()
+        # Nombre por contenido: el mismo brief reutiliza el mismo fondo
+        key = request_key(kind="background", **_cache_fields(provider, prompt, DEFAULT_BACKGROUND_SIZE))
+        out_path = Path(out_path) if out_path else out_dir / f"background_{key[:16]}.png"
+        cache = get_image_cache()
+        if out_path.exists() or (cache is not None and cache.materialize(key, out_path)):
+            print(f"[image_renderer] background cache hit: {out_path}")
+            return str(out_path)
+        
+        print(f"[image_renderer] generating background: {out_path}")
         
         # Generar imagen usando el proveedor configurado
-        image = provider.generate_image(
-            prompt=prompt,
-            size=DEFAULT_BACKGROUND_SIZE
-        )
+        with render_priority(priority), _tracked(provider, DEFAULT_BACKGROUND_SIZE) as obs:
+            image = provider.generate_image(
+                prompt=prompt,
+                size=DEFAULT_BACKGROUND_SIZE
+            )
+            if obs is not None:
+                obs.ok = image is not None
         
         if image is None:
             print(f"[image_renderer] ERROR: No se pudo generar el fondo")
             return None
         
-        # Guardar imagen
-        image.save(out_path, "PNG")
-        print(f"[image_renderer] background saved: {out_path}")
+        # Publicar en memoria; el PNG (y la cache) se escriben en segundo plano
+        publish(out_path, image, on_written=(
+            None if cache is None else
+            lambda p: cache.put(key, p, {"kind": "background", "setting": background_brief.get('setting', '')})
+        ))
+        print(f"[image_renderer] background published: {out_path}")
         return str(out_path)
 
     except Exception as e:
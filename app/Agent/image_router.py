@@ -0,0 +1,405 @@
+"""
+Enrutado de imágenes por tier de calidad y deadline.
+
+get_image_provider() usa un único backend (settings.IMAGE_PROVIDER) para todo.
+Con varios backends en settings.IMAGE_ROUTER_BACKENDS cada petición indica su
+tier ("preview", "final", "best_effort") y opcionalmente un deadline, y el
+enrutador elige entre ellos (SDXL completo, un modelo destilado pequeño, el
+generador procedural...) con estimaciones de latencia en vivo:
+
+- Latencia de cada backend: media móvil (EWMA) de segundos por megapíxel,
+  separada para previas y finales, más la espera estimada en su limitador y
+  el tiempo de carga si el modelo no está en memoria.
+- Con deadline nunca se usa el backend más lento (con tres o más); entre los
+  que llegan a tiempo se elige el de más calidad y, si ninguno llega, el más rápido.
+- Sin deadline se elige el de más calidad.
+
+Ejemplo (settings.json -> ImageGen):
+    "router_backends": [
+        {"name": "sdxl", "provider": "stable_diffusion", "quality": 3, "seconds": 25},
+        {"name": "tiny", "provider": "stable_diffusion", "model": "segmind/tiny-sd", "quality": 2, "seconds": 3},
+        {"name": "procedural", "provider": "procedural", "quality": 0}
+    ]
+"seconds" es la latencia esperada a 512x512 hasta la primera medición.
+"""
+
+import math
+import time
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from settings.settings import settings
+from app.Agent.image_providers import (
+    StableDiffusionProvider, OnnxDiffusionProvider, make_provider,
+)
+from app.Agent.Utils.concurrency import get_limiter
+from app.Agent.Utils.render_queue import render_priority, PRIORITY_BACKGROUND
+from app.Agent.Utils.image_postprocess import remove_border_background
+
+# Tiers por defecto (se pueden sobrescribir en settings.json -> ImageGen.router_tiers)
+DEFAULT_TIERS: Dict[str, Dict[str, Any]] = {
+    # Previa de retrato: algo en pantalla en menos de 2 s
+    "preview":     {"deadline": 2.0, "preview": True},
+    # Retrato final: la mejor calidad disponible
+    "final":       {"deadline": None},
+    # Fondos especulativos: la mejor calidad, con prioridad de fondo (interrumpibles)
+    "best_effort": {"deadline": None, "background": True},
+}
+REFERENCE_PIXELS = 512 * 512      # Tamaño al que se expresa "seconds" de cada backend
+COLD_START_SECONDS = 60.0         # Carga estimada de un modelo sin medir
+_MODEL_BASES = {"stable_diffusion": StableDiffusionProvider, "onnx": OnnxDiffusionProvider}
+
+
+class LatencyEstimator:
+    """EWMA de segundos por píxel de un backend, por separado para previas y finales"""
+
+    def __init__(self, prior: Optional[float] = None, alpha: float = 0.3):
+        """
+        Args:
+            prior: Segundos esperados a 512x512 (None = desconocido hasta medir)
+            alpha: Peso de cada medición nueva en la media
+        """
+        self.alpha = alpha
+        self._rates: Dict[bool, float] = {}   # preview -> segundos por píxel
+        self._measured: set = set()
+        self.samples = 0
+        self._lock = threading.Lock()
+        if prior:
+            self._rates[False] = prior / REFERENCE_PIXELS
+
+    def observe(self, preview: bool, seconds: float, pixels: int):
+        """Añade una medición (la primera sustituye a la estimación inicial)"""
+        rate = seconds / max(pixels, 1)
+        with self._lock:
+            previous = self._rates.get(preview)
+            if previous is None or preview not in self._measured:
+                self._rates[preview] = rate
+            else:
+                self._rates[preview] = previous + (rate - previous) * self.alpha
+            self._measured.add(preview)
+            self.samples += 1
+
+    def estimate(self, preview: bool, pixels: int) -> Optional[float]:
+        """Segundos estimados; una previa sin medir se acota por la final"""
+        rate = self._rates.get(preview)
+        if rate is None and preview:
+            rate = self._rates.get(False)
+        return None if rate is None else rate * pixels
+
+
+@dataclass
+class RouteBackend:
+    """Backend configurado en el enrutador"""
+    name: str
+    provider: Any
+    quality: int = 1
+    estimator: LatencyEstimator = field(default_factory=LatencyEstimator)
+    load_seconds: float = COLD_START_SECONDS
+    preload: bool = True
+
+
+class _Observation:
+    """Resultado de una generación dentro de ImageRouter.track()"""
+
+    def __init__(self):
+        self.ok = True
+
+
+def _parse_size(size: Optional[str]) -> Tuple[int, int]:
+    try:
+        width, height = (int(v) for v in (size or "").split('x'))
+        return width, height
+    except ValueError:
+        return 512, 512
+
+
+_model_classes: Dict[Tuple[type, str, Optional[int]], type] = {}
+
+
+def model_provider_class(base: type, model: str, steps: Optional[int] = None) -> type:
+    """
+    Subclase del proveedor fija a un modelo: cada modelo tiene su propio
+    pipeline, cola y residencia (ver StableDiffusionProvider.__init_subclass__)
+
+    Args:
+        base: StableDiffusionProvider u OnnxDiffusionProvider
+        model: Modelo de Hugging Face
+        steps: Steps fijos (None = settings.STABLE_DIFFUSION_STEPS)
+
+    Returns:
+        type: La misma clase para la misma combinación
+    """
+    key = (base, model, steps)
+    if key not in _model_classes:
+        _model_classes[key] = type(f"{base.__name__}[{model}]", (base,), {"MODEL": model, "STEPS": steps})
+    return _model_classes[key]
+
+
+def build_backend(spec: Dict[str, Any]) -> RouteBackend:
+    """
+    Crea un backend a partir de su entrada en settings.IMAGE_ROUTER_BACKENDS
+
+    Args:
+        spec: {name, provider, model?, steps?, quality?, seconds?, load_seconds?, preload?}
+
+    Returns:
+        RouteBackend
+    """
+    provider_name = spec.get("provider", "stable_diffusion")
+    model, steps = spec.get("model"), spec.get("steps")
+    base = _MODEL_BASES.get(provider_name)
+    if base is not None and ((model and model != settings.STABLE_DIFFUSION_MODEL) or steps):
+        provider = model_provider_class(base, model or settings.STABLE_DIFFUSION_MODEL, steps)()
+    else:
+        # Modelo por defecto: el mismo proveedor que get_image_provider (comparte precarga y daemon)
+        provider = make_provider(provider_name)
+    prior = spec.get("seconds", getattr(provider, "EXPECTED_SECONDS", None))
+    return RouteBackend(
+        name=spec.get("name", provider_name),
+        provider=provider,
+        quality=int(spec.get("quality", 1)),
+        estimator=LatencyEstimator(prior),
+        load_seconds=float(spec.get("load_seconds", COLD_START_SECONDS)),
+        preload=bool(spec.get("preload", True)),
+    )
+
+
+class ImageRouter:
+    """
+    Elige el backend de cada petición según su tier, su deadline y la latencia
+    medida de cada backend. Tiene la misma interfaz que un proveedor
+    (generate_image / generate_preview), así que get_image_provider() lo
+    devuelve cuando hay varios backends configurados.
+    """
+
+    def __init__(self, backends: List[RouteBackend], tiers: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Args:
+            backends: Backends disponibles
+            tiers: Configuración por tier, combinada con DEFAULT_TIERS
+        """
+        if not backends:
+            raise ValueError("El enrutador de imágenes necesita al menos un backend")
+        self.backends = list(backends)
+        self.tiers = {name: dict(config) for name, config in DEFAULT_TIERS.items()}
+        for name, config in (tiers or {}).items():
+            self.tiers.setdefault(name, {}).update(config)
+
+    # ---------- estimación ----------
+    def _tier(self, tier: str) -> Dict[str, Any]:
+        return self.tiers.get(tier) or self.tiers["final"]
+
+    @staticmethod
+    def _load_status(backend: RouteBackend) -> Optional[Dict[str, Any]]:
+        # Solo los proveedores locales tienen estado de carga (OpenAI, el daemon y el procedural no)
+        return getattr(type(backend.provider), "_load_status", None)
+
+    def _is_cold(self, backend: RouteBackend) -> bool:
+        status = self._load_status(backend)
+        return status is not None and status.get("state") != "ready"
+
+    def estimate(self, backend: RouteBackend, preview: bool, pixels: int) -> float:
+        """
+        Segundos estimados hasta tener la imagen: generación + espera en el
+        limitador + carga del modelo si no está en memoria (inf si no se sabe)
+        """
+        seconds = backend.estimator.estimate(preview, pixels)
+        if seconds is None:
+            return math.inf
+        limiter_name = getattr(backend.provider, "LIMITER", None)
+        if limiter_name:
+            limiter = get_limiter(limiter_name)
+            ahead = limiter.in_flight + limiter.queue_depth
+            seconds += seconds * ahead / max(limiter.limit, 1)
+        status = self._load_status(backend)
+        if status is not None:
+            if status.get("state") == "ready":
+                if status.get("seconds"):
+                    backend.load_seconds = float(status["seconds"])
+            else:
+                seconds += backend.load_seconds
+        return seconds
+
+    def select(self, tier: str = "final", size: Optional[str] = None, deadline: Optional[float] = None) -> RouteBackend:
+        """
+        Elige el backend para una petición
+
+        Args:
+            tier: 'preview', 'final', 'best_effort' u otro de settings
+            size: Tamaño pedido ('512x512')
+            deadline: Segundos máximos (None = el del tier)
+
+        Returns:
+            RouteBackend elegido
+        """
+        config = self._tier(tier)
+        deadline = config.get("deadline") if deadline is None else deadline
+        width, height = _parse_size(size)
+        preview = bool(config.get("preview"))
+
+        # Un modelo que no consiguió cargar solo se usa si no queda otro
+        candidates = [b for b in self.backends if (self._load_status(b) or {}).get("state") != "error"]
+        candidates = candidates or list(self.backends)
+        estimates = {b.name: self.estimate(b, preview, width * height) for b in candidates}
+
+        if deadline is None:
+            return max(candidates, key=lambda b: (b.quality, -estimates[b.name]))
+
+        # Petición con deadline: nunca al backend más lento (desconocido = más lento),
+        # siempre que queden al menos otros dos (uno que use y el de reserva)
+        if len(candidates) > 2:
+            slowest = max(candidates, key=lambda b: (estimates[b.name], b.quality))
+            candidates = [b for b in candidates if b is not slowest]
+        in_time = [b for b in candidates if estimates[b.name] <= deadline]
+        if in_time:
+            return max(in_time, key=lambda b: (b.quality, -estimates[b.name]))
+        return min(candidates, key=lambda b: (estimates[b.name], -b.quality))
+
+    def provider_for(self, tier: str = "final", size: Optional[str] = None, deadline: Optional[float] = None):
+        """Proveedor del backend elegido (para quien necesita el proveedor concreto, ver image_renderer)"""
+        return self.select(tier, size, deadline).provider
+
+    @contextmanager
+    def track(self, provider, size: Optional[str], preview: bool = False):
+        """
+        Mide una generación con el proveedor de un backend y actualiza su
+        estimación. Marca obs.ok = False si no devolvió imagen. Con el modelo
+        frío no se mide (la carga la da su estado de carga).
+        """
+        backend = next((b for b in self.backends if b.provider is provider), None)
+        obs = _Observation()
+        cold = backend is not None and self._is_cold(backend)
+        started = time.perf_counter()
+        yield obs
+        if backend is not None and obs.ok and not cold:
+            width, height = _parse_size(size)
+            backend.estimator.observe(preview, time.perf_counter() - started, width * height)
+
+    # ---------- interfaz de proveedor ----------
+    def generate_image(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        negative_prompt: Optional[str] = None,
+        tier: str = "final",
+        deadline: Optional[float] = None,
+    ) -> Optional[Image.Image]:
+        """
+        Genera con el backend elegido para el tier y el deadline
+
+        Args:
+            prompt: Prompt positivo
+            size: Tamaño ('512x512')
+            negative_prompt: Prompt negativo (None = el del backend)
+            tier: Tier de la petición
+            deadline: Segundos máximos (None = el del tier)
+
+        Returns:
+            Image.Image o None si falla
+        """
+        config = self._tier(tier)
+        backend = self.select(tier, size, deadline)
+        preview = bool(config.get("preview")) and hasattr(backend.provider, "generate_preview")
+        generate = backend.provider.generate_preview if preview else backend.provider.generate_image
+        extra = {"negative_prompt": negative_prompt} if negative_prompt else {}
+        print(f"[ImageRouter] {tier} {size} -> {backend.name}")
+        priority = render_priority(PRIORITY_BACKGROUND) if config.get("background") else nullcontext()
+        with priority, self.track(backend.provider, size, preview) as obs:
+            image = generate(prompt=prompt, size=size, **extra)
+            obs.ok = image is not None
+        return image
+
+    def generate_preview(
+        self,
+        prompt: str,
+        size: str = "512x512",
+        negative_prompt: Optional[str] = None
+    ) -> Optional[Image.Image]:
+        """Previa con el tier 'preview'"""
+        return self.generate_image(prompt, size=size, negative_prompt=negative_prompt, tier="preview")
+
+    @property
+    def generate_variations(self):
+        """img2img del backend de más calidad que lo soporte (None si ninguno)"""
+        for backend in sorted(self.backends, key=lambda b: -b.quality):
+            method = getattr(backend.provider, "generate_variations", None)
+            if callable(method):
+                return method
+        return None
+
+    def make_transparent_background(self, image: Image.Image) -> Image.Image:
+        return remove_border_background(image, getattr(settings, 'MATTING_TOLERANCE', 24))
+
+    # ---------- carga ----------
+    def _model_backends(self) -> List[RouteBackend]:
+        """Backends con modelo local, del más rápido al más lento"""
+        local = [b for b in self.backends if self._load_status(b) is not None]
+        return sorted(local, key=lambda b: self.estimate(b, False, REFERENCE_PIXELS) - b.load_seconds)
+
+    def preload(self) -> Optional[Future]:
+        """
+        Precarga los modelos locales de uno en uno, del más rápido al más lento
+        (las previas pueden usar el pequeño antes de que termine el grande)
+
+        Returns:
+            Future de la carga del primero, o None si no hay modelos locales
+        """
+        pending = [b for b in self._model_backends() if b.preload]
+        if not pending:
+            return None
+
+        def chain(index: int) -> Future:
+            print(f"[ImageRouter] Precargando {pending[index].name} en segundo plano...")
+            future = type(pending[index].provider).preload()
+            if index + 1 < len(pending):
+                future.add_done_callback(lambda _: chain(index + 1))
+            return future
+
+        return chain(0)
+
+    def pipeline_status(self) -> Dict[str, Any]:
+        """Estado de carga del primer modelo que se precarga (el que habilita las previas)"""
+        local = self._model_backends()
+        if not local:
+            return {"state": "ready", "stage": "", "progress": 1.0, "seconds": None, "error": None}
+        return dict(self._load_status(local[0]))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Estimaciones actuales por backend
+
+        Returns:
+            dict: {nombre: quality, seconds (final a 512x512), cold, samples}
+        """
+        return {
+            b.name: {
+                "quality": b.quality,
+                "seconds": self.estimate(b, False, REFERENCE_PIXELS),
+                "cold": self._is_cold(b),
+                "samples": b.estimator.samples,
+            }
+            for b in self.backends
+        }
+
+
+_router: Optional[ImageRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_image_router() -> Optional[ImageRouter]:
+    """Obtiene el enrutador global (lazy initialization), o None si no hay backends configurados"""
+    global _router
+    specs = getattr(settings, 'IMAGE_ROUTER_BACKENDS', None)
+    if not specs:
+        return None
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ImageRouter([build_backend(spec) for spec in specs],
+                                      getattr(settings, 'IMAGE_ROUTER_TIERS', None))
+    return _router
@@ -0,0 +1,272 @@
+"""
+Cache por similitud para la narrativa del Story Weaver.
+
+Cada salida (introducción, beat, narrativa de combate) se guarda junto con un
+texto de rasgos (arma, descripción, stats por tramos, tipo de evento...).
+Los rasgos se vectorizan con n-gramas de caracteres (feature hashing, sin
+dependencias externas) y se comparan por coseno con NumPy. Si una petición
+nueva supera el umbral de similitud se devuelve la narrativa guardada al
+instante, sustituyendo los nombres de los personajes.
+
+Persistencia: un JSONL (entradas) + un .npy (vectores) en settings.NARRATIVE_CACHE_DIR.
+"""
+
+import json
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.Agent.Utils.function_utils import normalize_name
+from app.Agent.Utils.path_utils import get_project_root, ensure_directory
+from app.domain.character import Character
+from settings.settings import settings
+
+_NAME_TOKEN = "{{{role}}}"  # se rellena como {player}, {enemy}
+_WORD_RX = re.compile(r"\w+", re.UNICODE)
+
+
+def _stat_bucket(value: int) -> str:
+    """Agrupa stats 1-10 en tramos para que stats parecidos coincidan."""
+    v = int(value or 0)
+    return "bajo" if v <= 3 else ("medio" if v <= 6 else "alto")
+
+
+def character_features(character: Optional[Character], role: str) -> str:
+    """
+    Texto de rasgos de un personaje SIN su nombre (el nombre se sustituye al servir).
+
+    Args:
+        character: Personaje (o None)
+        role: Prefijo del rol ('player' o 'enemy')
+
+    Returns:
+        str: Rasgos normalizados
+    """
+    if character is None:
+        return f"{role} generico"
+    return (
+        f"{role} arma {character.weapon} "
+        f"{role} dano {_stat_bucket(character.damage)} "
+        f"{role} resistencia {_stat_bucket(character.resistence)} "
+        f"{role} {character.description}"
+    )
+
+
+class NarrativeCache:
+    """Índice de recuperación por similitud sobre narrativas ya generadas."""
+
+    def __init__(self, cache_dir: Path, dims: int = 256, ngram: int = 3):
+        """
+        Args:
+            cache_dir: Directorio de persistencia
+            dims: Dimensiones del vector (feature hashing)
+            ngram: Tamaño de los n-gramas de caracteres
+        """
+        self.cache_dir = cache_dir
+        self.dims = dims
+        self.ngram = ngram
+        self._entries_path = cache_dir / "narrative_cache.jsonl"
+        self._vectors_path = cache_dir / "narrative_cache.npy"
+        self._entries: List[Dict[str, Any]] = []
+        # Índice por tipo: filas de _entries y matriz de vectores de ese tipo
+        # (solo se compara con narrativas del mismo evento). La matriz tiene
+        # capacidad de sobra que crece al doble: solo sus len(filas) primeras son válidas
+        self._rows_by_kind: Dict[str, List[int]] = {}
+        self._matrix_by_kind: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._unsaved = 0
+
+    # ---------- vectorización ----------
+    def vectorize(self, text: str) -> np.ndarray:
+        """
+        Vector L2-normalizado de n-gramas de caracteres (hashing estable con crc32).
+
+        Args:
+            text: Texto de rasgos
+
+        Returns:
+            np.ndarray: Vector float32 de tamaño dims
+        """
+        vec = np.zeros(self.dims, dtype=np.float32)
+        n = self.ngram
+        for word in _WORD_RX.findall(normalize_name(text)):
+            padded = f" {word} "
+            grams = [padded[i:i + n] for i in range(max(1, len(padded) - n + 1))]
+            for g in grams:
+                h = zlib.crc32(g.encode("utf-8"))
+                # El bit alto decide el signo para compensar colisiones
+                vec[h % self.dims] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    # ---------- persistencia ----------
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self._entries_path.exists():
+            return
+        try:
+            with open(self._entries_path, "r", encoding="utf-8") as f:
+                self._entries = [json.loads(line) for line in f if line.strip()]
+        except Exception as e:
+            print(f"[NarrativeCache] ⚠️ No se pudo leer la cache: {e}")
+            self._entries = []
+            return
+        if not self._entries:
+            # JSONL vacío o solo con líneas en blanco: nada que indexar
+            return
+
+        vectors = None
+        if self._vectors_path.exists():
+            try:
+                vectors = np.load(self._vectors_path)
+            except Exception:
+                vectors = None
+        done = 0 if vectors is None or vectors.shape[1] != self.dims else min(len(vectors), len(self._entries))
+        # Vectorizar solo las entradas añadidas desde el último guardado
+        extra = [self.vectorize(e["features"]) for e in self._entries[done:]]
+        parts = [vectors[:done].astype(np.float32)] if done else []
+        if extra:
+            parts.append(np.stack(extra))
+        all_vectors = np.concatenate(parts)
+        for row, entry in enumerate(self._entries):
+            self._rows_by_kind.setdefault(entry["kind"], []).append(row)
+        for kind, rows in self._rows_by_kind.items():
+            self._matrix_by_kind[kind] = all_vectors[rows]
+        print(f"[NarrativeCache] {len(self._entries)} narrativas cargadas")
+
+    def save(self):
+        """Guarda la matriz de vectores (las entradas se escriben al añadirlas)."""
+        with self._lock:
+            if not self._entries:
+                return
+            ensure_directory(self.cache_dir)
+            all_vectors = np.zeros((len(self._entries), self.dims), dtype=np.float32)
+            for kind, rows in self._rows_by_kind.items():
+                all_vectors[rows] = self._matrix_by_kind[kind][:len(rows)]
+            np.save(self._vectors_path, all_vectors)
+            self._unsaved = 0
+
+    # ---------- API ----------
+    def lookup(self, kind: str, features: str, names: Dict[str, str], threshold: float) -> Optional[Any]:
+        """
+        Busca una narrativa guardada suficientemente parecida.
+
+        Args:
+            kind: Tipo de narrativa (intro, combat, beat:<evento>)
+            features: Texto de rasgos de la petición
+            names: {rol: nombre} para rellenar los huecos de nombre
+            threshold: Similitud coseno mínima (0-1)
+
+        Returns:
+            Narrativa con los nombres sustituidos, o None si no hay coincidencia
+        """
+        with self._lock:
+            self._ensure_loaded()
+            rows = self._rows_by_kind.get(kind)
+            if not rows:
+                return None
+            query = self.vectorize(features)
+            scores = self._matrix_by_kind[kind][:len(rows)] @ query
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < threshold:
+                return None
+            entry = self._entries[rows[best]]
+        print(f"[NarrativeCache] hit {kind} (similitud {score:.3f})")
+        return _fill_names(entry["output"], names)
+
+    def add(self, kind: str, features: str, names: Dict[str, str], output: Any):
+        """
+        Guarda una narrativa generada (con los nombres convertidos en huecos).
+
+        Args:
+            kind: Tipo de narrativa
+            features: Texto de rasgos de la petición
+            names: {rol: nombre} a sustituir por huecos
+            output: Narrativa (str o dict de str)
+        """
+        entry = {"kind": kind, "features": features, "output": _strip_names(output, names)}
+        vec = self.vectorize(features)
+        with self._lock:
+            self._ensure_loaded()
+            row = len(self._entries)
+            self._entries.append(entry)
+            rows = self._rows_by_kind.setdefault(kind, [])
+            matrix = self._matrix_by_kind.get(kind)
+            used = len(rows)
+            if matrix is None or used == len(matrix):
+                # Crecer al doble: añadir es O(1) amortizado (un vstack por alta sería O(n²))
+                grown = np.zeros((max(16, used * 2), self.dims), dtype=np.float32)
+                if used:
+                    grown[:used] = matrix[:used]
+                self._matrix_by_kind[kind] = matrix = grown
+            matrix[used] = vec
+            rows.append(row)
+            try:
+                ensure_directory(self.cache_dir)
+                with open(self._entries_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"[NarrativeCache] ⚠️ No se pudo guardar la entrada: {e}")
+            self._unsaved += 1
+            flush = self._unsaved >= 25
+        if flush:
+            self.save()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+
+# ---------------- huecos de nombre ----------------
+def _map_strings(value: Any, fn) -> Any:
+    if isinstance(value, str):
+        return fn(value)
+    if isinstance(value, dict):
+        return {k: _map_strings(v, fn) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_map_strings(v, fn) for v in value]
+    return value
+
+
+def _strip_names(output: Any, names: Dict[str, str]) -> Any:
+    def strip(text: str) -> str:
+        # Nombres más largos primero para no romper nombres compuestos
+        for role, name in sorted(names.items(), key=lambda kv: -len(kv[1] or "")):
+            if name:
+                text = re.sub(rf"(?<!\w){re.escape(name)}(?!\w)", _NAME_TOKEN.format(role=role), text, flags=re.I)
+        return text
+    return _map_strings(output, strip)
+
+
+def _fill_names(output: Any, names: Dict[str, str]) -> Any:
+    def fill(text: str) -> str:
+        for role, name in names.items():
+            text = text.replace(_NAME_TOKEN.format(role=role), name or "el héroe")
+        return text
+    return _map_strings(output, fill)
+
+
+# ---------------- instancia global ----------------
+_cache: Optional[NarrativeCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_narrative_cache() -> NarrativeCache:
+    """Obtiene la cache global (lazy initialization)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                base = Path(getattr(settings, 'NARRATIVE_CACHE_DIR', None) or "cache/narrative")
+                cache_dir = base if base.is_absolute() else (get_project_root() / base)
+                _cache = NarrativeCache(cache_dir)
+    return _cache
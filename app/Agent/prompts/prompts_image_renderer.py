@@ -8,7 +8,7 @@ class PromptsImageRenderer:
     """Prompts especializados para generación de imágenes con IA"""
     
     @staticmethod
-    def portrait_prompt(spec_prompt: str, spec_style: str) -> str:
+    def portrait_prompt(spec_prompt: str, spec_style: str, tokenizer=None) -> str:
         """
         Construye el prompt final para generar un retrato con Stable Diffusion
         (Máximo 77 tokens para CLIP - muy optimizado)
@@ -16,11 +16,27 @@ class PromptsImageRenderer:
         Args:
             spec_prompt: Prompt del brief generado por el director de arte
             spec_style: Estilo del brief generado por el director de arte
+            tokenizer: Tokenizador CLIP (ver Utils/clip_tokens.py); si se da, el brief
+                       se recorta contando tokens reales en lugar de caracteres
         
         Returns:
             str: Prompt completo para Stable Diffusion (máximo 77 tokens)
         """
-        # Acortar el prompt del brief más agresivamente (máximo ~100 caracteres = ~15-20 tokens)
+        # Acortar el estilo (máximo 2-3 palabras clave)
+        style_words = spec_style.split()[:3]  # Máximo 3 palabras
+        style_short = ' '.join(style_words) if style_words else ''
+        
+        # Keywords específicas para pixel art que funcionan mejor con SD 2.1 (máximo 20 tokens)
+        suffix = "8-bit pixel art, retro game sprite, fighting game character, transparent background, pixelated, clean lines"
+        tail = f", {style_short}. {suffix}" if style_short else f". {suffix}"
+        
+        if tokenizer is not None:
+            # El brief ocupa exactamente lo que dejan libre el estilo y el sufijo
+            from app.Agent.Utils.clip_tokens import CLIP_USABLE_TOKENS, count_tokens, truncate_to_tokens
+            budget = CLIP_USABLE_TOKENS - count_tokens(tail, tokenizer)
+            return f"{truncate_to_tokens(spec_prompt, budget, tokenizer)}{tail}"
+        
+        # Sin tokenizador: acortar el brief por caracteres (máximo ~100 caracteres = ~15-20 tokens)
         max_brief_length = 100
         if len(spec_prompt) > max_brief_length:
             # Intentar cortar en un punto lógico (después de un punto, coma, o espacio)
@@ -36,21 +52,8 @@ class PromptsImageRenderer:
             else:
                 spec_prompt = truncated
         
-        # Acortar el estilo también (máximo 2-3 palabras clave)
-        style_words = spec_style.split()[:3]  # Máximo 3 palabras
-        style_short = ' '.join(style_words) if style_words else ''
-        
-        # Prompt optimizado para pixel art: brief + estilo corto + sufijo mejorado
-        # Keywords específicas para pixel art que funcionan mejor con SD 2.1 (máximo 20 tokens)
-        suffix = "8-bit pixel art, retro game sprite, fighting game character, transparent background, pixelated, clean lines"
-        
-        # Construir prompt final (máximo ~70 tokens)
-        if style_short:
-            prompt = f"{spec_prompt}, {style_short}. {suffix}"
-        else:
-            prompt = f"{spec_prompt}. {suffix}"
-        
-        return prompt
+        # Prompt optimizado para pixel art: brief + estilo corto + sufijo (máximo ~70 tokens)
+        return f"{spec_prompt}{tail}"
     
     @staticmethod
     def background_prompt(background_brief: dict) -> str:
@@ -0,0 +1,292 @@
+"""
+Daemon local de render para Stable Diffusion.
+
+Mantiene el pipeline cargado en memoria y atiende peticiones por un socket
+Unix, de modo que varios procesos (juego, herramientas, tests) comparten un
+único modelo ya caliente en lugar de cargar varios GB en cada arranque.
+Las imágenes se devuelven por memoria compartida (sin PNG intermedio).
+
+Arranque:
+    python -m app.Agent.render_daemon
+
+Protocolo (una línea JSON por mensaje):
+    cliente -> {"op": "generate" | "preview" | "ping", "prompt", "size", "negative_prompt", "priority"}
+    daemon  -> {"ok": true, "shm": nombre, "pid", "mode": "RGB", "width": w, "height": h, "nbytes"}
+    cliente -> {"op": "done"}   (el daemon libera la memoria compartida)
+"""
+
+import os
+import json
+import socket
+import tempfile
+import argparse
+import traceback
+import socketserver
+from pathlib import Path
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from settings.settings import settings
+from app.Agent.Utils.render_queue import render_priority, current_priority, PRIORITY_INTERACTIVE
+
+
+def get_socket_path() -> Path:
+    """Ruta del socket Unix del daemon (settings.RENDER_DAEMON_SOCKET o /tmp)"""
+    configured = getattr(settings, 'RENDER_DAEMON_SOCKET', None)
+    return Path(configured) if configured else Path(tempfile.gettempdir()) / "agentfight_render.sock"
+
+
+def _send(conn_file, message: Dict[str, Any]):
+    conn_file.write((json.dumps(message) + "\n").encode("utf-8"))
+    conn_file.flush()
+
+
+def _recv(conn_file) -> Optional[Dict[str, Any]]:
+    line = conn_file.readline()
+    return json.loads(line) if line else None
+
+
+def _attach_shm(name: str, owner_pid: Optional[int]) -> shared_memory.SharedMemory:
+    """Abre un bloque de memoria compartida sin que el resource_tracker de este proceso lo borre al salir."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if owner_pid == os.getpid():
+            # Mismo proceso (tests): el registro es el del propio daemon, que lo libera
+            return shm
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+# ============= SERVIDOR =============
+class _RenderHandler(socketserver.StreamRequestHandler):
+    """Atiende una petición por conexión (cada conexión en su propio hilo)"""
+
+    def handle(self):
+        daemon: "RenderDaemon" = self.server.daemon_ref
+        try:
+            request = _recv(self.rfile)
+        except Exception as e:
+            _send(self.wfile, {"ok": False, "error": f"petición inválida: {e}"})
+            return
+        if not request:
+            return
+
+        op = request.get("op")
+        if op == "ping":
+            _send(self.wfile, {"ok": True, "pid": os.getpid(), "model": getattr(daemon.provider, 'model_name', None)})
+            return
+        if op not in ("generate", "preview"):
+            _send(self.wfile, {"ok": False, "error": f"operación desconocida: {op}"})
+            return
+
+        try:
+            # La prioridad del cliente se respeta en la cola de render del daemon
+            with render_priority(request.get("priority", PRIORITY_INTERACTIVE)):
+                image = daemon.render(op, request.get("prompt", ""), request.get("size", "512x512"),
+                                      request.get("negative_prompt"))
+        except Exception as e:
+            traceback.print_exc()
+            image = None
+            error = str(e)
+        else:
+            error = "el proveedor no devolvió imagen"
+        if image is None:
+            _send(self.wfile, {"ok": False, "error": error})
+            return
+
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        data = image.tobytes()
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[:len(data)] = data
+            _send(self.wfile, {
+                "ok": True, "shm": shm.name, "pid": os.getpid(), "mode": image.mode,
+                "width": image.width, "height": image.height, "nbytes": len(data),
+            })
+            # Esperar a que el cliente copie la imagen antes de liberar el bloque
+            _recv(self.rfile)
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class RenderDaemon:
+    """Servidor que mantiene el proveedor de imágenes residente"""
+
+    def __init__(self, socket_path: Optional[Path] = None, provider=None):
+        """
+        Args:
+            socket_path: Ruta del socket Unix (None = get_socket_path())
+            provider: Proveedor a servir (None = StableDiffusionProvider)
+        """
+        self.socket_path = Path(socket_path or get_socket_path())
+        if provider is None:
+            from app.Agent.image_providers import StableDiffusionProvider
+            provider = StableDiffusionProvider()
+        self.provider = provider
+        self._server: Optional[_Server] = None
+
+    def render(self, op: str, prompt: str, size: str, negative_prompt: Optional[str]) -> Optional[Image.Image]:
+        """Genera la imagen con el proveedor residente (las llamadas concurrentes se agrupan en la cola de render)"""
+        generate = getattr(self.provider, "generate_preview", None) if op == "preview" else None
+        generate = generate or self.provider.generate_image
+        if negative_prompt is not None:
+            return generate(prompt=prompt, size=size, negative_prompt=negative_prompt)
+        return generate(prompt=prompt, size=size)
+
+    def start(self, warm: bool = True):
+        """
+        Abre el socket (y carga el pipeline si warm=True).
+
+        Raises:
+            RuntimeError: si ya hay otro daemon escuchando en el mismo socket
+        """
+        if self.socket_path.exists():
+            if RenderDaemonProvider.ping(self.socket_path, timeout=1.0):
+                raise RuntimeError(f"Ya hay un daemon de render en {self.socket_path}")
+            # Socket huérfano de una ejecución anterior
+            self.socket_path.unlink()
+        # El daemon existe para tener el modelo cargado: nunca se descarga por inactividad
+        if hasattr(type(self.provider), "pin"):
+            type(self.provider).pin()
+        if warm and hasattr(self.provider, "_get_pipeline"):
+            print("[RenderDaemon] Cargando pipeline...")
+            self.provider._get_pipeline()
+        self._server = _Server(str(self.socket_path), _RenderHandler)
+        self._server.daemon_ref = self
+        print(f"[RenderDaemon] ✅ Escuchando en {self.socket_path}")
+
+    def serve_forever(self):
+        """Atiende peticiones hasta shutdown()"""
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Detiene serve_forever (desde otro hilo)"""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def close(self):
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+        self.socket_path.unlink(missing_ok=True)
+
+
+# ============= CLIENTE =============
+class RenderDaemonProvider:
+    """
+    Proveedor de imágenes que delega en el daemon de render.
+    Misma interfaz que StableDiffusionProvider (generate_image / generate_preview).
+    """
+
+    def __init__(self, socket_path: Optional[Path] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            socket_path: Ruta del socket Unix (None = get_socket_path())
+            timeout: Segundos máximos por imagen (None = sin límite)
+        """
+        self.socket_path = Path(socket_path or get_socket_path())
+        self.timeout = timeout
+
+    @staticmethod
+    def ping(socket_path: Optional[Path] = None, timeout: float = 0.5) -> Optional[Dict[str, Any]]:
+        """
+        Comprueba si el daemon responde.
+
+        Returns:
+            dict con pid/modelo del daemon, o None si no está disponible
+        """
+        path = Path(socket_path or get_socket_path())
+        if not hasattr(socket, "AF_UNIX") or not path.exists():
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(timeout)
+                sock.connect(str(path))
+                with sock.makefile("rwb") as f:
+                    _send(f, {"op": "ping"})
+                    reply = _recv(f)
+            return reply if reply and reply.get("ok") else None
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def connect(cls, socket_path: Optional[Path] = None) -> Optional["RenderDaemonProvider"]:
+        """Devuelve un cliente si el daemon está en marcha, o None"""
+        info = cls.ping(socket_path)
+        if info is None:
+            return None
+        print(f"[RenderDaemon] Usando daemon de render (pid {info.get('pid')}, modelo {info.get('model')})")
+        return cls(socket_path)
+
+    def _request(self, op: str, prompt: str, size: str, negative_prompt: Optional[str]) -> Optional[Image.Image]:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(str(self.socket_path))
+                with sock.makefile("rwb") as f:
+                    _send(f, {"op": op, "prompt": prompt, "size": size, "negative_prompt": negative_prompt,
+                              "priority": current_priority()})
+                    reply = _recv(f)
+                    if not reply or not reply.get("ok"):
+                        print(f"[RenderDaemon] Error generando imagen: {(reply or {}).get('error', 'sin respuesta')}")
+                        return None
+                    shm = _attach_shm(reply["shm"], reply.get("pid"))
+                    try:
+                        image = Image.frombytes(
+                            reply["mode"], (reply["width"], reply["height"]),
+                            bytes(shm.buf[:reply["nbytes"]]),
+                        )
+                    finally:
+                        shm.close()
+                    _send(f, {"op": "done"})
+                    return image
+        except (OSError, ValueError) as e:
+            print(f"[RenderDaemon] Error de comunicación con el daemon: {e}")
+            return None
+
+    def generate_image(self, prompt: str, size: str = "512x512", negative_prompt: Optional[str] = None) -> Optional[Image.Image]:
+        """Genera una imagen en el daemon"""
+        return self._request("generate", prompt, size, negative_prompt)
+
+    def generate_preview(self, prompt: str, size: str = "512x512", negative_prompt: Optional[str] = None) -> Optional[Image.Image]:
+        """Genera una vista previa barata en el daemon"""
+        return self._request("preview", prompt, size, negative_prompt)
+
+    def make_transparent_background(self, image: Image.Image) -> Image.Image:
+        """Misma post-procesado que StableDiffusionProvider (se hace en el cliente)"""
+        from app.Agent.image_providers import StableDiffusionProvider
+        return StableDiffusionProvider.make_transparent_background(self, image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon local de render (Stable Diffusion residente)")
+    parser.add_argument("--socket", default=None, help="Ruta del socket Unix")
+    args = parser.parse_args()
+
+    daemon = RenderDaemon(Path(args.socket) if args.socket else None)
+    daemon.start()
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[RenderDaemon] Detenido")
+
+
+if __name__ == "__main__":
+    main()
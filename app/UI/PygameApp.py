@@ -2,6 +2,7 @@ import pygame as pg
 from settings.settings  import settings
 from app.UI.scenes      import make_scene
 from app.Agent.orchestrator import get_orchestrator 
+from app.Agent.image_providers import preload_image_pipeline, get_pipeline_status
 
 class PygameApp:
     def __init__(self):
@@ -14,6 +15,14 @@ class PygameApp:
         
         # Inicializar el orchestrator
         self.orchestrator = get_orchestrator(self)
+
+        # Precargar el modelo de imágenes mientras el jugador está en el menú
+        self.pipeline_future = None
+        if getattr(settings, 'SD_PRELOAD', True) and not settings.use_existing_assets:
+            try:
+                self.pipeline_future = preload_image_pipeline()
+            except Exception as e:
+                print(f"[PygameApp] ⚠️ No se pudo precargar el modelo de imágenes: {e}")
  
         self.set_scene(settings.UI_first_selected_menu)
 
@@ -29,6 +38,10 @@ class PygameApp:
         if hasattr(self.scene, "enter"):
             self.scene.enter()
 
+    def pipeline_status(self) -> dict | None:
+        """Estado de la precarga del modelo de imágenes (None si no se precarga)"""
+        return get_pipeline_status() if self.pipeline_future is not None else None
+
     def run(self):
         while self.running:
             # Controlar FPS y calcular delta time
@@ -1,14 +1,59 @@
 import os, random
 import pygame as pg
+from app.Agent.Utils.image_handoff import get_rendered
+from app.Agent.Utils.image_postprocess import read_crop_info
+from app.Agent.Utils.asset_bake import get_asset_baker, BACKGROUND_SMOOTH
 
 _BG_CACHE = {}
 
+def surface_from_rendered(rendered) -> pg.Surface:
+    """Superficie directa desde los píxeles RGBA publicados en memoria (sin PNG de por medio)."""
+    return pg.image.frombuffer(rendered.rgba, rendered.size, "RGBA")
+
+def _surface_from_baked(baked, alpha: bool):
+    with baked:
+        tmp = pg.image.frombuffer(baked.pixels, baked.size, "RGBA")
+        img = tmp.convert_alpha() if alpha else tmp.convert()
+        del tmp  # libera el buffer del mmap antes de cerrarlo
+    return img, baked.crop_info
+
+def load_image(path: str, size: tuple[int,int] | None = None, alpha: bool = True, smooth: bool = True):
+    """
+    Carga una imagen sin decodificar PNG si se puede: primero de memoria
+    (recién generada, ver image_handoff), después el derivado ya escalado a
+    size (horneado al guardar, ver asset_bake) o el blob horneado con mmap y,
+    si no, con pg.image.load (el blob se hornea en segundo plano para la
+    próxima vez: la escena no espera a escribirlo).
+    La imagen en memoria va primero: al regenerar, el PNG y los derivados
+    antiguos siguen en disco (y válidos) hasta que termina el write-behind.
+    Con size, una imagen recortada se recoloca en su lienzo (como scale_cropped)
+    y se devuelve sin crop_info. smooth elige LANCZOS/smoothscale o nearest.
+    Devuelve (superficie convertida y escalada, crop_info).
+    """
+    baker = get_asset_baker()
+    rendered = get_rendered(path)
+    if rendered is not None:
+        img, crop_info = surface_from_rendered(rendered), rendered.crop_info
+    else:
+        baked = baker.open(path, size, smooth) if baker is not None else None
+        if baked is not None:
+            return _surface_from_baked(baked, alpha)
+        if baker is not None:
+            baker.bake_later(path, size, smooth)
+        img, crop_info = pg.image.load(str(path)), read_crop_info(path)
+    img = img.convert_alpha() if alpha else img.convert()
+    if size is not None and (crop_info or img.get_size() != tuple(size)):
+        img, crop_info = scale_cropped(img, crop_info, size, smooth), None
+    return img, crop_info
+
+def load_generated(path: str, alpha: bool = True):
+    """Carga una imagen generada a su tamaño original. Devuelve (superficie, crop_info)."""
+    return load_image(path, None, alpha)
+
 def load_background(path: str, size: tuple[int,int], alpha: bool = False):
-    """Carga y escala; si falla, devuelve None."""
+    """Carga y escala (nearest, pixel art nítido como antes); si falla, devuelve None."""
     try:
-        img = pg.image.load(path)
-        img = img.convert_alpha() if alpha else img.convert()
-        return pg.transform.scale(img, size)
+        return load_image(path, size, alpha, smooth=BACKGROUND_SMOOTH)[0]
     except Exception:
         return None
 
@@ -38,6 +83,25 @@ def pick_random_bg(directory: str, size: tuple[int,int], alpha: bool = False):
     except Exception:
         return None
 
+def scale_cropped(img: pg.Surface, crop_info, size: tuple[int,int], smooth: bool = True) -> pg.Surface:
+    """
+    Escala una imagen recortada (ver image_postprocess.autocrop) como si fuera
+    su lienzo original: el contenido queda en su sitio y el resto transparente.
+    crop_info = (ox, oy, ancho_original, alto_original) o None.
+    smooth=False escala con vecino más próximo (pixel art nítido).
+    """
+    scale = pg.transform.smoothscale if smooth else pg.transform.scale
+    if not crop_info:
+        return scale(img, size)
+    ox, oy, full_w, full_h = crop_info
+    sx, sy = size[0] / full_w, size[1] / full_h
+    content = scale(
+        img, (max(1, round(img.get_width() * sx)), max(1, round(img.get_height() * sy)))
+    )
+    canvas = pg.Surface(size, pg.SRCALPHA)
+    canvas.blit(content, (round(ox * sx), round(oy * sy)))
+    return canvas
+
 def draw_photo_frame(screen: pg.Surface, rect: pg.Rect, color=(200,200,200)):
     """Marco simple para ‘slot’ de candidato."""
     pg.draw.rect(screen, color, rect, width=2, border_radius=8)
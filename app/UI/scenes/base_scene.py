@@ -1,7 +1,15 @@
+import time, threading
 import pygame as pg
 from settings.settings import settings
 
 class BaseScene:
+    # Plazo (segundos) para el contenido de IA. Al vencer, la escena muestra su
+    # fallback local y la generación sigue; si termina con la escena aún en
+    # pantalla, el resultado real sustituye al fallback (late binding).
+    # Se puede sobrescribir en settings.json -> UI.ai_deadlines[AI_DEADLINE_KEY].
+    AI_DEADLINE_KEY: str | None = None
+    AI_DEADLINE: float | None = None
+
     def __init__(self, app):
         self.app = app
         # fuentes “preset”
@@ -9,9 +17,77 @@ class BaseScene:
         self.big  = pg.font.SysFont(settings.FONT_NAME, 28, bold=True)
         # ✅ caché para fuentes de tamaño/estilo variables
         self._font_cache: dict[tuple[int, bool], pg.font.Font] = {}
+        # estado del plazo de IA
+        self._active          : bool = False
+        self._fallback_active : bool = False
+        self._ai_deadline_at  : float | None = None
+        self._ai_lock = threading.Lock()
 
     def enter(self): ...
-    def exit(self): ...
+    def exit(self):
+        self._active = False
+
+    # ---------- plazo de contenido IA ----------
+    def _ai_deadline_seconds(self) -> float | None:
+        deadlines = getattr(settings, "AI_DEADLINES", {}) or {}
+        return deadlines.get(self.AI_DEADLINE_KEY, self.AI_DEADLINE)
+
+    def _start_ai_deadline(self):
+        """Llamar en enter(): arranca el reloj del plazo de IA."""
+        self._active = True
+        self._fallback_active = False
+        seconds = self._ai_deadline_seconds()
+        self._ai_deadline_at = (time.monotonic() + seconds) if seconds else None
+
+    def _ai_deadline_expired(self) -> bool:
+        # Leer una sola vez: el hilo de generación puede anularlo entre medias
+        deadline = self._ai_deadline_at
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _apply_fallback_on_deadline(self, apply_fallback) -> bool:
+        """
+        Llamar en update(): si el plazo venció y aún no hay contenido,
+        aplica el fallback una sola vez. Devuelve True si lo aplicó.
+        """
+        if not self._ai_deadline_expired():
+            return False
+        with self._ai_lock:
+            # El resultado real pudo llegar justo antes de tomar el lock
+            if not self._ai_deadline_expired():
+                return False
+            self._ai_deadline_at = None
+            self._fallback_active = True
+            apply_fallback()
+        return True
+
+    def _apply_fallback_now(self, apply_fallback):
+        """Fallback inmediato (p.ej. el jugador salta la carga); la generación sigue."""
+        with self._ai_lock:
+            self._ai_deadline_at = None
+            self._fallback_active = True
+            apply_fallback()
+
+    def _publish_ai_result(self, apply_result) -> bool:
+        """
+        Llamar desde el hilo de generación con el resultado real.
+        Se aplica si la escena sigue en pantalla; devuelve False si se descartó.
+        """
+        with self._ai_lock:
+            if not self._active:
+                return False
+            self._ai_deadline_at = None
+            self._fallback_active = False
+            apply_result()
+            return True
+    def _model_status_text(self) -> str | None:
+        """Texto de la precarga del modelo de imágenes, o None si ya está listo (o no se precarga)."""
+        status = self.app.pipeline_status() if hasattr(self.app, "pipeline_status") else None
+        if not status or status["state"] in ("idle", "ready"):
+            return None
+        if status["state"] == "error":
+            return "Modelo de imágenes: error al cargar"
+        return f"Modelo de imágenes: {status['stage']} ({int(status['progress'] * 100)}%)"
+
     def handle_event(self, e): ...
     def update(self, dt): ...
     def draw(self, screen): ...
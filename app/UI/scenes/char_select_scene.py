@@ -5,7 +5,8 @@ import pygame as pg
 from app.UI.scenes.base_scene     import BaseScene
 from app.domain.character         import Character
 from settings.settings            import settings
-from app.UI.pg_assets             import load_background_cached, draw_background, draw_photo_frame
+from app.UI.pg_assets             import load_background_cached, draw_background, draw_photo_frame, load_image
+from app.UI.ui_layout             import char_select_frames, PORTRAIT_FRAME_PAD
 from app.Agent.agent_art_director import create_portrait_briefs
 from app.Agent.image_renderer     import render_portraits
  
@@ -51,26 +52,34 @@ def _slugify(s: str) -> str:
 class CharSelectScene(BaseScene):
     """
     - Carga candidatos y lanza la generación de retratos en background.
-    - Cada marco intenta cargar su PNG si ya existe en disco (no esperamos a todos).
+    - Los retratos llegan por _offer_portrait en cuanto se generan (píxeles en
+      memoria, ver image_handoff); mientras se generan no se sondea el disco.
+    - Retratos progresivos: primero llega una previa barata y después la final;
+      _img_cache guarda (versión, superficie) y una versión mayor sustituye a la anterior.
     - Navegación: ←/→ o A/D; selección con ENTER/SPACE o teclas 1..4.
+    - Si la IA supera AI_DEADLINE, se muestran candidatos locales y se
+      sustituyen por los de IA cuando terminan (si seguimos en la escena).
     """
+    AI_DEADLINE_KEY = "char_select"
+    AI_DEADLINE     = 6.0
+
     def __init__(self, app):
         super().__init__(app)
         self.bg = load_background_cached(settings.BG_SELECT, 
                                          (settings.WIDTH, settings.HEIGHT)) 
         self.candidates : list[Character] = []
-        self._img_cache : dict[str, pg.Surface | None] = {}
+        self._img_cache : dict[str, tuple[int, pg.Surface | None]] = {}
+        self._portrait_versions : dict[str, tuple[int, str]] = {}  # nombre -> (versión, ruta)
         self._thread    : threading.Thread | None = None
         self.generating : bool = False
         self.cursor     : int = 0
+        self._gen_id    : int = 0
+        self._pending_candidates : list[Character] = []
+        # Nombres cuyos retratos se están generando en esta generación (no se leen del disco)
+        self._rendering_names : set[str] = set()
 
-        # Marcos (4 slots)
-        margin_x    = 60
-        gap_x       = 40
-        frame_w     = (settings.WIDTH - margin_x*2 - gap_x*3) // 4
-        frame_h     = 190
-        y           = 140
-        self.frames = [pg.Rect(margin_x + i*(frame_w+gap_x), y, frame_w, frame_h) for i in range(4)]
+        # Marcos (4 slots); la geometría la comparte el horneado de derivados (ver ui_layout)
+        self.frames = [pg.Rect(*r) for r in char_select_frames(settings.WIDTH)]
 
         # Carpeta de retratos (ruta absoluta desde cwd)
         if settings.use_existing_assets or settings.use_local_characters_for_test:
@@ -133,8 +142,14 @@ class CharSelectScene(BaseScene):
 
         self.cursor     = 0
         self.candidates = []
+        self._pending_candidates = []
         self._img_cache.clear()
+        self._portrait_versions.clear()
+        self._rendering_names = set()
         self.generating = True
+        self._gen_id   += 1
+        gen_id          = self._gen_id
+        self._start_ai_deadline()
 
         def loader():
             # 1) Candidatos
@@ -166,6 +181,15 @@ class CharSelectScene(BaseScene):
                     slug = _slugify(ch.name)
                     ch.portrait = str(self.portrait_dir / f"{slug}.png")
 
+            # Los datos de texto ya están: si vence el plazo se muestran mientras llegan los retratos
+            self._pending_candidates = cand
+            published = False
+
+            def publish():
+                self.candidates = cand
+                self._img_cache.clear()
+                self.generating = False
+
             # 3) Generar imágenes ANTES de publicar candidatos (para que se usen las nuevas)
             if not settings.use_existing_assets:
                 try: 
@@ -174,7 +198,20 @@ class CharSelectScene(BaseScene):
                     from app.Agent.image_renderer import render_portraits, attach_portraits_to_characters
                     briefs = create_portrait_briefs(cand)
                     print(f"[CharSelectScene] Briefs creados: {len(briefs)} personajes")
-                    name_to_path = render_portraits(briefs, max_workers=3)
+
+                    def on_portrait(name: str, path: str, final: bool):
+                        # Previa = versión 1, final = versión 2 (la final sustituye a la previa)
+                        if gen_id == self._gen_id:
+                            self._offer_portrait(name, path, 2 if final else 1)
+
+                    if settings.PORTRAIT_PREVIEW_ENABLED and gen_id == self._gen_id:
+                        # Progresivo: publicar ya y dejar que los marcos se rellenen según lleguen las versiones
+                        published = self._publish_ai_result(publish)
+                    self._set_rendering(gen_id, {ch.name for ch in cand})
+                    try:
+                        name_to_path = render_portraits(briefs, on_update=on_portrait)
+                    finally:
+                        self._set_rendering(gen_id, set())
                     print(f"[CharSelectScene] Retratos generados: {len(name_to_path)} imágenes")
                     # Asociar los retratos generados a los personajes
                     if name_to_path:
@@ -204,13 +241,25 @@ class CharSelectScene(BaseScene):
                         ch.portrait = local_portraits[i % len(local_portraits)]
 
             # 4) Publicar candidatos DESPUÉS de generar imágenes (para que usen las nuevas)
-            self.candidates = cand 
+            #    Si ya se mostró el fallback, se sustituye solo si seguimos en esta escena
+            if gen_id != self._gen_id or published:
+                return
 
-            self.generating = False 
+            self._publish_ai_result(publish)
         
         self._thread = threading.Thread(target=loader, daemon=True)
         self._thread.start()
 
+    def update(self, dt):
+        if self.generating and not self.candidates:
+            self._apply_fallback_on_deadline(self._show_fallback_candidates)
+
+    def _show_fallback_candidates(self):
+        """Plazo vencido: candidatos de IA sin retrato (si ya existen) o candidatos locales."""
+        self.candidates = list(self._pending_candidates) or _fake_candidates(4)
+        self._img_cache.clear()
+        print(f"[CharSelectScene] Plazo de IA vencido, mostrando {len(self.candidates)} candidatos provisionales")
+
     def handle_event(self, e):
         if e.type == pg.KEYDOWN:
             if e.key in (pg.K_0, pg.K_ESCAPE):
@@ -305,41 +354,52 @@ class CharSelectScene(BaseScene):
             self.app.set_scene("show_principal_menu")
 
     # ---------------- draw helpers ----------------
+    def _offer_portrait(self, name: str, path: str, version: int):
+        """Registra una versión del retrato (desde el hilo de render); solo se aceptan versiones más nuevas."""
+        with self._ai_lock:
+            current = self._portrait_versions.get(name)
+            if current is None or version > current[0]:
+                self._portrait_versions[name] = (version, path)
+
+    def _set_rendering(self, gen_id: int, names: set[str]):
+        """Marca los candidatos en render; una generación ya sustituida no toca la actual."""
+        with self._ai_lock:
+            if gen_id == self._gen_id:
+                self._rendering_names = names
+
     def _portrait_surface(self, ch: Character, rect: pg.Rect) -> pg.Surface | None:
-        """Carga y cachea el retrato si el archivo YA existe. No dibuja aquí."""
-        if settings.use_existing_assets or settings.use_local_characters_for_test:
-            # En modo test, usar el path directo del character
+        """Crea y cachea la superficie del retrato (de memoria si acaba de generarse). No dibuja aquí."""
+        version, path = self._portrait_versions.get(ch.name, (0, None))
+        if path is None:
+            if ch.name in self._rendering_names:
+                # Su retrato llega por _offer_portrait: no sondear el disco mientras tanto
+                # (los candidatos locales del fallback conservan el suyo)
+                return None
+            # Modo test, candidatos provisionales o retrato ya asociado al personaje
             path = getattr(ch, "portrait", None)
-        else:
-            # En modo normal, construir path desde portrait_dir
-            slug = _slugify(ch.name)
-            path = str(self.portrait_dir / f"{slug}.png")
-        
         
         if not path:
             return None
-        key = path
+        key = ch.name
 
-        cached = self._img_cache.get(key)
-        if isinstance(cached, pg.Surface):
+        # Una versión nueva (p.ej. la final tras la previa) invalida la cacheada.
+        # Un intento fallido también queda cacheado para no reintentarlo en cada frame.
+        cached_version, cached = self._img_cache.get(key, (-1, None))
+        if cached_version >= version and key in self._img_cache:
             return cached
 
-        p = Path(path)
-        if not p.exists():
-            return None
-
         try:
-            img = pg.image.load(str(p)).convert_alpha()
-            pad = 12
-            w = rect.width - pad*2
-            h = rect.height - pad*2
-            img = pg.transform.smoothscale(img, (w, h))
-            self._img_cache[key] = img
+            # Hueco del marco (= ui_layout.portrait_slot_size): hay un derivado precalculado
+            # a este tamaño (ver asset_bake.derivative_sizes) y los recortados ya vienen recolocados
+            size = (rect.width - PORTRAIT_FRAME_PAD*2, rect.height - PORTRAIT_FRAME_PAD*2)
+            img, _ = load_image(path, size, smooth=not getattr(settings, 'PIXEL_ART_MODE', False))
+            self._img_cache[key] = (version, img)
             return img
         except Exception as e:
             print(f"Error loading image {path}: {e}")
-            self._img_cache[key] = None
-            return None
+            # Mantener la versión anterior (si la hay) hasta que llegue otra versión
+            self._img_cache[key] = (version, cached if isinstance(cached, pg.Surface) else None)
+            return self._img_cache[key][1]
 
 
     def _draw_frame(self, screen, rect: pg.Rect, selected: bool):
@@ -351,6 +411,13 @@ class CharSelectScene(BaseScene):
         t = pg.time.get_ticks() // 400
         return "Loading" + "." * (t % 4)
 
+    def _portrait_loading_text(self) -> str:
+        """En los marcos: el progreso del modelo si aún se está cargando, si no 'Loading...'"""
+        status = self.app.pipeline_status() if hasattr(self.app, "pipeline_status") else None
+        if status and status["state"] == "loading":
+            return f"Modelo {int(status['progress'] * 100)}%"
+        return self._loading_text()
+
     # ---------------- draw ----------------
     def draw(self, screen):
         draw_background(screen, self.bg, (25,25,32))
@@ -373,6 +440,7 @@ class CharSelectScene(BaseScene):
         stat_font = pg.font.SysFont(settings.FONT_NAME, 18)
         desc_font = pg.font.SysFont(settings.FONT_NAME, 16)
         loading_msg = self._loading_text()
+        portrait_msg = self._portrait_loading_text()
 
         for i, rect in enumerate(self.frames):
             x = rect.x
@@ -394,10 +462,9 @@ class CharSelectScene(BaseScene):
             # retrato (si el archivo ya existe)
             surf = self._portrait_surface(ch, rect)
             if surf is not None:
-                pad = 12
-                screen.blit(surf, (rect.x + pad, rect.y + pad))
+                screen.blit(surf, (rect.x + PORTRAIT_FRAME_PAD, rect.y + PORTRAIT_FRAME_PAD))
             else:
-                ph = self.font.render(loading_msg, True, (210,210,210))
+                ph = self.font.render(portrait_msg, True, (210,210,210))
                 screen.blit(ph, (rect.centerx - ph.get_width()//2, rect.centery - ph.get_height()//2))
 
             # 1) Nombre (hasta 2 líneas)
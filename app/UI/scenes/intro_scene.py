@@ -4,13 +4,18 @@ from app.UI.scenes.base_scene import BaseScene
 from app.Agent.agent_story_weaver import create_introduction_story
 from app.Agent.agent_background_director import create_story_background_brief
 from app.Agent.image_renderer import generate_background_image
+from app.UI.pg_assets import load_background_cached
 from settings.settings import settings
 
 class IntroScene(BaseScene):
     """
     Escena de introducción que muestra la narrativa inicial del juego.
     Usa el Story Weaver para generar contenido dinámico.
+    Si la IA supera AI_DEADLINE se muestra el texto estático y la historia
+    generada lo sustituye al llegar; el fondo se aplica cuando está listo.
     """
+    AI_DEADLINE_KEY = "intro"
+    AI_DEADLINE     = 5.0
     
     def __init__(self, app):
         super().__init__(app)
@@ -33,11 +38,12 @@ class IntroScene(BaseScene):
         self.current_text_index = 0
         self.text_timer = 0
         self.state = "loading"
+        self._start_ai_deadline()
         
         def generate_story():
+            player = None
             try:
                 # Obtener el personaje del jugador
-                player = None
                 if hasattr(self.app, 'orchestrator') and self.app.orchestrator.player_character:
                     player = self.app.orchestrator.player_character
                     print(f"IntroScene: Generando historia para {player.name}")
@@ -49,72 +55,82 @@ class IntroScene(BaseScene):
                     self.app.orchestrator.story_context.get("story_generated", False)):
                     
                     print("IntroScene: Usando historia prefetcheada")
-                    self.story_data = self.app.orchestrator.story_context.get("prefetched_story", {})
-                    self.background_brief = self.app.orchestrator.story_context.get("prefetched_background_brief", {})
-                    
-                    # Generar imagen de fondo si tenemos el brief
-                    if self.background_brief and settings.generate_backgrounds:
-                        try:
-                            print("IntroScene: Generando imagen de fondo desde brief prefetcheado")
-                            self.background_image_path = generate_background_image(self.background_brief)
-                            print(f"IntroScene: Imagen de fondo generada: {self.background_image_path}")
-                        except Exception as e:
-                            print(f"IntroScene: Error generando imagen de fondo - {e}")
-                            self.background_image_path = None
-                    
-                    self.generating = False
-                    self.state = "showing"
+                    story_data = self.app.orchestrator.story_context.get("prefetched_story", {})
+                    background_brief = self.app.orchestrator.story_context.get("prefetched_background_brief", {})
+                    self._publish_ai_result(lambda: self._show_story(story_data))
                     print("IntroScene: Historia prefetcheada cargada exitosamente")
+                    
+                    # Generar imagen de fondo si tenemos el brief (se muestra al llegar)
+                    if background_brief and settings.generate_backgrounds:
+                        self.background_brief = background_brief
+                        self._generate_background(background_brief)
                     return
                 
                 # Si no hay historia prefetcheada, generarla ahora
                 print("IntroScene: Generando historia personalizada")
-                self.story_data = create_introduction_story(player)
+                story_data = create_introduction_story(player)
+                if self._publish_ai_result(lambda: self._show_story(story_data)):
+                    print("IntroScene: Narrativa generada exitosamente")
                 
                 # Generar brief de fondo si está habilitado
                 if settings.generate_backgrounds:
                     try:
                         print("IntroScene: Generando brief de fondo")
-                        self.background_brief = create_story_background_brief(self.story_data, player)
+                        self.background_brief = create_story_background_brief(story_data, player)
                         print("IntroScene: Brief de fondo generado exitosamente")
-                        
-                        # Generar imagen de fondo usando el brief
-                        print("IntroScene: Generando imagen de fondo")
-                        self.background_image_path = generate_background_image(self.background_brief)
-                        print(f"IntroScene: Imagen de fondo generada: {self.background_image_path}")
-                        
+                        self._generate_background(self.background_brief)
                     except Exception as e:
                         print(f"IntroScene: Error generando fondo - {e}")
                         self.background_brief = {}
-                        self.background_image_path = None
-                
-                self.generating = False
-                self.state = "showing"
-                print("IntroScene: Narrativa generada exitosamente")
                 
             except Exception as e:
                 print(f"IntroScene: Error generando narrativa - {e}")
-                # Fallback con texto estático
-                if player:
-                    self.story_data = {
-                        "title": f"La Aventura de {player.name}",
-                        "introduction": f"{player.name}, el guerrero con {player.weapon}, se prepara para enfrentar desafíos épicos.",
-                        "conflict": "Las fuerzas del mal amenazan la paz del reino.",
-                        "setting": "Un mundo fantástico donde la magia y la espada se encuentran."
-                    }
-                else:
-                    self.story_data = {
-                        "title": "La Aventura Comienza",
-                        "introduction": "En un mundo lleno de misterios y peligros, un héroe se prepara para enfrentar desafíos épicos.",
-                        "conflict": "Las fuerzas del mal amenazan la paz del reino.",
-                        "setting": "Un mundo fantástico donde la magia y la espada se encuentran."
-                    }
-                self.generating = False
-                self.state = "showing"
+                # Fallback con texto estático (si no se mostró ya por plazo vencido)
+                if not self._fallback_active and self.state == "loading":
+                    self._publish_ai_result(lambda: self._show_story(self._fallback_story(player)))
         
         self._thread = threading.Thread(target=generate_story, daemon=True)
         self._thread.start()
     
+    def _generate_background(self, background_brief):
+        """Genera la imagen de fondo; se aplica cuando llega si seguimos en la escena"""
+        try:
+            print("IntroScene: Generando imagen de fondo")
+            path = generate_background_image(background_brief)
+            if path and self._active:
+                self.background_image_path = path
+            print(f"IntroScene: Imagen de fondo generada: {path}")
+        except Exception as e:
+            print(f"IntroScene: Error generando imagen de fondo - {e}")
+    
+    def _show_story(self, story_data):
+        """Muestra la historia (real o de fallback) sin reiniciar la lectura"""
+        self.story_data = story_data
+        self.generating = False
+        if self.state == "loading":
+            self.state = "showing"
+    
+    def _current_player(self):
+        if hasattr(self.app, 'orchestrator'):
+            return self.app.orchestrator.player_character
+        return None
+    
+    def _fallback_story(self, player=None):
+        """Historia estática para cuando la IA falla o no llega a tiempo"""
+        if player:
+            return {
+                "title": f"La Aventura de {player.name}",
+                "introduction": f"{player.name}, el guerrero con {player.weapon}, se prepara para enfrentar desafíos épicos.",
+                "conflict": "Las fuerzas del mal amenazan la paz del reino.",
+                "setting": "Un mundo fantástico donde la magia y la espada se encuentran."
+            }
+        return {
+            "title": "La Aventura Comienza",
+            "introduction": "En un mundo lleno de misterios y peligros, un héroe se prepara para enfrentar desafíos épicos.",
+            "conflict": "Las fuerzas del mal amenazan la paz del reino.",
+            "setting": "Un mundo fantástico donde la magia y la espada se encuentran."
+        }
+    
     def handle_event(self, e):
         if e.type == pg.KEYDOWN:
             if e.key in (pg.K_ESCAPE, pg.K_SPACE, pg.K_RETURN):
@@ -124,17 +140,14 @@ class IntroScene(BaseScene):
                     if self.current_text_index >= len(self._get_text_sequence()):
                         self._complete_intro()
                 elif self.state == "loading":
-                    # Saltar la generación y usar texto por defecto
-                    self.story_data = {
-                        "title": "La Aventura Comienza",
-                        "introduction": "En un mundo lleno de misterios y peligros, un héroe se prepara para enfrentar desafíos épicos.",
-                        "conflict": "Las fuerzas del mal amenazan la paz del reino.",
-                        "setting": "Un mundo fantástico donde la magia y la espada se encuentran."
-                    }
-                    self.generating = False
-                    self.state = "showing"
+                    # Saltar la generación y usar texto por defecto (la IA sigue en segundo plano)
+                    self._apply_fallback_now(lambda: self._show_story(self._fallback_story()))
     
     def update(self, dt):
+        if self.state == "loading":
+            self._apply_fallback_on_deadline(
+                lambda: self._show_story(self._fallback_story(self._current_player()))
+            )
         if self.state == "showing":
             self.text_timer += dt
             if self.text_timer >= self.text_speed:
@@ -179,9 +192,10 @@ class IntroScene(BaseScene):
         # Fondo con imagen generada o color sólido
         if self.background_image_path and self.state == "showing":
             try:
-                # Cargar y mostrar imagen de fondo
-                bg_surface = pg.image.load(self.background_image_path)
-                bg_surface = pg.transform.scale(bg_surface, (settings.WIDTH, settings.HEIGHT))
+                # Cargar (de memoria la primera vez, luego cacheado) y mostrar imagen de fondo
+                bg_surface = load_background_cached(self.background_image_path, (settings.WIDTH, settings.HEIGHT))
+                if bg_surface is None:
+                    raise ValueError(self.background_image_path)
                 screen.blit(bg_surface, (0, 0))
                 
                 # Overlay semi-transparente para mejorar legibilidad del texto
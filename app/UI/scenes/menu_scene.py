@@ -63,4 +63,8 @@ class MenuScene(BaseScene):
         
         self.text(screen, "[4] Settings (Configurar IA)", (40,y), color=(100,200,255)); y+=30
         
+        model_status = self._model_status_text()
+        if model_status:
+            self.text(screen, model_status, (40, settings.HEIGHT - 40), color=(180,180,180), size=16)
+        
         self.text(screen, "FIGHT: SPACE atk, E atk enemigo, R reset, N nuevo enemy, ESC menú", (40, 500))
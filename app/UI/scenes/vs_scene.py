@@ -7,11 +7,28 @@ from app.Agent.agent_character_creator import create_candidates
 from app.Agent.agent_story_weaver import create_story_beat
 from settings.settings import settings
 
+_CONFLICT_REASONS = [
+    "Se comió el último trozo de pizza",
+    "Mató a mi padre",
+    "Robó mi espada legendaria",
+    "Destruyó mi aldea",
+    "Secuestró a mi mascota",
+    "Insultó a mi madre",
+    "Pisó mis flores",
+    "Rompió mi vaso favorito",
+    "Usó mi toalla sin permiso",
+    "No devolvió el libro que le presté"
+]
+
 class VSScene(BaseScene):
     """
     Escena VS que muestra el enfrentamiento entre el jugador y el enemigo.
     Muestra características de ambos y el motivo del conflicto.
+    Si la IA supera AI_DEADLINE se muestra un enemigo local y, si el enemigo
+    de IA llega antes de empezar el combate, lo sustituye.
     """
+    AI_DEADLINE_KEY = "vs"
+    AI_DEADLINE     = 4.0
     
     def __init__(self, app):
         super().__init__(app)
@@ -38,34 +55,48 @@ class VSScene(BaseScene):
         if hasattr(self.app, 'orchestrator'):
             self.player = self.app.orchestrator.player_character
         
+        self._start_ai_deadline()
+        
         def generate_enemy():
             try:
                 # Generar enemigo usando el agente de IA
                 if settings.use_local_enemy_for_test:
                     # Usar enemigo local para test
-                    self.enemy = self._create_local_enemy()
+                    enemy = self._create_local_enemy()
                 else:
                     # Generar enemigo con IA
                     enemies = create_candidates(1)
-                    self.enemy = enemies[0] if enemies else self._create_local_enemy()
+                    enemy = enemies[0] if enemies else self._create_local_enemy()
                 
                 # Generar motivo del conflicto
-                self.conflict_reason = self._generate_conflict_reason()
+                reason = self._generate_conflict_reason(enemy)
                 
-                self.generating = False
-                self.state = "showing"
-                print(f"VSScene: Enemigo generado - {self.enemy.name}")
+                # Publicar (sustituye al fallback si seguimos en la escena)
+                if self._publish_ai_result(lambda: self._show_enemy(enemy, reason)):
+                    print(f"VSScene: Enemigo generado - {enemy.name}")
                 
             except Exception as e:
                 print(f"VSScene: Error generando enemigo - {e}")
-                self.enemy = self._create_local_enemy()
-                self.conflict_reason = "Un conflicto épico se desata en el reino."
-                self.generating = False
-                self.state = "showing"
+                if not self._fallback_active:
+                    self._publish_ai_result(lambda: self._show_enemy(
+                        self._create_local_enemy(), "Un conflicto épico se desata en el reino."
+                    ))
         
         self._thread = threading.Thread(target=generate_enemy, daemon=True)
         self._thread.start()
     
+    def _show_enemy(self, enemy: Character, reason: str):
+        """Muestra un enemigo (real o de fallback) sin interrumpir la cuenta regresiva"""
+        self.enemy = enemy
+        self.conflict_reason = reason
+        self.generating = False
+        if self.state == "loading":
+            self.state = "showing"
+    
+    def _show_local_enemy(self):
+        """Fallback local: enemigo y motivo sin IA"""
+        self._show_enemy(self._create_local_enemy(), random.choice(_CONFLICT_REASONS))
+    
     def _create_local_enemy(self) -> Character:
         """Crea un enemigo local para testing"""
         names = ["Grom", "Zarath", "Malak", "Vexar", "Kronos"]
@@ -80,35 +111,24 @@ class VSScene(BaseScene):
             portrait="app/UI/assets/test/portraits/maligno-tit-n.png"
         )
     
-    def _generate_conflict_reason(self) -> str:
+    def _generate_conflict_reason(self, enemy: Character = None) -> str:
         """Genera un motivo épico para el conflicto"""
-        reasons = [
-            "Se comió el último trozo de pizza",
-            "Mató a mi padre",
-            "Robó mi espada legendaria",
-            "Destruyó mi aldea",
-            "Secuestró a mi mascota",
-            "Insultó a mi madre",
-            "Pisó mis flores",
-            "Rompió mi vaso favorito",
-            "Usó mi toalla sin permiso",
-            "No devolvió el libro que le presté"
-        ]
+        enemy = enemy or self.enemy
         
         # Usar Story Weaver si está disponible
         try:
-            if hasattr(self.app, 'orchestrator') and self.player and self.enemy:
+            if hasattr(self.app, 'orchestrator') and self.player and enemy:
                 context = {
                     "player": self.player.name,
-                    "enemy": self.enemy.name,
+                    "enemy": enemy.name,
                     "player_weapon": self.player.weapon,
-                    "enemy_weapon": self.enemy.weapon
+                    "enemy_weapon": enemy.weapon
                 }
                 return create_story_beat("conflict_motive", self.player, context)
         except Exception:
             pass
         
-        return random.choice(reasons)
+        return random.choice(_CONFLICT_REASONS)
     
     def handle_event(self, e):
         if e.type == pg.KEYDOWN:
@@ -120,13 +140,14 @@ class VSScene(BaseScene):
                     # Saltar cuenta regresiva
                     self._start_combat()
                 elif self.state == "loading":
-                    # Saltar generación
-                    self.enemy = self._create_local_enemy()
-                    self.conflict_reason = "Un conflicto épico se desata."
-                    self.generating = False
-                    self.state = "showing"
+                    # Saltar generación (la IA sigue y sustituye al enemigo local si llega a tiempo)
+                    self._apply_fallback_now(lambda: self._show_enemy(
+                        self._create_local_enemy(), "Un conflicto épico se desata."
+                    ))
     
     def update(self, dt):
+        if self.state == "loading":
+            self._apply_fallback_on_deadline(self._show_local_enemy)
         if self.state == "countdown":
             self.countdown_timer += dt
             if self.countdown_timer >= 1.0:
@@ -1,8 +1,18 @@
 import pygame as pg
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, NamedTuple, Optional, List, Tuple
 from app.domain.physics import ActionState
 from app.domain.character import Character
+from app.UI.pg_assets import load_generated
+
+class SpriteFrame(NamedTuple):
+    """Frame de animación recortado a su contenido y su sitio en el frame original."""
+    surface: pg.Surface
+    trim: Tuple[int, int, int, int]  # (ox, oy, ancho_original, alto_original)
+
+def _full_frame(surface: pg.Surface) -> SpriteFrame:
+    """Frame sin recorte: ocupa todo su lienzo."""
+    return SpriteFrame(surface, (0, 0, surface.get_width(), surface.get_height()))
 
 class SpriteRenderer:
     """
@@ -12,7 +22,8 @@ class SpriteRenderer:
     
     def __init__(self):
         self.sprite_cache: Dict[str, pg.Surface] = {}
-        self.animation_frames: Dict[str, List[pg.Surface]] = {}
+        # Frames recortados a su contenido, cada uno con su offset (ver SpriteFrame)
+        self.animation_frames: Dict[str, List[SpriteFrame]] = {}
         self.frame_data: Dict[str, Dict] = {}  # Por personaje: {current_frame, timer}
         self.frame_delay = 90  # ms entre frames (~11 FPS por animación)
         
@@ -33,14 +44,14 @@ class SpriteRenderer:
                         # Crear sprite de placeholder para archivos .txt
                         sprite_surface = self._create_placeholder_sprite(sprite_type)
                     else:
-                        # Cargar sprite PNG real
-                        sprite_surface = pg.image.load(sprite_path).convert_alpha()
+                        # Cargar sprite real (blob horneado si existe, si no el PNG)
+                        sprite_surface, _ = load_generated(sprite_path)
                         # Si es un spritesheet horizontal, extraer frames
                         frames = self._try_extract_frames(sprite_surface, sprite_type, sprite_path)
                         if frames:
                             self.animation_frames[f"{character.name}_{sprite_type}"] = frames
                             # Usar el primer frame como base para cache simple
-                            sprite_surface = frames[0]
+                            sprite_surface = frames[0].surface
                         else:
                             # No escalar aquí, se hará en render_character con el multiplicador
                             pass
@@ -70,6 +81,11 @@ class SpriteRenderer:
         """
         Obtiene un sprite animado basado en el estado de acción.
         """
+        frame = self._animated_frame(character_name, action_state, dt)
+        return frame.surface if frame else None
+    
+    def _animated_frame(self, character_name: str, action_state: ActionState, dt: float) -> Optional[SpriteFrame]:
+        """Frame actual de la animación (con su offset de recorte) y avanza el temporizador."""
         # Mapear estados de acción a tipos de sprite
         sprite_type = self._action_to_sprite_type(action_state)
         
@@ -81,8 +97,10 @@ class SpriteRenderer:
         # Animación si existen frames
         key = f"{character_name}_{sprite_type}"
         frames = self.animation_frames.get(key)
-        if not frames or len(frames) <= 1:
-            return sprite
+        if not frames:
+            return _full_frame(sprite)
+        if len(frames) == 1:
+            return frames[0]
         
         # Frame tracking por personaje
         char_key = f"{character_name}_{sprite_type}"
@@ -123,16 +141,21 @@ class SpriteRenderer:
         Renderiza un personaje en la pantalla.
         """
         # Obtener sprite apropiado
-        sprite = self.get_animated_sprite(character.name, action_state, dt)
-        if not sprite:
+        frame = self._animated_frame(character.name, action_state, dt)
+        if not frame:
             # Fallback: dibujar rectángulo
             rect = pg.Rect(x, y, 80, 160)
             color = (90, 150, 240) if character == character else (240, 90, 90)
             pg.draw.rect(screen, color, rect)
             return False
         
-        # Voltear sprite si es necesario
+        # Offset del recorte respecto al frame original (sin recorte = frame completo)
+        sprite = frame.surface
+        ox, oy, full_w, full_h = frame.trim
+        
+        # Voltear sprite si es necesario (el offset horizontal se refleja)
         if not facing_right:
+            ox = full_w - ox - sprite.get_width()
             sprite = pg.transform.flip(sprite, True, False)
         
         # Escalar sprite al tamaño apropiado usando configuración
@@ -141,13 +164,17 @@ class SpriteRenderer:
         # Aplicar multiplicador directamente sin división
         target_width = int(162 * size_multiplier)
         target_height = int(162 * size_multiplier)
-        scaled_sprite = pg.transform.scale(sprite, (target_width, target_height))
+        # Solo se escala y dibuja el contenido recortado, colocado en su sitio del frame
+        sx, sy = target_width / full_w, target_height / full_h
+        scaled_sprite = pg.transform.scale(
+            sprite, (max(1, round(sprite.get_width() * sx)), max(1, round(sprite.get_height() * sy)))
+        )
         
         # Dibujar en pantalla
-        screen.blit(scaled_sprite, (x, y))
+        screen.blit(scaled_sprite, (x + round(ox * sx), y + round(oy * sy)))
         return True
 
-    def _try_extract_frames(self, sheet: pg.Surface, sprite_type: str, sprite_path: str = "") -> Optional[List[pg.Surface]]:
+    def _try_extract_frames(self, sheet: pg.Surface, sprite_type: str, sprite_path: str = "") -> Optional[List[SpriteFrame]]:
         """Intenta extraer frames de un spritesheet horizontal según reglas por tipo.
         El alto esperado del frame es 162 px (tu set), y el número de frames depende del tipo.
         Devuelve lista de frames o None si no aplica.
@@ -185,12 +212,20 @@ class SpriteRenderer:
         frame_w = sheet_w // num_frames
         if frame_w <= 0:
             return None
-        frames: List[pg.Surface] = []
+        frames: List[SpriteFrame] = []
         for i in range(num_frames):
             rect = pg.Rect(i * frame_w, 0, frame_w, sheet_h)
             frame = sheet.subsurface(rect).copy()
-            frames.append(frame)
+            frames.append(self._trim_surface(frame))
         return frames
+
+    def _trim_surface(self, surface: pg.Surface) -> SpriteFrame:
+        """Recorta un frame a la caja de su alfa; el offset va con el frame para dibujarlo en su sitio."""
+        bounds = surface.get_bounding_rect()
+        if bounds.width == 0 or bounds.size == surface.get_size():
+            return _full_frame(surface)
+        trimmed = surface.subsurface(bounds).copy()
+        return SpriteFrame(trimmed, (bounds.x, bounds.y, surface.get_width(), surface.get_height()))
     
     def _create_placeholder_sprite(self, sprite_type: str) -> pg.Surface:
         """Crea un sprite placeholder basado en el tipo."""
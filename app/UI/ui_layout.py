@@ -0,0 +1,34 @@
+"""
+Geometría de la UI sin depender de pygame.
+
+Las escenas la usan para colocar sus marcos y el horneado de derivados
+(Utils/asset_bake.py) para precalcular cada imagen al tamaño exacto al que
+se dibuja, sin escalar en tiempo de ejecución.
+"""
+
+from typing import List, Tuple
+
+Rect = Tuple[int, int, int, int]  # (x, y, ancho, alto)
+
+# Selección de personaje: 4 marcos de retrato
+CHAR_SELECT_SLOTS    = 4
+CHAR_SELECT_MARGIN_X = 60
+CHAR_SELECT_GAP_X    = 40
+CHAR_SELECT_FRAME_Y  = 140
+CHAR_SELECT_FRAME_H  = 190
+PORTRAIT_FRAME_PAD   = 12
+
+
+def char_select_frames(width: int) -> List[Rect]:
+    """Marcos de los candidatos en la selección de personaje para un ancho de pantalla"""
+    frame_w = (width - CHAR_SELECT_MARGIN_X * 2 - CHAR_SELECT_GAP_X * (CHAR_SELECT_SLOTS - 1)) // CHAR_SELECT_SLOTS
+    return [
+        (CHAR_SELECT_MARGIN_X + i * (frame_w + CHAR_SELECT_GAP_X), CHAR_SELECT_FRAME_Y, frame_w, CHAR_SELECT_FRAME_H)
+        for i in range(CHAR_SELECT_SLOTS)
+    ]
+
+
+def portrait_slot_size(width: int) -> Tuple[int, int]:
+    """Tamaño al que se dibuja un retrato dentro de su marco (marco menos el margen)"""
+    _, _, w, h = char_select_frames(width)[0]
+    return (w - PORTRAIT_FRAME_PAD * 2, h - PORTRAIT_FRAME_PAD * 2)
@@ -26,6 +26,8 @@ class Settings:
         config_ImageGen = load_config(path,"ImageGeneration")
         config_Controls = load_config(path,"Controls")
         config_AIProvider = load_config(path,"AIProvider")
+        config_Concurrency = load_config(path,"Concurrency")
+        config_NarrativeCache = load_config(path,"NarrativeCache")
         
         # UI Settings:  
         self.WIDTH                  = config_UI.get("WIDTH")
@@ -38,8 +40,13 @@ class Settings:
         self.BG_FIGHT_DIR           = config_UI.get("BG_FIGHT_DIR")
         self.BG_GEN_DIR             = config_UI.get("BG_GEN_DIR")
         self.BG_SEED_PATH           = config_UI.get("BG_SEED_PATH")
+        self.BG_CATALOG_PATH        = config_UI.get("BG_CATALOG_PATH", "cache/background_catalog.json")
+        # Assets pre-decodificados (blobs RGBA con mmap): "python -m app.Agent.Utils.asset_bake --bake"
+        self.ASSET_BAKE_ENABLED     = config_UI.get("ASSET_BAKE_ENABLED", True)
+        self.ASSET_BAKE_DIR         = config_UI.get("ASSET_BAKE_DIR", "cache/baked")
         self.PORTRAIT_DIR           = config_UI.get("PORTRAIT_DIR")
         self.PORTRAIT_SIZE          = config_UI.get("PORTRAIT_SIZE")
+        self.AI_DEADLINES           = config_UI.get("ai_deadlines", {})
         
         # Image Generation Settings
         self.IMAGE_PROVIDER = config_ImageGen.get("provider", "stable_diffusion")
@@ -52,6 +59,65 @@ class Settings:
         self.MAX_DAILY_GENERATIONS  = config_ImageGen.get("max_daily_generations", 50)
         self.BACKGROUND_CACHE_ENABLED = config_ImageGen.get("background_cache_enabled", True)
         self.SPRITE_CACHE_ENABLED   = config_ImageGen.get("sprite_cache_enabled", True)
+        # Micro-batching de Stable Diffusion (agrupa peticiones compatibles en una llamada)
+        self.SD_BATCHING_ENABLED    = config_ImageGen.get("sd_batching_enabled", True)
+        self.SD_BATCH_WINDOW_MS     = config_ImageGen.get("sd_batch_window_ms", 40)
+        self.SD_MAX_BATCH           = config_ImageGen.get("sd_max_batch", 4)
+        # Retratos progresivos: previa barata primero, versión final después
+        self.PORTRAIT_PREVIEW_ENABLED = config_ImageGen.get("portrait_preview_enabled", True)
+        self.PORTRAIT_PREVIEW_SCALE   = config_ImageGen.get("portrait_preview_scale", 0.5)
+        self.SD_PREVIEW_STEPS         = config_ImageGen.get("sd_preview_steps", 4)
+        # Precarga del pipeline de SD en segundo plano al arrancar (durante el menú)
+        self.SD_PRELOAD               = config_ImageGen.get("sd_preload", True)
+        # Residencia del modelo: liberar tras inactividad o con RSS alto ("unload" | "offload"; 0 = desactivado, por defecto)
+        self.SD_RESIDENCY_ENABLED     = config_ImageGen.get("sd_residency_enabled", True)
+        self.SD_RESIDENCY_MODE        = config_ImageGen.get("sd_residency_mode", "unload")
+        self.SD_IDLE_UNLOAD_SECONDS   = config_ImageGen.get("sd_idle_unload_seconds", 0)
+        self.SD_RSS_LIMIT_MB          = config_ImageGen.get("sd_rss_limit_mb", 0)
+        self.SD_RESIDENCY_CHECK_SECONDS = config_ImageGen.get("sd_residency_check_seconds", 15)
+        # Daemon de render: si está en marcha, get_image_provider lo usa en lugar de cargar el pipeline
+        self.RENDER_DAEMON_ENABLED    = config_ImageGen.get("render_daemon_enabled", True)
+        self.RENDER_DAEMON_SOCKET     = config_ImageGen.get("render_daemon_socket", None)
+        # Post-procesado: fondo por flood fill desde el borde, recorte y paleta (0 = sin paleta)
+        self.MATTING_TOLERANCE        = config_ImageGen.get("matting_tolerance", 24)
+        self.PORTRAIT_AUTOCROP        = config_ImageGen.get("portrait_autocrop", True)
+        self.PALETTE_COLORS           = config_ImageGen.get("palette_colors", 0)
+        # OpenAI asíncrono: peticiones en vuelo, reintentos con backoff exponencial y URL base (stub local)
+        self.OPENAI_ASYNC             = config_ImageGen.get("openai_async", True)
+        self.OPENAI_MAX_CONCURRENCY   = config_ImageGen.get("openai_max_concurrency", 4)
+        self.OPENAI_MAX_RETRIES       = config_ImageGen.get("openai_max_retries", 5)
+        self.OPENAI_BACKOFF_BASE      = config_ImageGen.get("openai_backoff_base", 1.0)
+        self.OPENAI_BACKOFF_MAX       = config_ImageGen.get("openai_backoff_max", 30.0)
+        self.OPENAI_BASE_URL          = config_ImageGen.get("openai_base_url", None)
+        # Cache de imágenes por contenido (hash de prompt/negativo/tamaño/modelo/steps/seed) con LRU
+        self.IMAGE_CACHE_ENABLED      = config_ImageGen.get("image_cache_enabled", True)
+        self.IMAGE_CACHE_DIR          = config_ImageGen.get("image_cache_dir", "cache/images")
+        self.IMAGE_CACHE_MAX_MB       = config_ImageGen.get("image_cache_max_mb", 512)
+        self.IMAGE_SEED               = config_ImageGen.get("seed", None)
+        # Índice de hashes perceptuales (casi duplicados); radio de reutilización en bits (0 = no reutilizar)
+        self.PHASH_INDEX_ENABLED      = config_ImageGen.get("phash_index_enabled", True)
+        self.PHASH_INDEX_PATH         = config_ImageGen.get("phash_index_path", "cache/phash_index.json")
+        self.PHASH_REUSE_RADIUS       = config_ImageGen.get("phash_reuse_radius", 0)
+        # Modo pixel art nativo: retratos a baja resolución + ampliación entera (nearest)
+        self.PIXEL_ART_MODE           = config_ImageGen.get("pixel_art_mode", False)
+        self.PIXEL_ART_NATIVE_SIZE    = config_ImageGen.get("pixel_art_native_size", "256x256")
+        # Cache LRU de embeddings de los text encoders (prompt y negativo) por texto
+        self.SD_EMBED_CACHE_ENABLED   = config_ImageGen.get("sd_embed_cache_enabled", True)
+        self.SD_EMBED_CACHE_SIZE      = config_ImageGen.get("sd_embed_cache_size", 64)
+        # Sprites por img2img: una pose base por personaje y frames derivados de sus latentes
+        self.SPRITE_IMG2IMG_ENABLED   = config_ImageGen.get("sprite_img2img_enabled", True)
+        self.SPRITE_IMG2IMG_STRENGTH  = config_ImageGen.get("sprite_img2img_strength", 0.35)
+        # Runtime de CPU para provider "onnx": "onnxruntime" | "openvino", pesos "fp32" | "fp16" | "int8"
+        self.ONNX_BACKEND             = config_ImageGen.get("onnx_backend", "onnxruntime")
+        self.ONNX_WEIGHTS             = config_ImageGen.get("onnx_weights", "int8")
+        self.ONNX_MODEL_DIR           = config_ImageGen.get("onnx_model_dir", "cache/cpu_runtime")
+        # Enrutado por tier/deadline entre varios backends (vacío = solo "provider"); ver app/Agent/image_router.py
+        self.IMAGE_ROUTER_BACKENDS    = config_ImageGen.get("router_backends", [])
+        self.IMAGE_ROUTER_TIERS       = config_ImageGen.get("router_tiers", {})
+        # Perfil de CPU (sin GPU): JSON generado por "python -m app.Agent.Utils.cpu_profile --autotune"
+        self.SD_CPU_PROFILE         = config_ImageGen.get("cpu_profile", {})
+        self.SD_CPU_PROFILE_PATH    = config_ImageGen.get("cpu_profile_path", "cache/sd_cpu_profile.json")
+        self.SD_COMPILE_CACHE_DIR   = config_ImageGen.get("compile_cache_dir", "cache/torch_compile")
         
         # Debug Settings
         self.use_local_characters_for_test  = config_Debug.get("use_local_characters_for_test")
@@ -87,6 +153,16 @@ class Settings:
             }
         }
         self.AI_PROVIDER = self.AI_PROVIDER_CONFIG.get("provider", "openai")
+        self.AI_COMPACT_SCHEMA = self.AI_PROVIDER_CONFIG.get("compact_schema", False)
+        self.AI_PARALLEL_CANDIDATES = self.AI_PROVIDER_CONFIG.get("parallel_candidates", False)
+        
+        # Concurrency Settings (límites AIMD por proveedor, ver app/Agent/Utils/concurrency.py)
+        self.CONCURRENCY_CONFIG = config_Concurrency or {}
+        
+        # Narrative Cache Settings (recuperación por similitud, ver app/Agent/narrative_cache.py)
+        self.NARRATIVE_CACHE_ENABLED   = config_NarrativeCache.get("enabled", True)
+        self.NARRATIVE_CACHE_THRESHOLD = config_NarrativeCache.get("threshold", 0.9)
+        self.NARRATIVE_CACHE_DIR       = config_NarrativeCache.get("dir", "cache/narrative")
          
         self.Player_selected_Player: Optional[Character] = None
         self.UI_first_selected_menu = config_UI.get("first_selected_menu")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el plazo de contenido IA de las escenas (fallback y late binding).
+El reloj es simulado: no hay esperas reales.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame as pg
+
+from app.UI.scenes import base_scene
+from app.UI.scenes.base_scene import BaseScene
+from app.UI.scenes.char_select_scene import CharSelectScene, _fake_candidates
+from app.domain.character import Character
+
+
+class _FakeClock:
+    """Sustituye al módulo time de base_scene; on_read se ejecuta en la siguiente lectura."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.on_read = None
+
+    def monotonic(self):
+        hook, self.on_read = self.on_read, None
+        if hook:
+            hook()
+        return self.now
+
+
+class _Scene(BaseScene):
+    AI_DEADLINE_KEY = "test"
+    AI_DEADLINE = 2.0
+
+    def __init__(self):
+        super().__init__(app=None)
+        self.shown = []
+
+
+def _with_clock(test):
+    def run():
+        pg.font.init()
+        clock = _FakeClock()
+        saved = base_scene.time
+        base_scene.time = clock
+        try:
+            return test(clock)
+        finally:
+            base_scene.time = saved
+    run.__name__ = test.__name__
+    run.__doc__ = test.__doc__
+    return run
+
+
+@_with_clock
+def test_fallback_then_late_result(clock):
+    """Prueba que el fallback sale al vencer el plazo, una sola vez, y que el resultado tardío lo sustituye."""
+    print("⏰ Probando fallback y resultado tardío...")
+    scene = _Scene()
+    scene._start_ai_deadline()
+    clock.now += 1.9
+    assert not scene._apply_fallback_on_deadline(lambda: scene.shown.append("fallback")), "❌ Fallback antes de plazo"
+    clock.now += 0.1
+    assert scene._apply_fallback_on_deadline(lambda: scene.shown.append("fallback")), "❌ No aplicó el fallback"
+    assert not scene._apply_fallback_on_deadline(lambda: scene.shown.append("fallback")), "❌ Fallback repetido"
+    assert scene._fallback_active, "❌ No marcó el fallback activo"
+
+    assert scene._publish_ai_result(lambda: scene.shown.append("ia")), "❌ Descartó el resultado tardío"
+    assert scene.shown == ["fallback", "ia"] and not scene._fallback_active, f"❌ Secuencia: {scene.shown}"
+    print("✅ fallback -> ia")
+    return True
+
+
+@_with_clock
+def test_result_wins_race_with_fallback(clock):
+    """Prueba que un resultado publicado mientras vence el plazo impide el fallback."""
+    print("🏎️ Probando carrera entre fallback y resultado...")
+    scene = _Scene()
+    scene._start_ai_deadline()
+    clock.now += 5
+    # El resultado llega justo cuando update() consulta el reloj (antes de tomar el lock)
+    clock.on_read = lambda: scene._publish_ai_result(lambda: scene.shown.append("ia"))
+    assert not scene._apply_fallback_on_deadline(lambda: scene.shown.append("fallback")), \
+        "❌ Aplicó el fallback tras llegar el resultado"
+    clock.now += 5
+    assert not scene._apply_fallback_on_deadline(lambda: scene.shown.append("fallback")), "❌ Fallback tardío"
+    assert scene.shown == ["ia"] and not scene._fallback_active, f"❌ Secuencia: {scene.shown}"
+
+    # Sin plazo configurado nunca hay fallback
+    scene.AI_DEADLINE = None
+    scene._start_ai_deadline()
+    clock.now += 1000
+    assert not scene._apply_fallback_on_deadline(lambda: scene.shown.append("fallback")), "❌ Fallback sin plazo"
+    print("✅ El resultado gana y el fallback no pisa el contenido real")
+    return True
+
+
+@_with_clock
+def test_result_after_exit_discarded(clock):
+    """Prueba que un resultado que llega tras exit() no toca la escena."""
+    print("🚪 Probando resultado tras salir de la escena...")
+    scene = _Scene()
+    scene._start_ai_deadline()
+    clock.now += 3
+    assert scene._apply_fallback_on_deadline(lambda: scene.shown.append("fallback"))
+    scene.exit()
+    assert not scene._publish_ai_result(lambda: scene.shown.append("ia")), "❌ Publicó tras exit()"
+    assert scene.shown == ["fallback"], f"❌ Secuencia: {scene.shown}"
+    print("✅ Resultado descartado")
+    return True
+
+
+def test_fallback_portraits_while_rendering():
+    """Prueba que los candidatos locales del fallback muestran su retrato mientras se generan los de IA."""
+    print("🖼️ Probando retratos del fallback durante el render...")
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    pg.font.init()
+    scene = CharSelectScene(app=None)
+    rect = scene.frames[0]
+    ai = Character(name="Kira", damage=5, resistence=5, weapon="espada",
+                   description="Guerrera", portrait="no-existe/kira.png")
+    scene._gen_id = 2
+    scene._set_rendering(2, {ai.name})
+    fallback = _fake_candidates(2)
+    for ch in fallback:
+        # Rutas relativas al proyecto: no depender del directorio de trabajo
+        ch.portrait = str(Path(__file__).parent.parent / ch.portrait)
+        assert scene._portrait_surface(ch, rect) is not None, f"❌ {ch.name} perdió su retrato local"
+    assert scene._portrait_surface(ai, rect) is None, "❌ Sondeó el disco para un retrato en render"
+
+    # Una generación anterior que termina no libera los de la actual
+    scene._set_rendering(1, set())
+    assert scene._rendering_names == {"Kira"}, f"❌ Generación vieja tocó la actual: {scene._rendering_names}"
+    scene._set_rendering(2, set())
+    assert not scene._rendering_names, "❌ No liberó los nombres al terminar"
+    print("✅ Solo se ocultan los retratos que se están sustituyendo")
+    return True
+
+
+def main():
+    tests = [test_fallback_then_late_result, test_result_wins_race_with_fallback, test_result_after_exit_discarded,
+             test_fallback_portraits_while_rendering]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para los assets pre-decodificados (blobs RGBA con mmap).
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.asset_bake import AssetBaker, benchmark
+from app.Agent.Utils.image_postprocess import save_png
+
+
+def _png(path: Path, seed: int = 0, size=(48, 32)) -> Path:
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, size=(size[1], size[0], 4), dtype=np.uint8), "RGBA").save(path, "PNG")
+    return path
+
+
+def test_bake_and_open():
+    """Prueba que el blob devuelve los mismos píxeles, el recorte y el tamaño pedido."""
+    print("🍞 Probando horneado y lectura con mmap...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = _png(tmp / "kira.png")
+        baker = AssetBaker(tmp / "baked")
+        assert baker.open(src) is None, "❌ Blob válido antes de hornear"
+
+        with baker.load(src) as baked:
+            assert baked.size == (48, 32), f"❌ Tamaño: {baked.size}"
+            assert bytes(baked.pixels) == Image.open(src).convert("RGBA").tobytes(), "❌ Píxeles distintos"
+            assert baked.crop_info is None, "❌ Info de recorte inventada"
+
+        with baker.load(src, (96, 64), smooth=False) as baked:
+            assert baked.size == (96, 64), f"❌ No se pre-escaló: {baked.size}"
+
+        cropped = tmp / "recortado.png"
+        save_png(Image.open(src), cropped, (4, 8, 64, 64))
+        with baker.load(cropped) as baked:
+            assert baked.crop_info == (4, 8, 64, 64), f"❌ Recorte: {baked.crop_info}"
+        assert baker.baked == 3, f"❌ Horneados: {baker.baked}"
+    print("✅ Píxeles, tamaño y recorte correctos")
+    return True
+
+
+def test_invalidation():
+    """Prueba la invalidación por mtime/tamaño y por contenido."""
+    print("♻️ Probando invalidación contra la fuente...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = _png(tmp / "fondo.png", seed=1)
+        baker = AssetBaker(tmp / "baked")
+        baker.bake(src)
+
+        # Mismo contenido, otra fecha: sigue siendo válido (decide el hash)
+        stat = src.stat()
+        os.utime(src, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+        baked = baker.open(src)
+        assert baked is not None, "❌ Un cambio de fecha invalidó el blob"
+        baked.close()
+
+        # Contenido nuevo: el blob queda obsoleto y se vuelve a hornear
+        _png(src, seed=2)
+        assert baker.open(src) is None, "❌ El blob obsoleto se consideró válido"
+        with baker.load(src) as baked:
+            assert bytes(baked.pixels) == Image.open(src).convert("RGBA").tobytes(), "❌ No se rehorneó"
+    print("✅ Fecha sola no invalida; contenido nuevo sí")
+    return True
+
+
+def test_benchmark_against_png():
+    """Prueba que el benchmark carga ambas versiones (y muestra los tiempos)."""
+    print("⏱️ Probando benchmark PNG vs horneado...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        targets = [(_png(tmp / f"img{i}.png", seed=i, size=(256, 256)), None, True) for i in range(4)]
+        targets.append((targets[0][0], (128, 128), True))
+        targets.append((targets[1][0], (128, 128), False))
+        png_ms, baked_ms = benchmark(AssetBaker(tmp / "baked"), targets, repeats=2)
+        assert png_ms > 0 and baked_ms > 0, "❌ Tiempos inválidos"
+    print(f"✅ PNG {png_ms:.2f} ms/img, horneado {baked_ms:.2f} ms/img")
+    return True
+
+
+def test_ui_miss_bakes_in_background():
+    """Prueba que un fallo de blob en la UI carga el PNG y hornea después, y que los fondos escalan nearest."""
+    print("🧵 Probando horneado en segundo plano desde la UI...")
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame as pg
+    from app.Agent.Utils import asset_bake
+    from app.UI.pg_assets import load_image, load_background
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = _png(tmp / "bg.png", seed=3, size=(8, 8))
+        saved = asset_bake._baker
+        asset_bake._baker = baker = AssetBaker(tmp / "baked")
+        pg.display.init()
+        pg.display.set_mode((1, 1))
+        try:
+            surf, _ = load_image(str(src), (32, 32), smooth=False)
+            assert surf.get_size() == (32, 32), "❌ No cargó el PNG en el fallo"
+            baker.bake_later(src, (32, 32), smooth=False).result(timeout=5)
+            assert baker.open(src, (32, 32), smooth=False) is not None, "❌ No se horneó en segundo plano"
+
+            # Nearest: cada píxel de origen ocupa un bloque de 4x4 idéntico
+            bg = pg.surfarray.array3d(load_background(str(src), (32, 32)))
+            expected = np.asarray(Image.open(src).convert("RGB")).transpose(1, 0, 2)
+            assert (bg[::4, ::4] == expected).all() and (bg[1::4, 1::4] == expected).all(), \
+                "❌ El fondo se escaló suavizado"
+        finally:
+            pg.display.quit()
+            asset_bake._baker = saved
+    print("✅ PNG en el fallo, blob en segundo plano y fondos nearest")
+    return True
+
+
+def main():
+    tests = [test_bake_and_open, test_invalidation, test_benchmark_against_png, test_ui_miss_bakes_in_background]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
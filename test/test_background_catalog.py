@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el catálogo de fondos por etiquetas.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from settings.settings import settings
+from app.Agent import background_manager as manager_module, image_renderer
+from app.Agent.background_catalog import BackgroundCatalog, TYPE_PALETTES
+from app.Agent.background_manager import BackgroundManager
+from app.Agent.image_providers import ProceduralProvider
+from app.Agent.Utils import image_cache
+from app.Agent.Utils.image_cache import ImageCache
+from app.Agent.Utils.image_handoff import get_rendered
+from app.domain.character import Character
+
+_SETTINGS = {"generate_backgrounds": True, "BACKGROUND_CACHE_ENABLED": True,
+             "PHASH_INDEX_ENABLED": False, "ASSET_BAKE_ENABLED": False}
+
+
+def _bg(path: Path, color) -> Path:
+    Image.new("RGB", (96, 64), color).save(path, "PNG")
+    return path
+
+
+def test_tag_lookup_and_persistence():
+    """Prueba la búsqueda por etiquetas y que el catálogo se recarga del disco."""
+    print("🏞️ Probando búsqueda por etiquetas...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        battle = tmp / "battle"
+        battle.mkdir()
+        # Fondo previo con nombre {tipo}_{rareza}_*.png: entra al reconstruir
+        _bg(battle / "fuego_raro_1.png", (230, 80, 20))
+
+        catalog = BackgroundCatalog(tmp / "catalog.json", battle)
+        assert len(catalog) == 1, "❌ No se reconstruyó el catálogo desde el directorio"
+        catalog.add(_bg(battle / "hielo_epico_2.png", (200, 230, 255)),
+                    enemy_type="hielo", rarity="epico", biome="nieve", mood="tenso")
+
+        found = catalog.find(enemy_type="hielo", rarity="epico")
+        assert [Path(e["path"]).name for e in found] == ["hielo_epico_2.png"], f"❌ Búsqueda: {found}"
+        assert not catalog.find(enemy_type="hielo", rarity="comun"), "❌ Coincidencia con rareza distinta"
+
+        reopened = BackgroundCatalog(tmp / "catalog.json", battle)
+        assert len(reopened.find(biome="nieve")) == 1, "❌ Las etiquetas no se persistieron"
+        assert len(reopened.find(enemy_type="fuego")) == 1, "❌ Se perdió el fondo reconstruido"
+    print("✅ Búsqueda por etiquetas y recarga correctas")
+    return True
+
+
+def test_nearest_palette_fallback():
+    """Prueba que sin etiquetas coincidentes se elige el fondo de paleta más parecida."""
+    print("🎨 Probando fallback por paleta...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        catalog = BackgroundCatalog(tmp / "catalog.json", tmp)
+        catalog.add(_bg(tmp / "a.png", (230, 80, 20)), enemy_type="dragon")
+        catalog.add(_bg(tmp / "b.png", (200, 230, 255)), enemy_type="yeti")
+
+        assert Path(catalog.nearest_palette(TYPE_PALETTES["hielo"])["path"]).name == "b.png", \
+            "❌ Paleta de hielo no eligió el fondo azul"
+        assert Path(catalog.nearest_palette(TYPE_PALETTES["fuego"])["path"]).name == "a.png", \
+            "❌ Paleta de fuego no eligió el fondo naranja"
+    print("✅ Fallback por paleta correcto")
+    return True
+
+
+def test_generated_background_at_battle_path():
+    """Prueba que el fondo generado se escribe directamente en el directorio de batalla (sin moverlo)."""
+    print("🚚 Probando la ruta del fondo generado...")
+    saved_settings = {name: getattr(settings, name, None) for name in (*_SETTINGS, "BG_GEN_DIR")}
+    saved = image_renderer._image_provider, image_cache._cache, manager_module.create_combat_background_brief
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for name, value in _SETTINGS.items():
+                setattr(settings, name, value)
+            settings.BG_GEN_DIR = str(tmp / "generated")
+            image_renderer._image_provider = ProceduralProvider()
+            image_cache._cache = ImageCache(tmp / "cache", max_bytes=0)
+            manager_module.create_combat_background_brief = lambda player, enemy: {
+                "setting": "cueva helada", "mood": "tenso", "color_palette": "azul"}
+
+            manager = BackgroundManager.__new__(BackgroundManager)
+            manager.battle_dir = tmp / "battle"
+            manager.battle_dir.mkdir()
+            manager.catalog = BackgroundCatalog(tmp / "catalog.json", manager.battle_dir)
+            enemy = Character(name="Golem de hielo", damage=5, resistence=4, weapon="puños", description="", portrait="")
+            path = Path(manager.get_combat_background(None, enemy))
+
+            assert path.parent == manager.battle_dir and path.exists(), f"❌ Ruta del fondo: {path}"
+            # La entrada en memoria (y con ella el horneado y el pHash) está en la ruta final
+            assert get_rendered(path) is not None, "❌ La imagen publicada quedó en otra ruta"
+            assert not any((tmp / "generated").glob("*.png")), "❌ Se escribió en el directorio de generados"
+            assert manager.catalog.find(enemy_type="hielo"), "❌ No se catalogó el fondo"
+    finally:
+        image_renderer._image_provider, image_cache._cache, manager_module.create_combat_background_brief = saved
+        for name, value in saved_settings.items():
+            setattr(settings, name, value)
+    print(f"✅ Generado en {path.name}")
+    return True
+
+
+def main():
+    tests = [test_tag_lookup_and_persistence, test_nearest_palette_fallback, test_generated_background_at_battle_path]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
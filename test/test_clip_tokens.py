@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el recorte de prompts por tokens de CLIP.
+"""
+
+import re
+import sys
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.clip_tokens import CLIP_USABLE_TOKENS, count_tokens, truncate_to_tokens
+from app.Agent.prompts.prompts_image_renderer import PromptsImageRenderer
+
+
+class _FakeTokenizer:
+    """Tokenizador aproximado a CLIP: palabras, signos y trozos de 4 letras."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text, add_special_tokens=True, truncation=False):
+        self.calls += 1
+        ids = []
+        for piece in re.findall(r"\w+|[^\w\s]", text.lower()):
+            ids.extend(range(max(1, (len(piece) + 3) // 4)))
+        return {"input_ids": ([0] + ids + [0]) if add_special_tokens else ids}
+
+
+BRIEF = ("Guerrera elfa de cabello plateado con armadura de escamas azules, capa raída por el viento, "
+         "espada rúnica que brilla con luz fría, cicatriz sobre el ojo izquierdo, mirada desafiante, "
+         "iluminación dramática desde abajo, partículas de escarcha flotando alrededor del personaje")
+
+
+def test_truncate_fits_budget():
+    """Prueba que el recorte cabe en el presupuesto y es un prefijo del texto."""
+    print("✂️ Probando recorte por tokens...")
+    tok = _FakeTokenizer()
+    for budget in (5, 20, 40):
+        cut = truncate_to_tokens(BRIEF, budget, tok)
+        assert count_tokens(cut, tok) <= budget, f"❌ {count_tokens(cut, tok)} tokens con presupuesto {budget}"
+        assert BRIEF.startswith(cut), "❌ El recorte no es un prefijo del brief"
+    assert truncate_to_tokens("corto", 20, tok) == "corto", "❌ Se recortó un texto que cabía"
+    print("✅ Recortes dentro del presupuesto")
+    return True
+
+
+def test_portrait_prompt_keeps_suffix():
+    """Prueba que el prompt final cabe en 77 tokens sin perder el sufijo de estilo."""
+    print("🎯 Probando prompt de retrato con tokenizador...")
+    tok = _FakeTokenizer()
+    prompt = PromptsImageRenderer.portrait_prompt(BRIEF, "pixel art oscuro épico", tok)
+    assert count_tokens(prompt, tok) <= CLIP_USABLE_TOKENS, f"❌ Prompt de {count_tokens(prompt, tok)} tokens"
+    assert prompt.endswith("pixelated, clean lines"), "❌ Se perdió el sufijo de estilo"
+    assert "pixel art oscuro" in prompt, "❌ Se perdió el estilo del brief"
+    # El brief aprovecha el presupuesto (no se queda muy por debajo del límite)
+    assert count_tokens(prompt, tok) > CLIP_USABLE_TOKENS // 2, "❌ El brief desaprovecha el presupuesto"
+    print(f"✅ {count_tokens(prompt, tok)} tokens, sufijo intacto")
+    return True
+
+
+def main():
+    tests = [test_truncate_fits_budget, test_portrait_prompt_keeps_suffix]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
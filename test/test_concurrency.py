@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el limitador adaptativo (AIMD) de concurrencia.
+Las latencias son sintéticas: se pasan directamente a release().
+"""
+
+import sys
+import time
+import asyncio
+import threading
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.concurrency import AdaptiveLimiter, DEFAULT_LIMITS
+
+
+def test_additive_increase_when_saturated():
+    """Prueba que el límite sube ~1 por cada 'límite' llamadas, solo si está saturado."""
+    print("📈 Probando subida aditiva...")
+    limiter = AdaptiveLimiter("test", initial=1, min_limit=1, max_limit=3)
+    assert limiter.acquire(timeout=0.1)
+    limiter.release(1.0)                      # saturado (1/1): +1/1
+    assert limiter.limit == 2, f"❌ Límite tras saturar: {limiter.limit}"
+
+    # Con 1 en vuelo y límite 2 no está saturado: no sube
+    assert limiter.acquire(timeout=0.1)
+    limiter.release(1.0)
+    assert limiter.limit == 2, "❌ Subió sin estar saturado"
+
+    # Saturado a 2: cada ronda suma 1/límite (2 -> 2.5 -> 2.9 -> 3.2)
+    for expected in (2, 2, 3):
+        assert limiter.acquire(timeout=0.1) and limiter.acquire(timeout=0.1)
+        limiter.release(1.0)
+        limiter.release(1.0)
+        assert limiter.limit == expected, f"❌ Límite tras una ronda saturada: {limiter.limit} (esperado {expected})"
+    for _ in range(3):
+        assert limiter.acquire(timeout=0.1) and limiter.acquire(timeout=0.1) and limiter.acquire(timeout=0.1)
+        for _ in range(3):
+            limiter.release(1.0)
+    assert limiter.limit == 3, "❌ Superó max_limit"
+    print(f"✅ 1 -> 2 -> 3 (máximo), stats: {limiter.stats()['completed']} completadas")
+    return True
+
+
+def test_multiplicative_decrease():
+    """Prueba que un error o una latencia por encima de base * tolerance dividen el límite."""
+    print("📉 Probando bajada multiplicativa...")
+    limiter = AdaptiveLimiter("test", initial=8, min_limit=1, max_limit=8, tolerance=1.5, backoff=0.5)
+    limiter.acquire()
+    limiter.release(1.0)                      # fija la base en 1.0
+    assert limiter.limit == 8, "❌ Bajó con una llamada normal"
+
+    limiter.acquire()
+    limiter.release(1.0, ok=False)
+    assert limiter.limit == 4 and limiter.stats()["errors"] == 1, f"❌ Tras un error: {limiter.stats()}"
+
+    limiter.acquire()
+    limiter.release(1.4)                      # dentro de la tolerancia
+    assert limiter.limit == 4, "❌ Bajó dentro de la tolerancia"
+    limiter.acquire()
+    limiter.release(3.0)                      # > base * 1.5: congestión
+    assert limiter.limit == 2, f"❌ Tras latencia alta: {limiter.limit}"
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(1.0, ok=False)
+    assert limiter.limit == 1, "❌ Bajó de min_limit"
+    print("✅ 8 -> 4 (error) -> 2 (latencia) -> 1 (mínimo)")
+    return True
+
+
+def test_skip_and_unrecorded_release():
+    """Prueba que las llamadas interrumpidas (skip / record=False) no mueven el límite ni la base."""
+    print("⏭️ Probando llamadas que no cuentan...")
+    limiter = AdaptiveLimiter("test", initial=4, min_limit=1, max_limit=8)
+    limiter.acquire()
+    limiter.release(1.0)
+    limiter.acquire()
+    limiter.release(50.0, ok=False, record=False)
+    with limiter.slot() as slot:
+        slot.skip = True
+        time.sleep(0.01)
+    stats = limiter.stats()
+    assert limiter.limit == 4 and stats["errors"] == 0 and stats["completed"] == 1, f"❌ Stats: {stats}"
+    assert stats["baseline_latency"] == 1.0 and stats["in_flight"] == 0, "❌ Cambió la base o quedó en vuelo"
+
+    # Una excepción dentro del slot cuenta como fallo
+    try:
+        with limiter.slot():
+            raise RuntimeError("fallo")
+    except RuntimeError:
+        pass
+    assert limiter.limit == 2 and limiter.stats()["errors"] == 1, "❌ La excepción no contó como fallo"
+    print("✅ skip y record=False no ajustan; las excepciones sí")
+    return True
+
+
+def test_latency_per_work_unit():
+    """Prueba que un lote mide la latencia por unidad de trabajo y no parece congestión."""
+    print("🧮 Probando latencia por unidad de trabajo...")
+    limiter = AdaptiveLimiter("test", initial=4, min_limit=1, max_limit=8, tolerance=1.5)
+    with limiter.slot():
+        time.sleep(0.02)                      # una imagen
+    with limiter.slot() as slot:
+        slot.units = 4
+        time.sleep(0.08)                      # lote de 4: 4 veces más largo
+    stats = limiter.stats()
+    assert limiter.limit == 4, f"❌ El lote se tomó como congestión: {stats}"
+    assert stats["last_latency"] < stats["baseline_latency"] * 1.5, f"❌ Latencia no normalizada: {stats}"
+    print(f"✅ Latencia por unidad {stats['last_latency']:.3f}s (base {stats['baseline_latency']:.3f}s)")
+    return True
+
+
+def test_acquire_blocks_at_limit():
+    """Prueba que acquire espera con el límite lleno y continúa al liberar."""
+    print("🚧 Probando espera con el límite lleno...")
+    limiter = AdaptiveLimiter("test", initial=1, min_limit=1, max_limit=1)
+    assert limiter.acquire(timeout=0.1)
+    assert not limiter.acquire(timeout=0.05), "❌ Dejó pasar por encima del límite"
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(limiter.acquire(timeout=2)))
+    waiter.start()
+    time.sleep(0.05)
+    assert limiter.queue_depth == 1, "❌ La espera no se ve en queue_depth"
+    limiter.release(1.0)
+    waiter.join(2)
+    assert got == [True] and limiter.in_flight == 1, "❌ No entró al liberar el hueco"
+    limiter.release(1.0)
+    print("✅ Espera y paso al liberar")
+    return True
+
+
+def test_local_pipelines_stay_serial():
+    """Prueba que los pipelines locales (un solo pipeline compartido) no pasan de una llamada."""
+    print("🔒 Probando límite de los pipelines locales...")
+    for name in ("stable_diffusion", "onnx_diffusion"):
+        limiter = AdaptiveLimiter(name, **DEFAULT_LIMITS[name])
+        for _ in range(5):
+            assert limiter.acquire(timeout=0.1)
+            limiter.release(1.0)                  # saturado: intentaría subir
+        assert limiter.limit == 1, f"❌ {name} subió a {limiter.limit}"
+        assert limiter.acquire(timeout=0.1) and not limiter.acquire(timeout=0.05), f"❌ {name} dejó pasar dos"
+        limiter.release(1.0)
+    print("✅ stable_diffusion y onnx_diffusion fijos en 1")
+    return True
+
+
+def test_async_slot_shares_limit():
+    """Prueba que aslot() cuenta en el mismo límite que slot() y devuelve el hueco si se cancela esperando."""
+    print("⚡ Probando hueco asíncrono...")
+    limiter = AdaptiveLimiter("test", initial=1, min_limit=1, max_limit=1)
+
+    async def scenario():
+        async with limiter.aslot():
+            assert limiter.in_flight == 1, "❌ aslot() no ocupó hueco"
+            assert not limiter.acquire(timeout=0.05), "❌ Una llamada síncrona pasó por encima del límite"
+        assert limiter.in_flight == 0 and limiter.stats()["completed"] == 1, "❌ No liberó ni midió la llamada"
+
+        # Con el límite lleno, una espera cancelada no se queda con el hueco al liberarse
+        assert limiter.acquire(timeout=0.1)
+
+        async def waiter():
+            async with limiter.aslot():
+                pass
+        task = asyncio.ensure_future(waiter())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        limiter.release(1.0)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0, f"❌ Hueco perdido tras cancelar: {limiter.in_flight} en vuelo"
+    assert limiter.acquire(timeout=0.1), "❌ El límite quedó bloqueado"
+    limiter.release(1.0)
+    print("✅ aslot() comparte el límite y no pierde huecos al cancelar")
+    return True
+
+
+def main():
+    tests = [test_additive_increase_when_saturated, test_multiplicative_decrease,
+             test_skip_and_unrecorded_release, test_latency_per_work_unit, test_acquire_blocks_at_limit,
+             test_local_pipelines_stay_serial, test_async_slot_shares_limit]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
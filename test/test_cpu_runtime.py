@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el proveedor de CPU (ONNX Runtime / OpenVINO).
+El runtime real no se carga: se sustituye el pipeline exportado por uno simulado.
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from settings.settings import settings
+from app.Agent import image_providers
+from app.Agent.Utils import cpu_runtime
+from app.Agent.image_providers import OnnxDiffusionProvider, StableDiffusionProvider
+
+
+class _FakeOrtPipeline:
+    """Pipeline de optimum simulado: misma llamada que diffusers, recibe textos."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, negative_prompt, width, height, num_inference_steps, guidance_scale, **kwargs):
+        self.calls.append(list(prompt))
+        return SimpleNamespace(images=[Image.new("RGB", (width, height), "purple") for _ in prompt])
+
+
+def test_backends_have_separate_state():
+    """Prueba que cada backend tiene su propio pipeline, lock y caches."""
+    print("🧩 Probando estado separado por backend...")
+    assert OnnxDiffusionProvider._lock is not StableDiffusionProvider._lock, "❌ Comparten el lock"
+    assert OnnxDiffusionProvider._embed_cache is not StableDiffusionProvider._embed_cache, "❌ Comparten caches"
+    saved = StableDiffusionProvider._pipeline
+    StableDiffusionProvider._pipeline = object()
+    try:
+        assert OnnxDiffusionProvider._pipeline is None, "❌ El pipeline de PyTorch se ve desde ONNX"
+    finally:
+        StableDiffusionProvider._pipeline = saved
+    assert not callable(getattr(OnnxDiffusionProvider(), "generate_variations", None)), "❌ Anuncia img2img"
+    print("✅ Estado independiente y sin img2img")
+    return True
+
+
+def test_generate_through_runtime():
+    """Prueba que generate_image usa el pipeline exportado con la misma interfaz."""
+    print("⚙️ Probando generación con el runtime de CPU...")
+    fake = _FakeOrtPipeline()
+    loads = []
+
+    def fake_load(model_name, backend, weights, threads=None):
+        loads.append((model_name, backend, weights))
+        return fake
+
+    saved = (cpu_runtime.load_pipeline, settings.IMAGE_PROVIDER)
+    cpu_runtime.load_pipeline, settings.IMAGE_PROVIDER = fake_load, "onnx"
+    try:
+        provider = image_providers.get_image_provider()
+        assert isinstance(provider, OnnxDiffusionProvider), f"❌ Proveedor: {type(provider).__name__}"
+        image = provider.generate_image("pixel art knight", size="256x256")
+        assert image is not None and image.size == (256, 256), "❌ No se generó la imagen"
+        assert loads == [(settings.STABLE_DIFFUSION_MODEL, settings.ONNX_BACKEND, settings.ONNX_WEIGHTS)], \
+            f"❌ Cargas: {loads}"
+        assert fake.calls == [["pixel art knight"]], "❌ El runtime no recibió el prompt como texto"
+        assert image_providers.get_pipeline_status()["state"] == "ready", "❌ Estado de carga del backend ONNX"
+    finally:
+        cpu_runtime.load_pipeline, settings.IMAGE_PROVIDER = saved
+        OnnxDiffusionProvider._release_pipeline()
+    print("✅ Imagen generada por el runtime exportado")
+    return True
+
+
+def test_export_dir_and_validation():
+    """Prueba la ruta de exportación por (modelo, runtime, pesos) y los valores no soportados."""
+    print("📁 Probando configuración de exportación...")
+    path = cpu_runtime.export_dir("stabilityai/sdxl-turbo", "openvino", "int8")
+    assert path.name == "stabilityai--sdxl-turbo-openvino-int8", f"❌ Ruta: {path}"
+    try:
+        cpu_runtime.export_model("stabilityai/sdxl-turbo", "tensorrt", "int8")
+        raise AssertionError("❌ Aceptó un runtime no soportado")
+    except ValueError:
+        pass
+    print("✅ Ruta por configuración y validación de runtime")
+    return True
+
+
+def test_cache_key_per_runtime():
+    """Prueba que PyTorch y cada runtime/cuantización no comparten entradas de cache."""
+    print("🔑 Probando claves de cache por runtime...")
+    from app.Agent.image_renderer import _cache_fields
+    from app.Agent.Utils.image_cache import request_key
+
+    torch_fields = _cache_fields(StableDiffusionProvider(), "pixel art knight", "512x512")
+    onnx = OnnxDiffusionProvider()
+    onnx.backend, onnx.weights = "onnxruntime", "int8"
+    int8_key = request_key(**_cache_fields(onnx, "pixel art knight", "512x512"))
+    onnx.weights = "fp32"
+    fp32_key = request_key(**_cache_fields(onnx, "pixel art knight", "512x512"))
+    assert "backend" not in torch_fields, "❌ Cambió la clave de PyTorch (invalidaría la cache existente)"
+    assert len({request_key(**torch_fields), int8_key, fp32_key}) == 3, "❌ Runtimes con la misma clave"
+    print("✅ Una clave por runtime y pesos")
+    return True
+
+
+def main():
+    tests = [test_backends_have_separate_state, test_generate_through_runtime, test_export_dir_and_validation,
+             test_cache_key_per_runtime]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para la cache de imágenes por contenido.
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.image_cache import ImageCache, request_key
+
+
+def _png(path: Path, color, size=(64, 64)) -> Path:
+    Image.new("RGB", size, color).save(path, "PNG")
+    return path
+
+
+def test_identical_requests_hit():
+    """Prueba que la misma petición reutiliza la imagen y una distinta no."""
+    print("🗂️ Probando claves por contenido...")
+    fields = dict(prompt="guerrera", negative_prompt="blurry", size="512x512",
+                  model="sdxl-turbo", steps=10, seed=None)
+    key = request_key(**fields)
+    assert key == request_key(**dict(reversed(list(fields.items())))), "❌ La clave depende del orden"
+    assert key != request_key(**dict(fields, prompt="guerrera con lanza")), "❌ Un prompt nuevo reutiliza la clave"
+    assert key != request_key(**dict(fields, seed=7)), "❌ La seed no forma parte de la clave"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = ImageCache(tmp / "cache", max_bytes=0)
+        assert cache.get(key) is None, "❌ Hit en una cache vacía"
+        cache.put(key, _png(tmp / "a.png", "red"))
+
+        # Un proceso nuevo lee el manifiesto del disco
+        reopened = ImageCache(tmp / "cache", max_bytes=0)
+        dst = tmp / "ui" / "kira.png"
+        assert reopened.materialize(key, dst), "❌ No se encontró la imagen cacheada"
+        assert Image.open(dst).getpixel((0, 0)) == (255, 0, 0), "❌ Imagen materializada incorrecta"
+    print("✅ Hit para la misma petición, miss para la modificada")
+    return True
+
+
+def test_lru_eviction_to_budget():
+    """Prueba que se expulsan las entradas menos usadas al superar el presupuesto."""
+    print("🧹 Probando expulsión LRU...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = _png(tmp / "src.png", "blue", size=(128, 128))
+        one = src.stat().st_size
+        cache = ImageCache(tmp / "cache", max_bytes=one * 2)
+
+        cache.put("a" * 64, src)
+        time.sleep(0.01)
+        cache.put("b" * 64, src)
+        time.sleep(0.01)
+        assert cache.get("a" * 64) is not None, "❌ 'a' debería estar en la cache"
+        time.sleep(0.01)
+        cache.put("c" * 64, src)
+
+        assert ("b" * 64) not in cache, "❌ 'b' (la menos usada) no se expulsó"
+        assert ("a" * 64) in cache and ("c" * 64) in cache, "❌ Se expulsó una entrada reciente"
+        assert not cache.object_path("b" * 64).exists(), "❌ El objeto expulsado sigue en disco"
+        assert cache.total_bytes() <= one * 2, f"❌ Presupuesto superado: {cache.total_bytes()}"
+    print("✅ Expulsada la entrada menos usada")
+    return True
+
+
+def test_hits_do_not_rewrite_manifest():
+    """Prueba que los aciertos no reescriben el manifiesto y que save() persiste los accesos."""
+    print("📝 Probando accesos en memoria...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = ImageCache(tmp / "cache", max_bytes=0)
+        cache.put("a" * 64, _png(tmp / "a.png", "red"))
+        manifest = tmp / "cache" / "manifest.json"
+        written = manifest.read_bytes()
+
+        time.sleep(0.01)
+        for _ in range(5):
+            assert cache.get("a" * 64) is not None, "❌ Miss de una entrada guardada"
+        assert manifest.read_bytes() == written, "❌ Un acierto reescribió el manifiesto"
+
+        cache.save()
+        reopened = ImageCache(tmp / "cache", max_bytes=0)
+        reopened._ensure_loaded()
+        saved_access = reopened._entries["a" * 64]["last_access"]
+        assert saved_access == cache._entries["a" * 64]["last_access"], "❌ save() no persistió el último acceso"
+        assert saved_access > reopened._entries["a" * 64]["created"], "❌ El acceso no es posterior al alta"
+    print("✅ Manifiesto intacto en los aciertos y accesos guardados con save()")
+    return True
+
+
+def main():
+    tests = [test_identical_requests_hit, test_lru_eviction_to_budget, test_hits_do_not_rewrite_manifest]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
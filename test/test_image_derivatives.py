@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para los derivados multi-resolución que se hornean al guardar.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils import asset_bake
+from app.Agent.Utils.asset_bake import AssetBaker, derivative_sizes
+from app.Agent.Utils.image_handoff import write_behind, wait_written
+from app.Agent.Utils.image_postprocess import autocrop, place_cropped
+from app.UI.ui_layout import char_select_frames, portrait_slot_size
+
+
+def _portrait(size=(128, 160)) -> Image.Image:
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    ImageDraw.Draw(img).ellipse((40, 50, 100, 140), fill=(220, 60, 40, 255))
+    return img
+
+
+def test_layout_matches_frames():
+    """Prueba que el hueco del retrato sale de la misma geometría que los marcos."""
+    print("📐 Probando geometría de la selección de personaje...")
+    frames = char_select_frames(960)
+    assert len(frames) == 4 and frames[0][:2] == (60, 140), f"❌ Marcos: {frames}"
+    assert frames[-1][0] + frames[-1][2] <= 960 - 60, "❌ Los marcos se salen del margen"
+    assert portrait_slot_size(960) == (frames[0][2] - 24, frames[0][3] - 24), "❌ Hueco del retrato"
+    print(f"✅ Hueco del retrato a 960px: {portrait_slot_size(960)}")
+    return True
+
+
+def test_place_cropped_matches_full_canvas():
+    """Prueba que escalar el recorte recolocado equivale a escalar el lienzo original."""
+    print("🖼️ Probando recolocación de recortes...")
+    full = _portrait()
+    cropped, crop_info = autocrop(full)
+    size = (64, 80)
+    placed = np.asarray(place_cropped(cropped, crop_info, size)).astype(int)
+    expected = np.asarray(full.resize(size, Image.LANCZOS)).astype(int)
+    assert placed.shape == expected.shape, f"❌ Tamaño: {placed.shape}"
+    diff = np.abs(placed[..., 3] - expected[..., 3]).mean()
+    assert diff < 8, f"❌ El contenido no quedó en su sitio (diferencia media de alfa {diff:.1f})"
+    print(f"✅ Diferencia media de alfa {diff:.2f}")
+    return True
+
+
+def test_derivatives_baked_at_save_time():
+    """Prueba que guardar un retrato hornea el derivado al tamaño del marco y la UI lo carga tal cual."""
+    print("🍞 Probando derivados al guardar...")
+    from settings.settings import settings
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame as pg
+    from app.UI.pg_assets import load_image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        saved = (settings.PORTRAIT_DIR, asset_bake._baker)
+        settings.PORTRAIT_DIR, asset_bake._baker = str(tmp / "portraits"), AssetBaker(tmp / "baked")
+        try:
+            path = tmp / "portraits" / "kira.png"
+            slot = portrait_slot_size(settings.WIDTH)
+            assert derivative_sizes(path) == [(slot, not settings.PIXEL_ART_MODE)], \
+                f"❌ Tamaños: {derivative_sizes(path)}"
+            assert derivative_sizes(tmp / "otro" / "kira.png") == [], "❌ Derivados fuera de las carpetas de la UI"
+
+            image, crop_info = autocrop(_portrait())
+            write_behind(image, path, crop_info)
+            assert wait_written(path, timeout=5), "❌ El PNG no se escribió a tiempo"
+            baked = asset_bake._baker.open(path, slot, not settings.PIXEL_ART_MODE)
+            assert baked is not None, "❌ No se horneó el derivado"
+            with baked:
+                assert baked.size == slot and baked.crop_info is None, f"❌ Derivado: {baked.size} {baked.crop_info}"
+
+            pg.display.init()
+            pg.display.set_mode((1, 1))
+            try:
+                surf, info = load_image(str(path), slot, smooth=not settings.PIXEL_ART_MODE)
+                assert surf.get_size() == slot and info is None, "❌ La UI no cargó el derivado"
+            finally:
+                pg.display.quit()
+        finally:
+            settings.PORTRAIT_DIR, asset_bake._baker = saved
+    print(f"✅ Derivado {slot[0]}x{slot[1]} listo al guardar")
+    return True
+
+
+def test_background_derivative_loaded():
+    """Prueba que un fondo guardado se hornea con el filtro de load_background y la escena abre ese blob."""
+    print("🌄 Probando derivado de fondo...")
+    from settings.settings import settings
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame as pg
+    from app.UI.pg_assets import load_background
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        saved = (settings.BG_GEN_DIR, asset_bake._baker)
+        baker = AssetBaker(tmp / "baked")
+        settings.BG_GEN_DIR, asset_bake._baker = str(tmp / "backgrounds"), baker
+        try:
+            path = tmp / "backgrounds" / "background_abc.png"
+            screen = (settings.WIDTH, settings.HEIGHT)
+            assert derivative_sizes(path) == [(screen, False)], f"❌ Tamaños: {derivative_sizes(path)}"
+            write_behind(Image.new("RGB", (64, 48), (30, 90, 160)), path)
+            assert wait_written(path, timeout=5), "❌ El PNG no se escribió a tiempo"
+
+            # Si la escena no encuentra el blob tendría que decodificar el PNG
+            later = []
+            baker.bake_later = lambda *args: later.append(args)
+            pg.display.init()
+            pg.display.set_mode((1, 1))
+            png_load, pg.image.load = pg.image.load, None
+            try:
+                surf = load_background(str(path), screen)
+            finally:
+                pg.image.load = png_load
+                pg.display.quit()
+            assert surf is not None and surf.get_size() == screen, "❌ El fondo no salió del derivado horneado"
+            assert not later, f"❌ Faltaba el blob: {later}"
+        finally:
+            settings.BG_GEN_DIR, asset_bake._baker = saved
+    print(f"✅ Fondo {screen[0]}x{screen[1]} cargado del derivado")
+    return True
+
+
+def test_regenerated_portrait_beats_stale_derivative():
+    """Prueba que, mientras se escribe un retrato regenerado, la UI ve el nuevo y no el derivado antiguo."""
+    print("🔁 Probando regeneración con escritura pendiente...")
+    import threading
+    from settings.settings import settings
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame as pg
+    from app.Agent.Utils.image_handoff import get_writer, publish, discard
+    from app.UI.pg_assets import load_image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        saved = (settings.PORTRAIT_DIR, asset_bake._baker)
+        settings.PORTRAIT_DIR, asset_bake._baker = str(tmp / "portraits"), AssetBaker(tmp / "baked")
+        writer = get_writer()
+        release = threading.Event()
+        try:
+            path = tmp / "portraits" / "kira.png"
+            slot = portrait_slot_size(settings.WIDTH)
+            smooth = not settings.PIXEL_ART_MODE
+            write_behind(Image.new("RGBA", (128, 160), (255, 0, 0, 255)), path)
+            assert wait_written(path, timeout=5), "❌ El PNG no se escribió a tiempo"
+            assert asset_bake._baker.open(path, slot, smooth) is not None, "❌ Falta el derivado antiguo"
+
+            # Retener la escritura de la versión nueva
+            def blocked_write(p, image, crop_info, _write=type(writer)._write):
+                release.wait(5)
+                _write(p, image, crop_info)
+            writer._write = blocked_write
+            publish(path, Image.new("RGBA", (128, 160), (0, 0, 255, 255)))
+
+            pg.display.init()
+            pg.display.set_mode((1, 1))
+            try:
+                surf, _ = load_image(str(path), slot, smooth=smooth)
+                pixel = tuple(surf.get_at((slot[0] // 2, slot[1] // 2)))
+                assert pixel == (0, 0, 255, 255), f"❌ Se cargó la versión antigua: {pixel}"
+            finally:
+                pg.display.quit()
+        finally:
+            release.set()
+            wait_written(path, timeout=5)
+            del writer._write
+            discard(path)
+            wait_written(path, timeout=5)
+            settings.PORTRAIT_DIR, asset_bake._baker = saved
+    print("✅ La imagen en memoria tiene prioridad sobre el derivado antiguo")
+    return True
+
+
+def main():
+    tests = [test_layout_matches_frames, test_place_cropped_matches_full_canvas,
+             test_derivatives_baked_at_save_time, test_background_derivative_loaded,
+             test_regenerated_portrait_beats_stale_derivative]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para la entrega en memoria de imágenes generadas (write-behind).
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.image_handoff import publish, get_rendered, wait_written, discard, get_writer
+from app.Agent.Utils.image_postprocess import read_crop_info
+
+
+def test_publish_then_write_behind():
+    """Prueba que los píxeles están en memoria al instante y el PNG llega después."""
+    print("📤 Probando publicación en memoria...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "retratos" / "kira.png"
+        image = Image.new("RGBA", (24, 32), (200, 30, 30, 255))
+        publish(path, image, (20, 16, 64, 64))
+
+        rendered = get_rendered(str(path))
+        assert rendered is not None, "❌ La imagen no está publicada"
+        assert rendered.size == (24, 32) and rendered.rgba == image.tobytes(), "❌ Píxeles publicados incorrectos"
+        assert rendered.crop_info == (20, 16, 64, 64), "❌ Se perdió la info de recorte"
+
+        assert wait_written(path, timeout=5), "❌ El PNG no se escribió a tiempo"
+        assert path.exists(), "❌ El PNG no está en disco"
+        assert read_crop_info(path) == (20, 16, 64, 64), "❌ El PNG no guarda la info de recorte"
+        assert not any(p.name.endswith(".tmp") for p in path.parent.iterdir()), "❌ Quedó un temporal"
+    print("✅ Memoria inmediata, PNG completo en segundo plano")
+    return True
+
+
+def test_discard_after_pending_write():
+    """Prueba que descartar una previa borra el PNG aunque su escritura siguiera pendiente."""
+    print("🗑️ Probando descarte de previas...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "kira_preview.png"
+        publish(path, Image.new("RGB", (16, 16), "blue"))
+        discard(path)
+        assert get_rendered(path) is None, "❌ La previa sigue publicada"
+        assert get_writer().flush(timeout=5), "❌ La cola no se vació"
+        assert not path.exists(), "❌ El PNG de la previa sigue en disco"
+    print("✅ Previa olvidada y borrada")
+    return True
+
+
+def test_surface_from_memory():
+    """Prueba que la UI crea la superficie desde memoria sin leer el PNG."""
+    print("🖼️ Probando superficie desde memoria...")
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame as pg
+    from app.UI.pg_assets import load_generated
+
+    pg.display.init()
+    try:
+        pg.display.set_mode((1, 1))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "nadie_lo_escribe.png"
+            publish(path, Image.new("RGBA", (8, 4), (10, 20, 30, 255)), (1, 2, 16, 16))
+            surface, crop_info = load_generated(str(path))
+            assert surface.get_size() == (8, 4), f"❌ Tamaño de superficie: {surface.get_size()}"
+            assert tuple(surface.get_at((0, 0))) == (10, 20, 30, 255), "❌ Color de superficie incorrecto"
+            assert crop_info == (1, 2, 16, 16), "❌ Info de recorte incorrecta"
+            wait_written(path, timeout=5)
+    finally:
+        pg.display.quit()
+    print("✅ Superficie creada con frombuffer")
+    return True
+
+
+def main():
+    tests = [test_publish_then_write_behind, test_discard_after_pending_write, test_surface_from_memory]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
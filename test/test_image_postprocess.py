@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el post-procesado de imágenes (matting, autocrop y paleta).
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.image_postprocess import (
+    remove_border_background, autocrop, quantize_palette, save_png, read_crop_info,
+    pixel_art_plan, upscale_nearest,
+)
+
+
+def _figure_with_white_eyes() -> Image.Image:
+    """Fondo blanco, figura roja con un 'ojo' blanco dentro."""
+    arr = np.full((64, 64, 3), 255, dtype=np.uint8)
+    arr[16:48, 20:44] = (200, 30, 30)
+    arr[24:28, 28:32] = (255, 255, 255)
+    return Image.fromarray(arr, "RGB")
+
+
+def test_matting_keeps_interior_whites():
+    """Prueba que solo se quita el fondo conectado al borde."""
+    print("🎨 Probando matting por flood fill desde el borde...")
+    alpha = np.asarray(remove_border_background(_figure_with_white_eyes()))[:, :, 3]
+    assert alpha[0, 0] == 0 and alpha[63, 63] == 0, "❌ El fondo del borde no es transparente"
+    assert alpha[20, 30] == 255, "❌ La figura perdió opacidad"
+    assert alpha[25, 29] == 255, "❌ El blanco interior se volvió transparente"
+    print("✅ Fondo transparente y blancos interiores conservados")
+    return True
+
+
+def test_autocrop_roundtrip():
+    """Prueba que el recorte guarda su offset en el PNG."""
+    print("✂️ Probando autocrop con offset...")
+    cropped, info = autocrop(remove_border_background(_figure_with_white_eyes()))
+    assert cropped.size == (24, 32), f"❌ Tamaño recortado: {cropped.size}"
+    assert info == (20, 16, 64, 64), f"❌ Offset: {info}"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "retrato.png"
+        save_png(cropped, path, info)
+        assert read_crop_info(path) == info, "❌ La info de recorte no se recuperó del PNG"
+    print(f"✅ Recorte {cropped.size} con offset {info}")
+    return True
+
+
+def test_quantize_palette():
+    """Prueba que la paleta se reduce y el alfa queda binario."""
+    print("🟪 Probando cuantización de paleta...")
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, size=(32, 32, 4), dtype=np.uint8)
+    out = np.asarray(quantize_palette(Image.fromarray(rgba, "RGBA"), colors=8))
+    colors = np.unique(out[:, :, :3].reshape(-1, 3), axis=0)
+    assert len(colors) <= 8, f"❌ Colores tras cuantizar: {len(colors)}"
+    assert set(np.unique(out[:, :, 3])) <= {0, 255}, "❌ El alfa no quedó binario"
+    print(f"✅ {len(colors)} colores")
+    return True
+
+
+def test_pixel_art_upscale():
+    """Prueba el plan de generación nativa y la ampliación entera."""
+    print("👾 Probando modo pixel art nativo...")
+    assert pixel_art_plan("512x512", "256x256") == ("256x256", 2), "❌ Plan 512 incorrecto"
+    assert pixel_art_plan("1024x1024", "256x256") == ("256x256", 4), "❌ Plan 1024 incorrecto"
+    assert pixel_art_plan("162x162", "256x256") == ("160x160", 1), "❌ Plan de sprite incorrecto"
+
+    small, info = autocrop(remove_border_background(_figure_with_white_eyes()))
+    big, big_info = upscale_nearest(small, 2, info)
+    assert big.size == (48, 64), f"❌ Tamaño ampliado: {big.size}"
+    assert big_info == (40, 32, 128, 128), f"❌ Offset ampliado: {big_info}"
+    colors = np.unique(np.asarray(big).reshape(-1, 4), axis=0)
+    assert len(colors) == len(np.unique(np.asarray(small).reshape(-1, 4), axis=0)), \
+        "❌ La ampliación introdujo colores intermedios"
+    print(f"✅ {small.size} -> {big.size} sin colores nuevos")
+    return True
+
+
+def main():
+    tests = [test_matting_keeps_interior_whites, test_autocrop_roundtrip, test_quantize_palette,
+             test_pixel_art_upscale]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
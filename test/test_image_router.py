@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el enrutado de imágenes por tier y deadline.
+Los modelos no se cargan: las latencias salen de estimaciones iniciales y mediciones.
+"""
+
+import sys
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from settings.settings import settings
+from app.Agent import image_providers, image_router
+from app.Agent.image_providers import ProceduralProvider, StableDiffusionProvider
+from app.Agent.image_router import (
+    ImageRouter, LatencyEstimator, RouteBackend, build_backend, model_provider_class,
+)
+
+
+class _FakeModel:
+    """Proveedor simulado (sin estado de carga: siempre caliente)"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def generate_image(self, prompt, size="512x512", negative_prompt=None):
+        return ProceduralProvider().generate_image(prompt, size)
+
+
+def _router(sdxl=25.0, tiny=1.5):
+    return ImageRouter([
+        RouteBackend("sdxl", _FakeModel("sdxl"), quality=3, estimator=LatencyEstimator(sdxl)),
+        RouteBackend("tiny", _FakeModel("tiny"), quality=2, estimator=LatencyEstimator(tiny)),
+        RouteBackend("procedural", ProceduralProvider(), quality=0,
+                     estimator=LatencyEstimator(ProceduralProvider.EXPECTED_SECONDS)),
+    ])
+
+
+def test_tiers_and_deadlines():
+    """Prueba la elección por tier: previa rápida, final de calidad y nunca el más lento con deadline."""
+    print("🚦 Probando elección por tier y deadline...")
+    router = _router()
+    assert router.select("preview", "512x512").name == "tiny", "❌ La previa no fue al modelo pequeño"
+    assert router.select("final", "512x512").name == "sdxl", "❌ La final no fue al de más calidad"
+    assert router.select("best_effort", "512x512").name == "sdxl", "❌ Best effort no fue al de más calidad"
+    assert router.select("preview", "512x512", deadline=0.5).name == "procedural", \
+        "❌ Con un deadline imposible debía ir al más rápido"
+    # Aunque el deadline dé para todos, una petición con deadline no va al más lento
+    assert router.select("final", "512x512", deadline=100).name == "tiny", "❌ Fue al backend más lento"
+    # La previa se estima por área: a 1024x1024 el pequeño ya no llega en 2 s
+    assert router.select("preview", "1024x1024").name == "procedural", "❌ No tuvo en cuenta el tamaño"
+    print("✅ preview -> tiny, final -> sdxl, deadline imposible -> procedural")
+    return True
+
+
+def test_live_estimates():
+    """Prueba que las mediciones sustituyen a la estimación inicial y cambian la ruta."""
+    print("⏱️ Probando estimaciones en vivo...")
+    router = _router()
+    tiny = router.backends[1]
+    # El pequeño resulta ser lento en esta máquina
+    tiny.estimator.observe(True, 3.0, 512 * 512)
+    assert router.select("preview", "512x512").name == "procedural", "❌ No usó la latencia medida"
+    for _ in range(10):
+        tiny.estimator.observe(True, 0.8, 512 * 512)
+    assert router.select("preview", "512x512").name == "tiny", "❌ La EWMA no se recuperó"
+    assert tiny.estimator.samples == 11, f"❌ Muestras: {tiny.estimator.samples}"
+    # Una generación fallida no cuenta
+    with router.track(tiny.provider, "512x512", preview=True) as obs:
+        obs.ok = False
+    assert tiny.estimator.samples == 11, "❌ Contó una generación fallida"
+    print(f"✅ Estimación de la previa: {router.estimate(tiny, True, 512 * 512):.2f}s")
+    return True
+
+
+def test_cold_model_avoided_for_previews():
+    """Prueba que un modelo sin cargar no recibe previas y que cada modelo tiene su propio estado."""
+    print("🧊 Probando modelos fríos...")
+    tiny_cls = model_provider_class(StableDiffusionProvider, "segmind/tiny-sd")
+    assert model_provider_class(StableDiffusionProvider, "segmind/tiny-sd") is tiny_cls, "❌ Clase duplicada"
+    assert tiny_cls._lock is not StableDiffusionProvider._lock, "❌ Comparte estado con el modelo por defecto"
+
+    backend = build_backend({"name": "tiny", "provider": "stable_diffusion", "model": "segmind/tiny-sd",
+                             "quality": 2, "seconds": 1.0, "load_seconds": 20})
+    assert backend.provider.model_name == "segmind/tiny-sd", f"❌ Modelo: {backend.provider.model_name}"
+    router = ImageRouter([backend, build_backend({"name": "procedural", "provider": "procedural", "quality": 0})])
+    assert router.select("preview", "512x512").name == "procedural", "❌ La previa fue a un modelo sin cargar"
+    assert router.select("final", "512x512").name == "tiny", "❌ La final sin deadline debe esperar al modelo"
+    saved = tiny_cls._load_status
+    tiny_cls._load_status = {"state": "ready", "stage": "listo", "progress": 1.0, "seconds": 12.0, "error": None}
+    try:
+        assert router.select("preview", "512x512").name == "tiny", "❌ Cargado no se usó para la previa"
+        assert backend.load_seconds == 12.0, "❌ No aprendió el tiempo de carga"
+    finally:
+        tiny_cls._load_status = saved
+    print("✅ Frío -> procedural; cargado -> modelo pequeño")
+    return True
+
+
+def test_factory_returns_router():
+    """Prueba que con backends configurados get_image_provider devuelve el enrutador y genera."""
+    print("🏭 Probando factory con enrutador...")
+    saved = (settings.IMAGE_ROUTER_BACKENDS, image_router._router)
+    settings.IMAGE_ROUTER_BACKENDS = [{"name": "procedural", "provider": "procedural", "quality": 0}]
+    image_router._router = None
+    try:
+        router = image_providers.get_image_provider()
+        assert isinstance(router, ImageRouter), f"❌ Proveedor: {type(router).__name__}"
+        image = router.generate_preview("pixel art knight", size="256x256")
+        assert image is not None and image.size == (256, 256), "❌ No se generó la imagen"
+        assert image.tobytes() == router.generate_image("pixel art knight", size="256x256").tobytes(), \
+            "❌ El generador procedural no es determinista"
+        assert router.stats()["procedural"]["samples"] == 2, f"❌ Stats: {router.stats()}"
+        assert image_providers.preload_image_pipeline() is None, "❌ Precargó sin modelos locales"
+    finally:
+        settings.IMAGE_ROUTER_BACKENDS, image_router._router = saved
+    print("✅ Enrutador desde settings")
+    return True
+
+
+def main():
+    tests = [test_tiers_and_deadlines, test_live_estimates, test_cold_model_avoided_for_previews,
+             test_factory_returns_router]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
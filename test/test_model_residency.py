@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el gestor de residencia de modelos (descarga por inactividad o RSS).
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.model_residency import ModelResidency, current_rss_mb
+from app.Agent.image_providers import StableDiffusionProvider
+
+
+class _FakeModel:
+    """Modelo simulado: 'ocupa' memoria mientras está cargado."""
+
+    def __init__(self):
+        self.loaded = True
+        self.releases = 0
+
+    def release(self):
+        self.loaded = False
+        self.releases += 1
+
+    def rss(self):
+        return 3000.0 if self.loaded else 500.0
+
+
+def test_idle_release_reports_rss():
+    """Prueba que el modelo se libera tras la inactividad y se informa del RSS."""
+    print("💤 Probando liberación por inactividad...")
+    model = _FakeModel()
+    residency = ModelResidency("Fake", lambda: model.loaded, model.release,
+                               idle_seconds=0.1, rss_reader=model.rss)
+    assert residency.check() is None, "❌ Se liberó antes de vencer el plazo"
+    time.sleep(0.15)
+    assert residency.check() == "idle", "❌ No se liberó tras la inactividad"
+    assert model.releases == 1 and not model.loaded, "❌ No se llamó a release"
+    report = residency.last_report
+    assert report["rss_before_mb"] == 3000.0 and report["rss_after_mb"] == 500.0, f"❌ Informe: {report}"
+    assert residency.check() is None, "❌ Se liberó un modelo ya descargado"
+    print(f"✅ Liberado: RSS {report['rss_before_mb']} MB -> {report['rss_after_mb']} MB")
+    return True
+
+
+def test_no_release_while_in_use():
+    """Prueba que no se libera un modelo con una petición en marcha."""
+    print("🔒 Probando que no se libera en uso...")
+    model = _FakeModel()
+    residency = ModelResidency("Fake", lambda: model.loaded, model.release,
+                               idle_seconds=0.05, rss_limit_mb=1000, check_interval=0.5,
+                               rss_reader=model.rss)
+    with residency.use():
+        time.sleep(0.1)
+        assert residency.check() is None, "❌ Se liberó durante el uso"
+    assert model.loaded, "❌ El modelo se descargó"
+    print("✅ El modelo sigue en memoria mientras se usa")
+    return True
+
+
+def test_rss_limit_release():
+    """Prueba que se libera por presión de memoria antes del plazo de inactividad."""
+    print("📈 Probando liberación por RSS...")
+    model = _FakeModel()
+    residency = ModelResidency("Fake", lambda: model.loaded, model.release,
+                               idle_seconds=3600, rss_limit_mb=2000, check_interval=0.5,
+                               rss_reader=model.rss)
+    assert residency.check() is None, "❌ Se liberó justo después de usarse"
+    time.sleep(0.55)
+    assert residency.check() == "rss", "❌ No se liberó con el RSS por encima del límite"
+    assert current_rss_mb() is None or current_rss_mb() > 0, "❌ Lectura de RSS inválida"
+    print("✅ Liberado por RSS")
+    return True
+
+
+def test_sd_unload_reloads_transparently():
+    """Prueba que tras descargar el pipeline la siguiente petición lo recarga."""
+    print("♻️ Probando recarga transparente del pipeline...")
+    cls = StableDiffusionProvider
+    calls = []
+
+    def fake_load(provider):
+        calls.append(1)
+        pipeline = object()
+        cls._pipeline, cls._model_name = pipeline, provider.model_name
+        return pipeline
+
+    saved = (cls._load_pipeline, cls._pipeline, cls._model_name, cls._load_future, cls._load_status)
+    cls._load_pipeline, cls._pipeline, cls._load_future = (lambda self: fake_load(self)), None, None
+    try:
+        first = cls()._get_pipeline()
+        cls._release_pipeline()
+        assert cls._pipeline is None and cls._load_future is None, "❌ El pipeline sigue referenciado"
+        assert cls._load_status["state"] == "idle", f"❌ Estado tras descargar: {cls._load_status}"
+        second = cls()._get_pipeline()
+        assert second is not None and second is not first and len(calls) == 2, "❌ No se recargó"
+    finally:
+        cls._load_pipeline, cls._pipeline, cls._model_name, cls._load_future, cls._load_status = saved
+    print("✅ Descarga y recarga bajo demanda")
+    return True
+
+
+def test_residency_opt_in_and_daemon_pins():
+    """Prueba que la descarga es opt-in y que el daemon de render mantiene su modelo residente."""
+    print("📌 Probando residencia opt-in y modelo fijado en el daemon...")
+    import tempfile
+    from settings.settings import settings
+    from app.Agent.render_daemon import RenderDaemon
+
+    class _Provider(StableDiffusionProvider):
+        pass
+
+    saved = (settings.SD_IDLE_UNLOAD_SECONDS, settings.SD_RSS_LIMIT_MB)
+    try:
+        settings.SD_IDLE_UNLOAD_SECONDS, settings.SD_RSS_LIMIT_MB = 0, 0
+        assert _Provider._get_residency() is None, "❌ Residencia activa sin plazo ni límite"
+        settings.SD_IDLE_UNLOAD_SECONDS = 600
+        residency = _Provider._get_residency()
+        assert residency is not None, "❌ La residencia configurada no se creó"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            daemon = RenderDaemon(Path(tmp) / "render.sock", provider=_Provider())
+            daemon.start(warm=False)
+            daemon.close()
+        assert _Provider._pinned and _Provider._get_residency() is None, "❌ El daemon no fijó el modelo"
+        assert residency._stopped.is_set(), "❌ La vigilancia sigue activa en el daemon"
+        assert not StableDiffusionProvider._pinned, "❌ Fijar un backend afectó a otro"
+    finally:
+        settings.SD_IDLE_UNLOAD_SECONDS, settings.SD_RSS_LIMIT_MB = saved
+    print("✅ Sin descarga por defecto y modelo residente en el daemon")
+    return True
+
+
+def main():
+    tests = [test_idle_release_reports_rss, test_no_release_while_in_use,
+             test_rss_limit_release, test_sd_unload_reloads_transparently,
+             test_residency_opt_in_and_daemon_pins]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
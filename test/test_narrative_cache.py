@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para verificar la cache por similitud de narrativas.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.narrative_cache import NarrativeCache, character_features
+from app.domain.character import Character
+
+
+def test_similar_character_reuses_narrative():
+    """Prueba que un personaje parecido reutiliza la narrativa con su nombre."""
+    print("📖 Probando reutilización por similitud...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = NarrativeCache(Path(tmp))
+        kumo = Character("Kumo", 7, 4, "katana", "Ninja veloz de las sombras", "")
+        raven = Character("Raven", 8, 4, "katana", "Ninja veloz de la sombra", "")
+        grom = Character("Grom", 2, 9, "martillo de guerra", "Gigante lento y brutal", "")
+
+        cache.add("intro", character_features(kumo, "player"), {"player": "Kumo"},
+                  {"introduction": "Kumo desenvaina su katana. Kumoria observa."})
+
+        hit = cache.lookup("intro", character_features(raven, "player"), {"player": "Raven"}, 0.9)
+        assert hit is not None, "❌ Un personaje parecido debería reutilizar la narrativa"
+        assert hit["introduction"] == "Raven desenvaina su katana. Kumoria observa.", f"❌ Nombres mal sustituidos: {hit}"
+
+        miss = cache.lookup("intro", character_features(grom, "player"), {"player": "Grom"}, 0.9)
+        assert miss is None, "❌ Un personaje distinto no debería reutilizar la narrativa"
+
+        other_kind = cache.lookup("combat:victoria", character_features(kumo, "player"), {"player": "Kumo"}, 0.9)
+        assert other_kind is None, "❌ Solo se compara con narrativas del mismo tipo"
+    print("✅ Reutilización correcta")
+    return True
+
+
+def test_cache_persists_between_instances():
+    """Prueba que la cache se recarga desde disco."""
+    print("\n💾 Probando persistencia...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = NarrativeCache(Path(tmp))
+        cache.add("beat:victory", "player arma arco enemy Orco", {"player": "Lia"}, "Lia celebra la victoria.")
+        cache.save()
+
+        reloaded = NarrativeCache(Path(tmp))
+        assert len(reloaded) == 1, f"❌ Entradas recargadas: {len(reloaded)}"
+        hit = reloaded.lookup("beat:victory", "player arma arco enemy Orco", {"player": "Tao"}, 0.95)
+        assert hit == "Tao celebra la victoria.", f"❌ Narrativa recargada: {hit}"
+    print("✅ Persistencia correcta")
+    return True
+
+
+def test_empty_cache_file():
+    """Prueba que un JSONL vacío o solo con líneas en blanco no rompe la carga."""
+    print("\n📭 Probando cache vacía en disco...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "narrative_cache.jsonl").write_text("\n  \n", encoding="utf-8")
+        cache = NarrativeCache(Path(tmp))
+        assert len(cache) == 0, f"❌ Entradas: {len(cache)}"
+        assert cache.lookup("intro", "player arma arco", {"player": "Lia"}, 0.5) is None, "❌ Hit en cache vacía"
+        cache.add("intro", "player arma arco", {"player": "Lia"}, "Lia tensa el arco.")
+        hit = cache.lookup("intro", "player arma arco", {"player": "Tao"}, 0.95)
+        assert hit == "Tao tensa el arco.", f"❌ No se pudo añadir tras cargar vacía: {hit}"
+    print("✅ Cache vacía cargada sin errores")
+    return True
+
+
+def test_many_adds_grow_matrix():
+    """Prueba que muchas altas (con la matriz creciendo al doble) se recuperan, también tras recargar."""
+    print("\n📈 Probando muchas altas...")
+
+    weapons = ["arco", "katana", "hacha", "lanza", "dagas", "baston", "maza", "latigo", "tridente", "guadana"]
+    requests = [(kind, f"player arma {weapons[i % 10]} {kind} variante {i}", f"Lia usa {weapons[i % 10]} ({kind} {i}).")
+                for i in range(40) for kind in ("intro", "combat")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = NarrativeCache(Path(tmp))
+        for kind, features, output in requests:
+            cache.add(kind, features, {"player": "Lia"}, output)
+        # 40 altas por tipo: la capacidad crece al doble (16 -> 32 -> 64), no fila a fila
+        assert len(cache._matrix_by_kind["intro"]) == 64, f"❌ Capacidad: {len(cache._matrix_by_kind['intro'])}"
+        cache.save()
+
+        for current in (cache, NarrativeCache(Path(tmp))):
+            assert len(current) == len(requests), f"❌ Entradas: {len(current)}"
+            for kind, features, output in requests[::7]:
+                hit = current.lookup(kind, features, {"player": "Lia"}, 0.999)
+                assert hit == output, f"❌ {kind} '{features}': {hit}"
+    print(f"✅ {len(requests)} narrativas recuperadas")
+    return True
+
+
+def main():
+    tests = [test_similar_character_reuses_narrative, test_cache_persists_between_instances, test_empty_cache_file,
+             test_many_adds_grow_matrix]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
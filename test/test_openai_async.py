@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el proveedor OpenAI asíncrono contra un endpoint local (stub).
+"""
+
+import sys
+import json
+import time
+import base64
+import threading
+from io import BytesIO
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils import concurrency
+from app.Agent.Utils.concurrency import AdaptiveLimiter
+
+
+class _StubState:
+    def __init__(self, rate_limited: int):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.rate_limited = rate_limited
+
+
+def _png_b64() -> str:
+    buf = BytesIO()
+    Image.new("RGB", (32, 32), (10, 200, 30)).save(buf, "PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def _start_stub(state: _StubState):
+    """Servidor que imita POST /v1/images/generations (los primeros responden 429)."""
+    payload = json.dumps({"created": 0, "data": [{"b64_json": _png_b64()}]}).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with state.lock:
+                state.requests += 1
+                limited = state.rate_limited > 0
+                if limited:
+                    state.rate_limited -= 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                if limited:
+                    body = b'{"error": {"message": "rate limit", "type": "rate_limit"}}'
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0")
+                else:
+                    time.sleep(0.2)
+                    body = payload
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _with_limiter(**config):
+    """Ejecuta la prueba con un limitador 'openai_image' nuevo (el registro es global)."""
+    def decorator(test):
+        def run():
+            saved = concurrency._limiters.get("openai_image")
+            limiter = AdaptiveLimiter("openai_image", **config)
+            concurrency._limiters["openai_image"] = limiter
+            try:
+                return test(limiter)
+            finally:
+                if saved is None:
+                    concurrency._limiters.pop("openai_image", None)
+                else:
+                    concurrency._limiters["openai_image"] = saved
+        run.__name__ = test.__name__
+        run.__doc__ = test.__doc__
+        return run
+    return decorator
+
+
+@_with_limiter(initial=4, min_limit=1, max_limit=16)
+def test_concurrent_requests_with_backoff(limiter):
+    """Prueba que 4 retratos se piden a la vez y que un 429 se reintenta y baja el límite compartido."""
+    print("🌐 Probando proveedor OpenAI asíncrono contra stub local...")
+    from openai import AsyncOpenAI
+    from app.Agent.image_providers import AsyncOpenAIProvider
+
+    state = _StubState(rate_limited=1)
+    server = _start_stub(state)
+    try:
+        client = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+        provider = AsyncOpenAIProvider(client=client, max_concurrency=4)
+        provider.backoff_base = 0.01
+
+        results = [None] * 4
+
+        def worker(i):
+            results[i] = provider.generate_image(f"retrato {i}", size="1024x1024", background="transparent")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+
+        assert all(isinstance(img, Image.Image) for img in results), f"❌ Resultados: {results}"
+        assert all(img.mode == "RGBA" for img in results), "❌ La imagen no se decodificó a RGBA"
+        assert provider.retries == 1, f"❌ Reintentos: {provider.retries}"
+        assert state.requests == 5, f"❌ Peticiones al stub: {state.requests}"
+        # Cada intento (también el 429, que cuenta como error y reduce el límite) pasa por el limitador
+        stats = limiter.stats()
+        assert stats["completed"] == 5 and stats["errors"] == 1, f"❌ Limitador: {stats}"
+        assert 3 <= state.max_in_flight <= 4, f"❌ Máximo en vuelo: {state.max_in_flight}"
+        assert limiter.in_flight == 0, "❌ Quedaron huecos sin devolver"
+    finally:
+        server.shutdown()
+    print(f"✅ {state.max_in_flight} en vuelo, {provider.retries} reintento tras 429")
+    return True
+
+
+@_with_limiter(initial=1, min_limit=1, max_limit=1)
+def test_limiter_bounds_async_requests(limiter):
+    """Prueba que el limitador 'openai_image' acota las peticiones aunque el semáforo permita más."""
+    print("🚥 Probando limitador compartido...")
+    from openai import AsyncOpenAI
+    from app.Agent.image_providers import AsyncOpenAIProvider
+
+    state = _StubState(rate_limited=0)
+    server = _start_stub(state)
+    try:
+        client = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+        provider = AsyncOpenAIProvider(client=client, max_concurrency=4)
+        images = provider.generate_many([f"p{i}" for i in range(3)], size="1024x1024")
+        assert all(img is not None for img in images), "❌ Alguna imagen falló"
+        assert state.max_in_flight == 1, f"❌ Máximo en vuelo: {state.max_in_flight}"
+        assert limiter.stats()["completed"] == 3, f"❌ Llamadas medidas: {limiter.stats()}"
+    finally:
+        server.shutdown()
+    print("✅ Una sola petición en vuelo con límite 1")
+    return True
+
+
+@_with_limiter(initial=4, min_limit=1, max_limit=16)
+def test_concurrency_is_bounded(limiter):
+    """Prueba que el semáforo limita las peticiones en vuelo."""
+    print("🚦 Probando límite de concurrencia...")
+    from openai import AsyncOpenAI
+    from app.Agent.image_providers import AsyncOpenAIProvider
+
+    state = _StubState(rate_limited=0)
+    server = _start_stub(state)
+    try:
+        client = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+        provider = AsyncOpenAIProvider(client=client, max_concurrency=2)
+        images = provider.generate_many([f"p{i}" for i in range(5)], size="1024x1024")
+        assert all(img is not None for img in images), "❌ Alguna imagen falló"
+        assert state.max_in_flight == 2, f"❌ Máximo en vuelo: {state.max_in_flight}"
+    finally:
+        server.shutdown()
+    print("✅ Nunca más de 2 en vuelo")
+    return True
+
+
+def main():
+    tests = [test_concurrent_requests_with_backoff, test_limiter_bounds_async_requests, test_concurrency_is_bounded]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para la creación de candidatos en paralelo.
+El Runner se sustituye por uno simulado: no se llama a ningún modelo.
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import app.Agent.agent_character_creator as character_creator
+from app.Agent.agents import StructuredResult
+from app.Agent.agent_character_creator import create_candidates_parallel
+
+
+class _FakeRunner:
+    """Runner simulado: cada llamada consume la siguiente respuesta (dict, excepción o (dict, segundos))."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def run_structured(self, agent, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.prompts.append(prompt)
+            response = self.responses.pop(0) if self.responses else RuntimeError("sin respuestas")
+        if isinstance(response, tuple):
+            response, delay = response
+            time.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        return StructuredResult(arguments=response, raw=None)
+
+
+def _enemy(name, weapon="espada", description="Guerrero errante"):
+    return {"name": name, "damage": 6, "resistence": 4, "weapon": weapon, "description": description}
+
+
+def _run(responses, n):
+    runner = _FakeRunner(responses)
+    previous = character_creator.Runner
+    character_creator.Runner = runner
+    try:
+        start = time.perf_counter()
+        out = create_candidates_parallel(n)
+        return out, runner, time.perf_counter() - start
+    finally:
+        character_creator.Runner = previous
+
+
+def test_calls_run_in_parallel_without_extras():
+    """Prueba que las n llamadas van en paralelo y que sin fallos no se lanza ninguna más."""
+    print("🏁 Probando n llamadas en paralelo...")
+    out, runner, elapsed = _run([(_enemy(name), 0.2) for name in ("Kumo", "Lia", "Raven")], n=3)
+    names = {ch.name for ch in out}
+    assert names == {"Kumo", "Lia", "Raven"}, f"❌ Candidatos: {names}"
+    assert elapsed < 0.5, f"❌ Las llamadas no fueron en paralelo: {elapsed:.2f}s"
+    assert runner.calls == 3, f"❌ Llamadas: {runner.calls} (esperado n, sin sobrantes)"
+    print(f"✅ {sorted(names)} en {elapsed:.2f}s con {runner.calls} llamadas")
+    return True
+
+
+def test_replacement_bans_accepted_names():
+    """Prueba que el reemplazo de un repetido veta los nombres ya aceptados."""
+    print("🚫 Probando nombres vetados en los reemplazos...")
+    # La 2ª respuesta tarda: cuando llega el repetido, Kumo ya está aceptado
+    responses = [_enemy("Kumo"), (_enemy("KUMO"), 0.1), _enemy("Lia")]
+    out, runner, _ = _run(responses, n=2)
+    names = [ch.name for ch in out]
+    assert names == ["Kumo", "Lia"], f"❌ Candidatos: {names}"
+    assert runner.calls == 3, f"❌ Llamadas: {runner.calls}"
+    assert "[kumo]" in runner.prompts[-1], f"❌ El reemplazo no vetó a Kumo: {runner.prompts[-1]}"
+    print(f"✅ {names}; el reemplazo vetó a Kumo")
+    return True
+
+
+def test_invalid_results_discarded():
+    """Prueba que se descartan fallos, campos vacíos y nombres repetidos, relanzando llamadas."""
+    print("🧹 Probando descarte de candidatos inválidos...")
+    responses = [
+        _enemy("Kumo"),
+        RuntimeError("timeout"),
+        _enemy("Sin arma", weapon=""),
+        _enemy("  "),
+        _enemy("KUMO"),                          # mismo nombre normalizado
+        _enemy("Raven"),
+        _enemy("Grom"),
+    ]
+    out, runner, _ = _run(responses, n=3)
+    names = [ch.name for ch in out]
+    # Kumo y KUMO compiten: gana el que llegue antes, pero solo uno
+    assert sorted(name.lower() for name in names) == ["grom", "kumo", "raven"], f"❌ Candidatos: {names}"
+    assert runner.calls == 7, f"❌ Llamadas: {runner.calls}"
+    print(f"✅ {names} tras {runner.calls} llamadas")
+    return True
+
+
+def test_placeholders_fill_the_batch():
+    """Prueba que, agotados los intentos (n*3), se rellena con placeholders."""
+    print("🧩 Probando relleno con placeholders...")
+    responses = [_enemy("Kumo")] + [RuntimeError("caído")] * 10
+    out, runner, _ = _run(responses, n=3)
+    names = [ch.name for ch in out]
+    assert len(out) == 3 and names[0] == "Kumo", f"❌ Candidatos: {names}"
+    assert names[1:] == ["Enemigo_2", "Enemigo_3"], f"❌ Placeholders: {names[1:]}"
+    assert out[1].description == "placeholder", "❌ No es el personaje de relleno"
+    assert runner.calls == 9, f"❌ Intentos: {runner.calls} (máximo n*3)"
+    print(f"✅ {names} con {runner.calls} intentos")
+    return True
+
+
+def main():
+    tests = [test_calls_run_in_parallel_without_extras, test_replacement_bans_accepted_names,
+             test_invalid_results_discarded, test_placeholders_fill_the_batch]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el índice de hashes perceptuales (pHash/dHash + BK-tree).
+"""
+
+import sys
+import random
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils import perceptual_hash
+from app.Agent.Utils.perceptual_hash import (
+    BKTree, PerceptualIndex, dhash, hamming, is_indexable, phash,
+)
+
+
+def _figure(seed: int, size: int = 256) -> Image.Image:
+    """Figura sobre fondo transparente (como un retrato generado)"""
+    rng = random.Random(seed)
+    img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        x, y = rng.randrange(size // 2), rng.randrange(size // 2)
+        w, h = rng.randrange(20, size // 2), rng.randrange(20, size // 2)
+        color = tuple(rng.randrange(256) for _ in range(3)) + (255,)
+        draw.ellipse((x, y, x + w, y + h), fill=color)
+    return img
+
+
+def _noisy(img: Image.Image, seed: int) -> Image.Image:
+    arr = np.asarray(img).astype(np.int16)
+    noise = np.random.default_rng(seed).integers(-12, 13, size=arr.shape[:2] + (3,))
+    arr[..., :3] = np.clip(arr[..., :3] + noise, 0, 255)
+    return Image.fromarray(arr.astype(np.uint8), "RGBA").resize((200, 200))
+
+
+def test_hashes_are_perceptual():
+    """Prueba que ruido y reescalado apenas cambian el hash y otra imagen sí."""
+    print("🔍 Probando pHash/dHash...")
+    base, other = _figure(1), _figure(2)
+    near = _noisy(base, 3)
+    d_near, d_far = hamming(phash(base), phash(near)), hamming(phash(base), phash(other))
+    assert d_near <= 6, f"❌ pHash de la variante demasiado lejos: {d_near}"
+    assert d_far > 12, f"❌ pHash de otra imagen demasiado cerca: {d_far}"
+    assert hamming(dhash(base), dhash(near)) < hamming(dhash(base), dhash(other)), "❌ dHash no discrimina"
+    assert 0 <= phash(base) < 2 ** 64, "❌ El hash no es de 64 bits"
+    print(f"✅ Distancias: variante {d_near}, otra imagen {d_far}")
+    return True
+
+
+def test_bktree_matches_brute_force():
+    """Prueba que el BK-tree devuelve lo mismo que recorrer todos los hashes."""
+    print("🌳 Probando BK-tree...")
+    rng = np.random.default_rng(0)
+    values = [int(v) for v in rng.integers(0, 2 ** 63, size=2000, dtype=np.int64)]
+    # Algunos vecinos cercanos del primero
+    values += [values[0] ^ (1 << bit) for bit in range(5)]
+    tree = BKTree()
+    for i, v in enumerate(values):
+        tree.add(v, str(i))
+    for q in values[:20]:
+        expected = sorted((hamming(q, v), str(i)) for i, v in enumerate(values) if hamming(q, v) <= 8)
+        assert tree.search(q, 8) == expected, "❌ El BK-tree no coincide con la búsqueda exhaustiva"
+    assert len(tree.search(values[0], 1)) >= 6, "❌ No encontró los vecinos a 1 bit"
+    print(f"✅ {len(tree)} hashes, resultados idénticos a la búsqueda exhaustiva")
+    return True
+
+
+def test_index_persists_and_groups_duplicates():
+    """Prueba el índice en disco: búsqueda, grupos de casi duplicados y sincronización."""
+    print("🗂️ Probando índice persistente...")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        portraits = root / "portraits"
+        (portraits / "lowres").mkdir(parents=True)
+        _figure(1).save(portraits / "sombra-oscura.png")
+        _noisy(_figure(1), 5).save(portraits / "sombra-de-terror.png")
+        _figure(2).save(portraits / "bestia-feroz.png")
+        _figure(1).save(portraits / "sombra-oscura.preview.png")
+        _figure(1).save(portraits / "lowres" / "sombra-oscura.png")
+        assert not is_indexable(portraits / "sombra-oscura.preview.png"), "❌ Las previas no se indexan"
+
+        index = PerceptualIndex(root / "phash.json", root=root)
+        assert index.rebuild(portraits.rglob("*.png")) == 3, "❌ Debían hashearse 3 imágenes"
+        groups = index.duplicates(6)
+        assert [sorted(p.name for p in g) for g in groups] == [["sombra-de-terror.png", "sombra-oscura.png"]], \
+            f"❌ Grupos: {groups}"
+        similar = index.find_similar(_figure(1), 6, exclude=portraits / "sombra-oscura.png")
+        assert similar == portraits / "sombra-de-terror.png", f"❌ Más parecida: {similar}"
+
+        reloaded = PerceptualIndex(root / "phash.json", root=root)
+        assert len(reloaded) == 3, "❌ El índice no se recargó del disco"
+        (portraits / "bestia-feroz.png").unlink()
+        assert reloaded.rebuild(portraits.rglob("*.png")) == 0 and len(reloaded) == 2, \
+            "❌ La sincronización volvió a hashear o no olvidó el fichero borrado"
+    print("✅ Índice persistente, grupos correctos y rehasheo solo de cambios")
+    return True
+
+
+def test_reindex_gray_files_and_batched_saves():
+    """Prueba que reindexar una ruta olvida su hash antiguo, que se leen PNG en gris y que add() agrupa escrituras."""
+    print("🔄 Probando reindexado, gris y escrituras agrupadas...")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        path = root / "x.png"
+        _figure(1).save(path)
+        index = PerceptualIndex(root / "phash.json", root=root)
+        index.add(path)
+        assert index.search(_figure(1), 0) == [(0, path)], "❌ No se indexó"
+
+        # Retrato regenerado con el mismo nombre: el hash antiguo ya no debe encontrarlo
+        _figure(2).save(path)
+        index.add(path)
+        assert index.search(_figure(1), 0) == [], f"❌ El hash antiguo sigue en el índice: {index.search(_figure(1), 0)}"
+        assert [p for _, p in index.search(_figure(2), 0)] == [path], "❌ No encontró el hash nuevo"
+
+        gray = root / "gris.png"
+        _figure(3).convert("L").save(gray)
+        assert phash(gray) == phash(_figure(3).convert("L")), "❌ pHash de un PNG en gris"
+        assert index.rebuild([path, gray]) == 1, "❌ rebuild con un PNG en gris"
+
+        # Altas sueltas: el JSON se escribe cada SAVE_EVERY y en save()
+        before = (root / "phash.json").stat().st_mtime_ns
+        for i in range(perceptual_hash.SAVE_EVERY - 1):
+            extra = root / f"extra{i}.png"
+            _figure(10 + i, size=64).save(extra)
+            index.add(extra)
+        assert (root / "phash.json").stat().st_mtime_ns == before, "❌ add() reescribió el JSON en cada alta"
+        assert len(PerceptualIndex(root / "phash.json", root=root)) == 2, "❌ Se guardó antes de tiempo"
+        index.save()
+        assert len(PerceptualIndex(root / "phash.json", root=root)) == len(index), "❌ save() no escribió las altas"
+    print("✅ Hash sustituido, PNG en gris y JSON escrito por lotes")
+    return True
+
+
+def test_renderer_reuses_similar_portrait():
+    """Prueba que una previa casi idéntica a un retrato existente lo reutiliza."""
+    print("♻️ Probando reutilización de retratos parecidos...")
+    from settings.settings import settings
+    from app.Agent import image_renderer
+    from app.Agent.Utils.image_handoff import get_rendered, publish, wait_written
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        existing = root / "sombra-oscura.png"
+        _figure(1).save(existing)
+        index = PerceptualIndex(root / "phash.json", root=root)
+        index.rebuild([existing])
+
+        preview = root / "sombra-de-terror.preview.png"
+        publish(preview, _noisy(_figure(1), 7))
+        wait_written(preview)
+        saved = (perceptual_hash._index, getattr(settings, 'PHASH_REUSE_RADIUS', 0))
+        perceptual_hash._index, settings.PHASH_REUSE_RADIUS = index, 6
+        try:
+            out = root / "sombra-de-terror.png"
+            assert image_renderer._reuse_similar(preview, out), "❌ No se reutilizó el retrato parecido"
+            assert get_rendered(out) is not None, "❌ El retrato reutilizado no se publicó"
+            settings.PHASH_REUSE_RADIUS = 0
+            assert not image_renderer._reuse_similar(preview, root / "otro.png"), "❌ Reutilizó con radio 0"
+        finally:
+            wait_written(root / "sombra-de-terror.png")
+            perceptual_hash._index, settings.PHASH_REUSE_RADIUS = saved
+    print("✅ Previa casi idéntica -> retrato existente")
+    return True
+
+
+def main():
+    tests = [test_hashes_are_perceptual, test_bktree_matches_brute_force,
+             test_index_persists_and_groups_duplicates, test_reindex_gray_files_and_batched_saves,
+             test_renderer_reuses_similar_portrait]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
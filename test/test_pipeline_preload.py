@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para la precarga del pipeline de Stable Diffusion.
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.image_providers import StableDiffusionProvider, get_pipeline_status
+
+
+class _FakeLoad:
+    """Sustituye la carga real: tarda un poco, cuenta llamadas y puede fallar la primera vez."""
+
+    def __init__(self, fail_first=False):
+        self.calls = 0
+        self.fail_first = fail_first
+
+    def __call__(self, provider):
+        self.calls += 1
+        time.sleep(0.2)
+        if self.fail_first and self.calls == 1:
+            raise RuntimeError("sin memoria")
+        pipeline = object()
+        StableDiffusionProvider._pipeline = pipeline
+        StableDiffusionProvider._model_name = provider.model_name
+        return pipeline
+
+
+def _with_fake_load(fake, body):
+    cls = StableDiffusionProvider
+    saved = (cls._load_pipeline, cls._pipeline, cls._model_name, cls._load_future, cls._load_status)
+    cls._load_pipeline, cls._pipeline, cls._load_future = (lambda self: fake(self)), None, None
+    try:
+        return body()
+    finally:
+        cls._load_pipeline, cls._pipeline, cls._model_name, cls._load_future, cls._load_status = saved
+
+
+def test_requests_wait_on_preload():
+    """Prueba que las peticiones durante la precarga esperan a la misma carga."""
+    print("⏳ Probando precarga compartida...")
+    fake = _FakeLoad()
+
+    def body():
+        future = StableDiffusionProvider.preload()
+        assert get_pipeline_status()["state"] == "loading", "❌ La precarga no se ve como 'loading'"
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(StableDiffusionProvider()._get_pipeline()))
+                   for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        assert fake.calls == 1, f"❌ Cargas: {fake.calls} (esperada 1)"
+        assert len(results) == 3 and all(r is future.result() for r in results), "❌ Pipelines distintos"
+        status = get_pipeline_status()
+        assert status["state"] == "ready" and status["seconds"] >= 0.2, f"❌ Estado final: {status}"
+        return status
+
+    status = _with_fake_load(fake, body)
+    print(f"✅ Una sola carga ({status['seconds']}s) para precarga + 3 peticiones")
+    return True
+
+
+def test_failed_load_is_retried():
+    """Prueba que una carga fallida no se queda cacheada."""
+    print("🔁 Probando reintento tras fallo de carga...")
+    fake = _FakeLoad(fail_first=True)
+
+    def body():
+        try:
+            StableDiffusionProvider()._get_pipeline()
+            raise AssertionError("❌ La carga fallida no propagó el error")
+        except RuntimeError:
+            pass
+        assert get_pipeline_status()["state"] == "error", "❌ El error no se ve en el estado"
+        assert StableDiffusionProvider()._get_pipeline() is not None, "❌ No se reintentó la carga"
+        assert fake.calls == 2, f"❌ Cargas: {fake.calls}"
+
+    _with_fake_load(fake, body)
+    print("✅ Error visible y segunda carga correcta")
+    return True
+
+
+def main():
+    tests = [test_requests_wait_on_preload, test_failed_load_is_retried]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el renderizado progresivo de retratos (previa y final).
+Usa el proveedor procedural: no se carga ningún modelo.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from settings.settings import settings
+from app.Agent import image_renderer
+from app.Agent.agent_art_director import PortraitSpec
+from app.Agent.image_providers import ProceduralProvider, StableDiffusionProvider
+from app.Agent.Utils import image_cache
+from app.Agent.Utils.image_cache import ImageCache
+from app.Agent.Utils.image_handoff import wait_written
+
+_SETTINGS = {"PIXEL_ART_MODE": False, "PHASH_REUSE_RADIUS": 0,
+             "PHASH_INDEX_ENABLED": False, "ASSET_BAKE_ENABLED": False}
+
+
+def test_preview_then_final_and_cache_hit():
+    """Prueba que on_update recibe la previa y luego la final, y que sin previa si la final está en cache."""
+    print("🎞️ Probando renderizado progresivo...")
+    saved_settings = {name: getattr(settings, name, None) for name in _SETTINGS}
+    saved = image_renderer._image_provider, image_cache._cache
+    try:
+        for name, value in _SETTINGS.items():
+            setattr(settings, name, value)
+        image_renderer._image_provider = ProceduralProvider()
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            image_cache._cache = ImageCache(tmp / "cache", max_bytes=0)
+            spec = PortraitSpec(name="Kira", prompt="guerrera de armadura azul", style="pixel art")
+            updates = []
+            on_update = lambda name, path, final: updates.append((name, Path(path).name, final))
+
+            path = image_renderer._render_progressive(spec, tmp / "a", "256x256", on_update, preview=True)
+            assert path == tmp / "a" / "kira.png", f"❌ Ruta final: {path}"
+            assert updates == [("Kira", "kira.preview.png", False), ("Kira", "kira.png", True)], \
+                f"❌ Orden de avisos: {updates}"
+            assert wait_written(path, timeout=5), "❌ No se escribió la final"
+
+            # La final ya está en la cache por contenido: no hace falta previa
+            updates.clear()
+            path = image_renderer._render_progressive(spec, tmp / "b", "256x256", on_update, preview=True)
+            assert updates == [("Kira", "kira.png", True)], f"❌ Avisos con la final en cache: {updates}"
+            assert path.exists() and not (tmp / "b" / "kira.preview.png").exists(), "❌ Generó una previa inútil"
+
+            # Sin previas solo hay un aviso
+            updates.clear()
+            image_renderer._render_progressive(spec, tmp / "c", "256x256", on_update, preview=False)
+            assert updates == [("Kira", "kira.png", True)], f"❌ Avisos sin previa: {updates}"
+    finally:
+        image_renderer._image_provider, image_cache._cache = saved
+        for name, value in saved_settings.items():
+            setattr(settings, name, value)
+    print("✅ previa -> final; con la final en cache solo final")
+    return True
+
+
+def test_preview_steps_and_cache_key():
+    """Prueba que la previa respeta el mínimo de steps del modelo y que su clave incluye escala y steps."""
+    print("🔧 Probando steps y clave de la previa...")
+
+    class _Provider(StableDiffusionProvider):
+        """Sin modelo: anota la clave (ancho, alto, steps, guidance) de cada render."""
+        MODEL = "stabilityai/sdxl-turbo"
+        keys = []
+
+        def _get_pipeline(self):
+            return None
+
+        def _generate(self, prompt, negative_prompt, key):
+            self.keys.append(key)
+            return None
+
+    saved = settings.SD_PREVIEW_STEPS, settings.PORTRAIT_PREVIEW_SCALE
+    try:
+        settings.SD_PREVIEW_STEPS = 4
+        provider = _Provider()
+        provider.generate_preview("guerrera", size="512x512")
+        assert provider.keys[-1][2] == 10, f"❌ Steps de la previa: {provider.keys[-1][2]} (mínimo 10 en Turbo)"
+
+        spec = PortraitSpec(name="Kira", prompt="guerrera de armadura azul", style="pixel art")
+        procedural = ProceduralProvider()
+        request = lambda preview: image_renderer._portrait_request(spec, "256x256", procedural, preview)[3]
+        preview_key, final_key = request(True), request(False)
+        settings.SD_PREVIEW_STEPS = 6
+        steps_key = request(True)
+        assert steps_key != preview_key, "❌ La clave de la previa ignora SD_PREVIEW_STEPS"
+        settings.PORTRAIT_PREVIEW_SCALE = 0.25
+        assert request(True) != steps_key, "❌ La clave de la previa ignora PORTRAIT_PREVIEW_SCALE"
+        assert request(False) == final_key, "❌ Los ajustes de la previa cambiaron la clave de la final"
+    finally:
+        settings.SD_PREVIEW_STEPS, settings.PORTRAIT_PREVIEW_SCALE = saved
+    print("✅ Previa con 10 steps y clave por escala y steps")
+    return True
+
+
+def main():
+    tests = [test_preview_then_final_and_cache_hit, test_preview_steps_and_cache_key]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
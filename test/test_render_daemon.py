@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para verificar el daemon de render (socket Unix + memoria compartida).
+"""
+
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from PIL import Image
+
+from app.Agent.render_daemon import RenderDaemon, RenderDaemonProvider
+
+
+class _FakeProvider:
+    """Proveedor de prueba: color según el prompt"""
+    model_name = "fake"
+
+    def generate_image(self, prompt, size="512x512"):
+        w, h = (int(v) for v in size.split("x"))
+        return Image.new("RGB", (w, h), (255, 0, 0) if prompt == "rojo" else (0, 0, 255))
+
+    def generate_preview(self, prompt, size="512x512"):
+        return None
+
+
+def test_daemon_roundtrip():
+    """Prueba que el cliente recibe la imagen del daemon por memoria compartida."""
+    print("🛰️ Probando daemon de render...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sock = Path(tmp) / "render.sock"
+        assert RenderDaemonProvider.connect(sock) is None, "❌ No debería haber daemon todavía"
+
+        daemon = RenderDaemon(sock, provider=_FakeProvider())
+        daemon.start(warm=False)
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = RenderDaemonProvider.connect(sock)
+            assert client is not None, "❌ El cliente no detectó el daemon"
+
+            image = client.generate_image("rojo", size="64x32")
+            assert image is not None and image.size == (64, 32), f"❌ Imagen inesperada: {image}"
+            assert image.getpixel((0, 0)) == (255, 0, 0), "❌ Contenido de la imagen incorrecto"
+
+            assert client.generate_preview("rojo", size="64x32") is None, "❌ Un fallo del proveedor debe devolver None"
+        finally:
+            daemon.shutdown()
+            thread.join(timeout=5)
+        assert not sock.exists(), "❌ El socket no se eliminó al cerrar"
+    print("✅ Imagen recibida por memoria compartida")
+    return True
+
+
+def main():
+    tests = [test_daemon_roundtrip]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
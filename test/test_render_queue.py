@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para verificar el micro-batching de la cola de render.
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from settings.settings import settings
+from app.Agent.image_providers import StableDiffusionProvider, IMG2IMG_OP
+from app.Agent.Utils.render_queue import (
+    RenderQueue, RenderPreempted, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, render_priority,
+)
+
+
+def test_compatible_requests_are_batched():
+    """Prueba que peticiones compatibles se agrupan y cada Future recibe su imagen."""
+    print("🧮 Probando agrupación de peticiones compatibles...")
+
+    calls = []
+    lock = threading.Lock()
+
+    def run_batch(prompts, negatives, key, should_abort=None):
+        with lock:
+            calls.append((list(prompts), key))
+        return [f"img:{p}" for p in prompts]
+
+    queue = RenderQueue(run_batch, window_ms=200, max_batch=4)
+    key = (512, 512, 4, 2.0)
+    futures = [queue.submit(f"p{i}", "neg", key) for i in range(4)]
+    other = queue.submit("x", "neg", (256, 256, 4, 2.0))
+
+    results = [f.result(timeout=5) for f in futures]
+    assert results == ["img:p0", "img:p1", "img:p2", "img:p3"], f"❌ Resultados: {results}"
+    assert other.result(timeout=5) == "img:x", "❌ La petición incompatible no se resolvió"
+    assert calls[0] == (["p0", "p1", "p2", "p3"], key), f"❌ Primer lote: {calls[0]}"
+    assert len(calls) == 2, f"❌ Llamadas al pipeline: {len(calls)}"
+    print(f"✅ {len(calls)} llamadas para 5 imágenes")
+    return True
+
+
+def test_failed_batch_retries_individually():
+    """Prueba que un lote fallido se reintenta de uno en uno."""
+    print("\n🔁 Probando reintento por separado...")
+
+    def run_batch(prompts, negatives, key, should_abort=None):
+        if len(prompts) > 1:
+            raise MemoryError("sin memoria")
+        if prompts[0] == "bad":
+            raise ValueError("prompt inválido")
+        return [prompts[0].upper()]
+
+    queue = RenderQueue(run_batch, window_ms=200, max_batch=2)
+    key = (512, 512, 4, 2.0)
+    ok, bad = queue.submit("ok", "", key), queue.submit("bad", "", key)
+
+    assert ok.result(timeout=5) == "OK", "❌ La petición válida no se recuperó"
+    assert isinstance(bad.exception(timeout=5), ValueError), "❌ El error individual no se propagó"
+    print("✅ Reintento correcto")
+    return True
+
+
+def test_interactive_preempts_background():
+    """Prueba que una render interactiva interrumpe a una de fondo entre steps."""
+    print("\n⏱️ Probando prioridades y preempción...")
+
+    order = []
+    started = threading.Event()
+
+    def run_batch(prompts, negatives, key, should_abort=None):
+        # Simula 20 steps comprobando el callback de fin de step
+        for step in range(20):
+            if prompts == ["fondo"]:
+                started.set()
+            if should_abort is not None and should_abort():
+                order.append(f"interrumpida:{prompts[0]}")
+                raise RenderPreempted(f"step {step}")
+            time.sleep(0.01)
+        order.append(prompts[0])
+        return list(prompts)
+
+    queue = RenderQueue(run_batch, window_ms=0, max_batch=4)
+    key = (512, 512, 4, 2.0)
+    background = queue.submit("fondo", "", key, priority=PRIORITY_BACKGROUND)
+    assert started.wait(5), "❌ La render de fondo no empezó"
+    portrait = queue.submit("retrato", "", key, priority=PRIORITY_INTERACTIVE)
+
+    assert portrait.result(timeout=5) == "retrato", "❌ El retrato no se generó"
+    assert background.result(timeout=5) == "fondo", "❌ El fondo no se completó tras la preempción"
+    assert order == ["interrumpida:fondo", "retrato", "fondo"], f"❌ Orden inesperado: {order}"
+    assert queue.preempted == 1, f"❌ Preempciones: {queue.preempted}"
+    print(f"✅ Orden: {order}")
+    return True
+
+
+def test_img2img_shares_queue_and_yields():
+    """Prueba que img2img va por la cola del pipeline, con su payload, y que un retrato lo interrumpe."""
+    print("\n🧬 Probando img2img en la cola de render...")
+
+    order = []
+    started = threading.Event()
+
+    class _Provider(StableDiffusionProvider):
+        """Sin modelo: img2img simula steps y txt2img solo anota el prompt."""
+
+        def _get_img2img_pipeline(self):
+            return None
+
+        def _run_batch(self, prompts, negative_prompts, key, should_abort=None, payload=None):
+            if key[0] == IMG2IMG_OP:
+                return super()._run_batch(prompts, negative_prompts, key, should_abort, payload)
+            order.append(prompts[0])
+            return list(prompts)
+
+        def _run_img2img(self, prompts, negative_prompts, key, base_image, should_abort=None):
+            for step in range(20):
+                started.set()
+                if should_abort is not None and should_abort():
+                    order.append("interrumpido:img2img")
+                    raise RenderPreempted(f"step {step}")
+                time.sleep(0.01)
+            order.append(f"img2img:{key[1]}:{base_image}")
+            return [f"{base_image}:{p}" for p in prompts]
+
+    saved = settings.SD_BATCHING_ENABLED, settings.SD_BATCH_WINDOW_MS
+    settings.SD_BATCHING_ENABLED, settings.SD_BATCH_WINDOW_MS = True, 50
+    try:
+        provider = _Provider()
+        frames = []
+
+        def derive():
+            with render_priority(PRIORITY_BACKGROUND):
+                frames.extend(provider.generate_variations(["f1", "f2"], "base", "kira", size="256x256"))
+
+        worker = threading.Thread(target=derive)
+        worker.start()
+        assert started.wait(5), "❌ img2img no empezó"
+        portrait = provider._get_queue().submit("retrato", "", (256, 256, 10, 7.5))
+        assert portrait.result(timeout=5) == "retrato", "❌ El retrato no se generó"
+        worker.join(5)
+    finally:
+        settings.SD_BATCHING_ENABLED, settings.SD_BATCH_WINDOW_MS = saved
+
+    assert frames == ["base:f1", "base:f2"], f"❌ Frames: {frames}"
+    assert order == ["interrumpido:img2img", "retrato", "img2img:kira:base"], f"❌ Orden inesperado: {order}"
+    assert provider._get_queue().batches == 2, f"❌ Lotes: {provider._get_queue().batches} (img2img en uno)"
+    print(f"✅ Orden: {order}")
+    return True
+
+
+def main():
+    tests = [test_compatible_requests_are_batched, test_failed_batch_retries_individually,
+             test_interactive_preempts_background, test_img2img_shares_queue_and_yields]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para verificar el esquema compacto (claves cortas) de salidas estructuradas.
+"""
+
+import sys
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.Agent.Utils.schema_utils import compact_schema, expand_arguments
+
+_CANDIDATES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "candidates": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name":        {"type": "string"},
+                    "damage":      {"type": "integer"},
+                    "resistence":  {"type": "integer"},
+                    "weapon":      {"type": "string"},
+                    "description": {"type": "string"},
+                },
+                "required": ["name", "damage", "resistence", "weapon", "description"],
+            },
+        }
+    },
+    "required": ["candidates"],
+}
+
+
+def test_compact_schema_keys():
+    """Prueba que las claves cortas son únicas y conservan el nombre canónico."""
+    print("🔧 Probando compact_schema...")
+
+    compact, key_map = compact_schema(_CANDIDATES_SCHEMA)
+    item = compact["properties"]["c"]["items"]
+    short_keys = list(item["properties"].keys())
+
+    assert len(short_keys) == len(set(short_keys)), "❌ Claves cortas duplicadas"
+    assert all(len(k) <= 2 for k in short_keys), f"❌ Claves demasiado largas: {short_keys}"
+    assert sorted(item["required"]) == sorted(short_keys), "❌ 'required' no se tradujo"
+    assert {p["description"] for p in item["properties"].values()} == set(
+        _CANDIDATES_SCHEMA["properties"]["candidates"]["items"]["properties"]
+    ), "❌ Las descripciones no contienen el nombre canónico"
+    print(f"✅ Claves cortas: {short_keys}")
+    return True
+
+
+def test_expand_arguments_roundtrip():
+    """Prueba que la respuesta compacta vuelve a los nombres canónicos."""
+    print("\n🔁 Probando expand_arguments...")
+
+    compact, key_map = compact_schema(_CANDIDATES_SCHEMA)
+    item_keys = key_map["children"]["c"]["items"]["keys"]
+    short = {canonical: s for s, canonical in item_keys.items()}
+
+    wire = {"c": [
+        {short["name"]: "Kumo", short["damage"]: 7, short["resistence"]: 4,
+         short["weapon"]: "katana", short["description"]: "Rápido."},
+        # El modelo a veces responde con nombres largos: se deben respetar
+        {"name": "Raven", "damage": 5},
+    ]}
+    args = expand_arguments(wire, key_map)
+
+    assert list(args.keys()) == ["candidates"], f"❌ Claves raíz: {list(args.keys())}"
+    assert args["candidates"][0] == {
+        "name": "Kumo", "damage": 7, "resistence": 4,
+        "weapon": "katana", "description": "Rápido.",
+    }, f"❌ Item mal traducido: {args['candidates'][0]}"
+    assert args["candidates"][1] == {"name": "Raven", "damage": 5}
+    print("✅ Argumentos traducidos correctamente")
+    return True
+
+
+def main():
+    tests = [test_compact_schema_keys, test_expand_arguments_roundtrip]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para los sprites derivados de una pose base (img2img).
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import app.Agent.agent_sprite_generator as sprite_generator
+import app.Agent.Utils.image_cache as image_cache
+from app.Agent.Utils.image_cache import ImageCache
+from app.Agent.agent_sprite_generator import generate_sprite_image, SPRITE_FRAMES, FRAME_SIZE, PIXEL_ART_FRAME_FACTOR
+from settings.settings import settings
+
+
+class _FakeProvider:
+    """Proveedor sin modelo: cuenta renders completos y derivaciones."""
+    supports_img2img = True
+
+    def __init__(self):
+        self.full_renders = 0
+        self.derived = []
+
+    def generate_image(self, prompt, size="256x256", **kwargs):
+        self.full_renders += 1
+        return Image.new("RGB", (256, 256), (200, 30, 30))
+
+    def generate_variations(self, prompts, base_image, base_key, strength=0.35, size="256x256", **kwargs):
+        self.derived.append((len(prompts), base_key, strength))
+        return [base_image.copy() for _ in prompts]
+
+    def make_transparent_background(self, image):
+        return image.convert("RGBA")
+
+    def save_image(self, image, output_path):
+        image.save(output_path, "PNG")
+        return True
+
+
+def _spec(sprite_type: str, description: str = "Guerrera de armadura azul") -> dict:
+    return {
+        "character_name": "Kira", "sprite_type": sprite_type,
+        "description": description, "color_palette": "azul, plata",
+        "pose_details": "espada en alto", "animation_frames": 6, "reference_style": "pixel art",
+    }
+
+
+def test_types_share_one_base_pose():
+    """Prueba que la pose base se genera una vez y cada tipo se deriva de ella."""
+    print("🧬 Probando derivación de sprites desde la pose base...")
+    fake = _FakeProvider()
+    previous = sprite_generator._image_provider, image_cache._cache
+    sprite_generator._image_provider = fake
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            image_cache._cache = ImageCache(out / "cache", max_bytes=0)
+            idle = generate_sprite_image(_spec("idle"), out)
+            walk = generate_sprite_image(_spec("walk"), out)
+
+            assert fake.full_renders == 1, f"❌ Renders completos: {fake.full_renders} (esperado 1, la base)"
+            assert (out / "kira_base.png").exists(), "❌ No se guardó la pose base"
+            assert len({key for _, key, _ in fake.derived}) == 1, "❌ Los tipos no comparten la base"
+            derived = sum(n for n, _, _ in fake.derived)
+            assert derived == SPRITE_FRAMES["idle"] + SPRITE_FRAMES["walk"], f"❌ Frames derivados: {derived}"
+
+            with Image.open(idle) as sheet:
+                assert sheet.size == (SPRITE_FRAMES["idle"] * FRAME_SIZE, FRAME_SIZE), f"❌ Tira idle: {sheet.size}"
+            with Image.open(walk) as sheet:
+                assert sheet.size == (SPRITE_FRAMES["walk"] * FRAME_SIZE, FRAME_SIZE), f"❌ Tira walk: {sheet.size}"
+    finally:
+        sprite_generator._image_provider, image_cache._cache = previous
+    print(f"✅ 1 render completo y {derived} frames derivados")
+    return True
+
+
+def test_base_pose_keyed_by_prompt():
+    """Prueba que la pose base se cachea por su prompt y no solo por el nombre del personaje."""
+    print("🔑 Probando la clave de la pose base...")
+    fake = _FakeProvider()
+    previous = sprite_generator._image_provider, image_cache._cache
+    sprite_generator._image_provider = fake
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            image_cache._cache = ImageCache(tmp / "cache", max_bytes=0)
+            (tmp / "a").mkdir()
+            (tmp / "b").mkdir()
+            generate_sprite_image(_spec("idle"), tmp / "a")
+            # Mismo nombre, otra descripción: la base antigua no sirve
+            generate_sprite_image(_spec("walk", "Monje de túnica roja"), tmp / "a")
+            assert fake.full_renders == 2, f"❌ Renders completos: {fake.full_renders} (la base cambió)"
+            assert len({key for _, key, _ in fake.derived}) == 2, "❌ Las latentes de la base no cambiaron de clave"
+
+            # La misma descripción en otro directorio sale de la cache
+            generate_sprite_image(_spec("block"), tmp / "b")
+            assert fake.full_renders == 2, "❌ No reutilizó la base cacheada"
+            assert (tmp / "b" / "kira_base.png").exists(), "❌ No se materializó la base"
+            assert fake.derived[0][1] == fake.derived[-1][1], "❌ Misma base con distinta clave"
+    finally:
+        sprite_generator._image_provider, image_cache._cache = previous
+    print("✅ Base regenerada al cambiar el prompt y reutilizada al repetirlo")
+    return True
+
+
+class _NoisyProvider(_FakeProvider):
+    """Frames con ruido: cualquier escalado no entero rompe los bloques de píxeles."""
+
+    def generate_variations(self, prompts, base_image, base_key, strength=0.35, size="256x256", **kwargs):
+        self.derived.append((len(prompts), base_key, strength))
+        return [Image.effect_noise(base_image.size, 80).convert("RGB") for _ in prompts]
+
+
+def test_pixel_art_frames_integer_scale():
+    """Prueba que en pixel art cada píxel lógico del frame es un bloque entero de factor x factor."""
+    print("🧱 Probando frames pixel art con ampliación entera...")
+    fake = _NoisyProvider()
+    previous = sprite_generator._image_provider, image_cache._cache
+    saved = settings.PIXEL_ART_MODE, settings.PALETTE_COLORS
+    sprite_generator._image_provider = fake
+    try:
+        settings.PIXEL_ART_MODE, settings.PALETTE_COLORS = True, 0
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp)
+            image_cache._cache = ImageCache(out / "cache", max_bytes=0)
+            path = generate_sprite_image(_spec("jump"), out)
+            frames, f = SPRITE_FRAMES["jump"], PIXEL_ART_FRAME_FACTOR
+            cell = FRAME_SIZE // f
+
+            with Image.open(out / "lowres" / "kira_jump.png") as low:
+                assert low.size == (frames * cell, cell), f"❌ Tira lowres: {low.size}"
+                low = low.convert("RGBA")
+            with Image.open(path) as sheet:
+                assert sheet.size == (frames * FRAME_SIZE, FRAME_SIZE), f"❌ Tira final: {sheet.size}"
+                sheet = sheet.convert("RGBA")
+            # La final es exactamente la lowres ampliada por nearest: bloques f x f idénticos
+            expected = low.resize(sheet.size, Image.NEAREST)
+            assert sheet.tobytes() == expected.tobytes(), "❌ La tira final no es una ampliación entera"
+    finally:
+        settings.PIXEL_ART_MODE, settings.PALETTE_COLORS = saved
+        sprite_generator._image_provider, image_cache._cache = previous
+    print(f"✅ {frames} frames de {cell} px ampliados x{f}")
+    return True
+
+
+def main():
+    tests = [test_types_share_one_base_pose, test_base_pose_keyed_by_prompt, test_pixel_art_frames_integer_scale]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
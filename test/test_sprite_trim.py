@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para los frames de sprite recortados a su contenido.
+Cada frame lleva su offset: se dibuja en el mismo sitio que el frame completo.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Añadir el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame as pg
+
+from settings.settings import settings
+from app.domain.character import Character
+from app.domain.physics import ActionState
+from app.UI.sprite_renderer import SpriteRenderer
+
+RED = (220, 30, 30, 255)
+# Caja roja de cada frame del spritesheet (x, y, ancho, alto)
+BOXES = [(20, 40, 30, 60), (90, 10, 50, 40), (60, 100, 20, 20)]
+
+
+def _sheet() -> pg.Surface:
+    sheet = pg.Surface((162 * len(BOXES), 162), pg.SRCALPHA)
+    for i, (x, y, w, h) in enumerate(BOXES):
+        sheet.fill(RED, (i * 162 + x, y, w, h))
+    return sheet
+
+
+def test_frames_carry_their_offsets():
+    """Prueba que cada frame recortado conserva su offset y se dibuja en su sitio."""
+    print("✂️ Probando frames recortados...")
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    renderer = SpriteRenderer()
+    frames = renderer._try_extract_frames(_sheet(), "jump", "kira_jump.png")
+    assert [f.trim for f in frames] == [(x, y, 162, 162) for x, y, _, _ in BOXES], \
+        f"❌ Offsets: {[f.trim for f in frames]}"
+    assert [f.surface.get_size() for f in frames] == [(w, h) for _, _, w, h in BOXES], "❌ No se recortaron"
+
+    saved = getattr(settings, 'CHARACTER_SIZE_MULTIPLIER', 2.0)
+    try:
+        settings.CHARACTER_SIZE_MULTIPLIER = 1.0
+        character = Character(name="Kira", damage=5, resistence=5, weapon="espada", description="", portrait="")
+        renderer.animation_frames["Kira_jump"] = frames
+        renderer.sprite_cache["Kira_jump"] = frames[0].surface
+        for i, (x, y, w, h) in enumerate(BOXES):
+            screen = pg.Surface((200, 200), pg.SRCALPHA)
+            renderer.frame_data["Kira_jump"] = {"current_frame": i, "timer": 0.0}
+            assert renderer.render_character(screen, character, 10, 10, action_state=ActionState.JUMPING)
+            drawn = screen.get_bounding_rect()
+            assert tuple(drawn) == (10 + x, 10 + y, w, h), f"❌ Frame {i} dibujado en {tuple(drawn)}"
+    finally:
+        settings.CHARACTER_SIZE_MULTIPLIER = saved
+    print("✅ Cada frame se dibuja en su sitio del frame original")
+    return True
+
+
+def main():
+    tests = [test_frames_carry_their_offsets]
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(e)
+    print(f"\n📊 Resultados: {passed}/{len(tests)} pruebas pasaron")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)